@@ -9,7 +9,7 @@ from InvenTree.status_codes import BuildStatus, StockStatus
 
 import InvenTree.status
 
-from users.models import RuleSet
+from users.models import get_user_roles
 
 
 def health_status(request):
@@ -30,8 +30,12 @@ def health_status(request):
 
     request._inventree_health_status = True
 
+    # The worker status is checked once, and used for both values
+    worker_running = InvenTree.status.check_background_worker()
+
     return {
-        "system_healthy": InvenTree.status.check_system_health(),
+        "system_healthy": InvenTree.status.check_system_health(worker_running=worker_running),
+        "background_worker_running": worker_running,
     }
 
 
@@ -69,36 +73,6 @@ def user_roles(request):
     Each value will return a boolean True / False
     """
 
-    user = request.user
-
-    roles = {
-    }
-
-    if user.is_superuser:
-        for ruleset in RuleSet.RULESET_MODELS.keys():
-            roles[ruleset] = {
-                'view': True,
-                'add': True,
-                'change': True,
-                'delete': True,
-            }
-    else:
-        for group in user.groups.all():
-            for rule in group.rule_sets.all():
-
-                # Ensure the role name is in the dict
-                if rule.name not in roles:
-                    roles[rule.name] = {
-                        'view': user.is_superuser,
-                        'add': user.is_superuser,
-                        'change': user.is_superuser,
-                        'delete': user.is_superuser
-                    }
-
-                # Roles are additive across groups
-                roles[rule.name]['view'] |= rule.can_view
-                roles[rule.name]['add'] |= rule.can_add
-                roles[rule.name]['change'] |= rule.can_change
-                roles[rule.name]['delete'] |= rule.can_delete
+    roles = get_user_roles(request.user)
 
     return {'roles': roles}
@@ -1,3 +1,5 @@
+from django.db import transaction
+
 from djmoney.contrib.exchange.backends.base import BaseExchangeBackend
 
 
@@ -19,3 +21,21 @@ class InvenTreeManualExchangeBackend(BaseExchangeBackend):
         """
         
         return {}
+
+    def update_rates(self, base_currency=None, **kwargs):
+        """
+        Update the exchange rates, and then invalidate the compiled pricing cache.
+
+        (Rates are created with bulk_create, which does not send any signals)
+        """
+
+        from company.pricing import price_cache
+
+        if base_currency is None:
+            super().update_rates(**kwargs)
+        else:
+            super().update_rates(base_currency=base_currency, **kwargs)
+
+        price_cache.invalidate()
+
+        transaction.on_commit(price_cache.invalidate)
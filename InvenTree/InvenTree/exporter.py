@@ -0,0 +1,208 @@
+"""
+Streaming data export for import_export resources.
+
+Exporting a resource with Resource.export() builds the entire dataset in memory,
+and then renders the entire output file (also in memory).
+For large tables (e.g. a full stocktake) this is not feasible.
+
+Instead, the ExportResourceMixin class iterates through the queryset in chunks
+(using a server-side cursor where the database supports it),
+and the output rows are streamed directly to the client.
+"""
+
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import csv
+import tempfile
+
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+
+import tablib
+
+from openpyxl import Workbook
+
+from .helpers import DownloadFile, DownloadFileObject, WrapWithQuotes
+
+
+class ExportResourceMixin:
+    """
+    Mixin class for an import_export ModelResource, which adds a chunked (streaming) export.
+
+    - The queryset is iterated in chunks, using a server-side cursor
+    - Any prefetch_related lookups on the queryset are performed for each chunk
+    - Derived columns can be calculated for each chunk (e.g. using grouped aggregate queries),
+      by overriding the prepare_export_chunk() method
+    """
+
+    export_chunk_size = 2000
+
+    def prepare_export_chunk(self, instances):
+        """
+        Calculate any derived data for a chunk of instances, before they are exported.
+
+        The default implementation does nothing
+        """
+        pass
+
+    def export_chunk(self, instances, prefetch=None):
+
+        if prefetch:
+            prefetch_related_objects(instances, *prefetch)
+
+        self.prepare_export_chunk(instances)
+
+        for instance in instances:
+            yield self.export_resource(instance)
+
+    def export_rows(self, queryset, chunk_size=None):
+        """
+        Generator which yields the header row, and then each data row for the provided queryset
+        """
+
+        if chunk_size is None:
+            chunk_size = self.export_chunk_size
+
+        # Note: iterator() ignores prefetch_related, so perform the prefetch for each chunk instead
+        prefetch = queryset._prefetch_related_lookups
+
+        yield self.get_export_headers()
+
+        chunk = []
+
+        for instance in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(instance)
+
+            if len(chunk) >= chunk_size:
+                yield from self.export_chunk(chunk, prefetch)
+                chunk = []
+
+        if len(chunk) > 0:
+            yield from self.export_chunk(chunk, prefetch)
+
+
+class EchoBuffer:
+    """
+    File-like object which simply returns the value which is written to it.
+    Allows csv.writer to be used to generate streamed output
+    """
+
+    def write(self, value):
+        return value
+
+
+def StreamCSV(rows, filename, delimiter=','):
+    """
+    Stream the provided rows to the client as a CSV (or TSV) file
+    """
+
+    writer = csv.writer(EchoBuffer(), delimiter=delimiter)
+
+    if delimiter == '\t':
+        content_type = 'text/tab-separated-values'
+    else:
+        content_type = 'text/csv'
+
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows),
+        content_type=content_type,
+    )
+
+    response['Content-Disposition'] = 'attachment; filename={f}'.format(f=WrapWithQuotes(filename))
+
+    return response
+
+
+def StreamXLSX(rows, filename):
+    """
+    Write the provided rows to a temporary XLSX file (without holding the rows in memory),
+    and stream the file to the client
+    """
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+
+    for row in rows:
+        worksheet.append(row)
+
+    output = tempfile.TemporaryFile()
+
+    workbook.save(output)
+    output.seek(0)
+
+    return DownloadFileObject(
+        output,
+        filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+def DownloadExport(resource, queryset, export_format, filename):
+    """
+    Export the provided queryset through an ExportResourceMixin resource, and return a file download.
+
+    - CSV / TSV data are streamed to the client row by row
+    - XLSX data are written row by row to a temporary file, which is then streamed
+    - Other formats are generated in memory (using tablib)
+    """
+
+    rows = resource.export_rows(queryset)
+
+    if export_format == 'csv':
+        return StreamCSV(rows, filename)
+    elif export_format == 'tsv':
+        return StreamCSV(rows, filename, delimiter='\t')
+    elif export_format == 'xlsx':
+        return StreamXLSX(rows, filename)
+
+    dataset = tablib.Dataset(headers=next(rows))
+
+    for row in rows:
+        dataset.append(row)
+
+    return DownloadFile(dataset.export(export_format), filename)
+
+
+def WriteExport(resource, queryset, export_format, output):
+    """
+    Export the provided queryset through an ExportResourceMixin resource, and write the data to a (binary) file object.
+
+    Used to generate export files outside of a request (e.g. by a background task)
+    """
+
+    rows = resource.export_rows(queryset)
+
+    if export_format in ['csv', 'tsv']:
+        text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+
+        writer = csv.writer(text, delimiter='\t' if export_format == 'tsv' else ',')
+
+        for row in rows:
+            writer.writerow(row)
+
+        text.flush()
+        text.detach()
+
+    elif export_format == 'xlsx':
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+
+        for row in rows:
+            worksheet.append(row)
+
+        workbook.save(output)
+
+    else:
+        dataset = tablib.Dataset(headers=next(rows))
+
+        for row in rows:
+            dataset.append(row)
+
+        data = dataset.export(export_format)
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        output.write(data)
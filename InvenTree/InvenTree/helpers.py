@@ -3,15 +3,16 @@ Provides helper functions used throughout the InvenTree project
 """
 
 import io
+import functools
 import re
 import json
-import os.path
+import os
 from PIL import Image
 
 from decimal import Decimal
 
 from wsgiref.util import FileWrapper
-from django.http import StreamingHttpResponse
+from django.http import StreamingHttpResponse, FileResponse
 from django.core.exceptions import ValidationError, FieldError
 from django.utils.translation import ugettext as _
 
@@ -337,15 +338,65 @@ def DownloadFile(data, filename, content_type='application/text'):
     return response
 
 
-def extract_serial_numbers(serials, expected_quantity):
+def DownloadFileObject(fileobj, filename, content_type='application/text'):
+    """ Create a streamed file download from an open file object.
+
+    Args:
+        fileobj: Open (binary) file object, positioned at the start of the data
+        filename: Filename for the file download
+        content_type: Content type for the download
+
+    Return:
+        A FileResponse object which streams the file contents (and closes the file when complete)
+    """
+
+    filename = WrapWithQuotes(filename)
+
+    response = FileResponse(fileobj, content_type=content_type)
+    response['Content-Length'] = os.fstat(fileobj.fileno()).st_size
+    response['Content-Disposition'] = 'attachment; filename={f}'.format(f=filename)
+
+    return response
+
+
+def serial_to_int(serial):
+    """ Return the integer value of a serial number (or None if the serial number is not a positive integer).
+
+    Integer values are stored alongside the serial number (see StockItem.serial_int),
+    so that the "latest" and "next available" serial numbers can be found using the database index.
+    """
+
+    if serial is None:
+        return None
+
+    serial = str(serial).strip()
+
+    if not serial.isdigit():
+        return None
+
+    value = int(serial)
+
+    # Values must fit within the (32-bit) database field
+    if value > 2147483647:
+        return None
+
+    return value
+
+
+def extract_serial_numbers(serials, expected_quantity, allocator=None):
     """ Attempt to extract serial numbers from an input string.
     - Serial numbers must be integer values
     - Serial numbers must be positive
     - Serial numbers can be split by whitespace / newline / commma chars
     - Serial numbers can be supplied as an inclusive range using hyphen char e.g. 10-20
 
+    If an allocator is provided, available serial numbers can also be requested:
+    - '~' is replaced with the next available serial number
+    - 'N+' is replaced with available serial numbers (starting from N) for the remaining quantity
+
     Args:
         expected_quantity: The number of (unique) serial numbers we expect
+        allocator: Callable allocator(quantity, start=None, exclude=None) which returns a list of available serial numbers (e.g. Part.allocate_serial_numbers)
     """
 
     serials = serials.strip()
@@ -363,10 +414,25 @@ def extract_serial_numbers(serials, expected_quantity):
     if len(serials) == 0:
         raise ValidationError([_("Empty serial number string")])
 
+    # Serial numbers to be allocated
+    next_count = 0
+    start = None
+
     for group in groups:
 
         group = group.strip()
 
+        if allocator is not None:
+            # Request the next available serial number
+            if group == '~':
+                next_count += 1
+                continue
+
+            # Request available serial numbers, starting from a given value
+            if re.match(r'^\d+\+$', group) and start is None:
+                start = int(group[:-1])
+                continue
+
         # Hyphen indicates a range of numbers
         if '-' in group:
             items = group.split('-')
@@ -404,6 +470,17 @@ def extract_serial_numbers(serials, expected_quantity):
     if len(errors) > 0:
         raise ValidationError(errors)
 
+    if next_count > 0:
+        numbers += allocator(next_count, exclude=numbers)
+
+    if start is not None:
+        remaining = expected_quantity - len(numbers)
+
+        if remaining <= 0:
+            raise ValidationError([_("Invalid group: {g}".format(g=f"{start}+"))])
+
+        numbers += allocator(remaining, start=start, exclude=numbers)
+
     if len(numbers) == 0:
         raise ValidationError([_("No serial numbers found")])
 
@@ -476,6 +553,142 @@ def validateFilterString(value, model=None):
     return results
 
 
+@functools.lru_cache(maxsize=1024)
+def _parseFilterString(value):
+
+    return validateFilterString(value)
+
+
+def parseFilterString(value):
+    """
+    Parse a filter string into a map of key:value pairs.
+
+    Parsed filter strings are cached, so a template filter is only parsed once
+    (until the template is edited and the filter string changes).
+
+    Raises a ValidationError if the filter string is invalid
+    """
+
+    return dict(_parseFilterString(str(value)))
+
+
+def matchFilterTemplates(templates, model, items):
+    """
+    Match a set of filterable templates (e.g. labels or reports) against a set of items.
+
+    Each template provides a 'filters' string, which is evaluated against all items at once,
+    with a single query per (distinct) filter string.
+
+    Args:
+        templates: Iterable of template objects, each with a 'filters' attribute
+        model: Model class of the items being matched
+        items: Iterable of model instances (or a queryset)
+
+    Returns:
+        A dict of {template: set of matching item pk values}.
+        Templates with an invalid filter string match no items.
+    """
+
+    item_ids = set([item.pk for item in items])
+
+    results = {}
+
+    # Cache query results for each distinct filter string
+    matches = {}
+
+    for template in templates:
+
+        filters = str(template.filters)
+
+        if filters not in matches:
+            try:
+                query = model.objects.filter(pk__in=item_ids).filter(**parseFilterString(filters))
+                matches[filters] = set(query.values_list('pk', flat=True))
+            except (ValidationError, FieldError, ValueError):
+                matches[filters] = set()
+
+        results[template] = matches[filters]
+
+    return results
+
+
+def filterTemplatesForItems(templates, model, items):
+    """
+    Return a list of the templates which match *every* provided item
+    """
+
+    items = list(items)
+
+    item_ids = set([item.pk for item in items])
+
+    matches = matchFilterTemplates(templates, model, items)
+
+    return [template for template, matched in matches.items() if matched == item_ids]
+
+
+def bulk_copy(instances, field, targets, batch_size=500):
+    """
+    Create a copy of each provided model instance, for each of the target objects, using bulk inserts.
+
+    e.g. bulk_copy(item.tracking_info.all(), 'item', new_items) copies the tracking history of item to each new item
+
+    Args:
+        instances: Iterable of model instances to copy (all of the same model)
+        field: Name of the ForeignKey field which is pointed at each target
+        targets: List of target objects (which must already be saved)
+        batch_size: Number of copies to insert at once
+
+    Note: As with any bulk_create operation, the save() method is not called and no signals are sent.
+    """
+
+    instances = list(instances)
+
+    if len(instances) == 0 or len(targets) == 0:
+        return
+
+    model = type(instances[0])
+
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+
+    data = [{f.attname: getattr(instance, f.attname) for f in fields} for instance in instances]
+
+    copies = []
+
+    for target in targets:
+        for values in data:
+            copy = model(**values)
+            setattr(copy, field, target)
+
+            copies.append(copy)
+
+        if len(copies) >= batch_size:
+            model.objects.bulk_create(copies, batch_size=batch_size)
+            copies = []
+
+    if len(copies) > 0:
+        model.objects.bulk_create(copies, batch_size=batch_size)
+
+
+def lock_tree_ids(model):
+    """
+    Lock the end of the tree_id range of an MPTT model, and return the largest tree_id in use.
+
+    New trees can then be created (with bulk inserts) using the following tree_id values,
+    which are not used by any concurrent transaction which also calls this function.
+    This allows the inserted rows to be identified by their tree_id values (where primary keys are not returned).
+
+    Must be called within a transaction (the lock is held until the transaction ends).
+    """
+
+    queryset = model.objects.select_for_update().order_by('-tree_id').values_list('tree_id', flat=True)
+
+    # The first (locking) read waits for any other transaction which holds the lock.
+    # The second read then returns the current value (including any trees created by that transaction).
+    queryset.first()
+
+    return queryset.first() or 0
+
+
 def addUserPermission(user, permission):
     """
     Shortcut function for adding a certain permission to a user.
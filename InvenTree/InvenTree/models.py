@@ -16,6 +16,8 @@ from django.dispatch import receiver
 
 from mptt.models import MPTTModel, TreeForeignKey
 
+from common.cache import get_stamp
+
 from .validators import validate_tree_name
 
 
@@ -130,6 +132,39 @@ class InvenTreeTree(MPTTModel):
         """
         return 0
 
+    @classmethod
+    def get_item_counts(cls):
+        """ Return the number of items which exist *directly* in each node of the tree,
+        as a dict of {pk: count}.
+
+        Used to calculate the item counts for an entire tree at once,
+        and should be implemented using a single (grouped) query.
+
+        The default implementation returns an empty dict
+        """
+        return {}
+
+    @classmethod
+    def tree_version_key(cls):
+        """ Name of the (shared) tree version stamp """
+        return 'tree-version-{label}'.format(label=cls._meta.label_lower)
+
+    @classmethod
+    def get_tree_version(cls):
+        """ Return the current version stamp for this tree (or None if it is not available).
+
+        The version stamp changes whenever the tree (or the items within the tree) is modified.
+        Changes made by other processes are seen within VersionStamp.CHECK_INTERVAL seconds.
+        """
+
+        return get_stamp(cls.tree_version_key()).get()
+
+    @classmethod
+    def invalidate_tree(cls):
+        """ Increment the version stamp for this tree """
+
+        get_stamp(cls.tree_version_key()).increment()
+
     def getUniqueParents(self):
         """ Return a flat set of all parent items that exist above this node.
         If any parents are repeated (which would be very bad!), the process is halted
@@ -147,7 +182,7 @@ class InvenTreeTree(MPTTModel):
     @property
     def has_children(self):
         """ True if there are any children under this item """
-        return self.getUniqueChildren(include_self=False).count() > 0
+        return self.get_descendant_count() > 0
 
     def getAcceptableParents(self):
         """ Returns a list of acceptable parent items within this model
@@ -0,0 +1,132 @@
+"""
+Custom pagination classes for the InvenTree API
+"""
+
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import base64
+
+from collections import OrderedDict
+
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class InvenTreePagination(LimitOffsetPagination):
+    """
+    Default pagination class for the InvenTree API.
+
+    By default, results are paginated using limit / offset parameters (e.g. ?limit=100&offset=200).
+
+    Alternatively, keyset ("cursor") pagination is used if the 'cursor' parameter is provided:
+
+    - The first page is requested with an empty cursor (e.g. ?cursor=&limit=500)
+    - Each response provides a 'next' link, which contains the cursor for the following page
+    - Results are ordered by primary key (any requested ordering is ignored)
+    - No count query is performed, and the cost of each page does not depend on how deep it is
+    """
+
+    cursor_query_param = 'cursor'
+
+    cursor_default_limit = 100
+    cursor_max_limit = 1000
+
+    cursor_mode = False
+
+    def use_cursor(self, queryset, request):
+        """
+        Determine if cursor pagination should be used for this request
+        """
+
+        if self.cursor_query_param not in request.query_params:
+            return False
+
+        # Cannot paginate a list, or a queryset which has already been sliced
+        if not hasattr(queryset, 'query') or queryset.query.is_sliced:
+            return False
+
+        return True
+
+    def get_cursor_limit(self, request):
+
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.cursor_default_limit
+
+        return min(max(limit, 1), self.cursor_max_limit)
+
+    def decode_cursor(self, request):
+        """
+        Return the primary key value encoded in the cursor (or None for the first page)
+        """
+
+        cursor = request.query_params.get(self.cursor_query_param, '')
+
+        if not cursor:
+            return None
+
+        try:
+            return int(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii'))
+        except (TypeError, ValueError):
+            raise NotFound(_('Invalid cursor'))
+
+    def encode_cursor(self, position):
+
+        return base64.urlsafe_b64encode(str(position).encode('ascii')).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+
+        self.cursor_mode = self.use_cursor(queryset, request)
+
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        self.limit = self.get_cursor_limit(request)
+
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by('pk')
+
+        if position is not None:
+            queryset = queryset.filter(pk__gt=position)
+
+        # Fetch one extra result, to determine if there is a next page
+        results = list(queryset[:self.limit + 1])
+
+        if len(results) > self.limit:
+            results = results[:self.limit]
+            self.next_position = results[-1].pk
+        else:
+            self.next_position = None
+
+        return results
+
+    def get_next_link(self):
+
+        if not self.cursor_mode:
+            return super().get_next_link()
+
+        if self.next_position is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
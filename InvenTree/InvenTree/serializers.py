@@ -10,7 +10,9 @@ from rest_framework import serializers
 
 import os
 
+from django.apps import apps
 from django.conf import settings
+from django.db import models
 from django.contrib.auth.models import User
 
 
@@ -33,12 +35,118 @@ class UserSerializerBrief(serializers.ModelSerializer):
         ]
 
 
+def get_requested_fields(request):
+    """
+    Return the set of field names requested with a "sparse fieldset" query parameter,
+    e.g. ?fields=pk,name,in_stock
+
+    Returns None if the parameter is not provided (i.e. all fields are requested)
+    """
+
+    if request is None:
+        return None
+
+    fields = request.query_params.get('fields', None)
+
+    if fields is None:
+        return None
+
+    return set([field.strip() for field in fields.split(',') if field.strip()])
+
+
+class InvenTreeAggregateListSerializer(serializers.ListSerializer):
+    """
+    List serializer which calculates aggregate values for all instances at once,
+    before each individual instance is serialized.
+    """
+
+    def to_representation(self, data):
+
+        if isinstance(data, models.Manager):
+            data = data.all()
+
+        instances = list(data)
+
+        self.child.calculate_aggregates(instances)
+
+        return super().to_representation(instances)
+
+
 class InvenTreeModelSerializer(serializers.ModelSerializer):
     """
     Inherits the standard Django ModelSerializer class,
     but also ensures that the underlying model class data are checked on validation.
     """
 
+    # Calculated fields which are aggregated (across all serialized instances) with a grouped query,
+    # rather than a correlated subquery for every row.
+    # Map of {field name: [(model label, key field, aggregate expression), ...]}
+    # If multiple aggregates are provided for a field, the results are summed.
+    # Note: Use InvenTreeAggregateListSerializer as the list_serializer_class
+    aggregates = {}
+
+    # Maximum number of key values in a single aggregate query (larger lists are aggregated in chunks)
+    AGGREGATE_CHUNK_SIZE = 500
+
+    def __init__(self, *args, **kwargs):
+
+        # Optional "sparse fieldset" - only include the specified fields
+        fields = kwargs.pop('fields', None)
+
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in list(self.fields.keys()):
+                if name != 'pk' and name not in fields:
+                    self.fields.pop(name)
+
+    def get_aggregates(self):
+        """ Return the aggregates which are required for the serialized fields """
+
+        return {name: specs for name, specs in self.aggregates.items() if name in self.fields}
+
+    def calculate_aggregates(self, instances):
+        """
+        Calculate aggregate values for a list of instances,
+        with a single grouped query for each aggregate (for each chunk of AGGREGATE_CHUNK_SIZE instances).
+
+        The related rows are always filtered by key, so that only the rows for the serialized instances are aggregated.
+        """
+
+        aggregates = self.get_aggregates()
+
+        if len(aggregates) == 0 or len(instances) == 0:
+            return
+
+        pk_values = sorted(set([instance.pk for instance in instances]))
+
+        chunks = [pk_values[idx:idx + self.AGGREGATE_CHUNK_SIZE] for idx in range(0, len(pk_values), self.AGGREGATE_CHUNK_SIZE)]
+
+        for name, specs in aggregates.items():
+
+            totals = {}
+
+            for label, key, expression in specs:
+
+                for chunk in chunks:
+                    query = apps.get_model(label).objects.filter(**{key + '__in': chunk})
+
+                    query = query.values(key).annotate(value=expression).order_by()
+
+                    for row in query:
+                        totals[row[key]] = totals.get(row[key], 0) + (row['value'] or 0)
+
+            for instance in instances:
+                setattr(instance, name, totals.get(instance.pk, 0))
+
+    def to_representation(self, instance):
+
+        # Calculate any aggregate values which have not already been calculated
+        if any([not hasattr(instance, name) for name in self.get_aggregates()]):
+            self.calculate_aggregates([instance])
+
+        return super().to_representation(instance)
+
     def validate(self, data):
         """ Perform serializer validation.
         In addition to running validators on the serializer fields,
@@ -185,6 +185,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     # InvenTree apps
+    'barcodes.apps.BarcodeConfig',
     'build.apps.BuildConfig',
     'common.apps.CommonConfig',
     'company.apps.CompanyConfig',
@@ -274,7 +275,7 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'InvenTree.pagination.InvenTreePagination',
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
         'rest_framework.permissions.DjangoModelPermissions',
@@ -390,6 +391,14 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'qr-code-cache',
         'TIMEOUT': 3600
+    },
+    'label': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'label-cache',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        }
     }
 }
 
@@ -472,6 +481,25 @@ BACKUP_DIR = get_setting(
     CONFIG.get('backup_dir', tempfile.gettempdir()),
 )
 
+# Number of worker processes used to render label PDF files
+LABEL_RENDER_WORKERS = int(get_setting(
+    'INVENTREE_LABEL_RENDER_WORKERS',
+    CONFIG.get('label_render_workers', 1)
+))
+
+# Maximum number of reports rendered (in memory) at once,
+# larger print jobs are rendered in chunks and streamed to the client
+REPORT_RENDER_CHUNK_SIZE = int(get_setting(
+    'INVENTREE_REPORT_RENDER_CHUNK_SIZE',
+    CONFIG.get('report_render_chunk_size', 50)
+))
+
+# Number of worker processes started by the 'worker' management command (background task queue)
+BACKGROUND_WORKERS = int(get_setting(
+    'INVENTREE_BACKGROUND_WORKERS',
+    CONFIG.get('background_workers', 1)
+))
+
 # Settings for dbbsettings app
 DBBACKUP_STORAGE = 'django.core.files.storage.FileSystemStorage'
 DBBACKUP_STORAGE_OPTIONS = {
@@ -10,30 +10,33 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def check_system_health(**kwargs):
+def check_system_health(worker_running=None, **kwargs):
     """
     Check that the InvenTree system is running OK.
 
     Returns True if all system checks pass.
-    """
 
-    result = True
+    Args:
+        worker_running: Background worker status, if already known (see check_background_worker)
 
-    if not check_celery_worker(**kwargs):
-        result = False
-        logger.warning(_("Celery worker check failed"))
+    Note: The background worker status is reported, but does not fail the health check,
+    as a background worker is not required (tasks are run immediately if no worker is running).
+    """
 
-    if not result:
-        logger.warning(_("InvenTree system health checks failed"))
+    if worker_running is None:
+        worker_running = check_background_worker(**kwargs)
 
-    return result
+    if not worker_running:
+        logger.info(_("Background worker check failed - tasks will be run immediately"))
 
+    return True
 
-def check_celery_worker(**kwargs):
+
+def check_background_worker(**kwargs):
     """
-    Check that a celery worker is running.
+    Check that a background worker is running (i.e. has recorded a recent heartbeat).
     """
 
-    # TODO - Checks that the configured celery worker thing is running
+    from common.tasks import is_worker_running
 
-    return True
+    return is_worker_running()
@@ -242,3 +242,31 @@ class BuildStatus(StatusCode):
         PENDING,
         PRODUCTION,
     ]
+
+
+class TaskStatus(StatusCode):
+
+    # Background task status codes
+    PENDING = 10  # Task is waiting to be run
+    RUNNING = 20  # Task is being run by a worker
+    COMPLETE = 30  # Task completed successfully
+    FAILED = 40  # Task failed (and will not be retried)
+
+    options = {
+        PENDING: _("Pending"),
+        RUNNING: _("Running"),
+        COMPLETE: _("Complete"),
+        FAILED: _("Failed"),
+    }
+
+    colors = {
+        PENDING: 'blue',
+        RUNNING: 'blue',
+        COMPLETE: 'green',
+        FAILED: 'red',
+    }
+
+    ACTIVE_CODES = [
+        PENDING,
+        RUNNING,
+    ]
@@ -1,5 +1,6 @@
 
 import json
+import tempfile
 
 from django.test import TestCase
 import django.core.exceptions as django_exceptions
@@ -175,6 +176,19 @@ class TestDownloadFile(TestCase):
         helpers.DownloadFile("hello world", "out.txt")
         helpers.DownloadFile(bytes("hello world".encode("utf8")), "out.bin")
 
+    def test_download_file_object(self):
+
+        f = tempfile.TemporaryFile()
+        f.write(b"hello world")
+        f.seek(0)
+
+        response = helpers.DownloadFileObject(f, "out.bin")
+
+        self.assertEqual(response['Content-Length'], '11')
+        self.assertEqual(b"".join(response.streaming_content), b"hello world")
+
+        response.close()
+
 
 class TestMPTT(TestCase):
     """ Tests for the MPTT tree models """
@@ -269,3 +283,47 @@ class TestSerialNumberExtraction(TestCase):
 
         with self.assertRaises(ValidationError):
             e("10, a, 7-70j", 4)
+
+    def test_allocate(self):
+        """ Test allocation of available serial numbers """
+
+        used = [1, 2, 3, 5, 8]
+
+        def allocator(quantity, start=None, exclude=None):
+            excluded = [helpers.serial_to_int(x) for x in exclude or []]
+
+            n = (start or max(used) + 1) - 1
+            serials = []
+
+            while len(serials) < quantity:
+                n += 1
+
+                if n not in used and n not in excluded:
+                    serials.append(n)
+
+            return serials
+
+        e = helpers.extract_serial_numbers
+
+        self.assertEqual(e("~", 1, allocator=allocator), [9])
+        self.assertEqual(e("~, ~", 2, allocator=allocator), [9, 10])
+        self.assertEqual(e("1+", 3, allocator=allocator), [4, 6, 7])
+        self.assertEqual(e("4, 1+", 3, allocator=allocator), ['4', 6, 7])
+        self.assertEqual(e("20-21, ~", 3, allocator=allocator), [20, 21, 9])
+
+        # No remaining quantity
+        with self.assertRaises(ValidationError):
+            e("1, 2, 3+", 2, allocator=allocator)
+
+        # Without an allocator, these are not valid
+        with self.assertRaises(ValidationError):
+            e("1+", 3)
+
+    def test_serial_to_int(self):
+
+        self.assertEqual(helpers.serial_to_int('123'), 123)
+        self.assertEqual(helpers.serial_to_int(45), 45)
+        self.assertEqual(helpers.serial_to_int(' 0012 '), 12)
+
+        for serial in [None, '', 'abc', '12a', '-5', '1.5', '99999999999']:
+            self.assertIsNone(helpers.serial_to_int(serial))
@@ -10,6 +10,7 @@ from __future__ import unicode_literals
 
 from django.utils.translation import gettext_lazy as _
 from django.template.loader import render_to_string
+from django.core.cache import cache
 from django.http import JsonResponse, HttpResponseRedirect
 from django.urls import reverse_lazy
 
@@ -48,62 +49,117 @@ class TreeSerializer(views.APIView):
 
         return '#'
 
-    def itemToJson(self, item):
+    # Number of seconds to cache the generated tree (keyed by the tree version)
+    # If None, the tree is generated for every request
+    cache_timeout = None
 
-        data = {
+    def itemToJson(self, item, count=None):
+
+        if count is None:
+            count = item.item_count
+
+        return {
             'pk': item.id,
             'text': item.name,
             'href': item.get_absolute_url(),
-            'tags': [item.item_count],
+            'tags': [count],
         }
 
-        if item.has_children:
-            nodes = []
+    def get_items(self):
+
+        return self.model.objects.all()
+
+    def generate_tree(self):
+        """
+        Construct the entire tree, using the MPTT fields.
 
-            for child in item.children.all().order_by('name'):
-                nodes.append(self.itemToJson(child))
+        - All nodes are fetched in a single query, in depth-first order (tree_id, lft)
+        - Item counts for each node are fetched in a single (grouped) query
+        - Counts are cascaded up the tree in a single (reverse) pass over the nodes
+        - The JSON structure is then assembled in a single (forward) pass over the nodes
+        """
 
-            data['nodes'] = nodes
+        items = self.get_items().only(
+            'pk', 'name', 'parent', 'tree_id', 'lft', 'rght', 'level',
+        ).order_by('tree_id', 'lft')
 
-        return data
+        items = list(items)
 
-    def get_items(self):
+        counts = self.model.get_item_counts()
 
-        return self.model.objects.all()
+        # Children always appear after their parent, so iterate in reverse to cascade the counts upwards
+        totals = {}
 
-    def generate_tree(self):
+        for item in reversed(items):
+            total = totals.get(item.pk, 0) + counts.get(item.pk, 0)
+
+            totals[item.pk] = total
 
-        nodes = []
+            if item.parent_id is not None:
+                totals[item.parent_id] = totals.get(item.parent_id, 0) + total
 
-        items = self.get_items()
+        # Parents always appear before their children, so each node can be attached to its parent immediately
+        nodes = {}
+        top_nodes = []
 
-        # Construct the top-level items
-        top_items = [i for i in items if i.parent is None]
+        for item in items:
+            data = self.itemToJson(item, count=totals[item.pk])
 
-        top_count = 0
+            nodes[item.pk] = data
 
-        # Construct the top-level items
-        top_items = [i for i in items if i.parent is None]
+            parent = nodes.get(item.parent_id, None)
 
-        for item in top_items:
-            nodes.append(self.itemToJson(item))
-            top_count += item.item_count
+            if parent is None:
+                top_nodes.append(data)
+            else:
+                parent.setdefault('nodes', []).append(data)
+
+        # Sort sibling nodes by name
+        for data in nodes.values():
+            if 'nodes' in data:
+                data['nodes'].sort(key=lambda node: node['text'])
+
+        top_nodes.sort(key=lambda node: node['text'])
 
         self.tree = {
             'pk': None,
             'text': self.title,
             'href': self.root_url,
-            'nodes': nodes,
-            'tags': [top_count],
+            'nodes': top_nodes,
+            'tags': [sum([node['tags'][0] for node in top_nodes])],
         }
 
+    def get_tree(self):
+        """
+        Return the generated tree, from the cache if available
+        """
+
+        version = self.model.get_tree_version() if self.cache_timeout is not None else None
+
+        if version is None:
+            self.generate_tree()
+            return self.tree
+
+        key = 'tree-{label}-{version}'.format(
+            label=self.model._meta.label_lower,
+            version=version,
+        )
+
+        tree = cache.get(key)
+
+        if tree is None:
+            self.generate_tree()
+            cache.set(key, self.tree, self.cache_timeout)
+        else:
+            self.tree = tree
+
+        return self.tree
+
     def get(self, request, *args, **kwargs):
         """ Respond to a GET request for the Tree """
 
-        self.generate_tree()
-
         response = {
-            'tree': [self.tree]
+            'tree': [self.get_tree()]
         }
 
         return JsonResponse(response, safe=False)
@@ -9,10 +9,33 @@ from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from stock.models import StockItem
-from stock.serializers import StockItemSerializer
+from stock.models import StockItem, StockLocation
+from stock.serializers import StockItemSerializer, LocationSerializer
+from part.models import Part
+from part.serializers import PartSerializer
 
-from barcodes.barcode import load_barcode_plugins, hash_barcode
+from barcodes.barcode import barcode_registry, hash_barcode
+from barcodes.models import BarcodeHash
+
+
+def render_barcode_match(obj, response):
+    """
+    Add the serialized data (and URL) for an object which matches a barcode hash
+    to the provided response dict.
+    """
+
+    if type(obj) is StockItem:
+        serializer = StockItemSerializer(obj, part_detail=True, location_detail=True, supplier_part_detail=True)
+        response['stockitem'] = serializer.data
+        response['url'] = reverse('stock-item-detail', kwargs={'pk': obj.id})
+
+    elif type(obj) is StockLocation:
+        response['stocklocation'] = LocationSerializer(obj).data
+        response['url'] = reverse('stock-location-detail', kwargs={'pk': obj.id})
+
+    elif type(obj) is Part:
+        response['part'] = PartSerializer(obj).data
+        response['url'] = reverse('part-detail', kwargs={'pk': obj.id})
 
 
 class BarcodeScan(APIView):
@@ -34,7 +57,9 @@ class BarcodeScan(APIView):
     (more information to follow)
 
     hashing:
-    Barcode hashes are calculated using MD5
+    Barcode hashes are calculated using MD5.
+    Barcode hashes which have been assigned to database objects
+    (see BarcodeHash) are matched using a single indexed lookup.
 
     """
 
@@ -52,19 +77,10 @@ class BarcodeScan(APIView):
         if 'barcode' not in data:
             raise ValidationError({'barcode': _('Must provide barcode_data parameter')})
 
-        plugins = load_barcode_plugins()
-
         barcode_data = data.get('barcode')
 
         # Look for a barcode plugin which knows how to deal with this barcode
-        plugin = None
-
-        for plugin_class in plugins:
-            plugin_instance = plugin_class(barcode_data)
-
-            if plugin_instance.validate():
-                plugin = plugin_instance
-                break
+        plugin = barcode_registry.find_plugin(barcode_data)
 
         match_found = False
         response = {}
@@ -77,9 +93,6 @@ class BarcodeScan(APIView):
             # Try to associate with a stock item
             item = plugin.getStockItem()
 
-            if item is None:
-                item = plugin.getStockItemByHash()
-
             if item is not None:
                 response['stockitem'] = plugin.renderStockItem(item)
                 response['url'] = reverse('stock-item-detail', kwargs={'pk': item.id})
@@ -105,22 +118,18 @@ class BarcodeScan(APIView):
             response['plugin'] = plugin.name
 
         # No plugin is found!
-        # However, the hash of the barcode may still be associated with a StockItem!
+        # However, the hash of the barcode may still be associated with a database object!
         else:
-            hash = hash_barcode(barcode_data)
-
-            response['hash'] = hash
+            response['hash'] = hash_barcode(barcode_data)
             response['plugin'] = None
 
-            # Try to look for a matching StockItem
-            try:
-                item = StockItem.objects.get(uid=hash)
-                serializer = StockItemSerializer(item, part_detail=True, location_detail=True, supplier_part_detail=True)
-                response['stockitem'] = serializer.data
-                response['url'] = reverse('stock-item-detail', kwargs={'pk': item.id})
+        if not match_found:
+            # Look for an object which has been assigned this barcode hash
+            obj = BarcodeHash.lookup(response['hash'])
+
+            if obj is not None:
+                render_barcode_match(obj, response)
                 match_found = True
-            except StockItem.DoesNotExist:
-                pass
 
         if not match_found:
             response['error'] = _('No match found for barcode data')
@@ -130,18 +139,228 @@ class BarcodeScan(APIView):
         return Response(response)
 
 
+class BarcodeBatchScan(APIView):
+    """
+    Endpoint for scanning multiple barcodes in a single request.
+
+    The following parameters must be provided:
+
+    - barcodes: List of raw barcode data
+
+    The response is a list containing the scan result for each barcode,
+    in the same format as returned by the BarcodeScan endpoint.
+
+    Rather than resolving each barcode separately, matching database objects
+    are grouped by model, and fetched (and serialized) in a single pass for each model.
+    """
+
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+
+    def serialize_stock_items(self, pks):
+        """ Return a dict of {pk: serialized data} for the provided StockItem pk values """
+
+        queryset = StockItem.objects.filter(pk__in=pks)
+
+        queryset = StockItemSerializer.prefetch_queryset(queryset)
+        queryset = StockItemSerializer.annotate_queryset(queryset)
+        queryset = queryset.select_related('part', 'location', 'supplier_part')
+
+        serializer = StockItemSerializer(queryset, many=True, part_detail=True, location_detail=True, supplier_part_detail=True)
+
+        return {item['pk']: item for item in serializer.data}
+
+    def serialize_locations(self, pks):
+        """ Return a dict of {pk: serialized data} for the provided StockLocation pk values """
+
+        serializer = LocationSerializer(StockLocation.objects.filter(pk__in=pks), many=True)
+
+        return {loc['pk']: loc for loc in serializer.data}
+
+    def serialize_parts(self, pks):
+        """ Return a dict of {pk: serialized data} for the provided Part pk values """
+
+        queryset = PartSerializer.prefetch_queryset(Part.objects.filter(pk__in=pks))
+
+        serializer = PartSerializer(queryset, many=True)
+
+        return {part['pk']: part for part in serializer.data}
+
+    def post(self, request, *args, **kwargs):
+        """
+        Respond to a batch barcode POST request
+        """
+
+        barcodes = request.data.get('barcodes', None)
+
+        if type(barcodes) not in [list, tuple]:
+            raise ValidationError({'barcodes': _('Must provide a list of barcodes')})
+
+        results = []
+
+        # Referenced objects for each barcode, as (model_key, pk) tuples
+        references = []
+
+        # Barcodes which do not reference an object directly are matched by hash
+        hashes = {}
+
+        for idx, barcode_data in enumerate(barcodes):
+
+            response = {
+                'barcode_data': barcode_data,
+            }
+
+            results.append(response)
+            references.append([])
+
+            plugin = barcode_registry.find_plugin(barcode_data)
+
+            if plugin is None:
+                response['hash'] = hash_barcode(barcode_data)
+                response['plugin'] = None
+
+                hashes[idx] = response['hash']
+                continue
+
+            response['hash'] = plugin.hash()
+            response['plugin'] = plugin.name
+
+            try:
+                refs = plugin.getReferences()
+
+                if refs is None:
+                    # Plugin does not support batch lookup - resolve the objects directly
+                    refs = {}
+
+                    for key, method in [('stockitem', plugin.getStockItem), ('stocklocation', plugin.getStockLocation), ('part', plugin.getPart)]:
+                        obj = method()
+
+                        if obj is not None:
+                            refs[key] = obj.pk
+
+            except ValidationError as e:
+                response['error'] = e.detail
+                continue
+
+            for key, pk in refs.items():
+                try:
+                    references[idx].append((key, int(pk)))
+                except (TypeError, ValueError):
+                    response['error'] = {key: _('Invalid primary key')}
+
+            if len(refs) == 0 and 'error' not in response:
+                hashes[idx] = response['hash']
+
+        # Resolve barcode hashes (one query per model type)
+        if len(hashes) > 0:
+            matches = {}
+
+            for item in StockItem.objects.filter(uid__in=hashes.values()).values_list('uid', 'pk'):
+                matches[item[0]] = ('stockitem', item[1])
+
+            model_keys = {
+                StockLocation: 'stocklocation',
+                Part: 'part',
+            }
+
+            entries = BarcodeHash.objects.filter(hash__in=hashes.values()).select_related('model_type')
+
+            for entry in entries:
+                key = model_keys.get(entry.model_type.model_class(), None)
+
+                if key is not None and entry.hash not in matches:
+                    matches[entry.hash] = (key, entry.model_id)
+
+            for idx, hash in hashes.items():
+                if hash in matches:
+                    references[idx].append(matches[hash])
+
+        # Fetch and serialize all referenced objects, grouped by model
+        pks = {
+            'stockitem': set(),
+            'stocklocation': set(),
+            'part': set(),
+        }
+
+        for refs in references:
+            for key, pk in refs:
+                pks[key].add(pk)
+
+        serialized = {
+            'stockitem': self.serialize_stock_items(pks['stockitem']) if pks['stockitem'] else {},
+            'stocklocation': self.serialize_locations(pks['stocklocation']) if pks['stocklocation'] else {},
+            'part': self.serialize_parts(pks['part']) if pks['part'] else {},
+        }
+
+        urls = {
+            'stockitem': 'stock-item-detail',
+            'stocklocation': 'stock-location-detail',
+            'part': 'part-detail',
+        }
+
+        # Messages for objects which were referenced but do not exist
+        missing = {
+            'stockitem': _('Stock item does not exist'),
+            'stocklocation': _('Stock location does not exist'),
+            'part': _('Part does not exist'),
+        }
+
+        for response, refs in zip(results, references):
+
+            if 'error' in response:
+                continue
+
+            match_found = False
+
+            for key, pk in refs:
+
+                data = serialized[key].get(pk, None)
+
+                if data is None:
+                    response['error'] = missing[key]
+                    continue
+
+                response[key] = data
+                response['url'] = reverse(urls[key], kwargs={'pk': pk})
+                match_found = True
+
+            if 'error' in response:
+                continue
+
+            if not match_found:
+                response['error'] = _('No match found for barcode data')
+            else:
+                response['success'] = _('Match found for barcode data')
+
+        return Response(results)
+
+
 class BarcodeAssign(APIView):
     """
-    Endpoint for assigning a barcode to a stock item.
+    Endpoint for assigning a barcode to a stock item, stock location or part.
     
     - This only works if the barcode is not already associated with an object in the database
-    - If the barcode does not match an object, then the barcode hash is assigned to the StockItem
+    - If the barcode does not match an object, then the barcode hash is assigned to the object
+
+    Exactly one of the following parameters must be provided:
+
+    - stockitem: The barcode hash is stored in the StockItem.uid field
+    - stocklocation: The barcode hash is stored in the BarcodeHash table
+    - part: The barcode hash is stored in the BarcodeHash table
     """
 
     permission_classes = [
         permissions.IsAuthenticated
     ]
 
+    # Map of request parameter to the model which can be assigned a barcode
+    ASSIGN_MODELS = {
+        'stockitem': StockItem,
+        'stocklocation': StockLocation,
+        'part': Part,
+    }
+
     def post(self, request, *args, **kwargs):
 
         data = request.data
@@ -149,27 +368,27 @@ class BarcodeAssign(APIView):
         if 'barcode' not in data:
             raise ValidationError({'barcode': _('Must provide barcode_data parameter')})
 
-        if 'stockitem' not in data:
-            raise ValidationError({'stockitem': _('Must provide stockitem parameter')})
-
         barcode_data = data['barcode']
 
-        try:
-            item = StockItem.objects.get(pk=data['stockitem'])
-        except (ValueError, StockItem.DoesNotExist):
-            raise ValidationError({'stockitem': _('No matching stock item found')})
+        target = None
+        obj = None
 
-        plugins = load_barcode_plugins()
+        for key, model in self.ASSIGN_MODELS.items():
+            if key in data:
+                target = key
 
-        plugin = None
+                try:
+                    obj = model.objects.get(pk=data[key])
+                except (ValueError, model.DoesNotExist):
+                    raise ValidationError({key: _('No matching object found')})
 
-        for plugin_class in plugins:
-            plugin_instance = plugin_class(barcode_data)
-
-            if plugin_instance.validate():
-                plugin = plugin_instance
                 break
 
+        if target is None:
+            raise ValidationError({'stockitem': _('Must provide stockitem parameter')})
+
+        plugin = barcode_registry.find_plugin(barcode_data)
+
         match_found = False
 
         response = {}
@@ -197,36 +416,34 @@ class BarcodeAssign(APIView):
                 match_found = True
                 response['error'] = _('Barcode already matches Part object')
 
-            if not match_found:
-                item = plugin.getStockItemByHash()
-
-                if item is not None:
-                    response['error'] = _('Barcode hash already matches StockItem object')
-                    match_found = True
-
         else:
             hash = hash_barcode(barcode_data)
 
             response['hash'] = hash
             response['plugin'] = None
 
-            # Lookup stock item by hash
-            try:
-                item = StockItem.objects.get(uid=hash)
-                response['error'] = _('Barcode hash already matches StockItem object')
+        if not match_found:
+            # Ensure that the barcode hash does not already match a database entry
+            existing = BarcodeHash.lookup(hash)
+
+            if existing is not None:
+                response['error'] = _('Barcode hash already matches {model} object').format(model=type(existing).__name__)
                 match_found = True
-            except StockItem.DoesNotExist:
-                pass
 
         if not match_found:
-            response['success'] = _('Barcode associated with StockItem')
 
             # Save the barcode hash
-            item.uid = response['hash']
-            item.save()
+            if target == 'stockitem':
+                obj.uid = hash
+                obj.save()
 
-            serializer = StockItemSerializer(item, part_detail=True, location_detail=True, supplier_part_detail=True)
-            response['stockitem'] = serializer.data
+                response['success'] = _('Barcode associated with StockItem')
+            else:
+                BarcodeHash.assign(obj, hash)
+
+                response['success'] = _('Barcode associated with {model}').format(model=type(obj).__name__)
+
+            render_barcode_match(obj, response)
 
         return Response(response)
 
@@ -234,6 +451,8 @@ class BarcodeAssign(APIView):
 barcode_api_urls = [
 
     url(r'^link/$', BarcodeAssign.as_view(), name='api-barcode-link'),
+
+    url(r'^batch/$', BarcodeBatchScan.as_view(), name='api-barcode-batch'),
     
     # Catch-all performs barcode 'scan'
     url(r'^.*$', BarcodeScan.as_view(), name='api-barcode-scan'),
@@ -0,0 +1,28 @@
+from __future__ import unicode_literals
+
+import logging
+
+from django.apps import AppConfig
+
+
+logger = logging.getLogger(__name__)
+
+
+class BarcodeConfig(AppConfig):
+    name = 'barcodes'
+
+    def ready(self):
+        """
+        This function is called whenever the barcodes app is loaded.
+        """
+
+        self.load_barcode_plugins()
+
+    def load_barcode_plugins(self):
+        """
+        Discover the available barcode plugins (once only).
+        """
+
+        from .barcode import barcode_registry
+
+        barcode_registry.load()
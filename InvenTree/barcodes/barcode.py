@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import re
 import string
 import hashlib
 import logging
+import threading
 
 from InvenTree import plugins as InvenTreePlugins
 from barcodes import plugins as BarcodePlugins
@@ -44,10 +46,50 @@ class BarcodePlugin:
     # Override the barcode plugin name for each sub-class
     PLUGIN_NAME = ""
 
+    # Cheap pre-filters, used to skip plugins which cannot possibly match the barcode data.
+    # Override for each sub-class as required:
+    # - BARCODE_PREFIX: String (or list of strings) which the barcode data must start with
+    # - BARCODE_REGEX: Regular expression which the barcode data must match
+    BARCODE_PREFIX = None
+    BARCODE_REGEX = None
+
     @property
     def name(self):
         return self.PLUGIN_NAME
 
+    @classmethod
+    def matches(cls, barcode_data):
+        """
+        Check the barcode data against the pre-filters for this plugin.
+
+        This is called *before* the plugin is instantiated,
+        and must not access the database.
+
+        Returns:
+            False if the barcode data cannot match this plugin, otherwise True
+        """
+
+        # Pre-filters only apply to string data
+        if type(barcode_data) is not str:
+            return True
+
+        data = barcode_data.strip()
+
+        if cls.BARCODE_PREFIX:
+            prefix = cls.BARCODE_PREFIX
+
+            if type(prefix) in [list, tuple]:
+                prefix = tuple(prefix)
+
+            if not data.startswith(prefix):
+                return False
+
+        if cls.BARCODE_REGEX:
+            if not re.match(cls.BARCODE_REGEX, data):
+                return False
+
+        return True
+
     def __init__(self, barcode_data):
         """
         Initialize the BarcodePlugin instance
@@ -58,6 +100,23 @@ class BarcodePlugin:
 
         self.data = barcode_data
 
+    def getReferences(self):
+        """
+        Return the primary keys of the database objects referenced by this barcode,
+        *without* accessing the database (used for batch barcode lookups).
+
+        Returns a dict which may contain the following keys:
+
+        - stockitem: StockItem primary key
+        - stocklocation: StockLocation primary key
+        - part: Part primary key
+
+        Default implementation returns None,
+        in which case getStockItem(), getStockLocation() and getPart() are called instead.
+        """
+
+        return None
+
     def getStockItem(self):
         """
         Attempt to retrieve a StockItem associated with this barcode.
@@ -141,16 +200,27 @@ class BarcodePlugin:
         return False
 
 
-def load_barcode_plugins(debug=False):
+class BarcodePluginRegistry:
     """
-    Function to load all barcode plugins
+    Registry of the available barcode plugins.
+
+    Plugins are discovered once (when the app is loaded),
+    rather than every time a barcode is scanned.
     """
 
-    logger.debug("Loading barcode plugins")
+    def __init__(self):
+        self.plugins = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Discover all barcode plugins
+        """
+
+        logger.debug("Loading barcode plugins")
 
-    plugins = InvenTreePlugins.get_plugins(BarcodePlugins, BarcodePlugin)
+        plugins = InvenTreePlugins.get_plugins(BarcodePlugins, BarcodePlugin)
 
-    if debug:
         if len(plugins) > 0:
             logger.info(f"Discovered {len(plugins)} barcode plugins")
 
@@ -159,4 +229,54 @@ def load_barcode_plugins(debug=False):
         else:
             logger.debug("No barcode plugins found")
 
-    return plugins
+        with self.lock:
+            self.plugins = plugins
+
+        return plugins
+
+    def get_plugins(self):
+        """
+        Return the list of registered barcode plugin classes
+        """
+
+        plugins = self.plugins
+
+        if plugins is None:
+            plugins = self.load()
+
+        return plugins
+
+    def find_plugin(self, barcode_data):
+        """
+        Find a plugin which can handle the provided barcode data.
+
+        Plugins are only instantiated (and validated) if the barcode data
+        passes the pre-filters for that plugin.
+
+        Returns:
+            A (validated) plugin instance, or None if no plugin matches
+        """
+
+        for plugin_class in self.get_plugins():
+
+            if not plugin_class.matches(barcode_data):
+                continue
+
+            plugin = plugin_class(barcode_data)
+
+            if plugin.validate():
+                return plugin
+
+        return None
+
+
+# Global barcode plugin registry
+barcode_registry = BarcodePluginRegistry()
+
+
+def load_barcode_plugins(debug=False):
+    """
+    Function to load all barcode plugins
+    """
+
+    return barcode_registry.get_plugins()
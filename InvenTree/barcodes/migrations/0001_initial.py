@@ -0,0 +1,29 @@
+# Generated by Django 3.0.7 on 2021-04-07 11:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarcodeHash',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(help_text='Barcode hash', max_length=128, unique=True)),
+                ('model_id', models.PositiveIntegerField()),
+                ('model_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='barcodehash',
+            constraint=models.UniqueConstraint(fields=('model_type', 'model_id'), name='unique_barcode_object'),
+        ),
+    ]
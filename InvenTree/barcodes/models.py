@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+Barcode database model definitions
+"""
+
+from __future__ import unicode_literals
+
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from stock.models import StockItem
+
+
+class BarcodeHash(models.Model):
+    """
+    A BarcodeHash maps the hash of (third-party) barcode data to a database object,
+    so that a scanned barcode can be resolved with a single indexed lookup.
+
+    StockItem barcodes are stored in the StockItem.uid field,
+    this table provides the same functionality for other models (e.g. Part, StockLocation).
+
+    Attributes:
+        hash: Hash of the barcode data
+        model_type: Type of the linked object
+        model_id: Primary key of the linked object
+        linked_object: The linked object
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_type', 'model_id'], name='unique_barcode_object'),
+        ]
+
+    hash = models.CharField(max_length=128, unique=True, help_text=_('Barcode hash'))
+
+    model_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+
+    model_id = models.PositiveIntegerField()
+
+    linked_object = GenericForeignKey('model_type', 'model_id')
+
+    def __str__(self):
+        return f'{self.hash} -> {self.model_type.model} {self.model_id}'
+
+    @classmethod
+    def assign(cls, obj, hash):
+        """
+        Assign a barcode hash to the provided object (replacing any existing hash)
+        """
+
+        model_type = ContentType.objects.get_for_model(obj)
+
+        entry, created = cls.objects.update_or_create(
+            model_type=model_type,
+            model_id=obj.pk,
+            defaults={'hash': hash},
+        )
+
+        return entry
+
+    @classmethod
+    def lookup(cls, hash):
+        """
+        Find the database object associated with the provided barcode hash.
+
+        StockItem objects are checked first (using the unique StockItem.uid field),
+        followed by any other object types.
+
+        Returns:
+            The matching object, or None if no match is found
+        """
+
+        if not hash:
+            return None
+
+        item = StockItem.objects.filter(uid=hash).first()
+
+        if item is not None:
+            return item
+
+        entry = cls.objects.filter(hash=hash).select_related('model_type').first()
+
+        if entry is None:
+            return None
+
+        obj = entry.linked_object
+
+        if obj is None:
+            # The linked object no longer exists
+            entry.delete()
+
+        return obj
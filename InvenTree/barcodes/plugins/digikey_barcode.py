@@ -11,6 +11,9 @@ class DigikeyBarcodePlugin(BarcodePlugin):
 
     PLUGIN_NAME = "DigikeyBarcode"
 
+    # Digikey 2D barcodes use the ISO/IEC 15434 message envelope
+    BARCODE_PREFIX = "[)>"
+
     def validate(self):
         """
         TODO: Validation of Digikey barcodes.
@@ -25,6 +25,9 @@ class InvenTreeBarcodePlugin(BarcodePlugin):
 
     PLUGIN_NAME = "InvenTreeBarcode"
 
+    # InvenTree barcodes are encoded as JSON objects
+    BARCODE_PREFIX = "{"
+
     def validate(self):
         """
         An "InvenTree" barcode must be a jsonnable-dict with the following tags:
@@ -58,26 +61,49 @@ class InvenTreeBarcodePlugin(BarcodePlugin):
 
         return True
 
-    def getStockItem(self):
+    def getPrimaryKey(self, key):
+        """
+        Extract the primary key value for the given key in the barcode data.
+
+        The value can either be an integer, or a dict containing an 'id' field.
+        """
+
+        pk = None
+
+        # Initially try casting to an integer
+        try:
+            pk = int(self.data[key])
+        except (TypeError, ValueError):
+            pk = None
+
+        if pk is None:
+            try:
+                pk = self.data[key]['id']
+            except (AttributeError, KeyError, TypeError):
+                raise ValidationError({key: "id parameter not supplied"})
+
+        return pk
+
+    def getReferences(self):
+        """
+        Return the primary keys of the objects referenced by this barcode,
+        without accessing the database.
+        """
+
+        references = {}
 
         for k in self.data.keys():
-            if k.lower() == 'stockitem':
+            if k.lower() in ['stockitem', 'stocklocation', 'part']:
+                references[k.lower()] = self.getPrimaryKey(k)
 
-                data = self.data[k]
+        return references
 
-                pk = None
+    def getStockItem(self):
 
-                # Initially try casting to an integer
-                try:
-                    pk = int(data)
-                except (TypeError, ValueError):
-                    pk = None
+        for k in self.data.keys():
+            if k.lower() == 'stockitem':
 
-                if pk is None:
-                    try:
-                        pk = self.data[k]['id']
-                    except (AttributeError, KeyError):
-                        raise ValidationError({k: "id parameter not supplied"})
+                pk = self.getPrimaryKey(k)
 
                 try:
                     item = StockItem.objects.get(pk=pk)
@@ -92,20 +118,7 @@ class InvenTreeBarcodePlugin(BarcodePlugin):
         for k in self.data.keys():
             if k.lower() == 'stocklocation':
 
-                pk = None
-
-                # First try simple integer lookup
-                try:
-                    pk = int(self.data[k])
-                except (TypeError, ValueError):
-                    pk = None
-
-                if pk is None:
-                    # Lookup by 'id' field
-                    try:
-                        pk = self.data[k]['id']
-                    except (AttributeError, KeyError):
-                        raise ValidationError({k: "id parameter not supplied"})
+                pk = self.getPrimaryKey(k)
 
                 try:
                     loc = StockLocation.objects.get(pk=pk)
@@ -120,19 +133,7 @@ class InvenTreeBarcodePlugin(BarcodePlugin):
         for k in self.data.keys():
             if k.lower() == 'part':
 
-                pk = None
-
-                # Try integer lookup first
-                try:
-                    pk = int(self.data[k])
-                except (TypeError, ValueError):
-                    pk = None
-
-                if pk is None:
-                    try:
-                        pk = self.data[k]['id']
-                    except (AttributeError, KeyError):
-                        raise ValidationError({k, 'id parameter not supplied'})
+                pk = self.getPrimaryKey(k)
 
                 try:
                     part = Part.objects.get(pk=pk)
@@ -10,7 +10,10 @@ from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 
-from stock.models import StockItem
+from stock.models import StockItem, StockLocation
+
+from barcodes.barcode import barcode_registry
+from barcodes.plugins.inventree_barcode import InvenTreeBarcodePlugin
 
 
 class BarcodeAPITest(APITestCase):
@@ -30,6 +33,7 @@ class BarcodeAPITest(APITestCase):
         self.client.login(username='testuser', password='password')
 
         self.scan_url = reverse('api-barcode-scan')
+        self.batch_url = reverse('api-barcode-batch')
         self.assign_url = reverse('api-barcode-link')
 
     def postBarcode(self, url, barcode):
@@ -144,3 +148,126 @@ class BarcodeAPITest(APITestCase):
 
         self.assertIn('error', data)
         self.assertNotIn('success', data)
+
+    def test_location_association(self):
+        """
+        Test that a barcode can be associated with a StockLocation
+        """
+
+        barcode_data = 'A-LOCATION-BARCODE'
+
+        response = self.postBarcode(self.scan_url, barcode_data)
+
+        self.assertIn('error', response.data)
+
+        response = self.client.post(
+            self.assign_url, format='json',
+            data={
+                'barcode': barcode_data,
+                'stocklocation': 1,
+            }
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('success', response.data)
+
+        # Scanning the barcode now returns the location
+        response = self.postBarcode(self.scan_url, barcode_data)
+
+        data = response.data
+
+        self.assertIn('success', data)
+        self.assertIn('stocklocation', data)
+        self.assertEqual(data['stocklocation']['pk'], 1)
+
+        # Cannot assign the same barcode to a stock item
+        response = self.client.post(
+            self.assign_url, format='json',
+            data={
+                'barcode': barcode_data,
+                'stockitem': 522,
+            }
+        )
+
+        self.assertIn('error', response.data)
+        self.assertNotIn('success', response.data)
+
+        # Deleting the location removes the barcode match
+        StockLocation.objects.get(pk=1).delete()
+
+        response = self.postBarcode(self.scan_url, barcode_data)
+
+        self.assertIn('error', response.data)
+
+    def test_registry(self):
+        """
+        Test the barcode plugin registry and pre-filters
+        """
+
+        self.assertIn(InvenTreeBarcodePlugin, barcode_registry.get_plugins())
+
+        # Pre-filter rejects non-JSON data
+        self.assertFalse(InvenTreeBarcodePlugin.matches('123456789'))
+        self.assertTrue(InvenTreeBarcodePlugin.matches('{"stockitem": 522}'))
+
+        item = StockItem.objects.get(pk=522)
+
+        plugin = barcode_registry.find_plugin(item.format_barcode())
+
+        self.assertIsNotNone(plugin)
+        self.assertEqual(plugin.getStockItem(), item)
+
+        self.assertIsNone(barcode_registry.find_plugin('123456789'))
+
+    def test_batch(self):
+        """
+        Test scanning multiple barcodes in a single request
+        """
+
+        response = self.client.post(self.batch_url, format='json', data={'barcodes': 'not-a-list'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        item = StockItem.objects.get(pk=522)
+
+        hashed = StockItem.objects.get(pk=521)
+
+        self.client.post(self.assign_url, format='json', data={'barcode': 'A-HASHED-ITEM', 'stockitem': hashed.pk})
+
+        barcodes = [
+            item.format_barcode(),
+            StockLocation.objects.get(pk=1).format_barcode(),
+            'A-HASHED-ITEM',
+            '123456789',
+            '{"stockitem": 999999}',
+        ]
+
+        response = self.client.post(self.batch_url, format='json', data={'barcodes': barcodes})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = response.data
+
+        self.assertEqual(len(data), 5)
+
+        for result in data:
+            self.assertIn('barcode_data', result)
+            self.assertIn('hash', result)
+            self.assertIn('plugin', result)
+
+        self.assertEqual(data[0]['stockitem']['pk'], item.pk)
+        self.assertIn('success', data[0])
+
+        self.assertEqual(data[1]['stocklocation']['pk'], 1)
+
+        self.assertEqual(data[2]['stockitem']['pk'], hashed.pk)
+        self.assertIsNone(data[2]['plugin'])
+
+        self.assertIn('error', data[3])
+        self.assertIn('error', data[4])
+
+        # Results must match the single-scan endpoint
+        single = self.postBarcode(self.scan_url, barcodes[0]).data
+
+        self.assertEqual(single['stockitem']['pk'], data[0]['stockitem']['pk'])
+        self.assertEqual(single['url'], data[0]['url'])
@@ -0,0 +1,328 @@
+"""
+Stock allocation engine for build orders.
+
+Allocating stock one BOM line at a time (for a single build output) requires several queries per line.
+Instead, the BuildAllocator loads everything required to allocate stock against
+any number of build outputs (across any number of builds) using a fixed number of queries:
+
+- The BOM lines for each build
+- The (incomplete) build outputs for each build
+- The existing BuildItem allocations
+- The candidate stock items for every BOM line, along with the quantity already allocated for each item
+
+Stock is then allocated in memory (taking into account stock which has already been allocated
+by earlier outputs in the same pass), and the BuildItem objects are created using bulk_create.
+
+The order in which candidate stock items are used is determined by the allocation strategy:
+
+- unique: Only allocate if there is a single stock item available for a BOM line
+- fifo: Use the oldest stock items first
+- expiry: Use the stock items which expire soonest first (then the oldest)
+- location: Use stock from the preferred location first (then from whichever location holds the most stock)
+"""
+
+import datetime
+import logging
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum, Q
+from django.utils.translation import ugettext_lazy as _
+
+import common.models
+
+from part import models as PartModels
+from stock import models as StockModels
+
+from build import models as BuildModels
+
+
+logger = logging.getLogger(__name__)
+
+
+STRATEGY_UNIQUE = 'unique'
+STRATEGY_FIFO = 'fifo'
+STRATEGY_EXPIRY = 'expiry'
+STRATEGY_LOCATION = 'location'
+
+STRATEGIES = [
+    (STRATEGY_UNIQUE, _('Only allocate where a single stock item is available')),
+    (STRATEGY_FIFO, _('Oldest stock first')),
+    (STRATEGY_EXPIRY, _('Soonest expiry first')),
+    (STRATEGY_LOCATION, _('Preferred location first')),
+]
+
+
+def in_location(location, tree_id, lft):
+    """ Return True if the location (given by tree_id, lft) is within the given StockLocation (or is the same) """
+
+    if location is None or tree_id is None:
+        return False
+
+    return location.tree_id == tree_id and location.lft <= lft <= location.rght
+
+
+class BuildAllocator:
+    """
+    Allocate stock against the outputs of one or more builds.
+
+    Builds are allocated in order of target date (then by creation),
+    and the outputs of each build in order of creation.
+
+    Attributes:
+        builds: List of Build objects
+        outputs: Dict of {build_pk: [output, ...]}
+        allocations: List of BuildItem objects (unsaved) created by allocate()
+    """
+
+    def __init__(self, builds, outputs=None, strategy=STRATEGY_FIFO, location=None):
+        """
+        Args:
+            builds: Iterable of Build objects
+            outputs: Optional list of build outputs to allocate against (default = all incomplete outputs)
+            strategy: Allocation strategy (see STRATEGIES)
+            location: Preferred StockLocation (for the 'location' strategy)
+        """
+
+        if strategy not in [code for code, label in STRATEGIES]:
+            raise ValueError(f"Invalid allocation strategy: '{strategy}'")
+
+        self.strategy = strategy
+        self.location = location
+
+        self.builds = sorted(
+            builds,
+            key=lambda build: (build.target_date is None, build.target_date or datetime.date.max, build.pk)
+        )
+
+        self.allocations = []
+
+        self.load_outputs(outputs)
+        self.load_bom()
+        self.load_allocations()
+        self.load_stock()
+
+    def load_outputs(self, outputs):
+        """ Load the build outputs to allocate against """
+
+        build_ids = [build.pk for build in self.builds]
+
+        if outputs is None:
+            outputs = StockModels.StockItem.objects.filter(build__in=build_ids, is_building=True)
+
+        self.outputs = defaultdict(list)
+
+        for output in sorted(outputs, key=lambda output: output.pk):
+            if output is not None and output.build_id in build_ids:
+                self.outputs[output.build_id].append(output)
+
+    def load_bom(self):
+        """ Load the BOM lines for each build, as {part_pk: [(sub_part_pk, quantity), ...]} """
+
+        part_ids = set([build.part_id for build in self.builds])
+
+        quantities = defaultdict(dict)
+
+        for part, sub_part, quantity in PartModels.BomItem.objects.filter(part__in=part_ids).order_by('pk').values_list('part', 'sub_part', 'quantity'):
+            quantities[part][sub_part] = quantities[part].get(sub_part, 0) + quantity
+
+        self.bom = {}
+
+        for part, lines in quantities.items():
+            self.bom[part] = list(lines.items())
+
+        self.sub_parts = set()
+
+        for lines in self.bom.values():
+            self.sub_parts.update([sub_part for sub_part, quantity in lines])
+
+    def load_allocations(self):
+        """ Load the existing allocations against the builds """
+
+        # Quantity allocated for each (output, part)
+        self.allocated = defaultdict(Decimal)
+
+        # Existing (build, stock_item, output) allocations (which must be unique)
+        self.existing = set()
+
+        allocations = BuildModels.BuildItem.objects.filter(build__in=[build.pk for build in self.builds])
+
+        for build, stock_item, output, part, quantity in allocations.values_list('build', 'stock_item', 'install_into', 'stock_item__part', 'quantity'):
+            self.allocated[(output, part)] += quantity
+            self.existing.add((build, stock_item, output))
+
+    def load_stock(self):
+        """
+        Load the candidate stock items for every BOM line,
+        and the quantity which is available (not already allocated) for each item.
+        """
+
+        items = StockModels.StockItem.objects.filter(StockModels.StockItem.IN_STOCK_FILTER)
+        items = items.filter(part__in=self.sub_parts)
+
+        # Exclude expired stock items
+        if not common.models.InvenTreeSetting.get_setting('STOCK_ALLOW_EXPIRED_BUILD'):
+            items = items.exclude(StockModels.StockItem.EXPIRED_FILTER)
+
+        # If every build has a source location, only stock within those locations is considered
+        sources = [build.take_from for build in self.builds]
+
+        if None not in sources and len(sources) > 0:
+            location_filter = Q()
+
+            for source in sources:
+                location_filter |= Q(location__tree_id=source.tree_id, location__lft__gte=source.lft, location__rght__lte=source.rght)
+
+            items = items.filter(location_filter)
+
+        items = list(items.select_related('part', 'location').order_by('pk'))
+
+        item_ids = [item.pk for item in items]
+
+        allocated = defaultdict(Decimal)
+
+        build_allocations = BuildModels.BuildItem.objects.filter(stock_item__in=item_ids).values('stock_item').annotate(q=Sum('quantity'))
+
+        for row in build_allocations.values_list('stock_item', 'q'):
+            allocated[row[0]] += row[1] or 0
+
+        so_allocations = StockModels.StockItem.objects.filter(pk__in=item_ids, sales_order_allocations__isnull=False)
+        so_allocations = so_allocations.values('pk').annotate(q=Sum('sales_order_allocations__quantity'))
+
+        for row in so_allocations.values_list('pk', 'q'):
+            allocated[row[0]] += row[1] or 0
+
+        self.available = {}
+        self.stock = defaultdict(list)
+
+        for item in items:
+            self.available[item.pk] = max(item.quantity - allocated[item.pk], 0)
+            self.stock[item.part_id].append(item)
+
+        # Total available quantity in each location (for the 'location' strategy)
+        self.location_totals = defaultdict(Decimal)
+
+        for item in items:
+            self.location_totals[(item.part_id, item.location_id)] += self.available[item.pk]
+
+        for part in self.stock:
+            self.stock[part] = sorted(self.stock[part], key=self.get_sort_key)
+
+    def get_sort_key(self, item):
+        """ Return the sort key for a stock item, according to the allocation strategy """
+
+        if self.strategy == STRATEGY_EXPIRY:
+            return (item.expiry_date is None, item.expiry_date or datetime.date.max, item.pk)
+
+        if self.strategy == STRATEGY_LOCATION:
+            preferred = False
+
+            if item.location is not None:
+                preferred = in_location(self.location, item.location.tree_id, item.location.lft)
+
+            return (not preferred, -self.location_totals[(item.part_id, item.location_id)], item.location_id or 0, item.pk)
+
+        return (item.pk,)
+
+    def get_candidates(self, build, output, part):
+        """ Return the stock items (in order of preference) which can be allocated against a BOM line """
+
+        candidates = []
+
+        for item in self.stock.get(part, []):
+
+            # Stock item must be within the source location for the build
+            if build.take_from is not None:
+                if item.location is None or not in_location(build.take_from, item.location.tree_id, item.location.lft):
+                    continue
+
+            # Stock item has already been allocated to this build output
+            if (build.pk, item.pk, output.pk) in self.existing:
+                continue
+
+            if self.available[item.pk] <= 0:
+                continue
+
+            candidates.append(item)
+
+        return candidates
+
+    def allocate(self):
+        """
+        Allocate stock against every BOM line, for every build output.
+
+        Returns a list of (unsaved) BuildItem objects
+        """
+
+        self.allocations = []
+
+        for build in self.builds:
+            for output in self.outputs.get(build.pk, []):
+                for part, quantity in self.bom.get(build.part_id, []):
+
+                    required = quantity * output.quantity - self.allocated[(output.pk, part)]
+
+                    if required <= 0:
+                        continue
+
+                    candidates = self.get_candidates(build, output, part)
+
+                    if self.strategy == STRATEGY_UNIQUE and len(candidates) != 1:
+                        continue
+
+                    for item in candidates:
+
+                        if required <= 0:
+                            break
+
+                        take = min(self.available[item.pk], required)
+
+                        # Serialized stock must be allocated as a single unit
+                        if item.serialized and take < 1:
+                            continue
+
+                        self.allocations.append(BuildModels.BuildItem(
+                            build=build,
+                            stock_item=item,
+                            quantity=take,
+                            install_into=output,
+                        ))
+
+                        self.available[item.pk] -= take
+                        self.allocated[(output.pk, part)] += take
+                        self.existing.add((build.pk, item.pk, output.pk))
+
+                        required -= take
+
+        return self.allocations
+
+    @transaction.atomic
+    def save(self):
+        """
+        Allocate stock, and create the BuildItem objects.
+
+        Returns the list of created BuildItem objects
+        """
+
+        allocations = self.allocate()
+
+        BuildModels.BuildItem.objects.bulk_create(allocations, batch_size=500)
+
+        # Bulk operations do not trigger the post_save signal, so update the stock summary here
+        PartModels.PartStockSummary.update_parts(set([item.stock_item.part_id for item in allocations]), create=False)
+
+        logger.info(f"Created {len(allocations)} stock allocations for {len(self.builds)} builds")
+
+        return allocations
+
+
+def auto_allocate(builds, outputs=None, strategy=STRATEGY_FIFO, location=None):
+    """
+    Allocate stock against multiple builds (and build outputs) in a single pass.
+
+    Returns the list of created BuildItem objects
+    """
+
+    return BuildAllocator(builds, outputs=outputs, strategy=strategy, location=location).save()
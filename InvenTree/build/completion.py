@@ -0,0 +1,279 @@
+"""
+Bulk completion of build outputs.
+
+Completing a build output one allocation at a time (via BuildItem.complete_allocation) requires,
+for each allocated stock item:
+
+- A full copy of the stock item (and its history) if the item must be split, or
+- A separate take_stock() call (with its own save and tracking entry)
+
+followed by the deletion of each BuildItem.
+
+Instead, the BuildCompletion class completes any number of build outputs (of the same build) at once:
+
+- The allocations are loaded (and the allocated stock items locked) with a single query
+- Allocations are grouped by stock item, and the splits and quantity changes are calculated in memory
+- Split stock items are created with one bulk insert per source stock item (see StockItem.split_children)
+- Quantity changes, installed items and completed outputs are written using bulk_update
+- Tracking entries are written using bulk_create
+- The allocations are deleted with a single query
+
+The time taken by each phase is recorded (see BuildCompletion.timings).
+"""
+
+import time
+import logging
+
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.db import transaction
+from django.utils.translation import ugettext as _
+
+from InvenTree import helpers
+
+from part import models as PartModels
+from stock import models as StockModels
+
+from build import models as BuildModels
+
+
+logger = logging.getLogger(__name__)
+
+
+class BuildCompletion:
+    """
+    Complete a number of build outputs (of a single build) at once.
+
+    Attributes:
+        build: The Build object
+        outputs: List of build outputs (StockItem objects) to be completed
+        location: Location for the completed outputs
+        timings: Dict of {phase: seconds} for each phase of the completion
+    """
+
+    def __init__(self, build, outputs, user, location=None):
+        """
+        Args:
+            build: Build object
+            outputs: Iterable of build outputs (StockItem objects)
+            user: User completing the outputs
+            location: Location for the completed outputs (default = build destination)
+        """
+
+        self.build = build
+        self.user = user
+        self.location = location
+        self.today = datetime.now().date()
+
+        self.outputs = []
+
+        for output in outputs:
+            if output.build_id != build.pk or not output.is_building:
+                logger.warning(f"Stock item {output.pk} is not an incomplete output of build {build.pk}")
+                continue
+
+            self.outputs.append(output)
+
+        self.timings = {}
+
+        self.tracking = []
+        self.part_ids = set([build.part_id])
+
+    @contextmanager
+    def phase(self, name):
+        """ Record the time taken by a phase of the completion """
+
+        t_start = time.time()
+
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + time.time() - t_start
+
+    def track(self, item, title, notes=''):
+        """ Construct (but do not save) a tracking entry for a stock item """
+
+        self.tracking.append(StockModels.StockItemTracking(
+            item=item,
+            title=title,
+            user=self.user,
+            quantity=item.quantity,
+            date=self.today,
+            notes=notes,
+            system=True,
+        ))
+
+    def load(self):
+        """ Load the allocations against the outputs, and lock the allocated stock items """
+
+        self.allocations = list(BuildModels.BuildItem.objects.filter(
+            build=self.build,
+            install_into__in=[output.pk for output in self.outputs]
+        ).order_by('pk'))
+
+        stock_ids = set([allocation.stock_item_id for allocation in self.allocations])
+
+        self.stock_items = StockModels.StockItem.objects.filter(pk__in=stock_ids).select_related('part').select_for_update().in_bulk()
+
+        # Allocations for each stock item (in order of allocation)
+        self.grouped = defaultdict(list)
+
+        for allocation in self.allocations:
+            self.grouped[allocation.stock_item_id].append(allocation)
+
+    def consume(self, item, allocations):
+        """
+        Remove the allocated quantity from a (non-trackable) stock item.
+
+        Returns True if the stock item has been changed (and must be saved)
+        """
+
+        if item.serialized or item.infinite:
+            return False
+
+        quantity = sum([allocation.quantity for allocation in allocations])
+
+        if quantity <= 0:
+            return False
+
+        item.quantity = max(item.quantity - quantity, 0)
+
+        if item.quantity == 0 and item.delete_on_deplete and item.can_delete():
+            self.depleted.append(item)
+            return False
+
+        self.track(item, f"{_('Removed')} {helpers.normalize(quantity)} {_('items')}")
+
+        return True
+
+    def prepare(self, child, allocation):
+        """ Install a stock item (split from an allocated stock item) into the output for the allocation """
+
+        child.belongs_to_id = allocation.install_into_id
+        child.updated = self.today
+
+    def install(self, item, allocations):
+        """
+        Install a (trackable) stock item into the build outputs.
+
+        If the stock item is allocated to multiple outputs (or is only partially allocated),
+        the allocated quantity for each output is split from the stock item, as per BuildItem.complete_allocation.
+
+        Returns True if the stock item has been changed (and must be saved)
+        """
+
+        remaining = item.quantity
+        splits = []
+        installed = False
+
+        for allocation in allocations:
+            if remaining > allocation.quantity:
+                splits.append(allocation)
+                remaining -= allocation.quantity
+            elif not installed:
+                # The stock item itself is installed into the output
+                item.belongs_to_id = allocation.install_into_id
+                installed = True
+            else:
+                logger.warning(f"Stock item {item.pk} is over-allocated - allocation {allocation.pk} cannot be completed")
+
+        if len(splits) == 0:
+            return installed
+
+        item.split_children([(allocation.quantity, allocation) for allocation in splits], self.track, prepare=self.prepare)
+
+        return True
+
+    @transaction.atomic
+    def complete(self):
+        """
+        Complete the build outputs.
+
+        Returns the number of outputs completed
+        """
+
+        if len(self.outputs) == 0:
+            return 0
+
+        t_start = time.time()
+
+        with self.phase('load'):
+            self.load()
+
+        updated = []
+        self.depleted = []
+
+        with self.phase('allocations'):
+            for pk, allocations in self.grouped.items():
+                item = self.stock_items[pk]
+
+                self.part_ids.add(item.part_id)
+
+                if item.part.trackable:
+                    changed = self.install(item, allocations)
+                else:
+                    changed = self.consume(item, allocations)
+
+                if changed:
+                    item.updated = self.today
+                    updated.append(item)
+
+        with self.phase('stock'):
+            StockModels.StockItem.objects.bulk_update(updated, ['quantity', 'belongs_to', 'updated'], batch_size=500)
+
+            # Depleted stock items are deleted individually (as per StockItem.updateQuantity)
+            for item in self.depleted:
+                item.delete()
+
+        with self.phase('outputs'):
+            location = self.location or self.build.destination
+
+            for output in self.outputs:
+                output.build = self.build
+                output.is_building = False
+                output.location = location
+                output.updated = self.today
+
+                self.track(output, _('Completed build output'))
+
+            StockModels.StockItem.objects.bulk_update(self.outputs, ['build', 'is_building', 'location', 'updated'], batch_size=500)
+
+            # Increase the completed quantity for the build
+            self.build.completed += sum([output.quantity for output in self.outputs])
+            self.build.save()
+
+        with self.phase('tracking'):
+            StockModels.StockItemTracking.objects.bulk_create(self.tracking, batch_size=500)
+
+        with self.phase('cleanup'):
+            BuildModels.BuildItem.objects.filter(pk__in=[allocation.pk for allocation in self.allocations]).delete()
+
+            # Bulk operations do not trigger the post_save signal, so update the stock summary (and location tree) here
+            PartModels.PartStockSummary.update_parts(self.part_ids, create=False)
+
+            StockModels.StockLocation.invalidate_tree()
+            transaction.on_commit(StockModels.StockLocation.invalidate_tree)
+
+        timings = ', '.join([f"{name}: {seconds:.2f}s" for name, seconds in self.timings.items()])
+
+        logger.info(
+            f"Completed {len(self.outputs)} outputs for build {self.build.pk} "
+            f"({len(self.allocations)} allocations) in {time.time() - t_start:.2f}s ({timings})"
+        )
+
+        return len(self.outputs)
+
+
+def complete_outputs(build, outputs, user, location=None):
+    """
+    Complete multiple outputs of a build at once.
+
+    Returns the BuildCompletion object (which provides the timing information for each phase)
+    """
+
+    completion = BuildCompletion(build, outputs, user, location=location)
+    completion.complete()
+
+    return completion
@@ -13,6 +13,7 @@ from InvenTree.fields import RoundingDecimalFormField
 from InvenTree.fields import DatePickerFormField
 
 from .models import Build, BuildItem, BuildOrderAttachment
+from . import allocation
 
 from stock.models import StockLocation, StockItem
 
@@ -167,11 +168,19 @@ class AutoAllocateForm(HelperForm):
         queryset=StockItem.objects.all(),
     )
 
+    strategy = forms.ChoiceField(
+        choices=allocation.STRATEGIES,
+        initial=allocation.STRATEGY_UNIQUE,
+        label=_('Strategy'),
+        help_text=_('Select how stock items are allocated'),
+    )
+
     class Meta:
         model = Build
         fields = [
             'confirm',
             'output',
+            'strategy',
         ]
 
 
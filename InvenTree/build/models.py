@@ -35,6 +35,9 @@ from stock import models as StockModels
 from part import models as PartModels
 from users import models as UserModels
 
+from . import allocation
+from . import completion
+
 
 class Build(MPTTModel):
     """ A Build object organises the creation of new StockItem objects from other existing StockItem objects.
@@ -486,19 +489,22 @@ class Build(MPTTModel):
         self.status = BuildStatus.CANCELLED
         self.save()
 
-    def getAutoAllocations(self, output):
+    def getAutoAllocations(self, output, strategy=None, location=None):
         """
         Return a list of StockItem objects which will be allocated
         using the 'AutoAllocate' function.
 
-        For each item in the BOM for the attached Part,
-        the following tests must *all* evaluate to True,
-        for the part to be auto-allocated:
+        Allocations are calculated by the BuildAllocator (see build.allocation).
+        The default strategy only allocates stock against a BOM line if:
+
+        - There is only a single stock item available (which has not already been allocated to this build output)
+        - The stock item has an (unallocated) quantity greater than zero
+
+        Args:
+            output: The build output to allocate against
+            strategy: Allocation strategy (default = STRATEGY_UNIQUE)
+            location: Preferred stock location (for the 'location' strategy)
 
-        - The sub_item in the BOM line must *not* be trackable
-        - There is only a single stock item available (which has not already been allocated to this build)
-        - The stock item has an availability greater than zero
-        
         Returns:
             A list object containing the StockItem objects to be allocated (and the quantities).
             Each item in the list is a dict as follows:
@@ -508,58 +514,18 @@ class Build(MPTTModel):
             }
         """
 
-        allocations = []
-
-        """
-        Iterate through each item in the BOM
-        """
-
-        for bom_item in self.bom_items:
+        if strategy is None:
+            strategy = allocation.STRATEGY_UNIQUE
 
-            part = bom_item.sub_part
-
-            # Skip any parts which are already fully allocated
-            if self.isPartFullyAllocated(part, output):
-                continue
-
-            # How many parts are required to complete the output?
-            required = self.unallocatedQuantity(part, output)
-
-            # Grab a list of stock items which are available
-            stock_items = self.availableStockItems(part, output)
-
-            # Ensure that the available stock items are in the correct location
-            if self.take_from is not None:
-                # Filter for stock that is located downstream of the designated location
-                stock_items = stock_items.filter(location__in=[loc for loc in self.take_from.getUniqueChildren()])
-
-            # Only one StockItem to choose from? Default to that one!
-            if stock_items.count() == 1:
-                stock_item = stock_items[0]
-
-                # Double check that we have not already allocated this stock-item against this build
-                build_items = BuildItem.objects.filter(
-                    build=self,
-                    stock_item=stock_item,
-                    install_into=output
-                )
+        allocator = allocation.BuildAllocator([self], outputs=[output], strategy=strategy, location=location)
 
-                if len(build_items) > 0:
-                    continue
-
-                # How many items are actually available?
-                if stock_item.quantity > 0:
-
-                    # Only take as many as are available
-                    if stock_item.quantity < required:
-                        required = stock_item.quantity
-
-                    allocation = {
-                        'stock_item': stock_item,
-                        'quantity': required,
-                    }
+        allocations = []
 
-                    allocations.append(allocation)
+        for build_item in allocator.allocate():
+            allocations.append({
+                'stock_item': build_item.stock_item,
+                'quantity': build_item.quantity,
+            })
 
         return allocations
 
@@ -682,35 +648,27 @@ class Build(MPTTModel):
         output.delete()
 
     @transaction.atomic
-    def autoAllocate(self, output):
+    def autoAllocate(self, output, strategy=None, location=None):
         """
         Run auto-allocation routine to allocate StockItems to this Build.
 
         Args:
             output: If specified, only auto-allocate against the given built output
+                    (otherwise, allocate against all incomplete outputs)
+            strategy: Allocation strategy (default = STRATEGY_UNIQUE)
+            location: Preferred stock location (for the 'location' strategy)
 
-        Returns a list of dict objects with keys like:
-
-            {
-                'stock_item': item,
-                'quantity': quantity,
-            }
+        Returns a list of the created BuildItem objects
 
         See: getAutoAllocations()
         """
 
-        allocations = self.getAutoAllocations(output)
+        if strategy is None:
+            strategy = allocation.STRATEGY_UNIQUE
 
-        for item in allocations:
-            # Create a new allocation
-            build_item = BuildItem(
-                build=self,
-                stock_item=item['stock_item'],
-                quantity=item['quantity'],
-                install_into=output,
-            )
+        outputs = [output] if output else None
 
-            build_item.save()
+        return allocation.auto_allocate([self], outputs=outputs, strategy=strategy, location=location)
 
     @transaction.atomic
     def completeBuildOutput(self, output, user, **kwargs):
@@ -724,38 +682,22 @@ class Build(MPTTModel):
         # Select the location for the build output
         location = kwargs.get('location', self.destination)
 
-        # List the allocated BuildItem objects for the given output
-        allocated_items = output.items_to_install.all()
+        self.completeBuildOutputs([output], user, location=location)
 
-        for build_item in allocated_items:
-
-            # TODO: This is VERY SLOW as each deletion from the database takes ~1 second to complete
-            # TODO: Use celery / redis to offload the actual object deletion...
-            # REF: https://www.botreetechnologies.com/blog/implementing-celery-using-django-for-background-task-processing
-            # REF: https://code.tutsplus.com/tutorials/using-celery-with-django-for-background-task-processing--cms-28732
-
-            # Complete the allocation of stock for that item
-            build_item.complete_allocation(user)
-
-        # Delete the BuildItem objects from the database
-        allocated_items.all().delete()
-
-        # Ensure that the output is updated correctly
-        output.build = self
-        output.is_building = False
-        output.location = location
+    def completeBuildOutputs(self, outputs, user, location=None):
+        """
+        Complete multiple build outputs at once (see build.completion)
 
-        output.save()
+        Args:
+            outputs: List of build outputs (StockItem objects)
+            user: User completing the outputs
+            location: Location for the completed outputs (default = build destination)
 
-        output.addTransactionNote(
-            _('Completed build output'),
-            user,
-            system=True
-        )
+        Returns:
+            Number of outputs completed
+        """
 
-        # Increase the completed quantity for this build
-        self.completed += output.quantity
-        self.save()
+        return completion.BuildCompletion(self, outputs, user, location=location).complete()
 
     def requiredQuantity(self, part, output):
         """
@@ -0,0 +1,42 @@
+"""
+Background tasks for the build app
+"""
+
+import logging
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from common.tasks import register_task
+
+from stock import models as StockModels
+
+from build import models as BuildModels
+
+
+logger = logging.getLogger(__name__)
+
+
+@register_task
+@transaction.atomic
+def complete_build_outputs(build_id, output_ids, user_id=None, location_id=None):
+    """
+    Complete a number of build outputs (see Build.completeBuildOutputs)
+
+    Any outputs which have already been completed are ignored.
+
+    Returns the number of outputs completed
+    """
+
+    build = BuildModels.Build.objects.get(pk=build_id)
+
+    # Lock the build outputs, so that they cannot be completed twice
+    outputs = list(StockModels.StockItem.objects.select_for_update().filter(pk__in=output_ids, is_building=True))
+
+    if len(outputs) < len(output_ids):
+        logger.warning(f"{len(output_ids) - len(outputs)} outputs of build {build_id} have already been completed")
+
+    user = User.objects.get(pk=user_id) if user_id else None
+    location = StockModels.StockLocation.objects.get(pk=location_id) if location_id else None
+
+    return build.completeBuildOutputs(outputs, user, location=location)
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
+from datetime import datetime, timedelta
+
 from django.test import TestCase
 
 from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
 
 from build.models import Build, BuildItem
+from build import allocation
 from stock.models import StockItem
 from part.models import Part, BomItem
 from InvenTree import status_codes as status
@@ -223,6 +226,79 @@ class BuildTest(TestCase):
         # But, the *other* build output has not been allocated against
         self.assertFalse(self.build.isPartFullyAllocated(self.sub_part_2, self.output_2))
 
+    def test_auto_allocate_fifo(self):
+        """
+        Allocate against all build outputs, using multiple stock items
+        """
+
+        self.stock_1_1.quantity = 70
+        self.stock_1_1.save()
+
+        items = self.build.autoAllocate(None, strategy=allocation.STRATEGY_FIFO)
+
+        # sub_part_1: 50 + 20 (stock_1_1) and 30 (stock_1_2), sub_part_2: 125 + 125 (stock_2_1)
+        self.assertEqual(len(items), 5)
+        self.assertEqual(BuildItem.objects.count(), 5)
+
+        self.assertTrue(self.build.isFullyAllocated(self.output_1))
+        self.assertTrue(self.build.isFullyAllocated(self.output_2))
+
+        self.assertEqual(self.stock_1_1.build_allocation_count(), 70)
+        self.assertEqual(self.stock_1_2.build_allocation_count(), 30)
+        self.assertEqual(self.stock_2_1.build_allocation_count(), 250)
+
+        # Nothing left to allocate
+        self.assertEqual(len(self.build.autoAllocate(None, strategy=allocation.STRATEGY_FIFO)), 0)
+
+    def test_auto_allocate_expiry(self):
+        """
+        Stock which expires soonest is allocated first
+        """
+
+        self.stock_1_2.expiry_date = datetime.now().date() + timedelta(days=10)
+        self.stock_1_2.save()
+
+        allocator = allocation.BuildAllocator([self.build], strategy=allocation.STRATEGY_EXPIRY)
+
+        items = [item for item in allocator.allocate() if item.stock_item.part == self.sub_part_1]
+
+        self.assertEqual([item.stock_item for item in items], [self.stock_1_2, self.stock_1_2])
+
+        # Nothing has been saved yet
+        self.assertEqual(BuildItem.objects.count(), 0)
+
+    def test_auto_allocate_multiple_builds(self):
+        """
+        Allocate stock against multiple builds in a single pass
+        """
+
+        build = Build.objects.create(
+            reference="2",
+            title="Another build",
+            part=self.assembly,
+            quantity=2,
+            target_date=datetime.now().date(),
+        )
+
+        output = StockItem.objects.create(
+            part=self.assembly,
+            quantity=2,
+            is_building=True,
+            build=build,
+        )
+
+        self.stock_2_1.quantity = 100
+        self.stock_2_1.save()
+
+        allocation.auto_allocate([self.build, build])
+
+        # The build with a target date is allocated first
+        self.assertEqual(build.allocatedQuantity(self.sub_part_2, output), 50)
+        self.assertEqual(self.build.allocatedQuantity(self.sub_part_2, self.output_1), 50)
+        self.assertEqual(self.build.allocatedQuantity(self.sub_part_2, self.output_2), 0)
+
+        self.assertTrue(build.isFullyAllocated(output))
+
     def test_cancel(self):
         """
         Test cancellation of the build
@@ -286,3 +362,71 @@ class BuildTest(TestCase):
 
         for output in outputs:
             self.assertFalse(output.is_building)
+
+    def test_complete_multiple(self):
+        """
+        Test completion of multiple build outputs at once (including trackable components)
+        """
+
+        component = Part.objects.create(
+            name="Tracked widget",
+            description="A trackable widget",
+            component=True,
+            trackable=True,
+        )
+
+        BomItem.objects.create(part=self.assembly, sub_part=component, quantity=1)
+
+        # A batch of 20 components (split between the outputs)
+        batch = StockItem.objects.create(part=component, quantity=20, batch='B123')
+
+        # A single serialized component
+        serialized = StockItem.objects.create(part=component, quantity=1, serial='1')
+
+        self.allocate_stock(50, 50, 125, self.output_1)
+        self.allocate_stock(50, 50, 125, self.output_2)
+
+        BuildItem.objects.create(build=self.build, stock_item=batch, quantity=5, install_into=self.output_1)
+        BuildItem.objects.create(build=self.build, stock_item=batch, quantity=4, install_into=self.output_2)
+        BuildItem.objects.create(build=self.build, stock_item=serialized, quantity=1, install_into=self.output_2)
+
+        n = StockItem.objects.count()
+
+        self.assertEqual(self.build.completeBuildOutputs([self.output_1, self.output_2], None), 2)
+
+        self.assertEqual(BuildItem.objects.count(), 0)
+
+        self.build.refresh_from_db()
+        self.assertEqual(self.build.completed, 10)
+
+        for output in [self.output_1, self.output_2]:
+            output.refresh_from_db()
+            self.assertFalse(output.is_building)
+
+        # Non-trackable stock is consumed (stock_1_2 is depleted)
+        self.assertEqual(StockItem.objects.get(pk=self.stock_1_1.pk).quantity, 900)
+        self.assertEqual(StockItem.objects.get(pk=self.stock_2_1.pk).quantity, 4750)
+        self.assertFalse(StockItem.objects.filter(pk=self.stock_1_2.pk).exists())
+
+        # Trackable stock is split from the batch, and installed into the outputs
+        batch.refresh_from_db()
+        self.assertEqual(batch.quantity, 11)
+
+        children = StockItem.objects.filter(parent=batch)
+        self.assertEqual(children.count(), 2)
+
+        self.assertEqual(children.get(belongs_to=self.output_1).quantity, 5)
+        self.assertEqual(children.get(belongs_to=self.output_2).quantity, 4)
+
+        for child in children:
+            self.assertEqual(child.batch, 'B123')
+            self.assertTrue(child.tracking_info.filter(title__icontains='Split').exists())
+
+        serialized.refresh_from_db()
+        self.assertEqual(serialized.belongs_to, self.output_2)
+
+        # Two new items created, one item deleted
+        self.assertEqual(StockItem.objects.count(), n + 1)
+
+        # Completing the outputs again has no effect
+        self.assertEqual(self.build.completeBuildOutputs([self.output_1, self.output_2], None), 0)
@@ -14,6 +14,7 @@ from django.urls import reverse
 from part.models import Part
 from .models import Build, BuildItem, BuildOrderAttachment
 from . import forms
+from . import allocation
 from stock.models import StockLocation, StockItem
 
 from InvenTree.views import AjaxUpdateView, AjaxCreateView, AjaxDeleteView
@@ -21,6 +22,10 @@ from InvenTree.views import InvenTreeRoleMixin
 from InvenTree.helpers import str2bool, extract_serial_numbers, normalize
 from InvenTree.status_codes import BuildStatus
 
+from common.tasks import offload_task, is_worker_running
+
+from .tasks import complete_build_outputs
+
 
 class BuildIndex(InvenTreeRoleMixin, ListView):
     """ View for displaying list of Builds
@@ -80,7 +85,8 @@ class BuildCancel(AjaxUpdateView):
 
 class BuildAutoAllocate(AjaxUpdateView):
     """ View to auto-allocate parts for a build.
-    Follows a simple set of rules to automatically allocate StockItem objects.
+    Follows a simple set of rules to automatically allocate StockItem objects
+    (according to the selected allocation strategy).
 
     Ref: build.models.Build.getAutoAllocations()
     """
@@ -128,9 +134,14 @@ class BuildAutoAllocate(AjaxUpdateView):
         except (ValueError, StockItem.DoesNotExist):
             output = None
 
+        strategy = form['strategy'].value()
+
+        if strategy not in [code for code, label in allocation.STRATEGIES]:
+            strategy = allocation.STRATEGY_UNIQUE
+
         if output:
             context['output'] = output
-            context['allocations'] = build.getAutoAllocations(output)
+            context['allocations'] = build.getAutoAllocations(output, strategy=strategy)
 
         context['build'] = build
 
@@ -160,8 +171,9 @@ class BuildAutoAllocate(AjaxUpdateView):
         """
 
         output = form.cleaned_data.get('output', None)
+        strategy = form.cleaned_data.get('strategy', None)
 
-        build.autoAllocate(output)
+        build.autoAllocate(output, strategy=strategy)
 
     def get_data(self):
         return {
@@ -190,7 +202,7 @@ class BuildOutputCreate(AjaxUpdateView):
         # Check that the serial numbers are valid
         if serials:
             try:
-                extracted = extract_serial_numbers(serials, quantity)
+                extracted = extract_serial_numbers(serials, quantity, allocator=build.part.allocate_serial_numbers)
 
                 if extracted:
                     # Check for conflicting serial numbers
@@ -224,7 +236,7 @@ class BuildOutputCreate(AjaxUpdateView):
         serials = data.get('serial_numbers', None)
 
         if serials:
-            serial_numbers = extract_serial_numbers(serials, quantity)
+            serial_numbers = extract_serial_numbers(serials, quantity, allocator=build.part.allocate_serial_numbers)
         else:
             serial_numbers = None
 
@@ -560,15 +572,47 @@ class BuildOutputComplete(AjaxUpdateView):
         location = data.get('location', None)
         output = data.get('output', None)
 
-        # Complete the build output
-        build.completeBuildOutput(
-            output,
-            self.request.user,
-            location=location,
-        )
-    
+        args = [build.pk, [output.pk], self.request.user.pk, location.pk if location else None]
+
+        if is_worker_running():
+            # Complete the build output in the background
+            offload_task('build.tasks.complete_build_outputs', *args, user=self.request.user)
+
+            self.queued = True
+            return
+
+        try:
+            completed = complete_build_outputs(*args)
+        except ValidationError as e:
+            for message in e.messages:
+                form.add_error(None, message)
+
+            completed = 0
+
+        if not completed:
+            if not form.non_field_errors():
+                form.add_error(None, _('Build output could not be completed'))
+
+            self.failed_form = form
+
     def get_data(self):
         """ Provide feedback data back to the form """
+
+        form = getattr(self, 'failed_form', None)
+
+        if form is not None:
+            # The build output was not completed, so the form is shown again (with the errors)
+            return {
+                'form_valid': False,
+                'form_errors': form.errors.as_json(),
+                'non_field_errors': form.non_field_errors().as_json(),
+            }
+
+        if getattr(self, 'queued', False):
+            return {
+                'success': _('Build output completion has been queued')
+            }
+
         return {
             'success': _('Build output completed')
         }
@@ -5,7 +5,7 @@ from django.contrib import admin
 
 from import_export.admin import ImportExportModelAdmin
 
-from .models import InvenTreeSetting
+from .models import InvenTreeSetting, BackgroundTask, WorkerHeartbeat
 
 
 class SettingsAdmin(ImportExportModelAdmin):
@@ -13,4 +13,18 @@ class SettingsAdmin(ImportExportModelAdmin):
     list_display = ('key', 'value')
 
 
+class BackgroundTaskAdmin(admin.ModelAdmin):
+
+    list_display = ('name', 'status', 'attempts', 'created', 'finished', 'worker', 'user')
+
+    list_filter = ('status', 'name')
+
+
+class WorkerHeartbeatAdmin(admin.ModelAdmin):
+
+    list_display = ('name', 'host', 'pid', 'started', 'last_seen', 'task', 'completed')
+
+
 admin.site.register(InvenTreeSetting, SettingsAdmin)
+admin.site.register(BackgroundTask, BackgroundTaskAdmin)
+admin.site.register(WorkerHeartbeat, WorkerHeartbeatAdmin)
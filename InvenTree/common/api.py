@@ -5,5 +5,37 @@ Provides a JSON API for common components.
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from django.conf.urls import url
+
+from rest_framework import generics, permissions
+
+from .models import BackgroundTask
+from .serializers import BackgroundTaskSerializer
+
+
+class BackgroundTaskDetail(generics.RetrieveAPIView):
+    """
+    API endpoint for checking the status (and result) of a background task.
+
+    Users can only view the tasks which they have queued (staff users can view any task).
+    """
+
+    serializer_class = BackgroundTaskSerializer
+
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+
+    def get_queryset(self):
+
+        queryset = BackgroundTask.objects.all()
+
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+
+        return queryset
+
+
 common_api_urls = [
+    url(r'^task/(?P<pk>\d+)/', BackgroundTaskDetail.as_view(), name='api-task-detail'),
 ]
@@ -0,0 +1,319 @@
+"""
+In-memory cache for InvenTreeSetting values.
+
+Settings are read very frequently (e.g. the default currency is read for every price calculation),
+but change very rarely. Rather than querying the database for each lookup,
+all settings are loaded (in a single query) into a process-local dict.
+
+To keep multiple server processes (e.g. gunicorn workers) coherent,
+a version stamp is stored in the database (see VersionStamp).
+Whenever a setting is saved or deleted, the version stamp is incremented,
+and each process reloads its local copy once it sees the new stamp.
+
+Note: The Django cache cannot be used for the version stamp,
+as the default (LocMemCache) backend is not shared between processes.
+"""
+
+import logging
+import threading
+import time
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.utils import OperationalError, ProgrammingError
+
+
+logger = logging.getLogger(__name__)
+
+
+class VersionStamp:
+    """
+    Version stamp which is shared between processes, stored in the database (see common.models.CacheVersion).
+
+    - The stored value is re-read at most once every CHECK_INTERVAL seconds,
+      so changes made by other processes are seen within this interval
+    - Changes made by this process (outside of a transaction) are seen immediately
+    - Changes made inside a database transaction are not visible to other connections until the transaction is committed,
+      so they must be counted again once the transaction is committed (e.g. using transaction.on_commit).
+      Until then, the stamp is unavailable to the transaction which made the change (see pending),
+      so that it does not cache uncommitted data.
+      If the transaction is rolled back, the change is discarded.
+
+    Use get_stamp() to access the (process-wide) stamp for a particular key.
+    """
+
+    # Maximum time (seconds) between reads of the stored value
+    CHECK_INTERVAL = 1
+
+    def __init__(self, key):
+        self.key = key
+
+        # Latest stored value, and the time it was read
+        self.stored = None
+        self.checked = None
+
+        # Marker which is registered (with transaction.on_commit) by each transaction which changes the stamp
+        self.marker = self.committed
+
+        self.lock = threading.RLock()
+
+    def value(self):
+        """ Return the version (a string), from the stored value """
+
+        if self.stored is None:
+            return None
+
+        return str(self.stored)
+
+    def load(self):
+        """ Read the stored value from the database (the stamp is created if it does not exist) """
+
+        from common.models import CacheVersion
+
+        try:
+            version = CacheVersion.objects.filter(key=self.key).values_list('version', flat=True).first()
+
+            if version is None:
+                version = CacheVersion.objects.get_or_create(key=self.key)[0].version
+        except (OperationalError, ProgrammingError):
+            # Database is not ready yet
+            return None
+
+        return version
+
+    def read(self):
+        """
+        Read the version (a string) directly from the database, as seen by the current connection.
+
+        Data which is loaded (in the same transaction) after this read is at least as new as the returned version.
+        The process-wide value is not affected, as a transaction may see an older version than other connections.
+        """
+
+        if self.pending():
+            return None
+
+        version = self.load()
+
+        return None if version is None else str(version)
+
+    def store(self):
+        """
+        Increment the stored value in the database.
+
+        Returns True if the stored value had not been changed by another process (since it was last read)
+        """
+
+        from common.models import CacheVersion
+
+        try:
+            with transaction.atomic():
+                if CacheVersion.objects.filter(key=self.key).update(version=F('version') + 1) == 0:
+                    CacheVersion.objects.get_or_create(key=self.key)
+
+                version = CacheVersion.objects.values_list('version', flat=True).get(key=self.key)
+        except (OperationalError, ProgrammingError):
+            self.stored = None
+            return False
+
+        unchanged = self.stored is not None and version == self.stored + 1
+
+        self.stored = version
+        self.checked = time.monotonic()
+
+        return unchanged
+
+    def committed(self):
+        """
+        Called once a transaction which changed the stamp is committed.
+
+        This does nothing, as the change is counted again by the caller (see increment).
+        """
+
+    def pending(self):
+        """
+        Return True if the stamp has been changed by the current (uncommitted) transaction.
+
+        The marker is removed from the on_commit callbacks if the transaction (or savepoint) is rolled back.
+        """
+
+        if not connection.in_atomic_block:
+            return False
+
+        return any([func is self.marker for sids, func in connection.run_on_commit])
+
+    def get(self):
+        """
+        Return the current version (a string), or None if the version is not available.
+
+        The version is not available inside a transaction which has changed the stamp.
+        """
+
+        if self.pending():
+            return None
+
+        with self.lock:
+            if self.stored is None or time.monotonic() - self.checked >= self.CHECK_INTERVAL:
+                self.stored = self.load()
+                self.checked = time.monotonic()
+
+            return self.value()
+
+    def increment(self, version=None):
+        """
+        Count a change.
+
+        Inside a transaction, the change is only marked against the transaction
+        (and must be counted again once the transaction is committed).
+
+        Args:
+            version: The version which the caller's local data is up to date with (if any)
+
+        Returns:
+            The new version if the caller's local data is still up to date
+            (i.e. there are no other changes since the provided version), otherwise None
+        """
+
+        if connection.in_atomic_block:
+            if not self.pending():
+                transaction.on_commit(self.marker)
+
+            return None
+
+        with self.lock:
+            unchanged = version is not None and version == self.value()
+
+            unchanged = self.store() and unchanged
+
+            return self.value() if unchanged else None
+
+
+# Process-wide version stamps, by key
+version_stamps = {}
+
+version_stamps_lock = threading.Lock()
+
+
+def get_stamp(key):
+    """ Return the VersionStamp for the provided key """
+
+    with version_stamps_lock:
+        if key not in version_stamps:
+            version_stamps[key] = VersionStamp(key)
+
+        return version_stamps[key]
+
+
+class SettingsCache:
+    """
+    Process-local cache of settings values, with cross-process invalidation.
+
+    The cache only ever reflects committed values:
+
+    - Values are loaded along with the version stamp (as seen by the loading connection),
+      so values loaded inside a transaction which has an older view of the database are replaced once the newer version is seen
+    - A transaction which changes a setting cannot use the cache (see VersionStamp.pending),
+      so its lookups fall through to the database until it is committed
+
+    Attributes:
+        loader: Callable which returns a dict of {key: value} for all settings
+        stamp: Version stamp which is shared between processes
+        hits: Number of lookups served from the cache
+        misses: Number of lookups which could not be served from the cache
+    """
+
+    def __init__(self, loader, version_key):
+        self.loader = loader
+        self.stamp = get_stamp(version_key)
+
+        self.values = None
+        self.version = None
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    def get_version(self):
+        """ Return the current version stamp """
+
+        return self.stamp.get()
+
+    def reload(self):
+        """
+        Reload all settings values from the database.
+
+        The values are stored against the version which was read (by the same connection) before the values were loaded.
+        """
+
+        version = self.stamp.read()
+
+        if version is None:
+            return None
+
+        try:
+            values = self.loader()
+        except (OperationalError, ProgrammingError):
+            # Database is not ready yet
+            logger.info("Could not load settings cache - database not ready")
+            return None
+
+        with self.lock:
+            self.values = values
+            self.version = version
+
+        return values
+
+    def lookup(self, key):
+        """
+        Return the cached value for the provided key.
+
+        Returns None if the value is not available from the cache,
+        (the caller should then fall back to the database).
+        """
+
+        version = self.get_version()
+
+        if version is None:
+            self.misses += 1
+            return None
+
+        values = self.values
+
+        if values is None or self.version != version:
+            values = self.reload()
+
+        if values is None or key not in values:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return values[key]
+
+    def invalidate(self):
+        """
+        Invalidate the cache for all processes.
+        """
+
+        with self.lock:
+            self.values = None
+            self.version = None
+
+        self.stamp.increment()
+
+    def stats(self):
+        """ Return a dict of cache statistics """
+
+        total = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'ratio': self.hits / total if total > 0 else 0,
+            'size': len(self.values) if self.values is not None else 0,
+        }
+
+    def reset_stats(self):
+        """ Reset the hit / miss counters """
+
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,102 @@
+"""
+Custom management command to run background task worker processes
+"""
+
+import signal
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from common.tasks import Worker, get_worker_count
+
+
+def run_worker(burst, poll_interval):
+    """ Run a single background worker (in the current process) until it is stopped """
+
+    worker = Worker(poll_interval=poll_interval)
+
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+
+    worker.run(burst=burst)
+
+
+class Command(BaseCommand):
+    """
+    Run a pool of background worker processes, which run the tasks queued with common.tasks.offload_task.
+
+    Worker processes which exit unexpectedly are restarted.
+    Stop the pool with SIGINT / SIGTERM (each worker finishes its current task first).
+    """
+
+    help = 'Run background task worker processes'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default = BACKGROUND_WORKERS setting)')
+        parser.add_argument('--poll', type=float, default=1.0, help='Interval (seconds) between checks for new tasks')
+        parser.add_argument('--burst', action='store_true', help='Exit once there are no more queued tasks')
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def start_process(self, burst, poll_interval):
+
+        process = self.context.Process(target=run_worker, args=(burst, poll_interval))
+        process.start()
+
+        return process
+
+    def handle(self, *args, **kwargs):
+
+        workers = kwargs['workers'] or get_worker_count()
+        burst = kwargs['burst']
+        poll_interval = kwargs['poll']
+
+        if workers < 1:
+            raise CommandError("Number of workers must be at least 1")
+
+        if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            self.stdout.write("Starting background worker")
+            run_worker(burst, poll_interval)
+            return
+
+        self.stdout.write(f"Starting {workers} background worker processes")
+
+        self.stopping = False
+        self.context = multiprocessing.get_context('fork')
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Database connections must not be shared with the worker processes
+        connections.close_all()
+
+        processes = [self.start_process(burst, poll_interval) for idx in range(workers)]
+
+        terminated = False
+
+        while len(processes) > 0:
+
+            if self.stopping and not terminated:
+                for process in processes:
+                    process.terminate()
+
+                terminated = True
+
+            for idx, process in enumerate(processes):
+                process.join(timeout=1)
+
+                if process.is_alive():
+                    continue
+
+                if self.stopping or burst:
+                    processes[idx] = None
+                else:
+                    self.stderr.write(f"Worker process {process.pid} exited (code {process.exitcode}) - restarting")
+                    processes[idx] = self.start_process(burst, poll_interval)
+
+            processes = [process for process in processes if process is not None]
+
+        self.stdout.write("Background workers stopped")
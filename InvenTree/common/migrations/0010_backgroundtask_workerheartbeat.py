@@ -0,0 +1,53 @@
+# Generated by Django 3.0.7 on 2021-04-20 10:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('common', '0009_delete_currency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Task name', max_length=200, verbose_name='Name')),
+                ('args', models.TextField(blank=True, default='[]', verbose_name='Arguments')),
+                ('kwargs', models.TextField(blank=True, default='{}', verbose_name='Keyword Arguments')),
+                ('status', models.PositiveIntegerField(choices=[(10, 'Pending'), (20, 'Running'), (30, 'Complete'), (40, 'Failed')], db_index=True, default=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='Maximum Attempts')),
+                ('run_after', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Run After')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Started')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Finished')),
+                ('worker', models.CharField(blank=True, max_length=200, verbose_name='Worker')),
+                ('result', models.TextField(blank=True, verbose_name='Result')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkerHeartbeat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Name')),
+                ('host', models.CharField(blank=True, max_length=200, verbose_name='Host')),
+                ('pid', models.PositiveIntegerField(default=0, verbose_name='Process ID')),
+                ('started', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Started')),
+                ('last_seen', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Last Seen')),
+                ('completed', models.PositiveIntegerField(default=0, verbose_name='Completed Tasks')),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.BackgroundTask', verbose_name='Task')),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2021-05-03 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0010_backgroundtask_workerheartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='Key')),
+                ('version', models.BigIntegerField(default=1, verbose_name='Version')),
+            ],
+        ),
+    ]
@@ -7,10 +7,16 @@ These models are 'generic' and do not fit a particular business logic object.
 from __future__ import unicode_literals
 
 import os
+import json
 
 from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.db.utils import IntegrityError, OperationalError
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 import djmoney.settings
 from djmoney.models.fields import MoneyField
@@ -24,6 +30,10 @@ from django.core.exceptions import ValidationError
 import InvenTree.helpers
 import InvenTree.fields
 
+from InvenTree.status_codes import TaskStatus
+
+from common.cache import SettingsCache
+
 
 class InvenTreeSetting(models.Model):
     """
@@ -467,7 +477,15 @@ class InvenTreeSetting(models.Model):
         if backup_value is None:
             backup_value = cls.get_setting_default(key)
 
-        setting = InvenTreeSetting.get_setting_object(key)
+        key = str(key).strip().upper()
+
+        # Try the settings cache first, to save a database hit
+        value = settings_cache.lookup(key)
+
+        if value is not None:
+            setting = InvenTreeSetting(key=key, value=value)
+        else:
+            setting = InvenTreeSetting.get_setting_object(key)
 
         if setting:
             value = setting.value
@@ -680,6 +698,38 @@ class InvenTreeSetting(models.Model):
         return value
         
 
+def load_settings():
+    """
+    Load all InvenTreeSetting values from the database (used to populate the settings cache)
+    """
+
+    values = {}
+
+    for key, value in InvenTreeSetting.objects.all().values_list('key', 'value'):
+        values[key.upper()] = value
+
+    return values
+
+
+# Process-wide cache of settings values
+settings_cache = SettingsCache(load_settings, 'inventree-settings-version')
+
+
+@receiver(post_save, sender=InvenTreeSetting, dispatch_uid='setting_save_invalidate_cache')
+@receiver(post_delete, sender=InvenTreeSetting, dispatch_uid='setting_delete_invalidate_cache')
+def after_setting_change(sender, instance, **kwargs):
+    """
+    Invalidate the settings cache when a setting is changed.
+
+    The cache is invalidated (for all processes) once the change is committed,
+    and also immediately (for this process) so that the change is visible straight away.
+    """
+
+    settings_cache.invalidate()
+
+    transaction.on_commit(settings_cache.invalidate)
+
+
 class PriceBreak(models.Model):
     """
     Represents a PriceBreak model
@@ -767,3 +817,154 @@ class ColorTheme(models.Model):
                 return True
 
         return False
+
+
+class BackgroundTask(models.Model):
+    """
+    A task which is queued to be run by a background worker process (see common.tasks).
+
+    Attributes:
+        name: Registered name of the task function
+        args: JSON encoded positional arguments
+        kwargs: JSON encoded keyword arguments
+        status: Task status (see TaskStatus)
+        attempts: Number of times the task has been attempted
+        max_attempts: Maximum number of attempts before the task is marked as failed
+        run_after: The task will not be run before this time (used to delay retries)
+        created: Time the task was queued
+        started: Time the (latest attempt of the) task was started
+        finished: Time the task completed (or failed)
+        worker: Name of the worker which is running (or ran) the task
+        result: JSON encoded return value of the task function
+        error: Error message (traceback) from the latest failed attempt
+        user: User who queued the task
+    """
+
+    class Meta:
+        ordering = ['created']
+
+    name = models.CharField(max_length=200, verbose_name=_('Name'), help_text=_('Task name'))
+
+    args = models.TextField(blank=True, default='[]', verbose_name=_('Arguments'))
+
+    kwargs = models.TextField(blank=True, default='{}', verbose_name=_('Keyword Arguments'))
+
+    status = models.PositiveIntegerField(
+        default=TaskStatus.PENDING,
+        choices=TaskStatus.items(),
+        db_index=True,
+        verbose_name=_('Status'),
+    )
+
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_('Attempts'))
+
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name=_('Maximum Attempts'))
+
+    run_after = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_('Run After'))
+
+    created = models.DateTimeField(auto_now_add=True, verbose_name=_('Created'))
+
+    started = models.DateTimeField(null=True, blank=True, verbose_name=_('Started'))
+
+    finished = models.DateTimeField(null=True, blank=True, verbose_name=_('Finished'))
+
+    worker = models.CharField(max_length=200, blank=True, verbose_name=_('Worker'))
+
+    result = models.TextField(blank=True, verbose_name=_('Result'))
+
+    error = models.TextField(blank=True, verbose_name=_('Error'))
+
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL,
+        blank=True, null=True,
+        related_name='+',
+        verbose_name=_('User'),
+    )
+
+    def __str__(self):
+        return f"{self.name} ({TaskStatus.text(self.status)})"
+
+    def get_args(self):
+        return json.loads(self.args or '[]')
+
+    def get_kwargs(self):
+        return json.loads(self.kwargs or '{}')
+
+    def get_result(self):
+        """ Return the decoded result of the task (or None) """
+
+        if not self.result:
+            return None
+
+        return json.loads(self.result)
+
+    def set_result(self, result):
+
+        try:
+            self.result = json.dumps(result, cls=DjangoJSONEncoder)
+        except TypeError:
+            self.result = json.dumps(str(result))
+
+    @property
+    def is_active(self):
+        return self.status in TaskStatus.ACTIVE_CODES
+
+
+class WorkerHeartbeat(models.Model):
+    """
+    Heartbeat record for a background worker process.
+
+    Each worker updates the last_seen time periodically (even while running a task),
+    which is used to check whether any workers are running (see InvenTree.status).
+
+    Attributes:
+        name: Unique worker name
+        host: Host name of the worker
+        pid: Process ID of the worker
+        started: Time the worker was started
+        last_seen: Time of the latest heartbeat
+        task: The task currently being run by the worker (if any)
+        completed: Number of tasks completed by the worker
+    """
+
+    name = models.CharField(max_length=200, unique=True, verbose_name=_('Name'))
+
+    host = models.CharField(max_length=200, blank=True, verbose_name=_('Host'))
+
+    pid = models.PositiveIntegerField(default=0, verbose_name=_('Process ID'))
+
+    started = models.DateTimeField(default=timezone.now, verbose_name=_('Started'))
+
+    last_seen = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_('Last Seen'))
+
+    task = models.ForeignKey(
+        BackgroundTask, on_delete=models.SET_NULL,
+        blank=True, null=True,
+        related_name='+',
+        verbose_name=_('Task'),
+    )
+
+    completed = models.PositiveIntegerField(default=0, verbose_name=_('Completed Tasks'))
+
+    def __str__(self):
+        return self.name
+
+
+class CacheVersion(models.Model):
+    """
+    Version stamp for a process-local cache (see common.cache.VersionStamp).
+
+    The version is incremented whenever the cached data is changed,
+    so that every server process can tell when its local copy is out of date.
+
+    Attributes:
+        key: Unique name of the version stamp
+        version: Version number
+    """
+
+    key = models.CharField(max_length=100, unique=True, verbose_name=_('Key'))
+
+    version = models.BigIntegerField(default=1, verbose_name=_('Version'))
+
+    def __str__(self):
+        return f"{self.key} ({self.version})"
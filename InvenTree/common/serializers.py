@@ -1,3 +1,43 @@
 """
 JSON serializers for common components
 """
+
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rest_framework import serializers
+
+from InvenTree.serializers import InvenTreeModelSerializer
+
+from .models import BackgroundTask
+
+
+class BackgroundTaskSerializer(InvenTreeModelSerializer):
+    """
+    Serializes a BackgroundTask object (status and result).
+    """
+
+    status_text = serializers.CharField(source='get_status_display', read_only=True)
+
+    result = serializers.SerializerMethodField()
+
+    def get_result(self, task):
+        return task.get_result()
+
+    class Meta:
+        model = BackgroundTask
+        fields = [
+            'pk',
+            'name',
+            'status',
+            'status_text',
+            'attempts',
+            'max_attempts',
+            'created',
+            'started',
+            'finished',
+            'result',
+            'error',
+        ]
+
+        read_only_fields = fields
@@ -0,0 +1,387 @@
+"""
+Database-backed background task queue.
+
+Some operations (e.g. completing a build output with many allocated stock items,
+shipping a large sales order, printing hundreds of labels) can take minutes to complete,
+which blocks the server process and often causes the request to time out.
+
+Instead, these operations can be offloaded to a background worker:
+
+- Task functions are registered (by name) using the @register_task decorator,
+  in a 'tasks.py' module in any InvenTree app
+- offload_task() adds a BackgroundTask entry to the database, and returns immediately
+- Worker processes (started with 'manage.py worker') claim and run the queued tasks
+- Failed tasks are retried (with an increasing delay) up to a maximum number of attempts
+- The return value (or error) of each task is stored against the BackgroundTask entry
+- Each worker records a periodic heartbeat, which is used by the system health checks
+
+If no worker is running, offload_task() runs the task immediately (in the calling process),
+so that the operation is still performed.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+import traceback
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from InvenTree.status_codes import TaskStatus
+
+from common import models as CommonModels
+
+
+logger = logging.getLogger(__name__)
+
+
+# Registered task functions, as {name: function}
+TASK_REGISTRY = {}
+
+# Task errors which are not resolved by running the task again
+PERMANENT_ERRORS = (ValidationError, ObjectDoesNotExist)
+
+
+def register_task(func=None, name=None, max_attempts=3):
+    """
+    Decorator which registers a function as a background task.
+
+    Args:
+        name: Task name (default = <module>.<function>)
+        max_attempts: Maximum number of attempts (if the task raises an exception)
+    """
+
+    def decorator(func):
+        func.task_name = name or f"{func.__module__}.{func.__name__}"
+        func.max_attempts = max_attempts
+
+        TASK_REGISTRY[func.task_name] = func
+
+        return func
+
+    if func is not None:
+        return decorator(func)
+
+    return decorator
+
+
+def get_task_function(name):
+    """ Return the registered task function with the provided name (or None) """
+
+    if name not in TASK_REGISTRY:
+        # Import the 'tasks' module for each app, which registers the task functions
+        autodiscover_modules('tasks')
+
+    return TASK_REGISTRY.get(name, None)
+
+
+def is_worker_running():
+    """ Return True if (at least) one background worker has recorded a recent heartbeat """
+
+    cutoff = timezone.now() - timedelta(seconds=Worker.HEARTBEAT_TIMEOUT)
+
+    return CommonModels.WorkerHeartbeat.objects.filter(last_seen__gte=cutoff).exists()
+
+
+def offload_task(name, *args, user=None, **kwargs):
+    """
+    Queue a task to be run by a background worker.
+
+    The task arguments must be JSON serializable (e.g. pass pk values rather than model instances).
+
+    If no background worker is running, the task is run immediately instead
+    (and any exception raised by the task is passed to the caller).
+
+    Args:
+        name: Registered task name
+        user: User who is queueing the task (optional)
+
+    Returns:
+        The queued BackgroundTask object, or None if the task was run immediately
+    """
+
+    func = get_task_function(name)
+
+    if func is None:
+        raise ValueError(f"Unknown background task: '{name}'")
+
+    if not is_worker_running():
+        logger.info(f"No background worker running - running task '{name}' immediately")
+        func(*args, **kwargs)
+        return None
+
+    task = CommonModels.BackgroundTask.objects.create(
+        name=name,
+        args=json.dumps(args, cls=DjangoJSONEncoder),
+        kwargs=json.dumps(kwargs, cls=DjangoJSONEncoder),
+        max_attempts=func.max_attempts,
+        user=user,
+    )
+
+    logger.info(f"Queued background task '{name}' ({task.pk})")
+
+    return task
+
+
+def save_task_output(filename, data):
+    """
+    Save a file generated by a background task (e.g. a label PDF or an export file) to the media directory.
+
+    Args:
+        filename: Name of the output file
+        data: File contents (str or bytes), or a file object
+
+    Returns the URL for the saved file
+    """
+
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    if isinstance(data, bytes):
+        content = ContentFile(data)
+    else:
+        content = File(data)
+
+    # Each output file is saved in a uniquely named directory
+    path = default_storage.save(os.path.join('task_output', uuid.uuid4().hex, filename), content)
+
+    return default_storage.url(path)
+
+
+class Worker:
+    """
+    Background worker, which claims and runs queued tasks.
+    """
+
+    # Interval (seconds) between heartbeat updates
+    HEARTBEAT_INTERVAL = 10
+
+    # A worker is considered to have stopped if there is no heartbeat within this time (seconds)
+    HEARTBEAT_TIMEOUT = 60
+
+    # Base delay (seconds) before a failed task is retried (doubled for each subsequent attempt)
+    RETRY_DELAY = 30
+
+    # Interval (seconds) between checks for tasks which were abandoned by a stopped worker
+    RECOVER_INTERVAL = 60
+
+    # Completed tasks are deleted after this time (days)
+    TASK_RETENTION = 30
+
+    def __init__(self, name=None, poll_interval=1.0):
+
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self.name = name or f"{self.host}-{self.pid}"
+        self.poll_interval = poll_interval
+
+        self.stopped = threading.Event()
+        self.task = None
+        self.completed = 0
+        self.last_recover = 0
+
+    def beat(self):
+        """ Record a heartbeat for this worker """
+
+        CommonModels.WorkerHeartbeat.objects.update_or_create(
+            name=self.name,
+            defaults={
+                'host': self.host,
+                'pid': self.pid,
+                'last_seen': timezone.now(),
+                'task': self.task,
+                'completed': self.completed,
+            }
+        )
+
+    def heartbeat(self):
+        """ Record a heartbeat periodically (in a separate thread, so long running tasks do not block it) """
+
+        while not self.stopped.wait(self.HEARTBEAT_INTERVAL):
+            try:
+                self.beat()
+            except Exception:
+                logger.exception(f"Worker '{self.name}' could not record heartbeat")
+
+        connection.close()
+
+    def recover(self):
+        """
+        Return any tasks which were being run by a worker which has stopped to the queue,
+        and delete old completed tasks.
+        """
+
+        now = timezone.now()
+
+        live = CommonModels.WorkerHeartbeat.objects.filter(last_seen__gte=now - timedelta(seconds=self.HEARTBEAT_TIMEOUT))
+
+        abandoned = CommonModels.BackgroundTask.objects.filter(status=TaskStatus.RUNNING)
+        abandoned = abandoned.exclude(worker__in=live.values_list('name', flat=True))
+
+        n = abandoned.update(status=TaskStatus.PENDING, run_after=now)
+
+        if n > 0:
+            logger.warning(f"Returned {n} abandoned tasks to the queue")
+
+        CommonModels.WorkerHeartbeat.objects.filter(last_seen__lt=now - timedelta(seconds=self.HEARTBEAT_TIMEOUT * 10)).delete()
+
+        CommonModels.BackgroundTask.objects.filter(
+            status=TaskStatus.COMPLETE,
+            finished__lt=now - timedelta(days=self.TASK_RETENTION)
+        ).delete()
+
+    def claim(self):
+        """
+        Claim the next queued task.
+
+        Each candidate task is claimed with a conditional update,
+        so that a task is never claimed by multiple workers.
+
+        Returns the claimed BackgroundTask, or None if there are no tasks ready to run
+        """
+
+        now = timezone.now()
+
+        candidates = CommonModels.BackgroundTask.objects.filter(status=TaskStatus.PENDING, run_after__lte=now)
+        candidates = candidates.order_by('run_after', 'pk').values_list('pk', flat=True)[:10]
+
+        for pk in candidates:
+            claimed = CommonModels.BackgroundTask.objects.filter(pk=pk, status=TaskStatus.PENDING).update(
+                status=TaskStatus.RUNNING,
+                worker=self.name,
+                started=now,
+                attempts=F('attempts') + 1,
+            )
+
+            if claimed:
+                return CommonModels.BackgroundTask.objects.get(pk=pk)
+
+        return None
+
+    def run_task(self, task):
+        """ Run a claimed task, and record the result """
+
+        func = get_task_function(task.name)
+
+        logger.info(f"Worker '{self.name}' running task '{task.name}' ({task.pk}), attempt {task.attempts}")
+
+        t_start = time.time()
+
+        try:
+            if func is None:
+                raise ValueError(f"Unknown background task: '{task.name}'")
+
+            result = func(*task.get_args(), **task.get_kwargs())
+
+        except Exception as e:
+            task.error = traceback.format_exc()
+
+            if func is not None and not isinstance(e, PERMANENT_ERRORS) and task.attempts < task.max_attempts:
+                task.status = TaskStatus.PENDING
+                task.run_after = timezone.now() + timedelta(seconds=self.RETRY_DELAY * 2 ** (task.attempts - 1))
+
+                logger.warning(f"Task '{task.name}' ({task.pk}) failed, will be retried: {e}")
+            else:
+                task.status = TaskStatus.FAILED
+                task.finished = timezone.now()
+
+                logger.error(f"Task '{task.name}' ({task.pk}) failed: {e}")
+
+        else:
+            task.status = TaskStatus.COMPLETE
+            task.finished = timezone.now()
+            task.error = ''
+            task.set_result(result)
+
+            logger.info(f"Task '{task.name}' ({task.pk}) completed in {time.time() - t_start:.2f}s")
+
+        task.save()
+
+    def run_once(self):
+        """
+        Claim and run a single task.
+
+        Returns True if a task was run
+        """
+
+        close_old_connections()
+
+        if time.time() - self.last_recover > self.RECOVER_INTERVAL:
+            self.recover()
+            self.last_recover = time.time()
+
+        task = self.claim()
+
+        if task is None:
+            return False
+
+        self.task = task
+        self.beat()
+
+        try:
+            self.run_task(task)
+        finally:
+            self.task = None
+            self.completed += 1
+
+        return True
+
+    def run(self, burst=False):
+        """
+        Run queued tasks until the worker is stopped.
+
+        Args:
+            burst: If True, stop once there are no more tasks ready to run
+        """
+
+        logger.info(f"Starting background worker '{self.name}'")
+
+        self.beat()
+
+        heartbeat = threading.Thread(target=self.heartbeat, daemon=True)
+        heartbeat.start()
+
+        try:
+            while not self.stopped.is_set():
+                try:
+                    ran = self.run_once()
+                except Exception:
+                    logger.exception(f"Worker '{self.name}' error")
+                    ran = False
+
+                if not ran:
+                    if burst:
+                        break
+
+                    self.stopped.wait(self.poll_interval)
+        finally:
+            self.stopped.set()
+            heartbeat.join()
+
+            CommonModels.WorkerHeartbeat.objects.filter(name=self.name).delete()
+
+            logger.info(f"Stopped background worker '{self.name}' ({self.completed} tasks completed)")
+
+    def stop(self, *args):
+        """ Stop the worker (once the current task is complete) """
+
+        self.stopped.set()
+
+
+def get_worker_count():
+    """ Return the configured number of background worker processes """
+
+    return max(int(getattr(settings, 'BACKGROUND_WORKERS', 1)), 1)
@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 
-from .models import InvenTreeSetting
+from InvenTree.status_codes import TaskStatus
+
+from .models import InvenTreeSetting, BackgroundTask, CacheVersion, settings_cache
+from .cache import get_stamp
+from .tasks import Worker, register_task, offload_task, is_worker_running
 
 
 class SettingsTest(TestCase):
@@ -85,3 +91,219 @@ class SettingsTest(TestCase):
 
                 if setting.default_value not in [True, False]:
                     raise ValueError(f'Non-boolean default value specified for {key}')
+
+
+class SettingsCacheTest(TransactionTestCase):
+    """
+    Tests for the settings cache.
+
+    Note: A TransactionTestCase is used, so that changes can be committed (and rolled back) by each test.
+    """
+
+    def setUp(self):
+        InvenTreeSetting.objects.filter(key__in=['PART_COMPONENT', 'PART_IPN_REGEX']).delete()
+
+        settings_cache.invalidate()
+        settings_cache.reset_stats()
+
+    def test_cache(self):
+
+        InvenTreeSetting.objects.create(key='PART_COMPONENT', value='True')
+
+        self.assertTrue(InvenTreeSetting.get_setting('PART_COMPONENT'))
+        self.assertTrue(InvenTreeSetting.get_setting('part_component'))
+
+        # The second lookup was served from the cache
+        self.assertEqual(settings_cache.hits, 2)
+        self.assertEqual(settings_cache.misses, 0)
+
+        # Changing the setting invalidates the cache
+        setting = InvenTreeSetting.get_setting_object('PART_COMPONENT')
+        setting.value = 'False'
+        setting.save()
+
+        self.assertFalse(InvenTreeSetting.get_setting('PART_COMPONENT'))
+
+        # Deleting the setting invalidates the cache
+        setting.delete()
+
+        self.assertIsNone(settings_cache.lookup('PART_COMPONENT'))
+
+    def test_transaction(self):
+        """ The cache is used inside a transaction, until the transaction changes a setting """
+
+        InvenTreeSetting.objects.create(key='PART_COMPONENT', value='True')
+
+        with transaction.atomic():
+            self.assertTrue(InvenTreeSetting.get_setting('PART_COMPONENT'))
+            self.assertEqual(settings_cache.hits, 1)
+
+            setting = InvenTreeSetting.get_setting_object('PART_COMPONENT')
+            setting.value = 'False'
+            setting.save()
+
+            # The change is not committed, so lookups by this transaction fall through to the database
+            self.assertIsNone(settings_cache.lookup('PART_COMPONENT'))
+            self.assertFalse(InvenTreeSetting.get_setting('PART_COMPONENT'))
+
+            transaction.set_rollback(True)
+
+        # The change was rolled back, so the cache is used again
+        self.assertTrue(InvenTreeSetting.get_setting('PART_COMPONENT'))
+        self.assertEqual(settings_cache.hits, 2)
+
+        with transaction.atomic():
+            setting = InvenTreeSetting.get_setting_object('PART_COMPONENT')
+            setting.value = 'False'
+            setting.save()
+
+        # The committed change is seen by the cache
+        self.assertFalse(InvenTreeSetting.get_setting('PART_COMPONENT'))
+        self.assertEqual(settings_cache.hits, 3)
+
+    def test_missing(self):
+
+        # Setting does not exist (it is created by get_setting)
+        self.assertEqual(InvenTreeSetting.get_setting('PART_IPN_REGEX'), '')
+        self.assertEqual(settings_cache.misses, 1)
+
+        self.assertEqual(InvenTreeSetting.get_setting('PART_IPN_REGEX'), '')
+        self.assertEqual(settings_cache.hits, 1)
+
+    def test_version_stamp(self):
+
+        stamp = get_stamp('test-version-stamp')
+
+        version = stamp.get()
+
+        # The stamp is stored in the database
+        self.assertEqual(CacheVersion.objects.get(key='test-version-stamp').version, 1)
+
+        # Local data is still up to date after a change by this process
+        version = stamp.increment(version)
+
+        self.assertIsNotNone(version)
+        self.assertEqual(version, stamp.get())
+        self.assertEqual(CacheVersion.objects.get(key='test-version-stamp').version, 2)
+
+        # Simulate a change by another process
+        CacheVersion.objects.filter(key='test-version-stamp').update(version=10)
+
+        self.assertIsNone(stamp.increment(version))
+
+        # Changes by another process are seen once the stored value is re-read
+        stamp.checked = 0
+
+        self.assertNotEqual(stamp.get(), version)
+
+        version = stamp.get()
+
+        # Inside a transaction, a change is only counted once the transaction is committed
+        with transaction.atomic():
+            self.assertIsNone(stamp.increment(version))
+            self.assertIsNone(stamp.get())
+
+            transaction.set_rollback(True)
+
+        self.assertEqual(stamp.get(), version)
+        self.assertEqual(str(CacheVersion.objects.get(key='test-version-stamp').version), version)
+
+
+@register_task(name='common.tests.add', max_attempts=2)
+def add_numbers(a, b):
+    return a + b
+
+
+@register_task(name='common.tests.fail', max_attempts=2)
+def fail_task():
+    raise RuntimeError("Task failed")
+
+
+class BackgroundTaskTest(TestCase):
+    """
+    Tests for the background task queue
+    """
+
+    def setUp(self):
+
+        user = get_user_model()
+
+        self.user = user.objects.create_user('username', 'user@email.com', 'password')
+
+        self.worker = Worker(name='test-worker')
+
+    def test_no_worker(self):
+        """ Without a running worker, tasks are run immediately """
+
+        self.assertFalse(is_worker_running())
+
+        self.assertIsNone(offload_task('common.tests.add', 1, 2))
+        self.assertEqual(BackgroundTask.objects.count(), 0)
+
+        with self.assertRaises(ValueError):
+            offload_task('common.tests.missing')
+
+    def test_queue(self):
+        """ With a running worker, tasks are queued and run by the worker """
+
+        self.worker.beat()
+
+        self.assertTrue(is_worker_running())
+
+        task = offload_task('common.tests.add', 1, b=2, user=self.user)
+
+        self.assertIsNotNone(task)
+        self.assertEqual(task.status, TaskStatus.PENDING)
+        self.assertEqual(task.max_attempts, 2)
+
+        self.assertTrue(self.worker.run_once())
+
+        task.refresh_from_db()
+
+        self.assertEqual(task.status, TaskStatus.COMPLETE)
+        self.assertEqual(task.attempts, 1)
+        self.assertEqual(task.worker, 'test-worker')
+        self.assertEqual(task.get_result(), 3)
+
+        # No more tasks in the queue
+        self.assertFalse(self.worker.run_once())
+
+    def test_retry(self):
+        """ Failed tasks are retried, up to the maximum number of attempts """
+
+        self.worker.beat()
+
+        task = offload_task('common.tests.fail')
+
+        self.assertTrue(self.worker.run_once())
+
+        task.refresh_from_db()
+
+        self.assertEqual(task.status, TaskStatus.PENDING)
+        self.assertIn('Task failed', task.error)
+
+        # The retry is delayed
+        self.assertFalse(self.worker.run_once())
+
+        task.run_after = timezone.now()
+        task.save()
+
+        self.assertTrue(self.worker.run_once())
+
+        task.refresh_from_db()
+
+        self.assertEqual(task.status, TaskStatus.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    def test_recover(self):
+        """ Tasks abandoned by a stopped worker are returned to the queue """
+
+        task = BackgroundTask.objects.create(name='common.tests.add', args='[1, 1]', status=TaskStatus.RUNNING, worker='stopped-worker')
+
+        self.worker.beat()
+        self.assertTrue(self.worker.run_once())
+
+        task.refresh_from_db()
+
+        self.assertEqual(task.status, TaskStatus.COMPLETE)
+        self.assertEqual(task.get_result(), 2)
@@ -7,24 +7,25 @@ from __future__ import unicode_literals
 
 import os
 
-import math
-
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum, Q, UniqueConstraint
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 from django.apps import apps
 from django.urls import reverse
 
 from moneyed import CURRENCIES
 
+from djmoney.contrib.exchange.models import ExchangeBackend, Rate
+
 from markdownx.models import MarkdownxField
 
 from stdimage.models import StdImageField
 
 from InvenTree.helpers import getMediaUrl, getBlankImage, getBlankThumbnail
-from InvenTree.helpers import normalize
 from InvenTree.fields import InvenTreeURLField
 from InvenTree.status_codes import PurchaseOrderStatus
 
@@ -33,6 +34,8 @@ import InvenTree.validators
 import common.models
 import common.settings
 
+from .pricing import price_cache
+
 
 def rename_company_image(instance, filename):
     """ Function to rename a company image after upload
@@ -428,45 +431,17 @@ class SupplierPart(models.Model):
         - Don't forget to add in flat-fee cost (base_cost field)
         - If MOQ (minimum order quantity) is required, bump quantity
         - If order multiples are to be observed, then we need to calculate based on that, too
-        """
-
-        price_breaks = self.price_breaks.filter(quantity__lte=quantity)
-
-        # No price break information available?
-        if len(price_breaks) == 0:
-            return None
-
-        # Order multiples
-        if multiples:
-            quantity = int(math.ceil(quantity / self.multiple) * self.multiple)
-
-        pb_found = False
-        pb_quantity = -1
-        pb_cost = 0.0
-
-        if currency is None:
-            # Default currency selection
-            currency = common.models.InvenTreeSetting.get_setting('INVENTREE_DEFAULT_CURRENCY')
-
-        for pb in self.price_breaks.all():
-            # Ignore this pricebreak (quantity is too high)
-            if pb.quantity > quantity:
-                continue
-
-            pb_found = True
 
-            # If this price-break quantity is the largest so far, use it!
-            if pb.quantity > pb_quantity:
-                pb_quantity = pb.quantity
+        The price breaks are compiled (and cached) as a PriceTable (see company.pricing)
+        """
 
-                # Convert everything to the selected currency
-                pb_cost = pb.convert_to(currency)
+        table = price_cache.get_table(self, currency)
 
-        if pb_found:
-            cost = pb_cost * quantity
-            return normalize(cost + self.base_cost)
-        else:
-            return None
+        return table.get_price(
+            quantity,
+            base_cost=self.base_cost,
+            multiple=self.multiple if multiples else None
+        )
 
     def open_orders(self):
         """ Return a database query for PO line items for this SupplierPart,
@@ -540,3 +515,20 @@ class SupplierPriceBreak(common.models.PriceBreak):
 
     def __str__(self):
         return f'{self.part.MPN} - {self.price} @ {self.quantity}'
+
+
+@receiver(post_save, sender=SupplierPriceBreak, dispatch_uid='pricebreak_save_pricing_cache')
+@receiver(post_delete, sender=SupplierPriceBreak, dispatch_uid='pricebreak_delete_pricing_cache')
+@receiver(post_save, sender=Rate, dispatch_uid='rate_save_pricing_cache')
+@receiver(post_delete, sender=Rate, dispatch_uid='rate_delete_pricing_cache')
+@receiver(post_save, sender=ExchangeBackend, dispatch_uid='exchangebackend_save_pricing_cache')
+def after_price_change(sender, instance, **kwargs):
+    """
+    Invalidate the compiled pricing cache when a price break or exchange rate is changed.
+
+    The cache is invalidated immediately (for this process), and again once the change is committed.
+    """
+
+    price_cache.invalidate()
+
+    transaction.on_commit(price_cache.invalidate)
@@ -0,0 +1,290 @@
+"""
+Compiled supplier pricing.
+
+Calculating the price of a SupplierPart requires the price breaks for that part,
+and an exchange rate lookup for each (qualifying) price break.
+Calculating the price range for a Part (or for an entire BOM) repeats this for every supplier part.
+
+Instead, the price breaks for each SupplierPart are compiled into a PriceTable:
+
+- The price break quantities are sorted, so the applicable price break is found with a binary search
+- Each unit price is converted (once) to the target currency, using a snapshot of the exchange rates
+
+Compiled tables are kept in a process-local cache (loaded with a single query for any number of supplier parts).
+The cache is invalidated whenever a price break or an exchange rate is changed.
+A version stamp is stored in the database (see common.cache.VersionStamp),
+so that other processes discard their cached tables within VersionStamp.CHECK_INTERVAL seconds of the change being committed.
+"""
+
+import math
+import logging
+import threading
+
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+
+from djmoney.contrib.exchange.models import Rate, get_default_backend_name
+
+from InvenTree.helpers import normalize
+
+from company import models as CompanyModels
+
+import common.settings
+
+from common.cache import get_stamp
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeRates:
+    """
+    Snapshot of the exchange rates for the default exchange backend.
+
+    Attributes:
+        base_currency: Base currency of the exchange backend
+        rates: Dict of {currency: value} (the value of one unit of the base currency)
+    """
+
+    def __init__(self, base_currency=None, rates=None):
+        self.base_currency = base_currency
+        self.rates = dict(rates or {})
+
+        if base_currency:
+            self.rates[base_currency] = Decimal(1)
+
+    @classmethod
+    def load(cls):
+        """ Load the current exchange rates from the database """
+
+        base_currency = None
+        rates = {}
+
+        for rate in Rate.objects.filter(backend=get_default_backend_name()).select_related('backend'):
+            base_currency = rate.backend.base_currency
+            rates[rate.currency] = rate.value
+
+        return cls(base_currency, rates)
+
+    def get_rate(self, source, target):
+        """
+        Return the exchange rate from the source currency to the target currency.
+
+        Returns None if the rate is not available.
+        """
+
+        source = str(source)
+        target = str(target)
+
+        if source == target:
+            return 1
+
+        if source not in self.rates or target not in self.rates:
+            return None
+
+        return self.rates[target] / self.rates[source]
+
+
+class PriceTable:
+    """
+    Price breaks for a single SupplierPart, compiled for a particular currency.
+
+    Attributes:
+        currency: Currency code which the unit prices have been converted to
+        quantities: Sorted list of price break quantities
+        prices: Unit price at each price break quantity
+    """
+
+    def __init__(self, breaks, currency, rates):
+        """
+        Args:
+            breaks: List of (quantity, amount, currency) values for each price break
+            currency: Currency code to convert the prices to
+            rates: ExchangeRates snapshot
+        """
+
+        self.currency = currency
+        self.quantities = []
+        self.prices = []
+
+        for quantity, amount, price_currency in sorted(breaks, key=lambda pb: pb[0]):
+
+            # Price breaks without a price are ignored
+            if amount is None:
+                continue
+
+            # Only the first price break at a given quantity is used
+            if len(self.quantities) > 0 and self.quantities[-1] == quantity:
+                continue
+
+            rate = rates.get_rate(price_currency, currency)
+
+            if rate is None:
+                logger.warning(f"No currency conversion rate available for {price_currency} -> {currency}")
+                rate = 1
+
+            self.quantities.append(quantity)
+            self.prices.append(amount * rate)
+
+    def get_unit_price(self, quantity):
+        """ Return the unit price for the provided quantity (or None if no price break applies) """
+
+        idx = bisect_right(self.quantities, quantity) - 1
+
+        if idx < 0:
+            return None
+
+        return self.prices[idx]
+
+    def get_price(self, quantity, base_cost=0, multiple=None):
+        """
+        Calculate the price for the provided quantity (see SupplierPart.get_price)
+
+        Args:
+            quantity: Quantity to purchase
+            base_cost: Flat-fee cost added to the price
+            multiple: If provided, the quantity is rounded up to a multiple of this value
+        """
+
+        # No price break information available?
+        if self.get_unit_price(quantity) is None:
+            return None
+
+        if multiple:
+            quantity = int(math.ceil(quantity / multiple) * multiple)
+
+        cost = self.get_unit_price(quantity) * quantity
+
+        return normalize(cost + base_cost)
+
+
+class PricingCache:
+    """
+    Process-local cache of compiled PriceTable objects, keyed by (SupplierPart pk, currency).
+    """
+
+    VERSION_KEY = 'inventree-pricing-version'
+
+    # The cache is cleared if it grows beyond this number of tables
+    MAX_TABLES = 50000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.rates = None
+        self.version = None
+        self.stamp = get_stamp(self.VERSION_KEY)
+
+    def get_version(self):
+        """ Return the current version stamp """
+
+        return self.stamp.get()
+
+    def check(self):
+        """ Clear the local cache if it has been invalidated (by any process). Returns the current version """
+
+        version = self.get_version()
+
+        with self.lock:
+            if version != self.version:
+                self.tables = {}
+                self.rates = None
+                self.version = version
+
+        return version
+
+    def invalidate(self):
+        """ Invalidate the cache (other processes are invalidated once the change is committed) """
+
+        with self.lock:
+            self.tables = {}
+            self.rates = None
+            self.version = None
+
+        self.stamp.increment()
+
+    def get_rates(self):
+        """ Return the exchange rate snapshot (loaded once after each invalidation) """
+
+        self.check()
+
+        rates = self.rates
+
+        if rates is None:
+            rates = ExchangeRates.load()
+
+            with self.lock:
+                self.rates = rates
+
+        return rates
+
+    def get_tables(self, supplier_parts, currency=None):
+        """
+        Return the compiled price tables for the provided supplier parts.
+
+        Any tables which are not already cached are compiled using a single query.
+
+        Args:
+            supplier_parts: Iterable of SupplierPart objects (or pk values)
+            currency: Currency code (default = the default currency setting)
+
+        Returns:
+            Dict of {pk: PriceTable}
+        """
+
+        if currency is None:
+            currency = common.settings.currency_code_default()
+
+        version = self.check()
+
+        tables = {}
+        missing = set()
+
+        for sp in supplier_parts:
+            pk = getattr(sp, 'pk', sp)
+
+            table = self.tables.get((pk, currency), None)
+
+            if table is None:
+                missing.add(pk)
+            else:
+                tables[pk] = table
+
+        if len(missing) == 0:
+            return tables
+
+        rates = self.get_rates()
+
+        breaks = defaultdict(list)
+
+        price_breaks = CompanyModels.SupplierPriceBreak.objects.filter(part__in=missing).order_by('pk')
+
+        for part, quantity, amount, price_currency in price_breaks.values_list('part', 'quantity', 'price', 'price_currency'):
+            breaks[part].append((quantity, amount, price_currency))
+
+        compiled = {}
+
+        for pk in missing:
+            compiled[(pk, currency)] = PriceTable(breaks[pk], currency, rates)
+            tables[pk] = compiled[(pk, currency)]
+
+        with self.lock:
+            # Do not store tables which may have been compiled before an invalidation
+            if self.version == version:
+                if len(self.tables) + len(compiled) > self.MAX_TABLES:
+                    self.tables = {}
+
+                self.tables.update(compiled)
+
+        return tables
+
+    def get_table(self, supplier_part, currency=None):
+        """ Return the compiled price table for a single supplier part """
+
+        pk = getattr(supplier_part, 'pk', supplier_part)
+
+        return self.get_tables([pk], currency)[pk]
+
+
+price_cache = PricingCache()
@@ -6,8 +6,13 @@ from django.core.exceptions import ValidationError
 
 import os
 
+from decimal import Decimal
+
+from djmoney.money import Money
+
 from .models import Company, Contact, SupplierPart
 from .models import rename_company_image
+from .pricing import price_cache
 from part.models import Part
 
 from InvenTree.exchange import InvenTreeManualExchangeBackend
@@ -123,6 +128,37 @@ class CompanySimpleTest(TestCase):
         self.assertIsNone(m3x12.get_price_info(3))
         self.assertIsNotNone(m3x12.get_price_info(50))
 
+    def test_price_cache(self):
+        """ Compiled price tables are cached, and invalidated when price breaks or exchange rates change """
+
+        self.assertEqual(self.acme0001.get_price(1, currency='USD'), 10)
+        self.assertEqual(self.acme0001.get_price(1, currency='AUD'), 13.5)
+
+        # The compiled table is now cached
+        with self.assertNumQueries(0):
+            self.assertEqual(self.acme0001.get_price(5, currency='USD'), 37.5)
+            self.assertEqual(self.acme0001.get_price(100, currency='AUD'), Decimal('472.5'))
+
+        # Changing a price break invalidates the cache
+        self.acme0001.add_price_break(100, Money(2, 'USD'))
+        self.assertEqual(self.acme0001.get_price(100, currency='USD'), 200)
+
+        # Changing an exchange rate invalidates the cache
+        rate = Rate.objects.get(currency='AUD', backend_id='inventree')
+        rate.value = 2
+        rate.save()
+
+        self.assertEqual(self.acme0001.get_price(100, currency='AUD'), 400)
+
+        # Tables for multiple supplier parts are compiled with a single query
+        price_cache.invalidate()
+
+        with self.assertNumQueries(2):
+            tables = price_cache.get_tables([self.acme0001, self.acme0002, self.zerglphs], currency='USD')
+
+        self.assertEqual(tables[self.acme0002.pk].get_price(45), 315)
+        self.assertIsNone(tables[self.zerglphs.pk].get_price(100))
+
     def test_currency_validation(self):
         """
         Test validation for currency selection
@@ -3,8 +3,8 @@ from __future__ import unicode_literals
 
 from django.utils.translation import ugettext as _
 from django.conf.urls import url, include
-from django.core.exceptions import ValidationError, FieldError
 from django.http import HttpResponse
+from django.urls import reverse
 
 from django_filters.rest_framework import DjangoFilterBackend
 
@@ -14,9 +14,12 @@ from rest_framework.response import Response
 import InvenTree.helpers
 import common.models
 
+from common.tasks import offload_task, is_worker_running
+
 from stock.models import StockItem, StockLocation
 
 from .models import StockItemLabel, StockLocationLabel
+from .render import render_labels
 from .serializers import StockItemLabelSerializer, StockLocationLabelSerializer
 
 
@@ -58,20 +61,18 @@ class LabelPrintMixin:
 
             return Response(data, status=400)
 
-        outputs = []
+        label = self.get_object()
 
         # In debug mode, generate single HTML output, rather than PDF
         debug_mode = common.models.InvenTreeSetting.get_setting('REPORT_DEBUG_MODE')
 
-        # Merge one or more PDF files into a single download
+        # Render the label template (to HTML) against each item
+        outputs = []
+
         for item in items_to_print:
-            label = self.get_object()
             label.object_to_print = item
 
-            if debug_mode:
-                outputs.append(label.render_as_string(request))
-            else:
-                outputs.append(label.render(request))
+            outputs.append(label.render_as_string(request))
 
         if debug_mode:
             """
@@ -84,22 +85,38 @@ class LabelPrintMixin:
             return HttpResponse(html)
         else:
             """
-            Concatenate all rendered pages into a single PDF object,
-            and return the resulting document!
+            Render each label to PDF (using the render cache and worker pool),
+            and merge the pages into a single document.
             """
 
-            pages = []
-
-            if len(outputs) > 1:
-                # If more than one output is generated, merge them into a single file
-                for output in outputs:
-                    doc = output.get_document()
-                    for page in doc.pages:
-                        pages.append(page)
-
-                pdf = outputs[0].get_document().copy(pages).write_pdf()
-            else:
-                pdf = outputs[0].get_document().write_pdf()
+            checksum, template = label.get_template()
+
+            if InvenTree.helpers.str2bool(request.query_params.get('background', False)) and is_worker_running():
+                """
+                Render the PDF file in the background,
+                and return the task details (the task result provides the URL of the PDF file)
+                """
+
+                task = offload_task(
+                    'label.tasks.print_labels',
+                    checksum,
+                    outputs,
+                    request.build_absolute_uri("/"),
+                    user=request.user,
+                )
+
+                data = {
+                    'task': task.pk,
+                    'url': reverse('api-task-detail', kwargs={'pk': task.pk}),
+                }
+
+                return Response(data, status=202)
+
+            pdf = render_labels(
+                checksum,
+                outputs,
+                base_url=request.build_absolute_uri("/"),
+            )
 
             return InvenTree.helpers.DownloadFile(
                 pdf,
@@ -168,47 +185,16 @@ class StockItemLabelList(LabelListView, StockItemLabelMixin):
         # We wish to filter by stock items
         if len(items) > 0:
             """
-            At this point, we are basically forced to be inefficient,
-            as we need to compare the 'filters' string of each label,
-            and see if it matches against each of the requested items.
-
-            TODO: In the future, if this becomes excessively slow, it
-                  will need to be readdressed.
+            Each template filter is evaluated against all of the specified stock items at once,
+            and only templates which match *every* item are returned.
             """
 
-            # Keep track of which labels match every specified stockitem
-            valid_label_ids = set()
-            
-            for label in queryset.all():
-
-                matches = True
-
-                # Filter string defined for the StockItemLabel object
-                try:
-                    filters = InvenTree.helpers.validateFilterString(label.filters)
-                except ValidationError:
-                    continue
-
-                for item in items:
-
-                    item_query = StockItem.objects.filter(pk=item.pk)
-
-                    try:
-                        if not item_query.filter(**filters).exists():
-                            matches = False
-                            break
-                    except FieldError:
-                        matches = False
-                        break
-
-                # Matched all items
-                if matches:
-                    valid_label_ids.add(label.pk)
-                else:
-                    continue
+            valid_ids = [
+                template.pk for template in InvenTree.helpers.filterTemplatesForItems(queryset.all(), StockItem, items)
+            ]
 
             # Reduce queryset to only valid matches
-            queryset = queryset.filter(pk__in=[pk for pk in valid_label_ids])
+            queryset = queryset.filter(pk__in=valid_ids)
 
         return queryset
 
@@ -300,47 +286,16 @@ class StockLocationLabelList(LabelListView, StockLocationLabelMixin):
         # We wish to filter by stock location(s)
         if len(locations) > 0:
             """
-            At this point, we are basically forced to be inefficient,
-            as we need to compare the 'filters' string of each label,
-            and see if it matches against each of the requested items.
-
-            TODO: In the future, if this becomes excessively slow, it
-                  will need to be readdressed.
+            Each template filter is evaluated against all of the specified stock locations at once,
+            and only templates which match *every* item are returned.
             """
 
-            valid_label_ids = set()
-
-            for label in queryset.all():
-
-                matches = True
-
-                # Filter string defined for the StockLocationLabel object
-                try:
-                    filters = InvenTree.helpers.validateFilterString(label.filters)
-                except:
-                    # Skip if there was an error validating the filters...
-                    continue
-
-                for loc in locations:
-
-                    loc_query = StockLocation.objects.filter(pk=loc.pk)
-
-                    try:
-                        if not loc_query.filter(**filters).exists():
-                            matches = False
-                            break
-                    except FieldError:
-                        matches = False
-                        break
-
-                # Matched all items
-                if matches:
-                    valid_label_ids.add(label.pk)
-                else:
-                    continue
+            valid_ids = [
+                template.pk for template in InvenTree.helpers.filterTemplatesForItems(queryset.all(), StockLocation, locations)
+            ]
 
             # Reduce queryset to only valid matches
-            queryset = queryset.filter(pk__in=[pk for pk in valid_label_ids])
+            queryset = queryset.filter(pk__in=valid_ids)
 
         return queryset
 
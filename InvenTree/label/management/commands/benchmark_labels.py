@@ -0,0 +1,121 @@
+"""
+Custom management command to benchmark label rendering
+"""
+
+import time
+import resource
+import tracemalloc
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+
+from stock.models import StockItem, StockLocation
+
+from label.models import StockItemLabel, StockLocationLabel
+from label.render import render_labels, render_pool
+
+
+class Command(BaseCommand):
+    """
+    Measure label rendering throughput and peak memory usage,
+    for a range of worker pool sizes.
+
+    Each pool size is measured with an empty render cache (cold),
+    and then again with a populated render cache (warm).
+    """
+
+    help = 'Benchmark label PDF rendering'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('label', type=int, help='Label template ID')
+        parser.add_argument('--location', action='store_true', help='Benchmark a StockLocation label (rather than a StockItem label)')
+        parser.add_argument('--count', type=int, default=100, help='Number of labels to print')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker pool sizes to test')
+
+    def get_objects(self, location, count):
+
+        if location:
+            queryset = StockLocation.objects.all()
+        else:
+            queryset = StockItem.objects.all()
+
+        objects = list(queryset[:count])
+
+        if len(objects) == 0:
+            raise CommandError("No objects available to print")
+
+        # Print the same objects repeatedly if there are not enough in the database
+        while len(objects) < count:
+            objects += objects[:count - len(objects)]
+
+        return objects
+
+    def render(self, label, request, objects, workers):
+        """
+        Render labels against the provided objects.
+
+        Returns a tuple of (duration, peak_memory, output_size)
+        """
+
+        tracemalloc.start()
+
+        t_start = time.time()
+
+        documents = []
+
+        for obj in objects:
+            label.object_to_print = obj
+            documents.append(label.render_as_string(request))
+
+        checksum, template = label.get_template()
+
+        pdf = render_labels(checksum, documents, request.build_absolute_uri('/'), workers=workers)
+
+        duration = time.time() - t_start
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return duration, peak, len(pdf)
+
+    def handle(self, *args, **kwargs):
+
+        location = kwargs['location']
+        count = kwargs['count']
+
+        label_class = StockLocationLabel if location else StockItemLabel
+
+        try:
+            label = label_class.objects.get(pk=kwargs['label'])
+        except label_class.DoesNotExist:
+            raise CommandError("Label template does not exist")
+
+        objects = self.get_objects(location, count)
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        self.stdout.write(f"Rendering {count} copies of label '{label}'")
+        self.stdout.write("workers | cache | time (s) | labels/s | peak memory (MB) | output (kB)")
+
+        for workers in kwargs['workers']:
+
+            caches['label'].clear()
+
+            for mode in ['cold', 'warm']:
+                duration, peak, size = self.render(label, request, objects, workers)
+
+                rate = count / duration if duration > 0 else 0
+
+                self.stdout.write(f"{workers:7d} | {mode:5s} | {duration:8.2f} | {rate:8.1f} | {peak / 1e6:16.1f} | {size / 1e3:11.1f}")
+
+        render_pool.shutdown()
+
+        # Maximum resident set size of the server process, and the largest worker process
+        rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+        self.stdout.write(f"Peak RSS: server process {rss_self / 1e3:.1f} MB, worker process {rss_children / 1e3:.1f} MB")
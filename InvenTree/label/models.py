@@ -15,15 +15,15 @@ from django.db import models
 from django.core.validators import FileExtensionValidator, MinValueValidator
 from django.core.exceptions import ValidationError, FieldError
 
-from django.template.loader import render_to_string
-
 from django.utils.translation import gettext_lazy as _
 
-from InvenTree.helpers import validateFilterString, normalize
+from InvenTree.helpers import validateFilterString, parseFilterString, normalize
 
 import common.models
 import stock.models
 
+from .render import template_cache
+
 try:
     from django_weasyprint import WeasyTemplateResponseMixin
 except OSError as err:
@@ -153,6 +153,15 @@ class LabelTemplate(models.Model):
 
         return template
 
+    def get_template(self):
+        """
+        Returns a (checksum, template) tuple for the label template file.
+
+        The compiled template is cached until the template file is modified.
+        """
+
+        return template_cache.get(self.template_name)
+
     def get_context_data(self, request):
         """
         Supply custom context data to the template for rendering.
@@ -187,7 +196,9 @@ class LabelTemplate(models.Model):
         Useful for debug mode (viewing generated code)
         """
 
-        return render_to_string(self.template_name, self.context(request), request)
+        checksum, template = self.get_template()
+
+        return template.render(self.context(request), request)
 
     def render(self, request, **kwargs):
         """
@@ -231,7 +242,7 @@ class StockItemLabel(LabelTemplate):
         """
 
         try:
-            filters = validateFilterString(self.filters)
+            filters = parseFilterString(self.filters)
             items = stock.models.StockItem.objects.filter(**filters)
         except (ValidationError, FieldError):
             # If an error exists with the "filters" field, return False
@@ -282,7 +293,7 @@ class StockLocationLabel(LabelTemplate):
         """
 
         try:
-            filters = validateFilterString(self.filters)
+            filters = parseFilterString(self.filters)
             locs = stock.models.StockLocation.objects.filter(**filters)
         except (ValidationError, FieldError):
             return False
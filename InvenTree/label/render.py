@@ -0,0 +1,313 @@
+"""
+Label rendering pipeline.
+
+Printing labels is performed in two stages:
+
+1. The label template is rendered to a HTML string, for each item.
+   This requires database access, and so is performed in the server process.
+2. Each HTML string is laid out and converted to PDF by WeasyPrint.
+   This is by far the most expensive stage, but requires no database access.
+
+To speed up the second stage:
+
+- Compiled templates are cached per revision of the template file
+- Fonts are configured once per rendering thread (or worker process), rather than for every label
+- Rendered PDF outputs are cached, keyed by the template checksum and a hash of the rendered context
+- Uncached outputs are rendered across a pool of worker processes (settings.LABEL_RENDER_WORKERS)
+
+The individual outputs are then merged (in the order they were requested) into a single PDF file.
+"""
+
+import io
+import os
+import hashlib
+import logging
+import threading
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template import engines
+
+from PyPDF2 import PdfFileMerger
+
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateCache:
+    """
+    Cache of compiled label templates.
+
+    A template is compiled once per revision of the template file,
+    (as determined by the file modification time and size),
+    rather than being read and compiled again for every label which is printed.
+    """
+
+    def __init__(self):
+        self.templates = {}
+        self.lock = threading.Lock()
+
+    def get(self, filename):
+        """
+        Return a (checksum, template) tuple for the provided template file.
+        """
+
+        stat = os.stat(filename)
+        revision = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self.templates.get(filename, None)
+
+        if entry is None or entry[0] != revision:
+
+            with open(filename, 'rb') as f:
+                data = f.read()
+
+            checksum = hashlib.md5(data).hexdigest()
+            template = engines['django'].from_string(data.decode('utf-8'))
+
+            entry = (revision, checksum, template)
+
+            with self.lock:
+                self.templates[filename] = entry
+
+        return entry[1], entry[2]
+
+    def clear(self):
+
+        with self.lock:
+            self.templates = {}
+
+
+template_cache = TemplateCache()
+
+
+# Per-thread rendering state (each worker process has its own copy)
+render_state = threading.local()
+
+
+def get_font_config():
+    """
+    Return the WeasyPrint font configuration for the current thread.
+
+    The font configuration (which loads the available system fonts, and any @font-face fonts)
+    is created once and re-used for every label rendered by this thread.
+    """
+
+    font_config = getattr(render_state, 'font_config', None)
+
+    if font_config is None:
+        try:
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:
+            # WeasyPrint < 53
+            from weasyprint.fonts import FontConfiguration
+
+        font_config = FontConfiguration()
+        render_state.font_config = font_config
+
+    return font_config
+
+
+def render_pdf(html, base_url):
+    """
+    Render a HTML string to a PDF file.
+
+    Media and static files are loaded using the django-weasyprint URL fetcher (as per WeasyTemplateResponse).
+
+    Note: This function is run in a worker process, and so must not access the database.
+    """
+
+    import weasyprint
+
+    from django_weasyprint.utils import django_url_fetcher
+
+    font_config = get_font_config()
+
+    document = weasyprint.HTML(string=html, base_url=base_url, url_fetcher=django_url_fetcher)
+
+    return document.write_pdf(presentational_hints=True, font_config=font_config)
+
+
+def init_worker(settings_module):
+    """
+    Initialize a (spawned) render worker process.
+
+    Django must be set up before rendering, as the django-weasyprint URL fetcher
+    resolves static and media files using the project settings (and the staticfiles finders).
+    """
+
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    django.setup()
+
+
+class RenderPool:
+    """
+    Pool of worker processes for rendering PDF files.
+
+    The pool is created the first time it is required,
+    and then kept alive for subsequent print jobs.
+
+    Worker processes are "spawned" rather than forked,
+    so that they do not inherit open database connections from the server process.
+    Each worker sets up Django (see init_worker) before rendering any documents.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.workers = 0
+        self.lock = threading.Lock()
+
+    def get_executor(self, workers):
+
+        with self.lock:
+            if self.executor is None or self.workers != workers:
+
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False)
+
+                self.executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'InvenTree.settings'),),
+                )
+
+                self.workers = workers
+
+            return self.executor
+
+    def shutdown(self):
+
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+
+            self.executor = None
+            self.workers = 0
+
+    def render(self, documents, base_url, workers=1):
+        """
+        Render a list of HTML strings to PDF.
+
+        Returns a list of PDF outputs, in the same order as the provided documents.
+        """
+
+        if workers <= 1 or len(documents) <= 1:
+            return [render_pdf(html, base_url) for html in documents]
+
+        # Split the documents evenly between the workers
+        chunksize = max(1, len(documents) // (workers * 4))
+
+        try:
+            executor = self.get_executor(workers)
+
+            return list(executor.map(
+                render_pdf,
+                documents,
+                [base_url] * len(documents),
+                chunksize=chunksize,
+            ))
+        except BrokenProcessPool:
+            logger.error("Label render pool failed - rendering labels in server process")
+
+            self.shutdown()
+
+            return [render_pdf(html, base_url) for html in documents]
+
+
+render_pool = RenderPool()
+
+
+def get_render_workers():
+    """
+    Return the number of worker processes to use for rendering labels
+    """
+
+    try:
+        workers = int(getattr(settings, 'LABEL_RENDER_WORKERS', 1))
+    except (ValueError, TypeError):
+        workers = 1
+
+    return max(1, workers)
+
+
+def output_cache_key(checksum, html, base_url):
+    """
+    Construct a cache key for a rendered label.
+
+    The rendered HTML string captures the entire context which was passed to the template,
+    so it is used (rather than the context data itself) to identify the output.
+    """
+
+    digest = hashlib.md5()
+
+    digest.update(base_url.encode('utf-8'))
+    digest.update(html.encode('utf-8'))
+
+    return 'label-pdf-{c}-{h}'.format(c=checksum, h=digest.hexdigest())
+
+
+def merge_pdfs(outputs):
+    """
+    Merge multiple PDF files (in order) into a single PDF file
+    """
+
+    if len(outputs) == 1:
+        return outputs[0]
+
+    merger = PdfFileMerger(strict=False)
+
+    for pdf in outputs:
+        merger.append(io.BytesIO(pdf))
+
+    result = io.BytesIO()
+
+    merger.write(result)
+    merger.close()
+
+    return result.getvalue()
+
+
+def render_labels(checksum, documents, base_url, workers=None):
+    """
+    Render a list of label documents into a single PDF file.
+
+    Args:
+        checksum: Checksum of the label template file
+        documents: List of HTML strings (rendered from the template), in print order
+        base_url: Base URL for resolving relative links in the documents
+        workers: Number of worker processes (defaults to settings.LABEL_RENDER_WORKERS)
+    """
+
+    if workers is None:
+        workers = get_render_workers()
+
+    output_cache = caches['label']
+
+    keys = [output_cache_key(checksum, html, base_url) for html in documents]
+
+    outputs = output_cache.get_many(set(keys))
+
+    # Render each (uncached) unique document only once
+    pending = {}
+
+    for key, html in zip(keys, documents):
+        if key not in outputs and key not in pending:
+            pending[key] = html
+
+    if len(pending) > 0:
+        rendered = render_pool.render(list(pending.values()), base_url, workers=workers)
+
+        rendered = dict(zip(pending.keys(), rendered))
+
+        output_cache.set_many(rendered)
+        outputs.update(rendered)
+
+    return merge_pdfs([outputs[key] for key in keys])
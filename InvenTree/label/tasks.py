@@ -0,0 +1,23 @@
+"""
+Background tasks for the label app
+"""
+
+from common.tasks import register_task, save_task_output
+
+from label.render import render_labels
+
+
+@register_task(max_attempts=1)
+def print_labels(checksum, documents, base_url, filename='inventree_label.pdf'):
+    """
+    Render a set of (pre-rendered HTML) label documents to a single PDF file (see label.render.render_labels)
+
+    Returns the filename and URL of the generated PDF file
+    """
+
+    pdf = render_labels(checksum, documents, base_url=base_url)
+
+    return {
+        'filename': filename,
+        'url': save_task_output(filename, pdf),
+    }
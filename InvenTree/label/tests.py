@@ -4,14 +4,17 @@
 from __future__ import unicode_literals
 
 import os
+import tempfile
 
 from django.test import TestCase
 from django.conf import settings
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
 
-from InvenTree.helpers import validateFilterString
+from InvenTree.helpers import validateFilterString, matchFilterTemplates, filterTemplatesForItems
 
 from .models import StockItemLabel, StockLocationLabel
+from .render import template_cache, output_cache_key, render_labels, RenderPool
 from stock.models import StockItem
 
 
@@ -74,3 +77,126 @@ class LabelTest(TestCase):
 
         with self.assertRaises(ValidationError):
             validateFilterString(bad_filter_string, model=StockItem)
+
+
+class LabelRenderTest(TestCase):
+    """
+    Tests for the label rendering pipeline
+    """
+
+    def setUp(self):
+
+        caches['label'].clear()
+        template_cache.clear()
+
+    def test_template_cache(self):
+        """
+        Test that compiled templates are cached per revision of the template file
+        """
+
+        with tempfile.NamedTemporaryFile('w', suffix='.html', delete=False) as f:
+            f.write("<p>{{ name }}</p>")
+            filename = f.name
+
+        checksum, template = template_cache.get(filename)
+
+        self.assertEqual(template.render({'name': 'abc'}), '<p>abc</p>')
+
+        # Template is not compiled again
+        self.assertIs(template_cache.get(filename)[1], template)
+
+        # Modify the template file
+        with open(filename, 'w') as f:
+            f.write("<h1>{{ name }}</h1>")
+
+        os.utime(filename, ns=(0, 0))
+
+        new_checksum, new_template = template_cache.get(filename)
+
+        self.assertNotEqual(checksum, new_checksum)
+        self.assertEqual(new_template.render({'name': 'abc'}), '<h1>abc</h1>')
+
+        os.remove(filename)
+
+    def test_output_cache(self):
+        """
+        Test that cached outputs are not rendered again
+        """
+
+        base_url = 'http://localhost/'
+
+        key = output_cache_key('abc', '<p>label</p>', base_url)
+
+        # Different context produces a different key
+        self.assertNotEqual(key, output_cache_key('abc', '<p>other</p>', base_url))
+
+        # Different template produces a different key
+        self.assertNotEqual(key, output_cache_key('def', '<p>label</p>', base_url))
+
+        caches['label'].set(key, b'%PDF-cached')
+
+        pdf = render_labels('abc', ['<p>label</p>'], base_url, workers=4)
+
+        self.assertEqual(pdf, b'%PDF-cached')
+
+    def test_worker_setup(self):
+        """
+        Test that render workers can resolve (app) static files, which requires Django to be set up
+        """
+
+        from django.contrib.staticfiles import finders
+
+        pool = RenderPool()
+
+        try:
+            executor = pool.get_executor(2)
+
+            path = executor.submit(finders.find, 'admin/css/base.css').result(timeout=120)
+        finally:
+            pool.shutdown()
+
+        self.assertEqual(path, finders.find('admin/css/base.css'))
+        self.assertIsNotNone(path)
+
+
+class LabelFilterTest(TestCase):
+    """
+    Tests for matching label filters against stock items
+    """
+
+    fixtures = [
+        'category',
+        'part',
+        'location',
+        'stock',
+    ]
+
+    def test_match_filters(self):
+
+        all_items = StockItemLabel.objects.create(name='All', label='all.html', filters='')
+        part_1 = StockItemLabel.objects.create(name='Part 1', label='part_1.html', filters='part=1')
+        location = StockItemLabel.objects.create(name='Location', label='location.html', filters='location=7')
+        invalid = StockItemLabel.objects.create(name='Invalid', label='invalid.html', filters='partt=1')
+
+        labels = [all_items, part_1, location, invalid]
+
+        items = StockItem.objects.filter(pk__in=[1, 2, 100, 101])
+
+        # One query to evaluate the items, and one query for each (valid) label filter
+        with self.assertNumQueries(4):
+            matches = matchFilterTemplates(labels, StockItem, items)
+
+        self.assertEqual(matches[all_items], set([1, 2, 100, 101]))
+        self.assertEqual(matches[part_1], set([1, 2]))
+        self.assertEqual(matches[location], set([100, 101]))
+        self.assertEqual(matches[invalid], set())
+
+        # Labels which match *every* item
+        self.assertEqual(filterTemplatesForItems(labels, StockItem, items), [all_items])
+        self.assertEqual(filterTemplatesForItems(labels, StockItem, items.filter(part=1)), [all_items, part_1])
+
+        item = StockItem.objects.get(pk=1)
+
+        self.assertTrue(part_1.matches_stock_item(item))
+        self.assertFalse(location.matches_stock_item(item))
+        self.assertFalse(invalid.matches_stock_item(item))
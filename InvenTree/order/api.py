@@ -6,20 +6,29 @@ JSON API for the Order app
 from __future__ import unicode_literals
 
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import generics
+from rest_framework import generics, permissions
 from rest_framework import filters
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.serializers import ValidationError
 
 from django.conf.urls import url, include
+from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError as DjangoValidationError
 
 from InvenTree.helpers import str2bool
 from InvenTree.api import AttachmentMixin
-from InvenTree.status_codes import PurchaseOrderStatus, SalesOrderStatus
+from InvenTree.status_codes import PurchaseOrderStatus, SalesOrderStatus, StockStatus
 
 from part.models import Part
 from company.models import SupplierPart
+from stock.models import StockLocation
+from users.models import RuleSet
 
 from .models import PurchaseOrder, PurchaseOrderLineItem
 from .models import PurchaseOrderAttachment
+from .receiving import PurchaseOrderReceipt
 from .serializers import POSerializer, POLineItemSerializer, POAttachmentSerializer
 
 from .models import SalesOrder, SalesOrderLineItem
@@ -188,6 +197,131 @@ class PODetail(generics.RetrieveUpdateAPIView):
         return queryset
 
 
+class POReceive(APIView):
+    """
+    API endpoint for receiving line items against a PurchaseOrder.
+
+    - POST: Receive the provided line items
+
+    Data:
+        location: Default destination for the received items (pk)
+        items: List of line items to receive, each of which contains:
+            - line: PurchaseOrderLineItem (pk)
+            - quantity: Quantity to receive
+            - location: Destination for this line (optional, pk)
+            - status: StockStatus code (optional)
+            - batch: Batch code (optional)
+            - serial_numbers: Serial numbers, e.g. "1-5, 10" (optional)
+
+    All of the lines are received in a single transaction (see order.receiving).
+    If any line cannot be received, nothing is received,
+    and the errors for each line are returned in the 'items' field of the response.
+    """
+
+    queryset = PurchaseOrder.objects.all()
+
+    # Receiving items requires permission to change the purchase order (see check_permissions),
+    # rather than the 'add' permission which is otherwise required for a POST request
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+
+    def check_permissions(self, request):
+        """ Receiving items requires permission to change the purchase order """
+
+        super().check_permissions(request)
+
+        if not RuleSet.check_table_permission(request.user, 'order_purchaseorder', 'change'):
+            self.permission_denied(request, message='User does not have permission to receive items')
+
+    def get_items(self, request):
+        """ Return the list of posted items (as dicts) """
+
+        items = request.data.get('items', None)
+
+        if not type(items) == list or len(items) == 0:
+            raise ValidationError({'items': 'Request must contain list of line items'})
+
+        for entry in items:
+            if not type(entry) == dict:
+                raise ValidationError({'items': 'Improperly formatted data'})
+
+        return items
+
+    def post(self, request, pk, *args, **kwargs):
+
+        order = get_object_or_404(PurchaseOrder, pk=pk)
+
+        items = self.get_items(request)
+
+        # Load all of the referenced lines and locations at once
+        lines = PurchaseOrderLineItem.objects.filter(order=order).select_related('part__part').in_bulk()
+
+        location_ids = set()
+
+        for pk in [request.data.get('location', None)] + [entry.get('location', None) for entry in items]:
+            try:
+                location_ids.add(int(pk))
+            except (ValueError, TypeError):
+                pass
+
+        locations = StockLocation.objects.in_bulk(location_ids)
+
+        def get_location(pk):
+            try:
+                return locations[int(pk)]
+            except (ValueError, TypeError, KeyError):
+                raise DjangoValidationError({'location': 'Valid location must be specified'})
+
+        default_location = request.data.get('location', None)
+
+        receipt = PurchaseOrderReceipt(order, request.user)
+
+        errors = []
+
+        for entry in items:
+
+            try:
+                try:
+                    line = lines[int(entry.get('line', None))]
+                except (ValueError, TypeError, KeyError):
+                    raise DjangoValidationError({'line': 'Line item does not match purchase order'})
+
+                location = entry.get('location', default_location)
+
+                location = None if location in [None, ''] else get_location(location)
+
+                receipt.add(
+                    line,
+                    entry.get('quantity', None),
+                    location,
+                    status=entry.get('status', StockStatus.OK),
+                    batch=entry.get('batch', None),
+                    serials=entry.get('serial_numbers', None),
+                )
+
+                errors.append({})
+
+            except DjangoValidationError as e:
+                errors.append(e.message_dict)
+
+        if any(errors):
+            raise ValidationError({'items': errors})
+
+        try:
+            created = receipt.receive()
+        except DjangoValidationError as e:
+            raise ValidationError(e.message_dict)
+
+        data = {
+            'success': 'Received {n} line items'.format(n=len(items)),
+            'items': [item.pk for item in created],
+            'complete': order.status == PurchaseOrderStatus.COMPLETE,
+        }
+
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
 class POLineItemList(generics.ListCreateAPIView):
     """ API endpoint for accessing a list of POLineItem objects
 
@@ -325,6 +459,12 @@ class SOList(generics.ListCreateAPIView):
             else:
                 queryset = queryset.exclude(SalesOrder.OVERDUE_FILTER)
 
+        # Filter by 'allocated' status (see SalesOrder.annotate_allocation)
+        allocated = params.get('allocated', None)
+
+        if allocated is not None:
+            queryset = queryset.filter(fully_allocated=str2bool(allocated))
+
         status = params.get('status', None)
 
         if status is not None:
@@ -502,6 +642,7 @@ class POAttachmentList(generics.ListCreateAPIView, AttachmentMixin):
 order_api_urls = [
     # API endpoints for purchase orders
     url(r'^po/(?P<pk>\d+)/$', PODetail.as_view(), name='api-po-detail'),
+    url(r'^po/(?P<pk>\d+)/receive/', POReceive.as_view(), name='api-po-receive'),
     url(r'po/attachment/', include([
         url(r'^.*$', POAttachmentList.as_view(), name='api-po-attachment-list'),
     ])),
@@ -9,7 +9,7 @@ from datetime import datetime
 from decimal import Decimal
 
 from django.db import models, transaction
-from django.db.models import Q, F, Sum
+from django.db.models import Q, F, Sum, Case, When, Exists, OuterRef
 from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
@@ -31,6 +31,9 @@ from InvenTree.helpers import decimal2string, increment, getSetting
 from InvenTree.status_codes import PurchaseOrderStatus, SalesOrderStatus, StockStatus
 from InvenTree.models import InvenTreeAttachment
 
+from . import receiving
+from . import shipping
+
 
 class Order(models.Model):
     """ Abstract model for an order.
@@ -325,7 +328,6 @@ class PurchaseOrder(Order):
 
         return self.pending_line_items().count() == 0
 
-    @transaction.atomic
     def receive_line_item(self, line, location, quantity, user, status=StockStatus.OK):
         """ Receive a line item (or partial line item) against this PO
         """
@@ -333,41 +335,25 @@ class PurchaseOrder(Order):
         if not self.status == PurchaseOrderStatus.PLACED:
             raise ValidationError({"status": _("Lines can only be received against an order marked as 'Placed'")})
 
-        try:
-            quantity = int(quantity)
-            if quantity <= 0:
-                raise ValidationError({"quantity": _("Quantity must be greater than zero")})
-        except ValueError:
-            raise ValidationError({"quantity": _("Invalid quantity provided")})
+        self.receive_line_items([(line, quantity, location, status)], user)
 
-        # Create a new stock item
-        if line.part:
-            stock = stock_models.StockItem(
-                part=line.part.part,
-                supplier_part=line.part,
-                location=location,
-                quantity=quantity,
-                purchase_order=self,
-                status=status
-            )
+    def receive_line_items(self, lines, user):
+        """
+        Receive multiple line items against this PO (see order.receiving)
 
-            stock.save()
+        Args:
+            lines: List of (line, quantity, location, status) tuples
+            user: User receiving the items
 
-            text = _("Received items")
-            note = f"{_('Received')} {quantity} {_('items against order')} {str(self)}"
+        Returns the list of created StockItem objects
+        """
 
-            # Add a new transaction note to the newly created stock item
-            stock.addTransactionNote(text, user, note)
+        receipt = receiving.PurchaseOrderReceipt(self, user)
 
-        # Update the number of parts received against the particular line item
-        line.received += quantity
-        line.save()
+        for line, quantity, location, status in lines:
+            receipt.add(line, quantity, location, status=status)
 
-        # Has this order been completed?
-        if len(self.pending_line_items()) == 0:
-            
-            self.received_by = user
-            self.complete_order()  # This will save the model
+        return receipt.receive()
 
 
 class SalesOrder(Order):
@@ -474,48 +460,57 @@ class SalesOrder(Order):
     def is_pending(self):
         return self.status == SalesOrderStatus.PENDING
 
+    @staticmethod
+    def annotate_allocation(queryset):
+        """
+        Annotate the allocation status of each SalesOrder in the queryset:
+
+        - fully_allocated: True if all line items are fully allocated (or fulfilled, once the order has been shipped)
+        - over_allocated: True if any line items are over-allocated
+
+        The line totals are calculated with a single grouped join for each status (see SalesOrderLineItem),
+        and the status of every order in the queryset is calculated by the same query
+        """
+
+        lines = SalesOrderLineItem.objects.filter(order=OuterRef('pk'))
+
+        allocated = SalesOrderLineItem.annotate_allocated(lines)
+        fulfilled = SalesOrderLineItem.annotate_fulfilled(lines)
+
+        return queryset.annotate(
+            fully_allocated=Case(
+                When(status=SalesOrderStatus.SHIPPED, then=~Exists(fulfilled.filter(fulfilled__lt=F('quantity')))),
+                default=~Exists(allocated.filter(allocated__lt=F('quantity'))),
+                output_field=models.BooleanField(),
+            ),
+            over_allocated=Exists(allocated.filter(allocated__gt=F('quantity'))),
+        )
+
+    def allocation_status(self):
+        """ Return the (fully_allocated, over_allocated) status of this order, with a single query """
+
+        query = SalesOrder.annotate_allocation(SalesOrder.objects.filter(pk=self.pk))
+
+        return query.values_list('fully_allocated', 'over_allocated').get()
+
     def is_fully_allocated(self):
         """ Return True if all line items are fully allocated """
 
-        for line in self.lines.all():
-            if not line.is_fully_allocated():
-                return False
-            
-        return True
+        return self.allocation_status()[0]
 
     def is_over_allocated(self):
         """ Return true if any lines in the order are over-allocated """
 
-        for line in self.lines.all():
-            if line.is_over_allocated():
-                return True
-
-        return False
+        return self.allocation_status()[1]
 
-    @transaction.atomic
     def ship_order(self, user):
-        """ Mark this order as 'shipped' """
+        """ Mark this order as 'shipped' (see order.shipping) """
 
         # The order can only be 'shipped' if the current status is PENDING
         if not self.status == SalesOrderStatus.PENDING:
             raise ValidationError({'status': _("SalesOrder cannot be shipped as it is not currently pending")})
 
-        # Complete the allocation for each allocated StockItem
-        for line in self.lines.all():
-            for allocation in line.allocations.all():
-                allocation.complete_allocation(user)
-
-                # Remove the allocation from the database once it has been 'fulfilled'
-                if allocation.item.sales_order == self:
-                    allocation.delete()
-                else:
-                    raise ValidationError("Could not complete order - allocation item not fulfilled")
-
-        # Ensure the order status is marked as "Shipped"
-        self.status = SalesOrderStatus.SHIPPED
-        self.shipment_date = datetime.now().date()
-        self.shipped_by = user
-        self.save()
+        shipping.SalesOrderShipment(self, user).ship()
 
         return True
 
@@ -665,6 +660,28 @@ class SalesOrderLineItem(OrderLineItem):
         unique_together = [
         ]
 
+    @staticmethod
+    def annotate_allocated(queryset):
+        """
+        Annotate the allocated quantity of each line item in the queryset (as per allocated_quantity),
+        with a grouped join against the allocations
+        """
+
+        return queryset.annotate(
+            allocated=Coalesce(Sum('allocations__quantity'), Decimal(0)),
+        )
+
+    @staticmethod
+    def annotate_fulfilled(queryset):
+        """
+        Annotate the fulfilled quantity of each line item in the queryset (as per fulfilled_quantity),
+        with a grouped join against the stock items assigned to the order
+        """
+
+        return queryset.annotate(
+            fulfilled=Coalesce(Sum('order__stock_items__quantity', filter=Q(order__stock_items__part=F('part'))), Decimal(0)),
+        )
+
     def fulfilled_quantity(self):
         """
         Return the total stock quantity fulfilled against this line item.
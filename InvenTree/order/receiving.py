@@ -0,0 +1,310 @@
+"""
+Batched receiving of purchase order line items.
+
+Receiving a line item (via PurchaseOrder.receive_line_item) creates a single StockItem
+(an individual MPTT tree insert, with full validation and a tracking entry), adds a second tracking entry,
+saves the line item, and then checks whether the order is complete by loading every pending line.
+Receiving an order with hundreds of lines repeats all of this for every line.
+
+Instead, the PurchaseOrderReceipt class receives any number of lines at once, in a single transaction:
+
+- Each line is validated as it is added (including serial numbers, which are checked for each part tree with a single query),
+  by validating a single template stock item for the line (as per StockItem.serializeStock)
+- The new stock items (each the root of a new tree) are created with bulk inserts (see StockItem.create_roots)
+- The tracking entries are created with bulk inserts
+- The received quantities are written using bulk_update
+- Order completion is checked with a single query
+"""
+
+import logging
+
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.translation import ugettext as _
+
+from InvenTree.helpers import extract_serial_numbers, serial_to_int
+from InvenTree.status_codes import PurchaseOrderStatus, StockStatus
+
+from part import models as PartModels
+from stock import models as StockModels
+
+from order import models as OrderModels
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiptLine:
+    """
+    A single line item to be received.
+
+    Attributes:
+        line: PurchaseOrderLineItem object
+        quantity: Quantity to receive (integer)
+        location: Destination StockLocation
+        status: StockStatus code for the received items
+        batch: Batch code for the received items (optional)
+        serials: List of serial numbers (optional) - one stock item is created for each serial number
+        template: Validated (unsaved) StockItem, from which the stock items for the line are created
+    """
+
+    def __init__(self, line, quantity, location, status, batch, serials, template=None):
+        self.line = line
+        self.quantity = quantity
+        self.location = location
+        self.status = status
+        self.batch = batch
+        self.serials = serials
+        self.template = template
+
+
+class PurchaseOrderReceipt:
+    """
+    Receive a number of line items against a PurchaseOrder.
+
+    Lines are added (and validated) with add(), and received together with receive().
+    """
+
+    def __init__(self, order, user):
+        self.order = order
+        self.user = user
+
+        self.lines = []
+
+        # Serial numbers already used by lines in this receipt, as {part_tree_id: set(serials)}
+        self.serials = defaultdict(set)
+
+    def add(self, line, quantity, location, status=StockStatus.OK, batch=None, serials=None):
+        """
+        Validate and add a line item to be received.
+
+        Args:
+            line: PurchaseOrderLineItem object
+            quantity: Quantity to receive (integer)
+            location: Destination StockLocation
+            status: StockStatus code for the received items
+            batch: Batch code (optional)
+            serials: Serial numbers, as a list or a string (e.g. "1-10") (optional)
+
+        Raises ValidationError if the line cannot be received
+        """
+
+        if not line.order_id == self.order.pk:
+            raise ValidationError({'line': _('Line item does not match purchase order')})
+
+        try:
+            quantity = int(quantity)
+            if quantity <= 0:
+                raise ValidationError({"quantity": _("Quantity must be greater than zero")})
+        except (ValueError, TypeError):
+            raise ValidationError({"quantity": _("Invalid quantity provided")})
+
+        try:
+            status = int(status)
+        except (ValueError, TypeError):
+            status = None
+
+        if status not in StockStatus.RECEIVING_CODES:
+            raise ValidationError({'status': _('Invalid stock status code')})
+
+        supplier_part = line.part
+
+        if supplier_part is not None:
+            if location is None:
+                raise ValidationError({'location': _('Destination location must be specified')})
+
+            serials = self.validate_serials(supplier_part.part, quantity, serials)
+        else:
+            serials = None
+
+        receipt = ReceiptLine(line, quantity, location, status, batch or None, serials)
+
+        if supplier_part is not None:
+            receipt.template = self.construct_template(receipt)
+
+        self.lines.append(receipt)
+
+    def validate_serials(self, part, quantity, serials):
+        """ Validate (and return) the list of serial numbers for a line """
+
+        if serials in [None, '', []]:
+            return None
+
+        if not part.trackable:
+            raise ValidationError({'serial_numbers': _('Serial numbers can only be assigned to trackable parts')})
+
+        if isinstance(serials, str):
+            try:
+                serials = extract_serial_numbers(serials, quantity)
+            except ValidationError as e:
+                raise ValidationError({'serial_numbers': e.messages})
+
+        serials = [str(serial).strip() for serial in serials]
+
+        if not len(serials) == quantity:
+            raise ValidationError({'serial_numbers': _('Number of serial numbers does not match quantity')})
+
+        if len(set(serials)) < len(serials):
+            raise ValidationError({'serial_numbers': _('Duplicate serial numbers provided')})
+
+        used = self.serials[part.tree_id]
+
+        conflicts = [serial for serial in serials if serial in used]
+
+        conflicts += [str(serial) for serial in part.find_conflicting_serial_numbers(serials)]
+
+        if len(conflicts) > 0:
+            raise ValidationError({'serial_numbers': _('Serial numbers already exist') + ': ' + ','.join(conflicts)})
+
+        used.update(serials)
+
+        return serials
+
+    def construct_template(self, receipt):
+        """
+        Construct (and validate) the template stock item for a received line.
+
+        The stock items for a line differ only by serial number, so the template is validated once
+        (as per StockItem.save), with the first serial number of the line.
+
+        Raises ValidationError if the template is invalid
+        """
+
+        supplier_part = receipt.line.part
+
+        template = StockModels.StockItem(
+            part=supplier_part.part,
+            supplier_part=supplier_part,
+            location=receipt.location,
+            quantity=receipt.quantity,
+            purchase_order=self.order,
+            status=receipt.status,
+            batch=receipt.batch,
+        )
+
+        if receipt.serials is not None:
+            template.quantity = 1
+            template.serial = receipt.serials[0]
+
+        template.validate_unique()
+        template.clean()
+
+        return template
+
+    def construct_items(self, receipt):
+        """ Construct (but do not save) the stock items for a received line """
+
+        template = receipt.template
+
+        fields = [f.attname for f in StockModels.StockItem._meta.concrete_fields if not f.primary_key]
+
+        if receipt.serials is None:
+            return [StockModels.StockItem(**{name: getattr(template, name) for name in fields})]
+
+        items = []
+
+        for serial in receipt.serials:
+            item = StockModels.StockItem(**{name: getattr(template, name) for name in fields})
+
+            item.serial = serial
+            item.serial_int = serial_to_int(serial)
+
+            items.append(item)
+
+        return items
+
+    @transaction.atomic
+    def receive(self):
+        """
+        Receive all of the added lines.
+
+        Returns the list of created StockItem objects
+        """
+
+        # Lock the order, and check that lines can still be received against it
+        status = OrderModels.PurchaseOrder.objects.select_for_update().values_list('status', flat=True).get(pk=self.order.pk)
+
+        if not status == PurchaseOrderStatus.PLACED:
+            raise ValidationError({"status": _("Lines can only be received against an order marked as 'Placed'")})
+
+        today = datetime.now().date()
+
+        items = []
+        lines = {}
+
+        # Tracking notes (title, notes) for the stock items created for each line
+        notes = []
+
+        for receipt in self.lines:
+
+            # The same line may be received multiple times
+            line = lines.setdefault(receipt.line.pk, receipt.line)
+            line.received += receipt.quantity
+            receipt.line.received = line.received
+
+            if line.part is None:
+                continue
+
+            created = self.construct_items(receipt)
+
+            items += created
+
+            for item in created:
+                notes.append((
+                    f"{_('Created new stock item for')} {str(line.part.part)}",
+                    f"{_('Received')} {item.quantity} {_('items against order')} {str(self.order)}",
+                ))
+
+        StockModels.StockItem.create_roots(items)
+
+        tracking = []
+
+        for item, (created, received) in zip(items, notes):
+            tracking.append(StockModels.StockItemTracking(
+                item=item,
+                title=_('Created stock item'),
+                user=self.user,
+                quantity=item.quantity,
+                date=today,
+                notes=created,
+                system=True,
+            ))
+
+            tracking.append(StockModels.StockItemTracking(
+                item=item,
+                title=_("Received items"),
+                user=self.user,
+                quantity=item.quantity,
+                date=today,
+                notes=received,
+                system=True,
+            ))
+
+        StockModels.StockItemTracking.objects.bulk_create(tracking, batch_size=500)
+
+        OrderModels.PurchaseOrderLineItem.objects.bulk_update(lines.values(), ['received'], batch_size=500)
+
+        # Bulk operations do not trigger the post_save signal, so update the stock summary (and location tree) here
+        part_ids = set([item.part_id for item in items])
+
+        part_ids.update(OrderModels.PurchaseOrderLineItem.objects.filter(
+            pk__in=lines.keys(),
+            part__isnull=False
+        ).values_list('part__part', flat=True))
+
+        PartModels.PartStockSummary.update_parts(part_ids, create=False)
+
+        StockModels.StockLocation.invalidate_tree()
+        transaction.on_commit(StockModels.StockLocation.invalidate_tree)
+
+        # Has this order been completed?
+        if not self.order.pending_line_items().exists():
+            self.order.received_by = self.user
+            self.order.complete_order()  # This will save the model
+
+        logger.info(f"Received {len(lines)} lines ({len(items)} stock items) against order {self.order.pk}")
+
+        return items
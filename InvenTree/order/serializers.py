@@ -174,12 +174,15 @@ class SalesOrderSerializer(InvenTreeModelSerializer):
 
         - Number of line items in the SalesOrder
         - Overdue status of the SalesOrder
+        - Allocation status of the SalesOrder
         """
 
         queryset = queryset.annotate(
             line_items=SubqueryCount('lines')
         )
 
+        queryset = SalesOrder.annotate_allocation(queryset)
+
         queryset = queryset.annotate(
             overdue=Case(
                 When(
@@ -199,6 +202,10 @@ class SalesOrderSerializer(InvenTreeModelSerializer):
 
     overdue = serializers.BooleanField(required=False, read_only=True)
 
+    fully_allocated = serializers.BooleanField(required=False, read_only=True)
+
+    over_allocated = serializers.BooleanField(required=False, read_only=True)
+
     class Meta:
         model = SalesOrder
 
@@ -209,9 +216,11 @@ class SalesOrderSerializer(InvenTreeModelSerializer):
             'customer_detail',
             'customer_reference',
             'description',
+            'fully_allocated',
             'line_items',
             'link',
             'notes',
+            'over_allocated',
             'overdue',
             'reference',
             'status',
@@ -0,0 +1,193 @@
+"""
+Bulk shipping of sales orders.
+
+Shipping a sales order one allocation at a time (via SalesOrderAllocation.complete_allocation) requires,
+for each allocation:
+
+- A full copy of the allocated stock item (and its history) if the item must be split
+- Separate saves (and tracking entries) for the stock item, the split item and the allocation
+- A separate query to delete the allocation
+
+Instead, the SalesOrderShipment class ships all of the allocations against an order at once:
+
+- The allocations are loaded (and the allocated stock items locked) with a single query
+- Allocations are grouped by stock item, and the splits are calculated in memory
+- Split stock items are created with one bulk insert per source stock item (see StockItem.split_children)
+- Quantity changes and customer assignments are written using bulk_update
+- Tracking entries are written using bulk_create
+- The allocations are deleted with a single query
+"""
+
+import time
+import logging
+
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.translation import ugettext as _
+
+from InvenTree.status_codes import SalesOrderStatus
+
+from part import models as PartModels
+from stock import models as StockModels
+
+from order import models as OrderModels
+
+
+logger = logging.getLogger(__name__)
+
+
+class SalesOrderShipment:
+    """
+    Ship all of the stock allocated against a SalesOrder.
+
+    Attributes:
+        order: The SalesOrder object
+        user: User shipping the order
+        shipped: List of StockItem objects which have been assigned to the customer
+    """
+
+    def __init__(self, order, user):
+        self.order = order
+        self.user = user
+        self.today = datetime.now().date()
+
+        self.tracking = []
+        self.shipped = []
+
+    def track(self, item, title, notes=''):
+        """ Construct (but do not save) a tracking entry for a stock item """
+
+        self.tracking.append(StockModels.StockItemTracking(
+            item=item,
+            title=title,
+            user=self.user,
+            quantity=item.quantity,
+            date=self.today,
+            notes=notes,
+            system=True,
+        ))
+
+    def assign(self, item):
+        """ Assign a stock item to the customer (as per StockItem.allocateToCustomer) """
+
+        item.sales_order = self.order
+        item.customer = self.order.customer
+        item.location = None
+        item.updated = self.today
+
+        self.shipped.append(item)
+
+    def prepare(self, child, allocation):
+        """ Assign a stock item (split from an allocated stock item) to the customer """
+
+        self.assign(child)
+
+    def load(self):
+        """ Load the allocations against the order, and lock the allocated stock items """
+
+        self.allocations = list(OrderModels.SalesOrderAllocation.objects.filter(
+            line__order=self.order
+        ).order_by('pk'))
+
+        stock_ids = set([allocation.item_id for allocation in self.allocations])
+
+        self.stock_items = StockModels.StockItem.objects.filter(pk__in=stock_ids).select_for_update().in_bulk()
+
+        # Allocations for each stock item (in order of allocation)
+        self.grouped = defaultdict(list)
+
+        for allocation in self.allocations:
+            self.grouped[allocation.item_id].append(allocation)
+
+    def split(self, item, allocations):
+        """
+        Split the allocated quantities from a stock item.
+
+        If the stock item is allocated to multiple lines (or is only partially allocated),
+        the allocated quantity for each line is split from the stock item, as per StockItem.allocateToCustomer.
+
+        Returns True if the stock item has been changed (and must be saved)
+        """
+
+        remaining = item.quantity
+        splits = []
+        assigned = False
+
+        for allocation in allocations:
+            if not item.serialized and remaining > allocation.quantity:
+                splits.append(allocation)
+                remaining -= allocation.quantity
+            elif not assigned:
+                # The stock item itself is assigned to the customer
+                self.assign(item)
+                assigned = True
+
+        if len(splits) == 0:
+            return assigned
+
+        item.split_children([(allocation.quantity, allocation) for allocation in splits], self.track, prepare=self.prepare)
+
+        item.updated = self.today
+
+        return True
+
+    @transaction.atomic
+    def ship(self):
+        """
+        Ship the order.
+
+        Returns the list of StockItem objects assigned to the customer
+        """
+
+        t_start = time.time()
+
+        # Lock the order, so that it cannot be shipped twice
+        status = OrderModels.SalesOrder.objects.select_for_update().values_list('status', flat=True).get(pk=self.order.pk)
+
+        if not status == SalesOrderStatus.PENDING:
+            raise ValidationError({'status': _("SalesOrder cannot be shipped as it is not currently pending")})
+
+        self.load()
+
+        updated = []
+
+        for pk, allocations in self.grouped.items():
+            item = self.stock_items[pk]
+
+            if self.split(item, allocations):
+                updated.append(item)
+
+        StockModels.StockItem.objects.bulk_update(updated, ['quantity', 'sales_order', 'customer', 'location', 'updated'], batch_size=500)
+
+        customer = self.order.customer
+
+        notes = _("Manually assigned to customer") + " " + (customer.name if customer else '')
+
+        for item in self.shipped:
+            self.track(item, _("Assigned to Customer"), notes)
+
+        StockModels.StockItemTracking.objects.bulk_create(self.tracking, batch_size=500)
+
+        OrderModels.SalesOrderAllocation.objects.filter(pk__in=[allocation.pk for allocation in self.allocations]).delete()
+
+        # Bulk operations do not trigger the post_save signal, so update the stock summary (and location tree) here
+        PartModels.PartStockSummary.update_parts(set([item.part_id for item in updated]), create=False)
+
+        StockModels.StockLocation.invalidate_tree()
+        transaction.on_commit(StockModels.StockLocation.invalidate_tree)
+
+        # Ensure the order status is marked as "Shipped"
+        self.order.status = SalesOrderStatus.SHIPPED
+        self.order.shipment_date = self.today
+        self.order.shipped_by = self.user
+        self.order.save()
+
+        logger.info(
+            f"Shipped sales order {self.order.pk} ({len(self.allocations)} allocations, "
+            f"{len(self.shipped)} stock items) in {time.time() - t_start:.2f}s"
+        )
+
+        return self.shipped
@@ -0,0 +1,38 @@
+"""
+Background tasks for the order app
+"""
+
+import logging
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from InvenTree.status_codes import SalesOrderStatus
+
+from common.tasks import register_task
+
+from order import models as OrderModels
+
+
+logger = logging.getLogger(__name__)
+
+
+@register_task
+@transaction.atomic
+def ship_sales_order(order_id, user_id=None):
+    """
+    Ship a sales order (see SalesOrder.ship_order)
+
+    Returns False if the order is no longer pending (e.g. it has already been shipped)
+    """
+
+    # Lock the order, so that it cannot be shipped twice
+    order = OrderModels.SalesOrder.objects.select_for_update().get(pk=order_id)
+
+    if order.status != SalesOrderStatus.PENDING:
+        logger.warning(f"Sales order {order_id} is not pending - cannot ship")
+        return False
+
+    user = User.objects.get(pk=user_id) if user_id else None
+
+    return order.ship_order(user)
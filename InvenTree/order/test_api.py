@@ -9,8 +9,11 @@ from rest_framework import status
 from django.urls import reverse
 
 from InvenTree.api_tester import InvenTreeAPITestCase
+from InvenTree.status_codes import PurchaseOrderStatus
 
-from .models import PurchaseOrder, SalesOrder
+from stock.models import StockItem
+
+from .models import PurchaseOrder, PurchaseOrderLineItem, SalesOrder, SalesOrderLineItem
 
 
 class OrderTest(InvenTreeAPITestCase):
@@ -109,7 +112,89 @@ class PurchaseOrderTest(OrderTest):
         response = self.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-    
+
+    def test_po_receive(self):
+        """
+        Test receiving multiple line items at once
+        """
+
+        order = PurchaseOrder.objects.get(pk=1)
+
+        url = reverse('api-po-receive', kwargs={'pk': order.pk})
+
+        # Serial numbered (trackable) line
+        line = PurchaseOrderLineItem.objects.create(order=order, part_id=100, quantity=3)
+
+        items = [
+            {'line': 1, 'quantity': 100, 'batch': 'B-123'},
+            {'line': 2, 'quantity': 200, 'location': 2},
+            {'line': 3, 'quantity': 1000},
+            {'line': line.pk, 'quantity': 3, 'serial_numbers': '1-3'},
+        ]
+
+        # Order has not been placed
+        response = self.post(url, {'location': 1, 'items': items})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        order.place_order()
+
+        n = StockItem.objects.count()
+
+        # Errors are reported for each line, and nothing is received
+        response = self.post(url, {
+            'location': 1,
+            'items': items + [
+                {'line': 1, 'quantity': -1},
+                {'line': 22, 'quantity': 10},
+                {'line': line.pk, 'quantity': 2, 'serial_numbers': '3, 4'},
+            ]
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        errors = response.data['items']
+
+        self.assertEqual(errors[:4], [{}, {}, {}, {}])
+        self.assertIn('quantity', errors[4])
+        self.assertIn('line', errors[5])
+        self.assertIn('serial_numbers', errors[6])
+
+        self.assertEqual(StockItem.objects.count(), n)
+
+        response = self.post(url, {'location': 1, 'items': items})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['complete'])
+
+        # One stock item for each line, plus one for each serial number
+        self.assertEqual(len(response.data['items']), 6)
+        self.assertEqual(StockItem.objects.count(), n + 6)
+
+        received = StockItem.objects.filter(pk__in=response.data['items'])
+
+        self.assertEqual(received.filter(batch='B-123').count(), 1)
+        self.assertEqual(received.filter(location=2).count(), 1)
+        self.assertEqual(received.filter(part=25, location=1).exclude(serial=None).count(), 3)
+
+        for item in received:
+            self.assertEqual(item.tracking_info.count(), 2)
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, PurchaseOrderStatus.COMPLETE)
+        self.assertEqual(order.pending_line_items().count(), 0)
+
+        # Order is complete, nothing more can be received
+        response = self.post(url, {'location': 1, 'items': items[:1]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Receiving items requires the 'change' permission
+        rule = self.group.rule_sets.get(name='purchase_order')
+        rule.can_change = False
+        rule.save()
+
+        response = self.post(url, {'location': 1, 'items': items[:1]})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
 
 class SalesOrderTest(OrderTest):
     """
@@ -136,6 +221,17 @@ class SalesOrderTest(OrderTest):
         self.filter({'status': 20}, 1)  # SHIPPED
         self.filter({'status': 99}, 0)  # Invalid
 
+        # Filter by allocation status (orders without line items are fully allocated)
+        self.filter({'allocated': True}, 5)
+
+        SalesOrderLineItem.objects.create(order=SalesOrder.objects.get(pk=1), part_id=1, quantity=10)
+
+        response = self.filter({'allocated': False}, 1)
+
+        self.assertEqual(response.data[0]['pk'], 1)
+        self.assertFalse(response.data[0]['fully_allocated'])
+        self.assertFalse(response.data[0]['over_allocated'])
+
     def test_overdue(self):
         """
         Test "overdue" status
@@ -167,3 +167,90 @@ class SalesOrderTest(TestCase):
         self.assertTrue(self.line.is_fully_allocated())
         self.assertEqual(self.line.fulfilled_quantity(), 50)
         self.assertEqual(self.line.allocated_quantity(), 0)
+
+    def test_ship_multiple_lines(self):
+        # Ship an order where a single stock item is allocated to multiple lines
+
+        line = SalesOrderLineItem.objects.create(quantity=20, order=self.order, part=self.part)
+
+        SalesOrderAllocation.objects.create(line=self.line, item=self.Sa, quantity=50)
+        SalesOrderAllocation.objects.create(line=line, item=self.Sa, quantity=20)
+
+        # A second (over-allocated) order
+        order = SalesOrder.objects.create(customer=self.customer, reference='5678')
+        other = SalesOrderLineItem.objects.create(quantity=5, order=order, part=self.part)
+        SalesOrderAllocation.objects.create(line=other, item=self.Sb, quantity=10)
+
+        # Allocation status is annotated for each order
+        orders = SalesOrder.annotate_allocation(SalesOrder.objects.all()).in_bulk()
+
+        self.assertTrue(orders[self.order.pk].fully_allocated)
+        self.assertFalse(orders[self.order.pk].over_allocated)
+        self.assertTrue(orders[order.pk].fully_allocated)
+        self.assertTrue(orders[order.pk].over_allocated)
+
+        self.assertTrue(order.is_over_allocated())
+        self.assertFalse(self.order.is_over_allocated())
+
+        self.order.ship_order(None)
+
+        self.assertEqual(StockItem.objects.count(), 4)
+
+        # The allocated quantities have been split from the original item
+        sa = StockItem.objects.get(pk=self.Sa.pk)
+        self.assertEqual(sa.quantity, 30)
+        self.assertEqual(sa.sales_order, None)
+
+        outputs = StockItem.objects.filter(sales_order=self.order)
+
+        self.assertEqual(sorted([item.quantity for item in outputs]), [20, 50])
+
+        for item in outputs:
+            self.assertEqual(item.parent, sa)
+            self.assertEqual(item.customer, self.customer)
+            self.assertEqual(item.location, None)
+            self.assertTrue(item.tracking_info.filter(title='Assigned to Customer').exists())
+
+        # Allocations against the other order are not affected
+        self.assertEqual(SalesOrderAllocation.objects.count(), 1)
+
+        self.assertEqual(self.order.status, status.SalesOrderStatus.SHIPPED)
+        self.assertTrue(self.order.is_fully_allocated())
+        self.assertTrue(line.is_fully_allocated())
+
+    def test_allocation_status_bulk(self):
+        """ The allocation status of any number of orders is calculated with a single query """
+
+        for idx in range(20):
+            order = SalesOrder.objects.create(customer=self.customer, reference=f'BULK-{idx}')
+
+            for n in range(3):
+                line = SalesOrderLineItem.objects.create(quantity=10, order=order, part=self.part)
+
+                # Unallocated, partially allocated, fully allocated or over-allocated lines
+                for item, quantity in zip([self.Sa, self.Sb], [[], [5], [5, 5], [5, 10]][(idx + n) % 4]):
+                    SalesOrderAllocation.objects.create(line=line, item=item, quantity=quantity)
+
+        # A shipped order uses the fulfilled quantity
+        self.order.status = status.SalesOrderStatus.SHIPPED
+        self.order.save()
+
+        StockItem.objects.create(part=self.part, quantity=30, sales_order=self.order)
+        StockItem.objects.create(part=self.part, quantity=20, sales_order=self.order)
+
+        queryset = SalesOrder.annotate_allocation(SalesOrder.objects.all())
+
+        with self.assertNumQueries(1):
+            orders = list(queryset)
+
+        self.assertEqual(len(orders), 21)
+
+        for order in orders:
+            lines = order.lines.all()
+
+            self.assertEqual(order.fully_allocated, all([line.is_fully_allocated() for line in lines]))
+            self.assertEqual(order.over_allocated, any([line.is_over_allocated() for line in lines]))
+
+        statuses = set([(order.fully_allocated, order.over_allocated) for order in orders])
+
+        self.assertEqual(statuses, set([(True, False), (False, True), (False, False)]))
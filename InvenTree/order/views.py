@@ -27,6 +27,9 @@ from stock.models import StockItem, StockLocation
 from part.models import Part
 
 from common.models import InvenTreeSetting
+from common.tasks import offload_task, is_worker_running
+
+from .tasks import ship_sales_order
 
 from . import forms as order_forms
 
@@ -548,14 +551,31 @@ class SalesOrderShip(AjaxUpdateView):
         else:
             valid = True
 
-        if valid:
-            if not order.ship_order(request.user):
-                form.add_error(None, _('Could not ship order'))
+        if valid and not order.status == SalesOrderStatus.PENDING:
+            form.add_error(None, _('Could not ship order'))
+            valid = False
+
+        data = {}
+
+        if valid and is_worker_running():
+            # Ship the order in the background
+            offload_task('order.tasks.ship_sales_order', order.pk, request.user.pk, user=request.user)
+
+            data['success'] = _('Order shipment has been queued')
+
+        elif valid:
+            try:
+                valid = ship_sales_order(order.pk, request.user.pk)
+            except ValidationError as e:
+                for message in e.messages:
+                    form.add_error(None, message)
+
                 valid = False
 
-        data = {
-            'form_valid': valid,
-        }
+            if not valid and not form.non_field_errors():
+                form.add_error(None, _('Could not ship order'))
+
+        data['form_valid'] = valid
 
         context = self.get_context_data()
 
@@ -759,24 +779,23 @@ class PurchaseOrderReceive(AjaxUpdateView):
 
         return self.renderJsonResponse(request, data=data, form=self.get_form())
 
-    @transaction.atomic
     def receive_parts(self):
         """ Called once the form has been validated.
         Create new stockitems against received parts.
+
+        All of the lines are received together (see order.receiving)
         """
 
+        lines = []
+
         for line in self.lines:
 
             if not line.part:
                 continue
 
-            self.order.receive_line_item(
-                line,
-                self.destination,
-                line.receive_quantity,
-                self.request.user,
-                status=line.status_code,
-            )
+            lines.append((line, line.receive_quantity, self.destination, line.status_code))
+
+        self.order.receive_line_items(lines, self.request.user)
 
 
 class OrderParts(AjaxView):
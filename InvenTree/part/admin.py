@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from collections import defaultdict
+
 from django.contrib import admin
+from django.db.models import Count
 
 from import_export.admin import ImportExportModelAdmin
 from import_export.resources import ModelResource
@@ -15,14 +18,16 @@ from .models import PartParameterTemplate, PartParameter
 from .models import PartCategoryParameterTemplate
 from .models import PartTestTemplate
 from .models import PartSellPriceBreak
+from .models import PartStockSummary
 
+from InvenTree.exporter import ExportResourceMixin
 from InvenTree.helpers import normalize
 
 from stock.models import StockLocation
 from company.models import SupplierPart
 
 
-class PartResource(ModelResource):
+class PartResource(ExportResourceMixin, ModelResource):
     """ Class for managing Part data import/export """
 
     # ForeignKey fields
@@ -49,6 +54,11 @@ class PartResource(ModelResource):
 
     building = Field(attribute='quantity_being_built', readonly=True, widget=widgets.IntegerWidget())
 
+    # Derived values calculated for each chunk of a streamed export (see prepare_export_chunk)
+    summaries = {}
+    supplier_counts = None
+    used_in_counts = None
+
     class Meta:
         model = Part
         skip_unchanged = True
@@ -60,19 +70,114 @@ class PartResource(ModelResource):
         ]
 
     def get_queryset(self):
-        """ Prefetch related data for quicker access """
+        """ Fetch related data for quicker access """
 
         query = super().get_queryset()
-        query = query.prefetch_related(
+        query = query.select_related(
             'category',
-            'used_in',
-            'builds',
-            'supplier_parts__purchase_order_line_items',
-            'stock_items__allocations'
+            'default_location',
+            'default_supplier',
+            'variant_of',
         )
 
         return query
 
+    def prepare_export_chunk(self, parts):
+        """
+        Calculate the derived columns for a chunk of exported parts.
+
+        Rather than calculating each value separately for every part,
+        a fixed number of queries are performed for the entire chunk.
+        """
+
+        part_ids = [part.pk for part in parts]
+
+        # Pre-calculated stock summary values
+        self.summaries = {summary.part_id: summary for summary in PartStockSummary.objects.filter(part__in=part_ids)}
+
+        missing = [pk for pk in part_ids if pk not in self.summaries]
+
+        if len(missing) > 0:
+            self.summaries.update(PartStockSummary.update_parts(missing))
+
+        # Number of supplier parts for each part
+        supplier_counts = SupplierPart.objects.filter(part__in=part_ids).values('part').annotate(count=Count('pk')).order_by()
+
+        self.supplier_counts = {row['part']: row['count'] for row in supplier_counts}
+
+        # Number of assemblies which each part is used in (including inherited BOMs)
+        bom_items = BomItem.objects.filter(sub_part__in=part_ids).values(
+            'sub_part', 'part', 'inherited', 'part__tree_id', 'part__lft', 'part__rght'
+        )
+
+        used_in = defaultdict(set)
+        inherited = []
+
+        for item in bom_items:
+            used_in[item['sub_part']].add(item['part'])
+
+            if item['inherited']:
+                inherited.append(item)
+
+        if len(inherited) > 0:
+            # Find the variants of each assembly with an inherited BOM
+            trees = defaultdict(list)
+
+            variants = Part.objects.filter(tree_id__in=set([item['part__tree_id'] for item in inherited]))
+
+            for variant in variants.values('pk', 'tree_id', 'lft'):
+                trees[variant['tree_id']].append(variant)
+
+            for item in inherited:
+                for variant in trees[item['part__tree_id']]:
+                    if item['part__lft'] < variant['lft'] < item['part__rght']:
+                        used_in[item['sub_part']].add(variant['pk'])
+
+        self.used_in_counts = {pk: len(assemblies) for pk, assemblies in used_in.items()}
+
+    def render_field(self, name, value):
+        return self.fields[name].widget.render(value)
+
+    def get_summary(self, part):
+
+        if part.pk in self.summaries:
+            return self.summaries[part.pk]
+        else:
+            return part.get_stock_summary()
+
+    def dehydrate_suppliers(self, part):
+
+        if self.supplier_counts is not None:
+            count = self.supplier_counts.get(part.pk, 0)
+        else:
+            count = part.supplier_count
+
+        return self.render_field('suppliers', count)
+
+    def dehydrate_in_stock(self, part):
+        return self.render_field('in_stock', self.get_summary(part).total_stock)
+
+    def dehydrate_on_order(self, part):
+        return self.render_field('on_order', self.get_summary(part).on_order)
+
+    def dehydrate_used_in(self, part):
+
+        if self.used_in_counts is not None:
+            count = self.used_in_counts.get(part.pk, 0)
+        else:
+            count = part.used_in_count
+
+        return self.render_field('used_in', count)
+
+    def dehydrate_allocated(self, part):
+
+        summary = self.get_summary(part)
+
+        return self.render_field('allocated', summary.build_order_allocations + summary.sales_order_allocations)
+
+    def dehydrate_building(self, part):
+        return self.render_field('building', self.get_summary(part).building)
+
 
 class PartAdmin(ImportExportModelAdmin):
     
@@ -30,6 +30,7 @@ from . import serializers as part_serializers
 from InvenTree.views import TreeSerializer
 from InvenTree.helpers import str2bool, isNull
 from InvenTree.api import AttachmentMixin
+from InvenTree.serializers import get_requested_fields
 
 from InvenTree.status_codes import BuildStatus
 
@@ -40,14 +41,13 @@ class PartCategoryTree(TreeSerializer):
     model = PartCategory
 
     queryset = PartCategory.objects.all()
+
+    cache_timeout = 3600
     
     @property
     def root_url(self):
         return reverse('part-index')
 
-    def get_items(self):
-        return PartCategory.objects.all().prefetch_related('parts', 'children')
-
 
 class CategoryList(generics.ListCreateAPIView):
     """ API endpoint for accessing a list of PartCategory objects.
@@ -383,6 +383,10 @@ class PartList(generics.ListCreateAPIView):
 
         kwargs['starred_parts'] = self.starred_parts
 
+        # Optionally restrict the serialized fields (e.g. ?fields=pk,name,in_stock)
+        if self.request is not None and self.request.method == 'GET':
+            kwargs['fields'] = get_requested_fields(self.request)
+
         return self.serializer_class(*args, **kwargs)
 
     def list(self, request, *args, **kwargs):
@@ -412,7 +416,7 @@ class PartList(generics.ListCreateAPIView):
             category_ids = set()
 
             for part in data:
-                cat_id = part['category']
+                cat_id = part.get('category', None)
 
                 if cat_id is not None:
                     category_ids.add(cat_id)
@@ -431,7 +435,7 @@ class PartList(generics.ListCreateAPIView):
                 category_map[category.pk] = part_serializers.CategorySerializer(category).data
 
             for part in data:
-                cat_id = part['category']
+                cat_id = part.get('category', None)
 
                 if cat_id is not None and cat_id in category_map.keys():
                     detail = category_map[cat_id]
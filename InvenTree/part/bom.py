@@ -239,6 +239,7 @@ class BomUploadManager:
     PART_MATCH_HEADERS = [
         'Part_Name',
         'Part_IPN',
+        'Part_MPN',
         'Part_ID',
     ]
     
@@ -0,0 +1,528 @@
+"""
+BOM explosion engine.
+
+Loads the complete (multi-level) Bill of Materials for a Part into memory,
+using a bounded number of database queries (two queries per BOM level),
+rather than walking the BOM with a separate query for each node.
+
+The BOM is represented as a directed acyclic graph (DAG) of parts,
+which can then be used to calculate:
+
+- Extended quantities (total quantity of each sub-part required)
+- The number of assemblies which can be built from available stock
+- Rolled-up (min / max) pricing for the assembly
+"""
+
+import logging
+
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db.models import Q
+
+from InvenTree.helpers import normalize
+from InvenTree.status_codes import BuildStatus
+
+from build import models as BuildModels
+from company.models import SupplierPart
+from company.pricing import price_cache
+from part import models as PartModels
+
+import common.settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class BomEdge:
+    """
+    A single (directed) link in the BOM graph.
+
+    Attributes:
+        part: Primary key of the parent (assembly) part
+        sub_part: Primary key of the child (component) part
+        quantity: Quantity of the sub_part required to make one parent part
+        bom_item: The BomItem object which defines this link
+    """
+
+    def __init__(self, part, sub_part, quantity, bom_item):
+        self.part = part
+        self.sub_part = sub_part
+        self.quantity = quantity
+        self.bom_item = bom_item
+
+
+class BomGraph:
+    """
+    In-memory representation of the multi-level BOM for a single (root) Part.
+
+    BOM items inherited from template parts (see Part.get_bom_item_filter) are included.
+    Any edges which would result in a cycle are reported and discarded.
+
+    Attributes:
+        root: The Part object at the top of the BOM
+        nodes: Dict of {pk: Part} for every part in the BOM (including the root)
+        edges: Dict of {pk: [BomEdge, ...]} for every assembly in the BOM
+        order: List of part pk values in topological order (assemblies before their components)
+    """
+
+    def __init__(self, root, include_inherited=True, max_depth=None):
+        """
+        Args:
+            root: The Part to load the BOM for
+            include_inherited: Include BOM items inherited from template parts (default = True)
+            max_depth: Maximum number of BOM levels to load (default = None, load all levels)
+        """
+
+        self.root = root
+        self.include_inherited = include_inherited
+        self.max_depth = max_depth
+
+        self.nodes = OrderedDict()
+        self.edges = {}
+        self.order = []
+
+        self._stock = None
+        self._suppliers = None
+        self._price_tables = None
+
+        self.load()
+        self.sort()
+
+    def load(self):
+        """
+        Load the BOM graph from the database, one BOM level at a time.
+
+        Each level requires (at most) two queries:
+
+        - Fetch the variant trees for the parts at this level (to find inherited BOM items)
+        - Fetch the BOM items for the parts at this level
+        """
+
+        self.nodes[self.root.pk] = self.root
+
+        frontier = [self.root]
+        depth = 0
+
+        while len(frontier) > 0:
+
+            if self.max_depth is not None and depth >= self.max_depth:
+                break
+
+            depth += 1
+
+            frontier_ids = set([part.pk for part in frontier])
+
+            bom_filter = Q(part__in=frontier_ids)
+
+            # Map of {ancestor_pk: [frontier_pk, ...]} for inherited BOM items
+            descendants = {}
+
+            if self.include_inherited:
+                tree_ids = set([part.tree_id for part in frontier])
+
+                tree_nodes = PartModels.Part.objects.filter(tree_id__in=tree_ids).values_list('pk', 'tree_id', 'lft', 'rght')
+
+                for part in frontier:
+                    for pk, tree_id, lft, rght in tree_nodes:
+                        if tree_id == part.tree_id and lft < part.lft and rght > part.rght:
+                            descendants.setdefault(pk, []).append(part.pk)
+
+                if len(descendants) > 0:
+                    bom_filter |= Q(part__in=descendants.keys(), inherited=True)
+
+            bom_items = PartModels.BomItem.objects.filter(bom_filter).select_related('sub_part').order_by('pk')
+
+            next_frontier = []
+
+            for item in bom_items:
+
+                targets = []
+
+                if item.part_id in frontier_ids:
+                    targets.append(item.part_id)
+
+                if item.inherited:
+                    targets += descendants.get(item.part_id, [])
+
+                for pk in targets:
+
+                    if item.sub_part_id == pk:
+                        logger.warning(f"BOM for part {pk} contains itself (BomItem {item.pk})")
+                        continue
+
+                    self.edges.setdefault(pk, []).append(
+                        BomEdge(pk, item.sub_part_id, item.quantity, item)
+                    )
+
+                if item.sub_part_id not in self.nodes:
+                    self.nodes[item.sub_part_id] = item.sub_part
+                    next_frontier.append(item.sub_part)
+
+            frontier = next_frontier
+
+    def sort(self):
+        """
+        Sort the graph nodes into topological order (depth-first search).
+
+        Any edge which points back to a part further up the same BOM branch
+        would create an infinite loop, and is removed from the graph.
+        """
+
+        visited = set()
+        stack = set()
+        post_order = []
+
+        # Iterative DFS, to avoid hitting the recursion limit for deep BOMs
+        visited.add(self.root.pk)
+        stack.add(self.root.pk)
+
+        pending = [(self.root.pk, iter(list(self.edges.get(self.root.pk, []))))]
+
+        while len(pending) > 0:
+            pk, children = pending[-1]
+
+            edge = next(children, None)
+
+            if edge is None:
+                pending.pop()
+                stack.remove(pk)
+                post_order.append(pk)
+                continue
+
+            if edge.sub_part in stack:
+                logger.warning(f"Circular BOM reference detected: part {edge.sub_part} is required by part {pk}")
+                self.edges[pk].remove(edge)
+                continue
+
+            if edge.sub_part in visited:
+                continue
+
+            visited.add(edge.sub_part)
+            stack.add(edge.sub_part)
+            pending.append((edge.sub_part, iter(list(self.edges.get(edge.sub_part, [])))))
+
+        self.order = list(reversed(post_order))
+
+    def get_edges(self, pk=None):
+        """ Return the list of BOM edges for the given part (default = root) """
+
+        if pk is None:
+            pk = self.root.pk
+
+        return self.edges.get(pk, [])
+
+    def get_required_parts(self, recursive=True):
+        """
+        Return a set of Part objects required to make the root part.
+
+        Args:
+            recursive: If True, include parts required for sub-assemblies
+        """
+
+        if recursive:
+            ids = [pk for pk in self.order if pk != self.root.pk]
+        else:
+            ids = [edge.sub_part for edge in self.get_edges()]
+
+        return set([self.nodes[pk] for pk in ids])
+
+    def get_extended_quantities(self, quantity=1):
+        """
+        Calculate the total quantity of each part required to make the root part.
+
+        Quantities are propagated through the graph in topological order,
+        so each part is only visited once, no matter how many paths lead to it.
+
+        Args:
+            quantity: Number of root parts to make (default = 1)
+
+        Returns:
+            Dict of {pk: quantity} for each part in the BOM (not including the root)
+        """
+
+        totals = {self.root.pk: Decimal(quantity)}
+
+        for pk in self.order:
+            total = totals.get(pk, Decimal(0))
+
+            for edge in self.get_edges(pk):
+                totals[edge.sub_part] = totals.get(edge.sub_part, Decimal(0)) + total * edge.quantity
+
+        del totals[self.root.pk]
+
+        return totals
+
+    def get_available_stock(self):
+        """
+        Return the available stock for every part in the graph.
+
+        Values are read from the PartStockSummary table in a single query.
+        """
+
+        if self._stock is None:
+
+            summaries = {}
+
+            for summary in PartModels.PartStockSummary.objects.filter(part__in=self.nodes.keys()):
+                summaries[summary.part_id] = summary
+
+            missing = [pk for pk in self.nodes.keys() if pk not in summaries]
+
+            if len(missing) > 0:
+                summaries.update(PartModels.PartStockSummary.update_parts(missing))
+
+            self._stock = {}
+
+            for pk, summary in summaries.items():
+                available = summary.total_stock - summary.build_order_allocations - summary.sales_order_allocations
+
+                self._stock[pk] = max(available, 0)
+
+        return self._stock
+
+    def can_build(self, pk=None):
+        """
+        Return the number of units of a particular assembly which can be built with available stock.
+
+        Args:
+            pk: Primary key of the assembly (default = root part)
+        """
+
+        if pk is None:
+            pk = self.root.pk
+
+        edges = self.get_edges(pk)
+
+        if len(edges) == 0:
+            return 0
+
+        stock = self.get_available_stock()
+
+        total = None
+
+        for edge in edges:
+
+            # If (by some chance) the BOM item quantity is invalid, ignore!
+            if edge.quantity <= 0:
+                continue
+
+            n = int(stock.get(edge.sub_part, 0) / edge.quantity)
+
+            if total is None or n < total:
+                total = n
+
+        if total is None:
+            total = 0
+
+        return max(total, 0)
+
+    def get_supplier_parts(self, pk):
+        """
+        Return the list of SupplierPart objects for the given part.
+        Supplier parts for the whole graph are loaded in one go.
+        """
+
+        if self._suppliers is None:
+            self._suppliers = {}
+
+            supplier_parts = SupplierPart.objects.filter(part__in=self.nodes.keys())
+
+            for sp in supplier_parts:
+                self._suppliers.setdefault(sp.part_id, []).append(sp)
+
+        return self._suppliers.get(pk, [])
+
+    def get_price_tables(self, currency):
+        """
+        Return the compiled price tables for every supplier part in the graph (see company.pricing)
+        """
+
+        if self._price_tables is None:
+            supplier_parts = []
+
+            for pk in self.nodes.keys():
+                supplier_parts += self.get_supplier_parts(pk)
+
+            self._price_tables = price_cache.get_tables(supplier_parts, currency)
+
+        return self._price_tables
+
+    def get_supplier_price_range(self, pk, quantity, currency):
+        """ Return the (min, max) supplier price for the given part (see Part.get_supplier_price_range) """
+
+        min_price = None
+        max_price = None
+
+        tables = self.get_price_tables(currency)
+
+        for sp in self.get_supplier_parts(pk):
+
+            price = tables[sp.pk].get_price(quantity, base_cost=sp.base_cost, multiple=sp.multiple)
+
+            if price is None:
+                continue
+
+            if min_price is None or price < min_price:
+                min_price = price
+
+            if max_price is None or price > max_price:
+                max_price = price
+
+        if min_price is None or max_price is None:
+            return None
+
+        return (normalize(min_price), normalize(max_price))
+
+    def calculate_prices(self, quantity=1):
+        """
+        Calculate the rolled-up price range for every (part, quantity) combination in the BOM.
+
+        Supplier price breaks mean that the price of a sub-assembly depends on the quantity
+        required, so firstly the required quantities for each part are collected (top-down),
+        and then each part is priced exactly once per distinct quantity (bottom-up).
+
+        Args:
+            quantity: Number of root parts to price
+
+        Returns:
+            Tuple of dicts ({(pk, quantity): supplier_range}, {(pk, quantity): bom_range})
+        """
+
+        currency = common.settings.currency_code_default()
+
+        # Collect the quantities each part must be priced at
+        demand = {self.root.pk: set([Decimal(quantity)])}
+
+        for pk in self.order:
+            for q in demand.get(pk, []):
+                for edge in self.get_edges(pk):
+                    demand.setdefault(edge.sub_part, set()).add(q * edge.quantity)
+
+        supplier_prices = {}
+        bom_prices = {}
+        prices = {}
+
+        # Price each part, starting with the lowest-level components
+        for pk in reversed(self.order):
+            for q in demand.get(pk, []):
+
+                buy_range = self.get_supplier_price_range(pk, q, currency)
+
+                min_price = None
+                max_price = None
+
+                for edge in self.get_edges(pk):
+
+                    item_prices = prices.get((edge.sub_part, q * edge.quantity), None)
+
+                    if item_prices is None:
+                        continue
+
+                    low, high = item_prices
+
+                    if min_price is None:
+                        min_price = 0
+
+                    if max_price is None:
+                        max_price = 0
+
+                    min_price += low
+                    max_price += high
+
+                if min_price is None or max_price is None:
+                    bom_range = None
+                else:
+                    bom_range = (normalize(min_price), normalize(max_price))
+
+                supplier_prices[(pk, q)] = buy_range
+                bom_prices[(pk, q)] = bom_range
+
+                prices[(pk, q)] = combine_price_ranges(buy_range, bom_range)
+
+        return supplier_prices, bom_prices
+
+    def get_bom_price_range(self, quantity=1):
+        """ Return the rolled-up price range of the BOM for the root part (see Part.get_bom_price_range) """
+
+        bom_prices = self.calculate_prices(quantity)[1]
+
+        return bom_prices[(self.root.pk, Decimal(quantity))]
+
+    def get_price_range(self, quantity=1, buy=True, bom=True):
+        """ Return the price range for the root part (see Part.get_price_range) """
+
+        supplier_prices, bom_prices = self.calculate_prices(quantity)
+
+        key = (self.root.pk, Decimal(quantity))
+
+        buy_range = supplier_prices[key] if buy else None
+        bom_range = bom_prices[key] if bom else None
+
+        return combine_price_ranges(buy_range, bom_range)
+
+
+def combine_price_ranges(buy_range, bom_range):
+    """
+    Combine a supplier price range and a BOM price range.
+
+    Returns:
+        The (min, max) across both ranges, or None if neither range is available
+    """
+
+    if buy_range is None:
+        return bom_range
+
+    elif bom_range is None:
+        return buy_range
+
+    else:
+        return (
+            min(buy_range[0], bom_range[0]),
+            max(buy_range[1], bom_range[1])
+        )
+
+
+def required_build_order_quantity(part):
+    """
+    Return the quantity of a part required for active build orders.
+
+    Rather than loading the BOM for each build order separately,
+    all BomItems which reference the part (directly, or via an inherited template BOM)
+    are matched against the active builds in memory.
+    """
+
+    bom_items = PartModels.BomItem.objects.filter(sub_part=part).values_list(
+        'part', 'part__tree_id', 'part__lft', 'part__rght', 'inherited', 'quantity',
+    )
+
+    bom_items = list(bom_items)
+
+    if len(bom_items) == 0:
+        return 0
+
+    # Construct a filter for all parts which use this part in their BOM
+    part_filter = Q(part__in=[item[0] for item in bom_items])
+
+    for pk, tree_id, lft, rght, inherited, quantity in bom_items:
+        if inherited:
+            part_filter |= Q(part__tree_id=tree_id, part__lft__gt=lft, part__rght__lt=rght)
+
+    builds = BuildModels.Build.objects.filter(
+        part_filter,
+        status__in=BuildStatus.ACTIVE_CODES
+    ).values_list('quantity', 'part', 'part__tree_id', 'part__lft', 'part__rght')
+
+    total = 0
+
+    for build_quantity, build_part, build_tree, build_lft, build_rght in builds:
+
+        for pk, tree_id, lft, rght, inherited, quantity in bom_items:
+
+            if pk == build_part:
+                total += build_quantity * quantity
+
+            elif inherited and tree_id == build_tree and lft < build_lft and rght > build_rght:
+                total += build_quantity * quantity
+
+    return total
@@ -0,0 +1,23 @@
+"""
+Custom management command to rebuild the PartStockSummary table
+"""
+
+from django.core.management.base import BaseCommand
+
+from part.models import PartStockSummary
+
+
+class Command(BaseCommand):
+    """
+    Recalculate the stock summary for every Part in the database
+    """
+
+    help = 'Rebuild the pre-calculated part stock summary table'
+
+    def handle(self, *args, **kwargs):
+
+        self.stdout.write("Rebuilding part stock summary...")
+
+        count = PartStockSummary.rebuild()
+
+        self.stdout.write(f"Updated stock summary for {count} parts")
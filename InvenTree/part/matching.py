@@ -0,0 +1,353 @@
+"""
+In-memory index for fuzzy matching of Part names (and exact matching of IPN / MPN values).
+
+Fuzzy matching a search term against every Part in the database is expensive,
+especially when it is performed for every line of an uploaded BOM file.
+Instead, the PartIndex:
+
+- Stores the normalized name and description of each Part, built once per process
+- Uses an n-gram (trigram) index to select a small number of candidate parts for each search,
+  based on the least common n-grams in the search term
+- Scores the candidates in a single batch using rapidfuzz.process
+- Returns (at most) a limited number of the best matches
+
+The index is updated when a Part (or SupplierPart) is saved or deleted (see the receivers in part.models).
+A version stamp is stored in the database (see common.cache.VersionStamp),
+so that changes made in other processes cause the index to be rebuilt
+(within VersionStamp.CHECK_INTERVAL seconds of the change being committed).
+"""
+
+import time
+import logging
+import threading
+
+from collections import defaultdict
+
+from rapidfuzz import fuzz, process, utils
+
+from common.cache import get_stamp
+
+from company import models as CompanyModels
+from part import models as PartModels
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    """ Normalize a string for fuzzy matching (lowercase, with non-alphanumeric characters removed) """
+
+    if text is None:
+        return ''
+
+    return utils.default_process(str(text))
+
+
+def normalize_code(code):
+    """ Normalize a part code (e.g. IPN or MPN) for exact (case-insensitive) matching """
+
+    if code is None:
+        return ''
+
+    return str(code).strip().lower()
+
+
+def get_ngrams(text):
+    """ Return the set of n-grams (trigrams) for each word in the provided (normalized) text """
+
+    grams = set()
+
+    for word in text.split():
+        if len(word) <= PartIndex.NGRAM_LENGTH:
+            grams.add(word)
+        else:
+            for idx in range(len(word) - PartIndex.NGRAM_LENGTH + 1):
+                grams.add(word[idx:idx + PartIndex.NGRAM_LENGTH])
+
+    return grams
+
+
+class PartIndex:
+    """
+    Fuzzy matching index for Part objects.
+
+    Each indexed part is stored as an "entry" (at a fixed position in the entry lists).
+    When a part is updated, the old entry is removed and a new entry is appended.
+    """
+
+    NGRAM_LENGTH = 3
+
+    # Number of (least common) n-grams from the search term which are used to select candidates
+    NGRAM_LOOKUPS = 8
+
+    # For small indexes, every part is a candidate (no pre-filtering is performed)
+    PREFILTER_THRESHOLD = 2000
+
+    # Maximum number of matches returned from a single search
+    MAX_RESULTS = 50
+
+    VERSION_KEY = 'part-index-version'
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.version = None
+        self.stamp = get_stamp(self.VERSION_KEY)
+
+    def get_version(self):
+        """ Return the current version stamp for the index """
+
+        return self.stamp.get()
+
+    def increment_version(self):
+        """
+        Increment the version stamp (after a change has been applied to this index).
+
+        If the index was not up to date before the change (e.g. another process has also changed the stamp),
+        the index is marked for rebuild.
+        """
+
+        with self.lock:
+            version = self.stamp.increment(self.version if self.built else None)
+
+            if version is None:
+                self.built = False
+            else:
+                self.version = version
+
+    def rebuild(self, version=None):
+        """ Build the index for all Part objects in the database """
+
+        t_start = time.time()
+
+        with self.lock:
+            self.pks = []
+            self.names = []
+            self.texts = []
+            self.positions = {}
+            self.ngrams = defaultdict(set)
+            self.ipns = defaultdict(set)
+            self.part_ipns = {}
+            self.removed = 0
+
+            parts = PartModels.Part.objects.values_list('pk', 'name', 'description', 'IPN')
+
+            for pk, name, description, ipn in parts.iterator():
+                self.add(pk, name, description, ipn)
+
+            self.mpns = None
+            self.version = version
+            self.built = True
+
+        logger.info(f"Built part index for {len(self.pks)} parts in {time.time() - t_start:.2f}s")
+
+    def ensure(self):
+        """ Ensure that the index is built, and up to date """
+
+        version = self.get_version()
+
+        with self.lock:
+            if not self.built or version != self.version:
+                self.rebuild(version)
+
+    def add(self, pk, name, description, ipn):
+
+        idx = len(self.pks)
+
+        name = normalize(name)
+
+        # Note: Name and description are joined without separation (as per the original BOM matching)
+        text = normalize(f"{name}{description or ''}")
+
+        self.pks.append(pk)
+        self.names.append(name)
+        self.texts.append(text)
+        self.positions[pk] = idx
+
+        for gram in get_ngrams(name) | get_ngrams(normalize(description)):
+            self.ngrams[gram].add(idx)
+
+        code = normalize_code(ipn)
+
+        if code:
+            self.ipns[code].add(pk)
+            self.part_ipns[pk] = code
+
+    def remove(self, pk):
+
+        idx = self.positions.pop(pk, None)
+
+        if idx is None:
+            return
+
+        self.pks[idx] = None
+
+        code = self.part_ipns.pop(pk, None)
+
+        if code:
+            self.ipns[code].discard(pk)
+
+        self.removed += 1
+
+    def update_part(self, part):
+        """ Update the index entry for a Part which has been saved """
+
+        with self.lock:
+            if self.built:
+                self.remove(part.pk)
+                self.add(part.pk, part.name, part.description, part.IPN)
+
+        self.increment_version()
+
+    def remove_part(self, part):
+        """ Remove the index entry for a Part which has been deleted """
+
+        with self.lock:
+            if self.built:
+                self.remove(part.pk)
+
+                # Rebuild if a large proportion of the entries have been removed
+                if self.removed > len(self.pks) / 4:
+                    self.built = False
+
+        self.increment_version()
+
+    def invalidate_mpns(self):
+        """ Mark the MPN lookup table for rebuild (e.g. after a SupplierPart is changed) """
+
+        with self.lock:
+            self.mpns = None
+
+        self.increment_version()
+
+    def get_candidates(self, query):
+        """
+        Return a list of entry positions which may match the (normalized) search term.
+
+        Candidates are selected from the least common n-grams in the search term.
+        """
+
+        count = len(self.pks)
+
+        if count <= self.PREFILTER_THRESHOLD:
+            return [idx for idx in range(count) if self.pks[idx] is not None]
+
+        grams = [gram for gram in get_ngrams(query) if gram in self.ngrams]
+
+        grams = sorted(grams, key=lambda gram: len(self.ngrams[gram]))[:self.NGRAM_LOOKUPS]
+
+        candidates = set()
+
+        for gram in grams:
+            candidates.update(self.ngrams[gram])
+
+        return sorted([idx for idx in candidates if self.pks[idx] is not None])
+
+    def search(self, query, threshold=0, limit=None, compare_length=False, parts=None, description=False):
+        """
+        Return the parts which best match the provided search term.
+
+        Args:
+            query: Search term
+            threshold: Minimum match ratio (0 - 100)
+            limit: Maximum number of matches to return (capped at MAX_RESULTS)
+            compare_length: Scale the match ratio by the ratio of the string lengths
+            parts: Optional set of Part pk values to restrict the search to
+            description: If True, match against the part name and description (rather than just the name)
+
+        Returns:
+            A list of (pk, ratio) tuples, best match first
+        """
+
+        query = normalize(query)
+
+        if len(query) == 0:
+            return []
+
+        if limit is None or limit > self.MAX_RESULTS:
+            limit = self.MAX_RESULTS
+
+        self.ensure()
+
+        with self.lock:
+            candidates = self.get_candidates(query)
+
+            if parts is not None:
+                candidates = [idx for idx in candidates if self.pks[idx] in parts]
+
+            if description:
+                strings = self.texts
+                scorer = fuzz.partial_ratio
+            else:
+                strings = self.names
+                scorer = fuzz.partial_token_sort_ratio
+
+            # Any entries with an empty string are ignored
+            candidates = [idx for idx in candidates if strings[idx]]
+
+            choices = [strings[idx] for idx in candidates]
+            pks = [self.pks[idx] for idx in candidates]
+
+        results = process.extractIndices(
+            query,
+            choices,
+            scorer=scorer,
+            processor=None,
+            limit=None if compare_length else limit,
+            score_cutoff=threshold,
+        )
+
+        matches = []
+
+        for idx, ratio in results:
+
+            if compare_length:
+                # Also employ primitive length comparison
+                l_min = min(len(query), len(choices[idx]))
+                l_max = max(len(query), len(choices[idx]))
+
+                ratio *= (l_min / l_max)
+
+                if ratio < threshold:
+                    continue
+
+            matches.append((pks[idx], ratio))
+
+        matches = sorted(matches, key=lambda item: item[1], reverse=True)
+
+        return matches[:limit]
+
+    def match_ipn(self, ipn):
+        """ Return the set of Part pk values with the provided IPN (case-insensitive) """
+
+        code = normalize_code(ipn)
+
+        if not code:
+            return set()
+
+        self.ensure()
+
+        with self.lock:
+            return set(self.ipns.get(code, set()))
+
+    def match_mpn(self, mpn):
+        """ Return the set of Part pk values which have a SupplierPart with the provided MPN (case-insensitive) """
+
+        code = normalize_code(mpn)
+
+        if not code:
+            return set()
+
+        self.ensure()
+
+        with self.lock:
+            if self.mpns is None:
+                self.mpns = defaultdict(set)
+
+                for value, pk in CompanyModels.SupplierPart.objects.exclude(MPN=None).values_list('MPN', 'part'):
+                    self.mpns[normalize_code(value)].add(pk)
+
+            return set(self.mpns.get(code, set()))
+
+
+part_index = PartIndex()
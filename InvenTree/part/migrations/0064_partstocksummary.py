@@ -0,0 +1,28 @@
+# Generated by Django 3.0.7 on 2021-04-06 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('part', '0063_bomitem_inherited'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartStockSummary',
+            fields=[
+                ('part', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_summary', serialize=False, to='part.Part')),
+                ('in_stock', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('total_stock', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('build_order_allocations', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('sales_order_allocations', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('on_order', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('building', models.DecimalField(decimal_places=5, default=0, max_digits=15)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -9,17 +9,18 @@ import os
 import logging
 
 from django.utils.translation import gettext_lazy as _
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.urls import reverse
+from django.utils import timezone
 
 from django.db import models, transaction
 from django.db.utils import IntegrityError
-from django.db.models import Q, Sum, UniqueConstraint
+from django.db.models import Q, F, Sum, Count, Case, When, Value, UniqueConstraint
 from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 
 from django.contrib.auth.models import User
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
 
 from markdownx.models import MarkdownxField
@@ -32,7 +33,6 @@ from stdimage.models import StdImageField
 
 from decimal import Decimal
 from datetime import datetime
-from rapidfuzz import fuzz
 import hashlib
 
 from InvenTree import helpers
@@ -46,11 +46,16 @@ from InvenTree.status_codes import BuildStatus, PurchaseOrderStatus, SalesOrderS
 from build import models as BuildModels
 from order import models as OrderModels
 from company.models import SupplierPart
+from company.pricing import price_cache
 from stock import models as StockModels
+from stock import serials as StockSerials
 
 import common.models
 import part.settings as part_settings
 
+from . import bom_engine
+from .matching import part_index
+
 
 logger = logging.getLogger(__name__)
 
@@ -100,6 +105,14 @@ class PartCategory(InvenTreeTree):
     def item_count(self):
         return self.partcount()
 
+    @classmethod
+    def get_item_counts(cls):
+        """ Return the number of parts in each category (not including subcategories) """
+
+        query = Part.objects.filter(category__isnull=False).values('category').annotate(count=Count('pk')).order_by()
+
+        return {row['category']: row['count'] for row in query}
+
     def partcount(self, cascade=True, active=False):
         """ Return the total part count under this category
         (including children of child categories)
@@ -211,6 +224,20 @@ def before_delete_part_category(sender, instance, using, **kwargs):
         child.save()
 
 
+@receiver(post_save, sender=PartCategory, dispatch_uid='partcategory_save_tree')
+@receiver(post_delete, sender=PartCategory, dispatch_uid='partcategory_delete_tree')
+@receiver(post_save, sender='part.Part', dispatch_uid='part_save_category_tree')
+@receiver(post_delete, sender='part.Part', dispatch_uid='part_delete_category_tree')
+def after_category_tree_change(sender, instance, **kwargs):
+    """ Invalidate the cached category tree when a category (or a part) is changed """
+
+    PartCategory.invalidate_tree()
+
+    # Invalidate again once the transaction is committed,
+    # in case the tree was cached from uncommitted data
+    transaction.on_commit(PartCategory.invalidate_tree)
+
+
 def rename_part_image(instance, filename):
     """ Function for renaming a part image file
 
@@ -228,14 +255,17 @@ def rename_part_image(instance, filename):
     return os.path.join(base, fname)
 
 
-def match_part_names(match, threshold=80, reverse=True, compare_length=False):
+def match_part_names(match, threshold=80, reverse=True, compare_length=False, limit=None):
     """ Return a list of parts whose name matches the search term using fuzzy search.
 
+    Matching is performed against the in-memory part index (see part.matching)
+
     Args:
         match: Term to match against
         threshold: Match percentage that must be exceeded (default = 65)
         reverse: Ordering for search results (default = True - highest match is first)
         compare_length: Include string length checks
+        limit: Maximum number of results (capped at PartIndex.MAX_RESULTS)
 
     Returns:
         A sorted dict where each element contains the following key:value pairs:
@@ -243,38 +273,21 @@ def match_part_names(match, threshold=80, reverse=True, compare_length=False):
             - 'ratio' : The matched ratio
     """
 
-    match = str(match).strip().lower()
-
-    if len(match) == 0:
-        return []
+    results = part_index.search(match, threshold=threshold, limit=limit, compare_length=compare_length)
 
-    parts = Part.objects.all()
+    parts = Part.objects.in_bulk([pk for pk, ratio in results])
 
     matches = []
 
-    for part in parts:
-        compare = str(part.name).strip().lower()
-
-        if len(compare) == 0:
-            continue
-
-        ratio = fuzz.partial_token_sort_ratio(compare, match)
-
-        if compare_length:
-            # Also employ primitive length comparison
-            # TODO - Improve this somewhat...
-            l_min = min(len(match), len(compare))
-            l_max = max(len(match), len(compare))
-
-            ratio *= (l_min / l_max)
-
-        if ratio >= threshold:
+    for pk, ratio in results:
+        if pk in parts:
             matches.append({
-                'part': part,
+                'part': parts[pk],
                 'ratio': round(ratio, 1)
             })
 
-    matches = sorted(matches, key=lambda item: item['ratio'], reverse=reverse)
+    if not reverse:
+        matches.reverse()
 
     return matches
 
@@ -447,20 +460,12 @@ class Part(MPTTModel):
                 p2=str(parent)
             ))})
 
-        bom_items = self.get_bom_items()
-
-        # Ensure that the parent part does not appear under any child BOM item!
-        for item in bom_items.all():
-
-            # Check for simple match
-            if item.sub_part == parent:
-                raise ValidationError({'sub_part': _("Part '{p1}' is  used in BOM for '{p2}' (recursive)".format(
-                    p1=str(parent),
-                    p2=str(self)
-                ))})
-
-            # And recursively check too
-            item.sub_part.checkAddToBOM(parent)
+        # Ensure that the parent part does not appear anywhere in the (multi-level) BOM for this part
+        if parent.pk in bom_engine.BomGraph(self).nodes:
+            raise ValidationError({'sub_part': _("Part '{p1}' is  used in BOM for '{p2}' (recursive)".format(
+                p1=str(parent),
+                p2=str(self)
+            ))})
 
     def checkIfSerialNumberExists(self, sn, exclude_self=False):
         """
@@ -470,27 +475,18 @@ class Part(MPTTModel):
         so here we filter by the entire tree.
         """
 
-        parts = Part.objects.filter(tree_id=self.tree_id)
-
-        stock = StockModels.StockItem.objects.filter(part__in=parts, serial=sn)
+        exclude = [self.pk] if exclude_self else None
 
-        if exclude_self:
-            stock = stock.exclude(pk=self.pk)
-
-        return stock.exists()
+        return len(StockSerials.find_conflicting_serials(self.tree_id, [sn], exclude=exclude)) > 0
 
     def find_conflicting_serial_numbers(self, serials):
         """
         For a provided list of serials, return a list of those which are conflicting.
-        """
 
-        conflicts = []
-
-        for serial in serials:
-            if self.checkIfSerialNumberExists(serial, exclude_self=True):
-                conflicts.append(serial)
+        All serials are checked with a single query.
+        """
 
-        return conflicts
+        return StockSerials.find_conflicting_serials(self.tree_id, serials)
 
     def getLatestSerialNumber(self):
         """
@@ -503,28 +499,19 @@ class Part(MPTTModel):
         so we filter by the entire tree.
         """
 
-        parts = Part.objects.filter(tree_id=self.tree_id)
-        stock = StockModels.StockItem.objects.filter(part__in=parts).exclude(serial=None)
-        
-        # There are no matchin StockItem objects (skip further tests)
-        if not stock.exists():
-            return None
+        return StockSerials.get_latest_serial(self.tree_id)
 
-        # Attempt to coerce the returned serial numbers to integers
-        # If *any* are not integers, fail!
-        try:
-            ordered = sorted(stock.all(), reverse=True, key=lambda n: int(n.serial))
+    def allocate_serial_numbers(self, quantity, start=None, exclude=None):
+        """
+        Return a list of the next available serial numbers for this Part (see stock.serials.allocate_serials)
 
-            if len(ordered) > 0:
-                return ordered[0].serial
+        Args:
+            quantity: Number of serial numbers required
+            start: Optional first serial number (otherwise, numbers following the highest existing serial number are returned)
+            exclude: Optional list of serial numbers which should not be returned
+        """
 
-        # One or more of the serial numbers was non-numeric
-        # In this case, the "best" we can do is return the most recent
-        except ValueError:
-            return stock.last().serial
-
-        # No serial numbers found
-        return None
+        return StockSerials.allocate_serials(self.tree_id, quantity, start=start, exclude=exclude)
 
     def getSerialNumberString(self, quantity=1):
         """
@@ -910,8 +897,10 @@ class Part(MPTTModel):
         - This subtracts stock which is already allocated to builds
         """
 
-        total = self.total_stock
-        total -= self.allocation_count()
+        summary = self.get_stock_summary()
+
+        total = summary.total_stock
+        total -= summary.build_order_allocations + summary.sales_order_allocations
 
         return max(total, 0)
 
@@ -938,26 +927,7 @@ class Part(MPTTModel):
         Return the quantity of this part required for active build orders
         """
 
-        # List active build orders which reference this part
-        builds = self.requiring_build_orders()
-
-        quantity = 0
-
-        for build in builds:
-    
-            bom_item = None
-
-            # List the bom lines required to make the build (including inherited ones!)
-            bom_items = build.part.get_bom_items().filter(sub_part=self)
-
-            # Match BOM item to build
-            for bom_item in bom_items:
-
-                build_quantity = build.quantity * bom_item.quantity
-
-                quantity += build_quantity
-        
-        return quantity
+        return bom_engine.required_build_order_quantity(self)
 
     def requiring_sales_orders(self):
         """
@@ -1088,32 +1058,8 @@ class Part(MPTTModel):
         """ Return the number of units that can be build with available stock
         """
 
-        # If this part does NOT have a BOM, result is simply the currently available stock
-        if not self.has_bom:
-            return 0
-
-        total = None
-
-        bom_items = self.get_bom_items().prefetch_related('sub_part__stock_items')
-
-        # Calculate the minimum number of parts that can be built using each sub-part
-        for item in bom_items.all():
-            stock = item.sub_part.available_stock
-
-            # If (by some chance) we get here but the BOM item quantity is invalid,
-            # ignore!
-            if item.quantity <= 0:
-                continue
-
-            n = int(stock / item.quantity)
-
-            if total is None or n < total:
-                total = n
-
-        if total is None:
-            total = 0
-        
-        return max(total, 0)
+        # Only the first level of the BOM is required
+        return bom_engine.BomGraph(self, max_depth=1).can_build()
 
     @property
     def active_builds(self):
@@ -1139,15 +1085,7 @@ class Part(MPTTModel):
               In this fashion, it is the "projected" quantity of builds
         """
 
-        builds = self.active_builds
-
-        quantity = 0
-
-        for build in builds:
-            # The remaining items in the build
-            quantity += build.remaining
-
-        return quantity
+        return self.get_stock_summary().building
 
     def build_order_allocations(self):
         """
@@ -1161,9 +1099,7 @@ class Part(MPTTModel):
         Return the total amount of this part allocated to build orders
         """
 
-        query = self.build_order_allocations().aggregate(total=Coalesce(Sum('quantity'), 0))
-
-        return query['total']
+        return self.get_stock_summary().build_order_allocations
 
     def sales_order_allocations(self):
         """
@@ -1177,9 +1113,7 @@ class Part(MPTTModel):
         Return the tutal quantity of this part allocated to sales orders
         """
 
-        query = self.sales_order_allocations().aggregate(total=Coalesce(Sum('quantity'), 0))
-
-        return query['total']
+        return self.get_stock_summary().sales_order_allocations
 
     def allocation_count(self):
         """
@@ -1187,10 +1121,9 @@ class Part(MPTTModel):
         against both build orders and sales orders.
         """
 
-        return sum([
-            self.build_order_allocation_count(),
-            self.sales_order_allocation_count(),
-        ])
+        summary = self.get_stock_summary()
+
+        return summary.build_order_allocations + summary.sales_order_allocations
 
     def stock_entries(self, include_variants=True, in_stock=None):
         """ Return all stock entries for this Part.
@@ -1221,11 +1154,23 @@ class Part(MPTTModel):
         - If this part is a "template" (variants exist) then these are counted too
         """
 
-        entries = self.stock_entries(in_stock=True)
+        return self.get_stock_summary().total_stock
+
+    def get_stock_summary(self):
+        """
+        Return the PartStockSummary object for this part.
+
+        The summary is read fresh from the database on every call,
+        so that changes made since this Part object was loaded are reflected.
+        If no summary has been calculated for this part yet, it is created here.
+        """
 
-        query = entries.aggregate(t=Coalesce(Sum('quantity'), Decimal(0)))
+        summary = PartStockSummary.objects.filter(part=self.pk).first()
 
-        return query['t']
+        if summary is None:
+            summary = PartStockSummary.update_parts([self.pk])[self.pk]
+
+        return summary
 
     def get_bom_item_filter(self, include_inherited=True):
         """
@@ -1416,18 +1361,9 @@ class Part(MPTTModel):
         if parts is None:
             parts = set()
 
-        bom_items = self.get_bom_items().all()
-
-        for bom_item in bom_items:
-
-            sub_part = bom_item.sub_part
-
-            if sub_part not in parts:
-
-                parts.add(sub_part)
+        graph = bom_engine.BomGraph(self, max_depth=None if recursive else 1)
 
-                if recursive:
-                    sub_part.getRequiredParts(recursive=True, parts=parts)
+        parts.update(graph.get_required_parts(recursive=recursive))
 
         return parts
 
@@ -1501,9 +1437,16 @@ class Part(MPTTModel):
         min_price = None
         max_price = None
 
-        for supplier in self.supplier_parts.all():
+        supplier_parts = self.supplier_parts.all()
 
-            price = supplier.get_price(quantity)
+        # Compile the price tables for all supplier parts at once
+        tables = price_cache.get_tables(supplier_parts)
+
+        for supplier in supplier_parts:
+
+            table = tables[supplier.pk]
+
+            price = table.get_price(quantity, base_cost=supplier.base_cost, multiple=supplier.multiple)
 
             if price is None:
                 continue
@@ -1530,38 +1473,8 @@ class Part(MPTTModel):
         these items cannot be included in the BOM!
         """
 
-        min_price = None
-        max_price = None
-
-        for item in self.get_bom_items().all().select_related('sub_part'):
-
-            if item.sub_part.pk == self.pk:
-                print("Warning: Item contains itself in BOM")
-                continue
-
-            prices = item.sub_part.get_price_range(quantity * item.quantity)
-
-            if prices is None:
-                continue
-
-            low, high = prices
-
-            if min_price is None:
-                min_price = 0
-
-            if max_price is None:
-                max_price = 0
-
-            min_price += low
-            max_price += high
-
-        if min_price is None or max_price is None:
-            return None
-
-        min_price = normalize(min_price)
-        max_price = normalize(max_price)
-
-        return (min_price, max_price)
+        # The entire BOM is loaded and priced in a single pass
+        return bom_engine.BomGraph(self).get_bom_price_range(quantity)
 
     def get_price_range(self, quantity=1, buy=True, bom=True):
         
@@ -1574,20 +1487,10 @@ class Part(MPTTModel):
             Minimum of the supplier price or BOM price. If no pricing available, returns None
         """
 
-        buy_price_range = self.get_supplier_price_range(quantity) if buy else None
-        bom_price_range = self.get_bom_price_range(quantity) if bom else None
+        if not bom:
+            return self.get_supplier_price_range(quantity) if buy else None
 
-        if buy_price_range is None:
-            return bom_price_range
-
-        elif bom_price_range is None:
-            return buy_price_range
-
-        else:
-            return (
-                min(buy_price_range[0], bom_price_range[0]),
-                max(buy_price_range[1], bom_price_range[1])
-            )
+        return bom_engine.BomGraph(self).get_price_range(quantity, buy=buy, bom=bom)
 
     @transaction.atomic
     def copy_bom_from(self, other, clear=True, **kwargs):
@@ -1769,21 +1672,7 @@ class Part(MPTTModel):
     def on_order(self):
         """ Return the total number of items on order for this part. """
 
-        orders = self.supplier_parts.filter(purchase_order_line_items__order__status__in=PurchaseOrderStatus.OPEN).aggregate(
-            quantity=Sum('purchase_order_line_items__quantity'),
-            received=Sum('purchase_order_line_items__received')
-        )
-
-        quantity = orders['quantity']
-        received = orders['received']
-
-        if quantity is None:
-            quantity = 0
-
-        if received is None:
-            received = 0
-
-        return quantity - received
+        return self.get_stock_summary().on_order
 
     def get_parameters(self):
         """ Return all parameters for this part, ordered by name """
@@ -1828,6 +1717,424 @@ class Part(MPTTModel):
         return len(self.get_related_parts())
 
 
+class PartStockSummary(models.Model):
+    """
+    A PartStockSummary stores pre-calculated stock and allocation totals for a single Part.
+
+    Calculating these values on demand requires a separate aggregate query for each value
+    (some of which must also traverse the variant tree), for each part being displayed.
+    Instead, the values are stored here and recalculated whenever a related object
+    (StockItem, BuildItem, SalesOrderAllocation, PurchaseOrder, PurchaseOrderLineItem or Build)
+    is saved or deleted. Summary rows are created when a Part is created (or on demand),
+    or can be (re)built for all parts using the 'rebuild_stock_summary' management command.
+
+    Attributes:
+        part: Link to the Part object
+        in_stock: Quantity in stock for this part (not including variants)
+        total_stock: Quantity in stock for this part, including any variant parts
+        build_order_allocations: Quantity of this part allocated to build orders
+        sales_order_allocations: Quantity of this part allocated to sales orders
+        on_order: Quantity of this part outstanding against open purchase orders
+        building: Quantity of this part remaining to be completed by active build orders
+        updated: Date and time that the summary was last calculated
+    """
+
+    # Fields which are calculated by the calculate() method
+    SUMMARY_FIELDS = [
+        'in_stock',
+        'total_stock',
+        'build_order_allocations',
+        'sales_order_allocations',
+        'on_order',
+        'building',
+    ]
+
+    part = models.OneToOneField(
+        Part, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stock_summary',
+    )
+
+    in_stock = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+
+    total_stock = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+
+    build_order_allocations = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+
+    sales_order_allocations = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+
+    on_order = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+
+    building = models.DecimalField(max_digits=15, decimal_places=5, default=0)
+
+    updated = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.part.full_name} - {helpers.normalize(self.total_stock)}"
+
+    @staticmethod
+    def calculate(tree_ids):
+        """
+        Calculate the summary values for every part in the provided part (variant) trees.
+
+        Values are calculated for the whole tree, as the 'total_stock' value
+        for a template part includes the stock of any variants underneath it.
+        Each value is calculated using a single grouped aggregate query.
+
+        Args:
+            tree_ids: List (or queryset) of Part tree_id values
+
+        Returns:
+            A dict of {part_id: {field: value}} for each part in the trees
+        """
+
+        # Deepest parts first, so that variant stock can be rolled up to each parent in a single pass
+        nodes = Part.objects.filter(tree_id__in=tree_ids).order_by('-level').values_list('pk', 'variant_of')
+
+        # Filter which matches all parts in the selected trees
+        part_filter = Q(part__tree_id__in=tree_ids)
+
+        in_stock = {}
+
+        stock = StockModels.StockItem.objects.filter(part_filter).filter(StockModels.StockItem.IN_STOCK_FILTER)
+
+        for row in stock.order_by().values('part').annotate(q=Sum('quantity')):
+            in_stock[row['part']] = row['q']
+
+        build_allocations = {}
+
+        items = BuildModels.BuildItem.objects.filter(Q(stock_item__part__tree_id__in=tree_ids))
+
+        for row in items.order_by().values('stock_item__part').annotate(q=Sum('quantity')):
+            build_allocations[row['stock_item__part']] = row['q']
+
+        sales_allocations = {}
+
+        items = OrderModels.SalesOrderAllocation.objects.filter(Q(item__part__tree_id__in=tree_ids))
+
+        for row in items.order_by().values('item__part').annotate(q=Sum('quantity')):
+            sales_allocations[row['item__part']] = row['q']
+
+        on_order = {}
+
+        lines = OrderModels.PurchaseOrderLineItem.objects.filter(
+            Q(part__part__tree_id__in=tree_ids),
+            order__status__in=PurchaseOrderStatus.OPEN,
+        )
+
+        for row in lines.order_by().values('part__part').annotate(q=Sum('quantity'), r=Sum('received')):
+            on_order[row['part__part']] = row['q'] - row['r']
+
+        building = {}
+
+        # Only count the quantity which is yet to be completed for each build
+        remaining = Case(
+            When(quantity__gt=F('completed'), then=F('quantity') - F('completed')),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        )
+
+        builds = BuildModels.Build.objects.filter(part_filter, status__in=BuildStatus.ACTIVE_CODES)
+
+        for row in builds.order_by().values('part').annotate(q=Sum(remaining)):
+            building[row['part']] = row['q']
+
+        # Stock for each part and any variants underneath it
+        totals = {}
+
+        for pk, parent in nodes:
+            totals[pk] = totals.get(pk, Decimal(0)) + in_stock.get(pk, Decimal(0))
+
+            if parent is not None:
+                totals[parent] = totals.get(parent, Decimal(0)) + totals[pk]
+
+        results = {}
+
+        for pk in totals.keys():
+            results[pk] = {
+                'in_stock': in_stock.get(pk, Decimal(0)),
+                'total_stock': totals[pk],
+                'build_order_allocations': build_allocations.get(pk, Decimal(0)),
+                'sales_order_allocations': sales_allocations.get(pk, Decimal(0)),
+                'on_order': on_order.get(pk, Decimal(0)),
+                'building': Decimal(building.get(pk, 0)),
+            }
+
+        return results
+
+    @classmethod
+    def update_trees(cls, tree_ids, create=True):
+        """
+        Recalculate the summary for all parts in the provided part trees.
+
+        Args:
+            tree_ids: List (or queryset) of Part tree_id values
+            create: If True, create summary objects for any parts which do not have one.
+                    Otherwise, only existing summary objects are updated.
+
+        Returns:
+            A dict of {part_id: PartStockSummary} for each updated (or created) summary
+        """
+
+        if not create:
+            # Nothing to do if none of these parts have a summary
+            if not cls.objects.filter(part__tree_id__in=tree_ids).exists():
+                return {}
+
+        values = cls.calculate(tree_ids)
+
+        existing = set(cls.objects.filter(part__in=values.keys()).values_list('part', flat=True))
+
+        now = timezone.now()
+
+        summaries = {}
+        to_update = []
+        to_create = []
+
+        for pk, data in values.items():
+            summary = cls(part_id=pk, updated=now, **data)
+
+            if pk in existing:
+                to_update.append(summary)
+            elif create:
+                to_create.append(summary)
+            else:
+                continue
+
+            summaries[pk] = summary
+
+        if len(to_update) > 0:
+            cls.objects.bulk_update(to_update, cls.SUMMARY_FIELDS + ['updated'], batch_size=500)
+
+        if len(to_create) > 0:
+            cls.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+
+        return summaries
+
+    @classmethod
+    def update_parts(cls, part_ids, create=True):
+        """
+        Recalculate the summary for the provided parts (and any parts in the same variant trees).
+
+        Args:
+            part_ids: List of Part primary keys
+            create: If True, create summary objects which do not yet exist
+
+        Returns:
+            A dict of {part_id: PartStockSummary}
+        """
+
+        part_ids = [pk for pk in part_ids if pk is not None]
+
+        if len(part_ids) == 0:
+            return {}
+
+        tree_ids = list(Part.objects.filter(pk__in=part_ids).order_by().values_list('tree_id', flat=True).distinct())
+
+        return cls.update_trees(tree_ids, create=create)
+
+    @classmethod
+    def invalidate_parts(cls, part_ids):
+        """
+        Remove the summary for the provided parts (and any parts in the same variant trees).
+        The summary will be recalculated the next time it is required.
+        """
+
+        part_ids = [pk for pk in part_ids if pk is not None]
+
+        trees = Part.objects.filter(pk__in=part_ids).values('tree_id')
+
+        cls.objects.filter(part__tree_id__in=trees).delete()
+
+    @classmethod
+    def rebuild(cls, chunk_size=500):
+        """
+        Recalculate the summary for every Part in the database.
+
+        Returns:
+            The number of parts for which the summary was calculated
+        """
+
+        tree_ids = list(Part.objects.order_by('tree_id').values_list('tree_id', flat=True).distinct())
+
+        count = 0
+
+        for idx in range(0, len(tree_ids), chunk_size):
+            count += len(cls.update_trees(tree_ids[idx:idx + chunk_size]))
+
+        return count
+
+
+# Path to the Part (from each model which affects the part summary) which is recorded before the model is saved
+SUMMARY_PART_PATHS = {
+    'part.Part': 'variant_of',
+    'stock.StockItem': 'part',
+    'build.BuildItem': 'stock_item__part',
+    'build.Build': 'part',
+    'order.SalesOrderAllocation': 'item__part',
+    'order.PurchaseOrderLineItem': 'part__part',
+}
+
+
+@receiver(pre_save, sender=Part, dispatch_uid='part_presave_part_summary')
+@receiver(pre_save, sender='stock.StockItem', dispatch_uid='stockitem_presave_part_summary')
+@receiver(pre_save, sender='build.BuildItem', dispatch_uid='builditem_presave_part_summary')
+@receiver(pre_save, sender='build.Build', dispatch_uid='build_presave_part_summary')
+@receiver(pre_save, sender='order.SalesOrderAllocation', dispatch_uid='soallocation_presave_part_summary')
+@receiver(pre_save, sender='order.PurchaseOrderLineItem', dispatch_uid='poline_presave_part_summary')
+def before_summary_change(sender, instance, raw=False, **kwargs):
+    """
+    Record the Part which an existing object referred to before it is saved,
+    so that the summary for the previous part (variant tree) is also updated if the reference changes.
+
+    For a Part, the previous parent (variant_of) is recorded, as the part may have moved to another variant tree.
+    """
+
+    instance._summary_previous_part = None
+
+    if raw or instance._state.adding or instance.pk is None:
+        return
+
+    path = SUMMARY_PART_PATHS[sender._meta.label]
+
+    instance._summary_previous_part = sender.objects.filter(pk=instance.pk).values_list(path, flat=True).first()
+
+
+def previous_summary_part(instance):
+    """ Return the Part which an object referred to before it was saved (see before_summary_change) """
+
+    return getattr(instance, '_summary_previous_part', None)
+
+
+def refresh_part_stock_summary(part_ids, raw=False):
+    """
+    Update the PartStockSummary for the provided parts, after a related object has changed.
+
+    - Only existing summary objects are updated (missing summaries are created on demand)
+    - For "raw" saves (e.g. loading fixture data) the summary is invalidated instead,
+      as the related data may not yet be complete.
+    """
+
+    if raw:
+        PartStockSummary.invalidate_parts(part_ids)
+    else:
+        PartStockSummary.update_parts(part_ids, create=False)
+
+
+@receiver(post_save, sender=Part, dispatch_uid='part_save_part_summary')
+def after_part_save(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Update the part summary when a Part is saved (as the variant tree may have changed).
+    A summary is created for each new Part.
+    """
+
+    if created and not raw:
+        PartStockSummary.update_parts([instance.pk])
+    else:
+        # The previous variant tree is also updated (if the part has moved to another tree)
+        refresh_part_stock_summary([instance.pk, previous_summary_part(instance)], raw=raw)
+
+
+@receiver(post_save, sender=Part, dispatch_uid='part_save_part_index')
+def after_part_save_index(sender, instance, **kwargs):
+    """ Update the part matching index when a Part is saved """
+
+    part_index.update_part(instance)
+
+    # Other processes see the change once it is committed
+    transaction.on_commit(part_index.increment_version)
+
+
+@receiver(post_delete, sender=Part, dispatch_uid='part_delete_part_index')
+def after_part_delete_index(sender, instance, **kwargs):
+    """ Update the part matching index when a Part is deleted """
+
+    part_index.remove_part(instance)
+
+    transaction.on_commit(part_index.increment_version)
+
+
+@receiver(post_save, sender='company.SupplierPart', dispatch_uid='supplierpart_save_part_index')
+@receiver(post_delete, sender='company.SupplierPart', dispatch_uid='supplierpart_delete_part_index')
+def after_supplier_part_change_index(sender, instance, **kwargs):
+    """ Invalidate the MPN lookup for the part matching index when a SupplierPart is changed """
+
+    part_index.invalidate_mpns()
+
+    transaction.on_commit(part_index.increment_version)
+
+
+@receiver(post_save, sender='stock.StockItem', dispatch_uid='stockitem_save_part_summary')
+@receiver(post_delete, sender='stock.StockItem', dispatch_uid='stockitem_delete_part_summary')
+def after_stock_item_change(sender, instance, raw=False, **kwargs):
+    """ Update the part summary when a StockItem is saved or deleted """
+
+    refresh_part_stock_summary([instance.part_id, previous_summary_part(instance)], raw=raw)
+
+
+@receiver(post_save, sender='build.BuildItem', dispatch_uid='builditem_save_part_summary')
+@receiver(post_delete, sender='build.BuildItem', dispatch_uid='builditem_delete_part_summary')
+def after_build_item_change(sender, instance, raw=False, **kwargs):
+    """ Update the part summary when a BuildItem (build allocation) is saved or deleted """
+
+    try:
+        part_id = instance.stock_item.part_id
+    except ObjectDoesNotExist:
+        part_id = None
+
+    refresh_part_stock_summary([part_id, previous_summary_part(instance)], raw=raw)
+
+
+@receiver(post_save, sender='order.SalesOrderAllocation', dispatch_uid='soallocation_save_part_summary')
+@receiver(post_delete, sender='order.SalesOrderAllocation', dispatch_uid='soallocation_delete_part_summary')
+def after_sales_order_allocation_change(sender, instance, raw=False, **kwargs):
+    """ Update the part summary when a SalesOrderAllocation is saved or deleted """
+
+    try:
+        part_id = instance.item.part_id
+    except ObjectDoesNotExist:
+        part_id = None
+
+    refresh_part_stock_summary([part_id, previous_summary_part(instance)], raw=raw)
+
+
+@receiver(post_save, sender='order.PurchaseOrderLineItem', dispatch_uid='poline_save_part_summary')
+@receiver(post_delete, sender='order.PurchaseOrderLineItem', dispatch_uid='poline_delete_part_summary')
+def after_purchase_order_line_change(sender, instance, raw=False, **kwargs):
+    """ Update the part summary when a PurchaseOrderLineItem is saved or deleted """
+
+    try:
+        part_id = instance.part.part_id if instance.part else None
+    except ObjectDoesNotExist:
+        part_id = None
+
+    refresh_part_stock_summary([part_id, previous_summary_part(instance)], raw=raw)
+
+
+@receiver(post_save, sender='order.PurchaseOrder', dispatch_uid='po_save_part_summary')
+def after_purchase_order_save(sender, instance, raw=False, **kwargs):
+    """ Update the part summary for each line when a PurchaseOrder changes (e.g. the order status) """
+
+    part_ids = SupplierPart.objects.filter(purchase_order_line_items__order=instance.pk).values_list('part', flat=True)
+
+    refresh_part_stock_summary(list(part_ids), raw=raw)
+
+
+@receiver(post_delete, sender='company.SupplierPart', dispatch_uid='supplierpart_delete_part_summary')
+def after_supplier_part_delete(sender, instance, **kwargs):
+    """ Update the part summary when a SupplierPart is deleted (as line items are orphaned) """
+
+    refresh_part_stock_summary([instance.part_id])
+
+
+@receiver(post_save, sender='build.Build', dispatch_uid='build_save_part_summary')
+@receiver(post_delete, sender='build.Build', dispatch_uid='build_delete_part_summary')
+def after_build_change(sender, instance, raw=False, **kwargs):
+    """ Update the part summary when a Build is saved or deleted """
+
+    refresh_part_stock_summary([instance.part_id, previous_summary_part(instance)], raw=raw)
+
+
 def attach_file(instance, filename):
     """ Function for storing a file for a PartAttachment
 
@@ -4,18 +4,17 @@ JSON serializers for Part app
 import imghdr
 from decimal import Decimal
 
-from django.db.models import Q
+from django.db.models import F, Count
 from django.db.models.functions import Coalesce
 from InvenTree.serializers import (InvenTreeAttachmentSerializerField,
+                                   InvenTreeAggregateListSerializer,
                                    InvenTreeModelSerializer)
-from InvenTree.status_codes import BuildStatus, PurchaseOrderStatus
 from rest_framework import serializers
-from sql_util.utils import SubqueryCount, SubquerySum
-from stock.models import StockItem
 
 from .models import (BomItem, Part, PartAttachment, PartCategory,
                      PartParameter, PartParameterTemplate, PartSellPriceBreak,
-                     PartStar, PartTestTemplate, PartCategoryParameterTemplate)
+                     PartStar, PartStockSummary, PartTestTemplate,
+                     PartCategoryParameterTemplate)
 
 
 class CategorySerializer(InvenTreeModelSerializer):
@@ -175,7 +174,7 @@ class PartSerializer(InvenTreeModelSerializer):
         super().__init__(*args, **kwargs)
 
         if category_detail is not True:
-            self.fields.pop('category_detail')
+            self.fields.pop('category_detail', None)
 
     @staticmethod
     def prefetch_queryset(queryset):
@@ -204,58 +203,68 @@ class PartSerializer(InvenTreeModelSerializer):
         to reduce database trips.
         """
 
+        # Missing stock summaries are created for the serialized parts (see calculate_aggregates)
+        queryset = queryset.annotate(
+            summary=F('stock_summary__part'),
+        )
+
         # Annotate with the total 'in stock' quantity
         queryset = queryset.annotate(
             in_stock=Coalesce(
-                SubquerySum('stock_items__quantity', filter=StockItem.IN_STOCK_FILTER),
+                F('stock_summary__in_stock'),
                 Decimal(0)
             ),
         )
 
-        # Annotate with the total number of stock items
-        queryset = queryset.annotate(
-            stock_item_count=SubqueryCount('stock_items')
-        )
-
-        # Filter to limit builds to "active"
-        build_filter = Q(
-            status__in=BuildStatus.ACTIVE_CODES
-        )
-
         # Annotate with the total 'building' quantity
         queryset = queryset.annotate(
             building=Coalesce(
-                SubquerySum('builds__quantity', filter=build_filter),
+                F('stock_summary__building'),
                 Decimal(0),
             )
         )
-        
-        # Filter to limit orders to "open"
-        order_filter = Q(
-            order__status__in=PurchaseOrderStatus.OPEN
-        )
 
         # Annotate with the total 'on order' quantity
         queryset = queryset.annotate(
             ordering=Coalesce(
-                SubquerySum('supplier_parts__purchase_order_line_items__quantity', filter=order_filter),
-                Decimal(0),
-            ) - Coalesce(
-                SubquerySum('supplier_parts__purchase_order_line_items__received', filter=order_filter),
+                F('stock_summary__on_order'),
                 Decimal(0),
             )
         )
 
-        # Annotate with the number of 'suppliers'
-        queryset = queryset.annotate(
-            suppliers=Coalesce(
-                SubqueryCount('supplier_parts'),
-                Decimal(0),
-            ),
-        )
-        
         return queryset
 
+    def calculate_aggregates(self, instances):
+        """
+        Create stock summaries for any serialized parts which do not yet have one
+        (e.g. parts loaded from fixture data), so that the annotated stock values are correct.
+        """
+
+        missing = [part for part in instances if hasattr(part, 'summary') and part.summary is None]
+
+        if len(missing) > 0:
+            summaries = PartStockSummary.update_parts([part.pk for part in missing])
+
+            for part in missing:
+                summary = summaries.get(part.pk, None)
+
+                if summary is not None:
+                    part.in_stock = summary.in_stock
+                    part.building = summary.building
+                    part.ordering = summary.on_order
+
+        super().calculate_aggregates(instances)
+
+    # Counts are calculated (with a single grouped query) for all serialized parts at once
+    aggregates = {
+        'stock_item_count': [
+            ('stock.StockItem', 'part', Count('pk')),
+        ],
+        'suppliers': [
+            ('company.SupplierPart', 'part', Count('pk')),
+        ],
+    }
+
     def get_starred(self, part):
         """
         Return "true" if the part is starred by the current user.
@@ -288,6 +297,7 @@ class PartSerializer(InvenTreeModelSerializer):
     class Meta:
         model = Part
         partial = True
+        list_serializer_class = InvenTreeAggregateListSerializer
         fields = [
             'active',
             # 'allocated_stock',
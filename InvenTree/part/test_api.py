@@ -325,3 +325,21 @@ class PartAPIAggregationTest(InvenTreeAPITestCase):
 
         self.assertEqual(data['in_stock'], 1100)
         self.assertEqual(data['stock_item_count'], 105)
+
+    def test_sparse_fields(self):
+        """
+        Test that the part list can be restricted to a subset of fields
+        """
+
+        url = reverse('api-part-list')
+
+        response = self.client.get(url, {'fields': 'name,in_stock,stock_item_count'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for part in response.data:
+            self.assertEqual(set(part.keys()), set(['pk', 'name', 'in_stock', 'stock_item_count']))
+
+            if part['pk'] == self.part.pk:
+                self.assertEqual(part['in_stock'], 600)
+                self.assertEqual(part['stock_item_count'], 4)
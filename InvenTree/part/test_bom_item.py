@@ -1,7 +1,10 @@
 from django.test import TestCase
 import django.core.exceptions as django_exceptions
 
+from decimal import Decimal
+
 from .models import Part, BomItem
+from .bom_engine import BomGraph
 
 
 class BomItemTest(TestCase):
@@ -111,3 +114,86 @@ class BomItemTest(TestCase):
         item.validate_hash()
 
         self.assertNotEqual(h1, h2)
+
+
+class BomEngineTest(TestCase):
+    """ Tests for the multi-level BOM engine """
+
+    fixtures = [
+        'category',
+        'part',
+        'location',
+        'bom',
+    ]
+
+    def setUp(self):
+        Part.objects.rebuild()
+
+        self.bob = Part.objects.get(id=100)
+        self.orphan = Part.objects.get(name='Orphan')
+
+        # Construct a multi-level BOM:
+        # Top -> 2 x Bob -> (BOM from fixture)
+        # Top -> 3 x Sub -> 5 x Orphan
+        self.top = Part.objects.create(name='Top', description='Top level assembly', assembly=True)
+        self.sub = Part.objects.create(name='Sub', description='Sub assembly', assembly=True, component=True)
+
+        BomItem.objects.create(part=self.top, sub_part=self.bob, quantity=2)
+        BomItem.objects.create(part=self.top, sub_part=self.sub, quantity=3)
+        BomItem.objects.create(part=self.sub, sub_part=self.orphan, quantity=5)
+
+    def test_required_parts(self):
+        parts = self.top.getRequiredParts()
+
+        self.assertEqual(parts, set([self.bob, self.sub]))
+
+        parts = self.top.getRequiredParts(recursive=True)
+
+        self.assertEqual(len(parts), 6)
+        self.assertIn(self.orphan, parts)
+
+    def test_extended_quantities(self):
+        graph = BomGraph(self.top)
+
+        quantities = graph.get_extended_quantities(10)
+
+        self.assertEqual(quantities[self.bob.pk], 20)
+        self.assertEqual(quantities[self.sub.pk], 30)
+
+        # Orphan is required for Bob (3 each) and Sub (5 each)
+        self.assertEqual(quantities[self.orphan.pk], Decimal(10 * 2 * 3 + 10 * 3 * 5))
+
+        # Parts are ordered with assemblies before components
+        self.assertEqual(graph.order[0], self.top.pk)
+        self.assertLess(graph.order.index(self.sub.pk), graph.order.index(self.orphan.pk))
+
+    def test_inherited(self):
+        # Create a variant of Top, which inherits the BOM
+        variant = Part.objects.create(name='Top variant', description='A variant', variant_of=self.top, assembly=True)
+
+        self.assertEqual(len(variant.getRequiredParts()), 0)
+
+        item = BomItem.objects.get(part=self.top, sub_part=self.sub)
+        item.inherited = True
+        item.save()
+
+        self.assertEqual(variant.getRequiredParts(), set([self.sub]))
+        self.assertEqual(variant.getRequiredParts(recursive=True), set([self.sub, self.orphan]))
+
+    def test_recursive(self):
+        # Adding Top into the BOM for Orphan is not allowed
+        with self.assertRaises(django_exceptions.ValidationError):
+            BomItem.objects.create(part=self.orphan, sub_part=self.top, quantity=1)
+
+        # Force a circular reference into the database (bypassing validation)
+        BomItem.objects.bulk_create([BomItem(part=self.orphan, sub_part=self.top, quantity=1)])
+
+        graph = BomGraph(self.top)
+
+        # The circular reference is discarded
+        self.assertEqual(len(graph.get_edges(self.orphan.pk)), 0)
+        self.assertEqual(len(graph.order), 7)
+
+    def test_can_build(self):
+        self.assertEqual(self.top.can_build, 0)
+        self.assertEqual(self.orphan.can_build, 0)
@@ -11,13 +11,17 @@ from django.core.exceptions import ValidationError
 
 import os
 
-from .models import Part, PartTestTemplate
+from django.db.models import Sum
+
+from .models import Part, PartTestTemplate, PartStockSummary
 from .models import rename_part_image, match_part_names
+from .matching import part_index
 from .templatetags import inventree_extras
 
 import part.settings
 
 from common.models import InvenTreeSetting
+from stock.models import StockItem
 
 
 class TemplateTagTest(TestCase):
@@ -113,6 +117,153 @@ class PartTest(TestCase):
 
         self.assertTrue(len(matches) > 0)
 
+    def test_match_index(self):
+        """ The part matching index is updated when a Part is saved or deleted """
+
+        part = Part.objects.create(name='Zyxwv Gizmo', description='A gizmo', IPN='ZG-001')
+
+        matches = match_part_names('ZYXWV gizmo')
+
+        self.assertEqual(matches[0]['part'], part)
+        self.assertEqual(matches[0]['ratio'], 100)
+
+        self.assertEqual(part_index.match_ipn('zg-001'), set([part.pk]))
+
+        # Force candidate selection using the n-gram index
+        part_index.PREFILTER_THRESHOLD = 0
+
+        try:
+            matches = match_part_names('gizmo zyxwv')
+            self.assertEqual(matches[0]['part'], part)
+
+            self.assertEqual(len(match_part_names('qqqqq')), 0)
+        finally:
+            del part_index.PREFILTER_THRESHOLD
+
+        part.name = 'Other thing'
+        part.IPN = 'ZG-002'
+        part.save()
+
+        self.assertNotIn(part, [m['part'] for m in match_part_names('Zyxwv Gizmo')])
+        self.assertEqual(part_index.match_ipn('zg-001'), set())
+        self.assertEqual(part_index.match_ipn('ZG-002'), set([part.pk]))
+
+        pk = part.pk
+        part.delete()
+
+        self.assertEqual(part_index.match_ipn('ZG-002'), set())
+        self.assertNotIn(pk, [pk for pk, ratio in part_index.search('Other thing')])
+
+        # Number of results is limited
+        self.assertEqual(len(match_part_names('r', threshold=0, limit=2)), 2)
+
+
+class PartStockSummaryTest(TestCase):
+    """ Tests for the pre-calculated PartStockSummary table """
+
+    fixtures = [
+        'category',
+        'part',
+        'location',
+        'stock',
+    ]
+
+    def setUp(self):
+        Part.objects.rebuild()
+
+        self.chair = Part.objects.get(pk=10000)
+        self.blue = Part.objects.get(pk=10001)
+
+    def expected_stock(self, part):
+        """ Calculate the stock level directly from the StockItem table """
+
+        total = part.stock_entries(in_stock=True).aggregate(q=Sum('quantity'))['q']
+
+        return total or 0
+
+    def test_variants(self):
+        # Template part includes stock for all variants
+        self.assertEqual(self.chair.total_stock, self.expected_stock(self.chair))
+        self.assertGreater(self.chair.total_stock, 0)
+
+        summary = self.chair.get_stock_summary()
+
+        # No stock directly against the template part
+        self.assertEqual(summary.in_stock, 0)
+
+        # Summary objects have been created for the whole variant tree
+        self.assertEqual(PartStockSummary.objects.filter(part__tree_id=self.chair.tree_id).count(), 5)
+
+    def test_update(self):
+        n = self.chair.total_stock
+        m = self.blue.total_stock
+
+        item = StockItem.objects.create(part=self.blue, quantity=50)
+
+        self.assertEqual(self.blue.total_stock, m + 50)
+        self.assertEqual(self.chair.total_stock, n + 50)
+
+        item.take_stock(20, None)
+
+        self.assertEqual(self.blue.total_stock, m + 30)
+
+        item.delete()
+
+        self.assertEqual(self.blue.total_stock, m)
+        self.assertEqual(self.chair.total_stock, n)
+
+    def test_change_part(self):
+        # Moving a stock item to another part updates the summary for both parts
+        other = Part.objects.get(pk=100)
+
+        n = self.chair.total_stock
+        m = other.total_stock
+
+        item = StockItem.objects.create(part=self.blue, quantity=50)
+
+        self.assertEqual(self.chair.total_stock, n + 50)
+
+        item.part = other
+        item.save()
+
+        self.assertEqual(self.chair.total_stock, n)
+        self.assertEqual(other.total_stock, m + 50)
+
+    def test_move_variant(self):
+        # Moving a variant part to another tree updates the summary for both trees
+        n = self.chair.total_stock
+        m = self.blue.total_stock
+
+        self.assertGreater(m, 0)
+
+        self.blue.variant_of = None
+        self.blue.save()
+
+        self.assertEqual(self.chair.total_stock, n - m)
+        self.assertEqual(self.blue.total_stock, m)
+
+        # Reload the template part, as its tree values have changed
+        self.chair = Part.objects.get(pk=10000)
+
+        self.blue.variant_of = self.chair
+        self.blue.save()
+
+        self.assertEqual(self.chair.total_stock, n)
+
+        for prt in Part.objects.filter(tree_id=self.chair.tree_id):
+            self.assertEqual(prt.total_stock, self.expected_stock(prt))
+
+    def test_rebuild(self):
+        PartStockSummary.objects.all().delete()
+
+        count = PartStockSummary.rebuild()
+
+        self.assertEqual(count, Part.objects.count())
+        self.assertEqual(PartStockSummary.objects.count(), Part.objects.count())
+
+        for prt in Part.objects.all():
+            self.assertEqual(prt.total_stock, self.expected_stock(prt))
+
 
 class TestTemplateTest(TestCase):
 
@@ -1,5 +1,10 @@
 """ Unit tests for Part Views (see views.py) """
 
+import csv
+import io
+
+from decimal import Decimal
+
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
@@ -66,6 +71,26 @@ class PartListTest(PartViewTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('streaming_content', dir(response))
 
+    def test_export_values(self):
+        """ Exported (chunked) values match the values calculated for each part """
+
+        response = self.client.get(reverse('part-export'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        self.assertEqual(response.status_code, 200)
+
+        content = b''.join(response.streaming_content).decode('utf-8')
+
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual(len(rows), Part.objects.count())
+
+        for row in rows:
+            part = Part.objects.get(pk=row['id'])
+
+            self.assertEqual(int(row['suppliers']), part.supplier_count)
+            self.assertEqual(int(row['used_in']), part.used_in_count)
+            self.assertEqual(Decimal(row['in_stock']), part.total_stock)
+
 
 class PartDetailTest(PartViewTestCase):
 
@@ -26,7 +26,6 @@ import requests
 import os
 import io
 
-from rapidfuzz import fuzz
 from decimal import Decimal, InvalidOperation
 
 from .models import PartCategory, Part, PartAttachment, PartRelated
@@ -44,6 +43,7 @@ import common.settings as inventree_settings
 
 from . import forms as part_forms
 from .bom import MakeBomTemplate, BomUploadManager, ExportBom, IsValidBOMFormat
+from .matching import part_index
 
 from .admin import PartResource
 
@@ -51,7 +51,8 @@ from InvenTree.views import AjaxView, AjaxCreateView, AjaxUpdateView, AjaxDelete
 from InvenTree.views import QRCodeView
 from InvenTree.views import InvenTreeRoleMixin
 
-from InvenTree.helpers import DownloadFile, str2bool
+from InvenTree.exporter import DownloadExport
+from InvenTree.helpers import str2bool
 
 
 class PartIndex(InvenTreeRoleMixin, ListView):
@@ -1277,12 +1278,17 @@ class BomUpload(InvenTreeRoleMixin, FormView):
         k_idx = self.getColumnIndex('Part_ID')
         p_idx = self.getColumnIndex('Part_Name')
         i_idx = self.getColumnIndex('Part_IPN')
+        m_idx = self.getColumnIndex('Part_MPN')
 
         q_idx = self.getColumnIndex('Quantity')
         r_idx = self.getColumnIndex('Reference')
         o_idx = self.getColumnIndex('Overage')
         n_idx = self.getColumnIndex('Note')
 
+        # Part matching is performed (via the part index) against the allowed parts only
+        allowed_parts = list(self.allowed_parts)
+        allowed_ids = set([part.pk for part in allowed_parts])
+
         for row in self.bom_rows:
             """
 
@@ -1293,11 +1299,13 @@ class BomUpload(InvenTreeRoleMixin, FormView):
 
             a) Use the PK (primary key) field for the part, uploaded in the "Part_ID" field
             b) Use the IPN (internal part number) field for the part, uploaded in the "Part_IPN" field
-            c) Use the name of the part, uploaded in the "Part_Name" field
+            c) Use the MPN (manufacturer part number) of a supplier part, uploaded in the "Part_MPN" field
+            d) Use the name of the part, uploaded in the "Part_Name" field
 
             Notes:
             - If using the Part_ID field, we can do an exact match against the PK field
             - If using the Part_IPN field, we can do an exact match against the IPN field
+            - If using the Part_MPN field, we can do an exact match against the MPN field
             - If using the Part_Name field, we can use fuzzy string matching to match "close" values
             
             We also extract other information from the row, for the other non-matched fields:
@@ -1348,22 +1356,24 @@ class BomUpload(InvenTreeRoleMixin, FormView):
 
                 row['part_name'] = part_name
 
-                matches = []
-
-                for part in self.allowed_parts:
-                    ratio = fuzz.partial_ratio(part.name + part.description, part_name)
-                    matches.append({'part': part, 'match': ratio})
+                # The best matches (if any) are listed first, followed by the other allowed parts
+                matches = part_index.search(part_name, parts=allowed_ids, description=True)
 
-                # Sort matches by the 'strength' of the match ratio
                 if len(matches) > 0:
-                    matches = sorted(matches, key=lambda item: item['match'], reverse=True)
+                    matched = set([pk for pk, ratio in matches])
+                    parts = dict([(part.pk, part) for part in allowed_parts])
 
-                    part_options = [m['part'] for m in matches]
+                    part_options = [parts[pk] for pk, ratio in matches]
+                    part_options += [part for part in allowed_parts if part.pk not in matched]
 
             # Check if there is a column corresponding to "Part IPN"
             if i_idx >= 0:
                 row['part_ipn'] = row['data'][i_idx]
 
+            # Check if there is a column corresponding to "Part MPN"
+            if m_idx >= 0:
+                row['part_mpn'] = row['data'][m_idx]
+
             # Check if there is a column corresponding to "Overage" field
             if o_idx >= 0:
                 row['overage'] = row['data'][o_idx]
@@ -1386,18 +1396,17 @@ class BomUpload(InvenTreeRoleMixin, FormView):
                 # If there is an exact match based on PK, use that
                 row['part_match'] = exact_match_part
             else:
-                # Otherwise, check to see if there is a matching IPN
-                try:
-                    if row['part_ipn']:
-                        part_matches = [part for part in self.allowed_parts if part.IPN and row['part_ipn'].lower() == str(part.IPN.lower())]
-    
-                        # Check for single match
-                        if len(part_matches) == 1:
-                            row['part_match'] = part_matches[0]
-
+                # Otherwise, check to see if there is a (single) matching IPN or MPN
+                for key, lookup in [('part_ipn', part_index.match_ipn), ('part_mpn', part_index.match_mpn)]:
+                    if not row.get(key, None):
                         continue
-                except KeyError:
-                    pass
+
+                    part_matches = lookup(row[key]) & allowed_ids
+
+                    if len(part_matches) == 1:
+                        pk = part_matches.pop()
+                        row['part_match'] = next(part for part in allowed_parts if part.pk == pk)
+                        break
 
     def extractDataFromFile(self, bom):
         """ Read data from the BOM file """
@@ -1787,13 +1796,12 @@ class PartExport(AjaxView):
         if len(parts) > 0:
             part_list = part_list.filter(pk__in=parts)
 
-        # Prefetch related fields to reduce DB hits
-        part_list = part_list.prefetch_related(
+        # Fetch related fields to reduce DB hits
+        part_list = part_list.select_related(
             'category',
-            'used_in',
-            'builds',
-            'supplier_parts__purchase_order_line_items',
-            'stock_items__allocations',
+            'default_location',
+            'default_supplier',
+            'variant_of',
         )
 
         return part_list
@@ -1802,10 +1810,7 @@ class PartExport(AjaxView):
 
         parts = self.get_parts(request)
 
-        dataset = PartResource().export(queryset=parts)
-
-        csv = dataset.export('csv')
-        return DownloadFile(csv, 'InvenTree_Parts.csv')
+        return DownloadExport(PartResource(), parts, 'csv', 'InvenTree_Parts.csv')
 
 
 class BomUploadTemplate(AjaxView):
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import logging
+
+from django.conf import settings
 from django.utils.translation import ugettext as _
 from django.conf.urls import url, include
-from django.core.exceptions import ValidationError, FieldError
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 from django_filters.rest_framework import DjangoFilterBackend
 
@@ -31,6 +33,10 @@ from .serializers import BuildReportSerializer
 from .serializers import BOMReportSerializer
 from .serializers import POReportSerializer
 from .serializers import SOReportSerializer
+from .stream import PdfStream
+
+
+logger = logging.getLogger(__name__)
 
 
 class ReportListView(generics.ListAPIView):
@@ -81,7 +87,7 @@ class StockItemReportMixin:
                 pass
 
         # List of StockItems which match provided values
-        valid_items = StockItem.objects.filter(pk__in=valid_ids)
+        valid_items = StockItem.objects.filter(pk__in=valid_ids).select_related('part')
 
         return valid_items
 
@@ -190,6 +196,63 @@ class ReportPrintMixin:
     Mixin for printing reports
     """
 
+    def render_pdf(self, report, request, items_to_print):
+        """
+        Render the report against each item, and merge the pages into a single PDF file.
+
+        All rendered documents are held in memory, and so this is only suitable for a small number of items.
+        """
+
+        pages = []
+        document = None
+
+        for item in items_to_print:
+            report.object_to_print = item
+
+            doc = report.render(request).get_document()
+
+            if document is None:
+                document = doc
+
+            pages += doc.pages
+
+        return document.copy(pages).write_pdf()
+
+    def render_pdf_chunked(self, report, request, items_to_print, chunk_size, first=None):
+        """
+        Render the report against each item, in chunks of (at most) chunk_size items.
+
+        Yields the merged PDF file incrementally (see report.stream.PdfStream):
+        the output for each chunk is returned as soon as the chunk is rendered,
+        so only a single chunk of rendered documents is held in memory at any time.
+
+        Args:
+            first: Rendered output for the first chunk (if it has already been rendered)
+
+        If a later chunk fails to render, the error is logged and the stream is ended
+        without writing the end of the file, so that the client does not receive
+        a valid (but incomplete) PDF file.
+        """
+
+        if first is None:
+            first = self.render_pdf(report, request, items_to_print[:chunk_size])
+
+        stream = PdfStream()
+
+        yield stream.start()
+        yield stream.append(first)
+
+        for idx in range(chunk_size, len(items_to_print), chunk_size):
+            try:
+                pdf = self.render_pdf(report, request, items_to_print[idx:idx + chunk_size])
+            except Exception:
+                logger.exception(f"Failed to render report '{report.name}' (items {idx} - {idx + chunk_size - 1}) - aborting")
+                return
+
+            yield stream.append(pdf)
+
+        yield stream.finish()
+
     def print(self, request, items_to_print):
         """
         Print this report template against a number of pre-validated items.
@@ -203,54 +266,66 @@ class ReportPrintMixin:
 
             return Response(data, status=400)
 
-        outputs = []
+        report = self.get_object()
+
+        report.prepare(items_to_print)
 
         # In debug mode, generate single HTML output, rather than PDF
         debug_mode = common.models.InvenTreeSetting.get_setting('REPORT_DEBUG_MODE')
 
-        # Merge one or more PDF files into a single download
-        for item in items_to_print:
-            report = self.get_object()
-            report.object_to_print = item
-
-            if debug_mode:
-                outputs.append(report.render_as_string(request))
-            else:
-                outputs.append(report.render(request))
-
         if debug_mode:
             """
             Contatenate all rendered templates into a single HTML string,
             and return the string as a HTML response.
             """
 
+            outputs = []
+
+            for item in items_to_print:
+                report.object_to_print = item
+
+                outputs.append(report.render_as_string(request))
+
             html = "\n".join(outputs)
 
             return HttpResponse(html)
-        else:
+
+        chunk_size = max(1, settings.REPORT_RENDER_CHUNK_SIZE)
+
+        if len(items_to_print) <= chunk_size:
             """
             Concatenate all rendered pages into a single PDF object,
             and return the resulting document!
             """
 
-            pages = []
-
-            if len(outputs) > 1:
-                # If more than one output is generated, merge them into a single file
-                for output in outputs:
-                    doc = output.get_document()
-                    for page in doc.pages:
-                        pages.append(page)
-
-                pdf = outputs[0].get_document().copy(pages).write_pdf()
-            else:
-                pdf = outputs[0].get_document().write_pdf()
+            pdf = self.render_pdf(report, request, items_to_print)
 
             return InvenTree.helpers.DownloadFile(
                 pdf,
                 'inventree_report.pdf',
                 content_type='application/pdf'
             )
+        else:
+            """
+            Render the reports in chunks (to keep memory usage bounded),
+            and stream the merged file back to the client as each chunk is rendered.
+
+            The first chunk is rendered before the response is started,
+            so that a template error is reported as an error response (as per a single chunk).
+            """
+
+            first = self.render_pdf(report, request, items_to_print[:chunk_size])
+
+            response = StreamingHttpResponse(
+                self.render_pdf_chunked(report, request, items_to_print, chunk_size, first=first),
+                content_type='application/pdf'
+            )
+
+            response['Content-Disposition'] = 'attachment; filename={f}'.format(
+                f=InvenTree.helpers.WrapWithQuotes('inventree_report.pdf')
+            )
+
+            return response
 
 
 class StockItemTestReportList(ReportListView, StockItemReportMixin):
@@ -276,44 +351,16 @@ class StockItemTestReportList(ReportListView, StockItemReportMixin):
 
         if len(items) > 0:
             """
-            We wish to filter by stock items.
-
-            We need to compare the 'filters' string of each report,
-            and see if it matches against each of the specified stock items.
-
-            TODO: In the future, perhaps there is a way to make this more efficient.
+            Each template filter is evaluated against all of the specified stock items at once,
+            and only templates which match *every* item are returned.
             """
 
-            valid_report_ids = set()
-
-            for report in queryset.all():
-
-                matches = True
-
-                # Filter string defined for the report object
-                try:
-                    filters = InvenTree.helpers.validateFilterString(report.filters)
-                except:
-                    continue
-
-                for item in items:
-                    item_query = StockItem.objects.filter(pk=item.pk)
-
-                    try:
-                        if not item_query.filter(**filters).exists():
-                            matches = False
-                            break
-                    except FieldError:
-                        matches = False
-                        break
-
-                if matches:
-                    valid_report_ids.add(report.pk)
-                else:
-                    continue
+            valid_ids = [
+                template.pk for template in InvenTree.helpers.filterTemplatesForItems(queryset.all(), StockItem, items)
+            ]
 
             # Reduce queryset to only valid matches
-            queryset = queryset.filter(pk__in=[pk for pk in valid_report_ids])
+            queryset = queryset.filter(pk__in=valid_ids)
         return queryset
 
 
@@ -366,42 +413,16 @@ class BOMReportList(ReportListView, PartReportMixin):
 
         if len(parts) > 0:
             """
-            We wish to filter by part(s).
-
-            We need to compare the 'filters' string of each report,
-            and see if it matches against each of the specified parts.
+            Each template filter is evaluated against all of the specified parts at once,
+            and only templates which match *every* item are returned.
             """
 
-            valid_report_ids = set()
-
-            for report in queryset.all():
-
-                matches = True
-
-                try:
-                    filters = InvenTree.helpers.validateFilterString(report.filters)
-                except ValidationError:
-                    # Filters are ill-defined
-                    continue
-
-                for p in parts:
-                    part_query = part.models.Part.objects.filter(pk=p.pk)
-
-                    try:
-                        if not part_query.filter(**filters).exists():
-                            matches = False
-                            break
-                    except FieldError:
-                        matches = False
-                        break
-
-                if matches:
-                    valid_report_ids.add(report.pk)
-                else:
-                    continue
+            valid_ids = [
+                template.pk for template in InvenTree.helpers.filterTemplatesForItems(queryset.all(), part.models.Part, parts)
+            ]
 
             # Reduce queryset to only valid matches
-            queryset = queryset.filter(pk__in=[pk for pk in valid_report_ids])
+            queryset = queryset.filter(pk__in=valid_ids)
 
         return queryset
 
@@ -455,43 +476,16 @@ class BuildReportList(ReportListView, BuildReportMixin):
 
         if len(builds) > 0:
             """
-            We wish to filter by Build(s)
-
-            We need to compare the 'filters' string of each report,
-            and see if it matches against each of the specified parts
-            
-            # TODO: This code needs some refactoring!
+            Each template filter is evaluated against all of the specified builds at once,
+            and only templates which match *every* item are returned.
             """
 
-            valid_build_ids = set()
-
-            for report in queryset.all():
-
-                matches = True
-
-                try:
-                    filters = InvenTree.helpers.validateFilterString(report.filters)
-                except ValidationError:
-                    continue
-
-                for b in builds:
-                    build_query = build.models.Build.objects.filter(pk=b.pk)
-
-                    try:
-                        if not build_query.filter(**filters).exists():
-                            matches = False
-                            break
-                    except FieldError:
-                        matches = False
-                        break
-
-                if matches:
-                    valid_build_ids.add(report.pk)
-                else:
-                    continue
+            valid_ids = [
+                template.pk for template in InvenTree.helpers.filterTemplatesForItems(queryset.all(), build.models.Build, builds)
+            ]
 
             # Reduce queryset to only valid matches
-            queryset = queryset.filter(pk__in=[pk for pk in valid_build_ids])
+            queryset = queryset.filter(pk__in=valid_ids)
 
         return queryset
 
@@ -535,44 +529,16 @@ class POReportList(ReportListView, OrderReportMixin):
 
         if len(orders) > 0:
             """
-            We wish to filter by purchase orders
-
-            We need to compare the 'filters' string of each report,
-            and see if it matches against each of the specified orders.
-
-            TODO: In the future, perhaps there is a way to make this more efficient.
+            Each template filter is evaluated against all of the specified orders at once,
+            and only templates which match *every* item are returned.
             """
 
-            valid_report_ids = set()
-
-            for report in queryset.all():
-                
-                matches = True
-
-                # Filter string defined for the report object
-                try:
-                    filters = InvenTree.helpers.validateFilterString(report.filters)
-                except:
-                    continue
-
-                for o in orders:
-                    order_query = order.models.PurchaseOrder.objects.filter(pk=o.pk)
-
-                    try:
-                        if not order_query.filter(**filters).exists():
-                            matches = False
-                            break
-                    except FieldError:
-                        matches = False
-                        break
-                
-                if matches:
-                    valid_report_ids.add(report.pk)
-                else:
-                    continue
+            valid_ids = [
+                template.pk for template in InvenTree.helpers.filterTemplatesForItems(queryset.all(), order.models.PurchaseOrder, orders)
+            ]
 
             # Reduce queryset to only valid matches
-            queryset = queryset.filter(pk__in=[pk for pk in valid_report_ids])
+            queryset = queryset.filter(pk__in=valid_ids)
 
         return queryset
 
@@ -618,44 +584,16 @@ class SOReportList(ReportListView, OrderReportMixin):
 
         if len(orders) > 0:
             """
-            We wish to filter by purchase orders
-
-            We need to compare the 'filters' string of each report,
-            and see if it matches against each of the specified orders.
-
-            TODO: In the future, perhaps there is a way to make this more efficient.
+            Each template filter is evaluated against all of the specified orders at once,
+            and only templates which match *every* item are returned.
             """
 
-            valid_report_ids = set()
-
-            for report in queryset.all():
-                
-                matches = True
-
-                # Filter string defined for the report object
-                try:
-                    filters = InvenTree.helpers.validateFilterString(report.filters)
-                except:
-                    continue
-
-                for o in orders:
-                    order_query = order.models.SalesOrder.objects.filter(pk=o.pk)
-
-                    try:
-                        if not order_query.filter(**filters).exists():
-                            matches = False
-                            break
-                    except FieldError:
-                        matches = False
-                        break
-                
-                if matches:
-                    valid_report_ids.add(report.pk)
-                else:
-                    continue
+            valid_ids = [
+                template.pk for template in InvenTree.helpers.filterTemplatesForItems(queryset.all(), order.models.SalesOrder, orders)
+            ]
 
             # Reduce queryset to only valid matches
-            queryset = queryset.filter(pk__in=[pk for pk in valid_report_ids])
+            queryset = queryset.filter(pk__in=valid_ids)
 
         return queryset
 
@@ -24,9 +24,10 @@ import build.models
 import common.models
 import part.models
 import stock.models
+import stock.results
 import order.models
 
-from InvenTree.helpers import validateFilterString
+from InvenTree.helpers import validateFilterString, parseFilterString
 
 from django.utils.translation import gettext_lazy as _
 
@@ -219,6 +220,14 @@ class ReportTemplateBase(ReportBase):
 
         return {}
 
+    def prepare(self, items):
+        """
+        Prepare to render the report against a number of items
+        (e.g. to load any data required for all of the items at once)
+        """
+
+        pass
+
     def context(self, request):
         """
         All context to be passed to the renderer.
@@ -310,7 +319,7 @@ class TestReport(ReportTemplateBase):
         """
 
         try:
-            filters = validateFilterString(self.filters)
+            filters = parseFilterString(self.filters)
             items = stock.models.StockItem.objects.filter(**filters)
         except (ValidationError, FieldError):
             return False
@@ -320,15 +329,33 @@ class TestReport(ReportTemplateBase):
 
         return items.exists()
 
+    # Test results for the stock items to be printed (see prepare)
+    test_results = None
+
+    def prepare(self, items):
+        """
+        Calculate the test results for all of the stock items at once (see stock.results)
+        """
+
+        self.test_results = stock.results.TestResultMap(items, include_installed=self.include_installed)
+
     def get_context_data(self, request):
 
         stock_item = self.object_to_print
 
+        test_results = self.test_results
+
+        if test_results is None or stock_item.pk not in test_results.results:
+            test_results = stock.results.TestResultMap([stock_item], include_installed=self.include_installed)
+
+        results = test_results.get(stock_item)
+
         return {
             'stock_item': stock_item,
             'part': stock_item.part,
-            'results': stock_item.testResultMap(include_installed=self.include_installed),
-            'result_list': stock_item.testResultList(include_installed=self.include_installed)
+            'results': results,
+            'result_list': list(results.values()),
+            'test_status': test_results.required_status(stock_item),
         }
 
 
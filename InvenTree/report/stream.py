@@ -0,0 +1,198 @@
+"""
+Streamed merging of PDF files.
+
+Merging PDF files with PyPDF2 (PdfFileMerger) holds every page of every input file in memory,
+and the merged file can only be written once all of the input files are available.
+For a large print job, this means that nothing is sent to the client until the entire job has been rendered.
+
+Instead, the PdfStream class writes the merged file incrementally:
+
+- The objects for the pages of each input file are copied (and renumbered) as soon as the file is appended,
+  and the output for that file is returned straight away
+- Only the page references and the object offsets are kept until the end of the file
+- The page tree, document catalog and cross-reference table are written last
+
+Note: Only the pages (and the objects they refer to) are copied.
+Document level information in the input files (e.g. outlines and named destinations) is discarded.
+"""
+
+import io
+
+from PyPDF2 import PdfFileReader
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+)
+
+
+class PdfStream:
+    """
+    Incrementally written PDF file, made up of the pages of other PDF files.
+
+    Usage:
+        stream = PdfStream()
+
+        yield stream.start()
+
+        for pdf in files:
+            yield stream.append(pdf)
+
+        yield stream.finish()
+    """
+
+    # Fixed object numbers for the document catalog and the page tree
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self):
+        self.position = 0
+        self.offsets = {}
+        self.count = self.PAGES
+        self.kids = []
+
+    def allocate(self):
+        """ Allocate a new object number """
+
+        self.count += 1
+
+        return self.count
+
+    def emit(self, data):
+        """ Account for data which is written to the output """
+
+        self.position += len(data)
+
+        return data
+
+    def write_object(self, output, number, obj):
+        """ Write an object to the output buffer (recording the offset of the object) """
+
+        self.offsets[number] = self.position + output.tell()
+
+        output.write(b'%d 0 obj\n' % number)
+        obj.writeToStream(output, None)
+        output.write(b'\nendobj\n')
+
+    def start(self):
+        """ Return the file header """
+
+        return self.emit(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def append(self, stream):
+        """
+        Append the pages of a PDF file.
+
+        Args:
+            stream: Binary file object (or bytes) containing the PDF file
+
+        Returns:
+            The output data for the appended pages
+        """
+
+        if isinstance(stream, bytes):
+            stream = io.BytesIO(stream)
+
+        reader = PdfFileReader(stream, strict=False)
+
+        # Map of (object number, generation) in the input file to object number in the output file
+        numbers = {}
+
+        # Objects which have been numbered, but not yet written
+        pending = []
+
+        def reference(indirect):
+            key = (indirect.idnum, indirect.generation)
+
+            if key not in numbers:
+                numbers[key] = self.allocate()
+                pending.append((numbers[key], key, indirect))
+
+            return IndirectObject(numbers[key], 0, None)
+
+        def copy(obj, exclude=()):
+            if isinstance(obj, IndirectObject):
+                return reference(obj)
+
+            if isinstance(obj, DictionaryObject):
+                if isinstance(obj, StreamObject):
+                    result = EncodedStreamObject() if isinstance(obj, EncodedStreamObject) else DecodedStreamObject()
+                    result._data = obj._data
+                else:
+                    result = DictionaryObject()
+
+                for key, value in obj.items():
+                    if key not in exclude:
+                        result[key] = copy(value)
+
+                return result
+
+            if isinstance(obj, ArrayObject):
+                return ArrayObject([copy(value) for value in obj])
+
+            return obj
+
+        # The (flattened) pages include any attributes inherited from the page tree of the input file
+        pages = {}
+
+        for idx in range(reader.getNumPages()):
+            page = reader.getPage(idx)
+
+            key = (page.indirectRef.idnum, page.indirectRef.generation)
+
+            pages[key] = page
+
+            self.kids.append(reference(page.indirectRef))
+
+        output = io.BytesIO()
+
+        while len(pending) > 0:
+            number, key, indirect = pending.pop(0)
+
+            if key in pages:
+                obj = copy(pages[key], exclude=['/Parent'])
+                obj[NameObject('/Parent')] = IndirectObject(self.PAGES, 0, None)
+            else:
+                obj = copy(indirect.getObject())
+
+            self.write_object(output, number, obj)
+
+        return self.emit(output.getvalue())
+
+    def finish(self):
+        """ Return the page tree, document catalog, cross-reference table and trailer """
+
+        output = io.BytesIO()
+
+        pages = DictionaryObject()
+        pages[NameObject('/Type')] = NameObject('/Pages')
+        pages[NameObject('/Kids')] = ArrayObject(self.kids)
+        pages[NameObject('/Count')] = NumberObject(len(self.kids))
+
+        self.write_object(output, self.PAGES, pages)
+
+        catalog = DictionaryObject()
+        catalog[NameObject('/Type')] = NameObject('/Catalog')
+        catalog[NameObject('/Pages')] = IndirectObject(self.PAGES, 0, None)
+
+        self.write_object(output, self.CATALOG, catalog)
+
+        xref = self.position + output.tell()
+
+        size = self.count + 1
+
+        output.write(b'xref\n0 %d\n' % size)
+        output.write(b'0000000000 65535 f \n')
+
+        for number in range(1, size):
+            output.write(b'%010d 00000 n \n' % self.offsets[number])
+
+        output.write(b'trailer\n<< /Size %d /Root %d 0 R >>\n' % (size, self.CATALOG))
+        output.write(b'startxref\n%d\n%%%%EOF\n' % xref)
+
+        return self.emit(output.getvalue())
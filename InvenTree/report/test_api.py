@@ -0,0 +1,116 @@
+# Tests for the report API
+
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+
+from unittest import mock
+
+from django.urls import reverse
+from django.test import override_settings
+
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from PyPDF2.utils import PdfReadError
+
+from InvenTree.api_tester import InvenTreeAPITestCase
+
+from stock.models import StockItem
+
+from .api import ReportPrintMixin
+from .models import TestReport
+
+
+@override_settings(REPORT_RENDER_CHUNK_SIZE=2)
+class ReportPrintTest(InvenTreeAPITestCase):
+    """
+    Tests for printing reports in chunks (which are streamed to the client)
+    """
+
+    fixtures = [
+        'category',
+        'part',
+        'location',
+        'stock',
+    ]
+
+    roles = [
+        'stock.view',
+    ]
+
+    def setUp(self):
+
+        super().setUp()
+
+        self.report = TestReport.objects.create(
+            name='Test report',
+            description='A test report',
+            template='report/inventree_test_report.html',
+        )
+
+        self.url = reverse('api-stockitem-testreport-print', kwargs={'pk': self.report.pk})
+
+        self.items = list(StockItem.objects.order_by('pk').values_list('pk', flat=True)[:5])
+
+        # Pages rendered for each chunk
+        self.chunks = []
+
+    def render_pdf(self, view, report, request, items_to_print):
+        """ Render a blank page for each item (in place of the report template) """
+
+        if len(self.chunks) in self.failures:
+            raise ValueError("Render failed")
+
+        self.chunks.append(len(items_to_print))
+
+        writer = PdfFileWriter()
+
+        for item in items_to_print:
+            writer.addBlankPage(100, 100)
+
+        output = io.BytesIO()
+        writer.write(output)
+
+        return output.getvalue()
+
+    def print(self, failures=()):
+
+        self.failures = failures
+
+        with mock.patch.object(ReportPrintMixin, 'render_pdf', side_effect=self.render_pdf, autospec=True):
+            response = self.client.get(self.url, {'item': self.items})
+
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+
+        return response, content
+
+    def test_chunked(self):
+
+        response, content = self.print()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        self.assertEqual(self.chunks, [2, 2, 1])
+
+        reader = PdfFileReader(io.BytesIO(content), strict=True)
+
+        self.assertEqual(reader.getNumPages(), 5)
+
+    def test_first_chunk_error(self):
+        # An error in the first chunk occurs before the response is started
+        with self.assertRaises(ValueError):
+            self.print(failures=[0])
+
+        self.assertEqual(self.chunks, [])
+
+    def test_later_chunk_error(self):
+        # An error in a later chunk ends the stream, without completing the file
+        with self.assertLogs('report.api', level='ERROR'):
+            response, content = self.print(failures=[1])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.chunks, [2])
+
+        with self.assertRaises(PdfReadError):
+            PdfFileReader(io.BytesIO(content), strict=True)
@@ -1,2 +1,50 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+
+import io
+
+from django.test import SimpleTestCase
+
+from PyPDF2 import PdfFileReader, PdfFileWriter
+
+from .stream import PdfStream
+
+
+class PdfStreamTest(SimpleTestCase):
+    """ Tests for incrementally merging PDF files """
+
+    def make_pdf(self, pages, width):
+        """ Return a PDF file with the provided number of (blank) pages """
+
+        writer = PdfFileWriter()
+
+        for idx in range(pages):
+            writer.addBlankPage(width, 100)
+
+        output = io.BytesIO()
+        writer.write(output)
+
+        return output.getvalue()
+
+    def test_merge(self):
+
+        stream = PdfStream()
+
+        outputs = [
+            stream.start(),
+            stream.append(self.make_pdf(2, 100)),
+            stream.append(io.BytesIO(self.make_pdf(3, 200))),
+            stream.finish(),
+        ]
+
+        # Each chunk produces output as soon as it is appended
+        for output in outputs:
+            self.assertGreater(len(output), 0)
+
+        reader = PdfFileReader(io.BytesIO(b''.join(outputs)), strict=True)
+
+        self.assertEqual(reader.getNumPages(), 5)
+
+        widths = [float(reader.getPage(idx).mediaBox.getWidth()) for idx in range(5)]
+
+        self.assertEqual(widths, [100, 100, 200, 200, 200])
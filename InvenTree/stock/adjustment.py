@@ -0,0 +1,341 @@
+"""
+Batched stock adjustments.
+
+Adjusting stock items one at a time (via StockItem.stocktake, add_stock, take_stock or move)
+saves each item individually (with full validation), and creates a separate StockItemTracking entry for each item.
+
+Instead, the StockAdjustment class processes a batch of adjustments in a single transaction:
+
+- The affected stock items are loaded (and locked, using select_for_update) with a single query
+- Quantity / location changes are written using bulk_update
+- Tracking entries are written using bulk_create
+
+Any adjustments which cannot be performed are reported (per item),
+without preventing the other adjustments in the batch.
+
+Note: Some adjustments are still performed individually, as they change the stock item tree:
+
+- Moving part of the quantity of a stock item (which splits the stock item)
+- Removing all the stock from an item which is deleted once depleted
+"""
+
+import logging
+
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils.translation import gettext_lazy as _
+
+from InvenTree import helpers
+from InvenTree.status_codes import StockStatus
+
+import common.models
+
+from part.models import PartStockSummary
+
+from .models import StockItem, StockItemTracking, StockLocation
+
+
+logger = logging.getLogger(__name__)
+
+
+class StockAdjustmentResult:
+    """
+    Summary of a batch of stock adjustments.
+
+    Attributes:
+        adjusted: List of StockItem objects which were adjusted
+        errors: Dict of {pk: error_message} for each adjustment which could not be performed
+    """
+
+    def __init__(self):
+        self.adjusted = []
+        self.errors = {}
+
+    @property
+    def count(self):
+        return len(self.adjusted)
+
+    def has_errors(self):
+        return len(self.errors) > 0
+
+
+class StockAdjustment:
+    """
+    Perform a batch of stock adjustments of the same type.
+
+    Each adjustment is specified as a (stock_item, quantity) pair,
+    where stock_item is a StockItem object or pk value.
+
+    Actions:
+        count: Set the quantity of each item (stocktake)
+        add: Add the quantity to each item
+        take: Remove the quantity from each item
+        move: Move the quantity of each item to a new location
+    """
+
+    ACTIONS = ['count', 'add', 'take', 'move']
+
+    def __init__(self, action, user, notes='', location=None):
+        """
+        Args:
+            action: Adjustment action (see ACTIONS)
+            user: User performing the adjustment
+            notes: Notes added to each tracking entry
+            location: Destination location (for the 'move' action)
+        """
+
+        if action not in self.ACTIONS:
+            raise ValueError(f"Invalid stock adjustment action: '{action}'")
+
+        if action == 'move' and location is None:
+            raise ValueError("Destination location must be specified")
+
+        self.action = action
+        self.user = user
+        self.notes = notes
+        self.location = location
+
+        self.today = datetime.now().date()
+
+        # String representation of each location (which requires a query for each location)
+        self.location_names = {}
+
+        # Moved stock items take the owner of the destination location (if ownership control is enabled)
+        self.owner = None
+
+        if action == 'move' and common.models.InvenTreeSetting.get_setting('STOCK_OWNERSHIP_CONTROL'):
+            self.owner = location.owner
+
+    def get_location_name(self, location):
+
+        if location.pk not in self.location_names:
+            self.location_names[location.pk] = str(location)
+
+        return self.location_names[location.pk]
+
+    def track(self, item, title, notes=None):
+        """ Construct (but do not save) a tracking entry for a stock item """
+
+        return StockItemTracking(
+            item=item,
+            title=title,
+            user=self.user,
+            quantity=item.quantity,
+            date=self.today,
+            notes=self.notes if notes is None else notes,
+            system=True,
+        )
+
+    def is_in_stock(self, item):
+        """ Check (without a query) whether a stock item is "in stock" (see StockItem.IN_STOCK_FILTER) """
+
+        return all([
+            item.quantity > 0,
+            item.sales_order_id is None,
+            item.belongs_to_id is None,
+            item.customer_id is None,
+            not item.is_building,
+            item.status in StockStatus.AVAILABLE_CODES,
+        ])
+
+    def adjust(self, item, quantity):
+        """
+        Calculate the adjustment for a single item (without saving).
+
+        Returns a tuple of (fields, tracking_title), where fields is the list of fields which have been changed.
+
+        Raises ValueError (with an error message) if the adjustment is not valid.
+        """
+
+        if quantity < 0:
+            raise ValueError(_('Quantity must not be less than zero'))
+
+        if self.action == 'move':
+
+            if not self.is_in_stock(item):
+                raise ValueError(_("StockItem cannot be moved as it is not in stock"))
+
+            if quantity <= 0:
+                raise ValueError(_('Quantity must be greater than zero'))
+
+            if quantity > item.quantity:
+                raise ValueError(_('Quantity must not exceed {x}').format(x=helpers.normalize(item.quantity)))
+
+            if item.location_id == self.location.pk and quantity == item.quantity:
+                raise ValueError(_('Stock item is already in the selected location'))
+
+            msg = f"{_('Moved to')} {self.get_location_name(self.location)}"
+
+            if item.location is not None:
+                msg += f" ({_('from')} {self.get_location_name(item.location)})"
+
+            item.location = self.location
+
+            fields = ['location']
+
+            if self.owner is not None:
+                item.owner = self.owner
+                fields.append('owner')
+
+            return fields, msg
+
+        if item.infinite:
+            raise ValueError(_('Quantity of this stock item cannot be adjusted'))
+
+        if item.serialized:
+            raise ValueError(_('Quantity of serialized stock cannot be adjusted'))
+
+        fields = ['quantity']
+
+        if self.action == 'count':
+            item.quantity = quantity
+            item.stocktake_date = self.today
+            item.stocktake_user = self.user
+
+            fields += ['stocktake_date', 'stocktake_user']
+
+            return fields, f"{_('Counted')} {helpers.normalize(quantity)} {_('items')}"
+
+        if quantity <= 0:
+            raise ValueError(_('Quantity must be greater than zero'))
+
+        if self.action == 'add':
+            item.quantity = item.quantity + quantity
+            return fields, f"{_('Added')} {helpers.normalize(quantity)} {_('items')}"
+
+        # Remove stock
+        item.quantity = max(item.quantity - quantity, 0)
+
+        return fields, f"{_('Removed')} {helpers.normalize(quantity)} {_('items')}"
+
+    def load_related(self, items):
+        """ Load the current location of each stock item (for the tracking notes) """
+
+        if self.action != 'move':
+            return
+
+        locations = StockLocation.objects.in_bulk(set([item.location_id for item in items if item.location_id]))
+
+        for item in items:
+            if item.location_id:
+                item.location = locations[item.location_id]
+
+    def lock_items(self, pks):
+        """ Load (and lock) the stock items to be adjusted. Returns a dict of {pk: StockItem} """
+
+        items = StockItem.objects.filter(pk__in=pks)
+
+        if connection.features.has_select_for_update_of:
+            # Only lock the stock item rows (not any related rows)
+            items = items.select_for_update(of=('self',))
+        else:
+            items = items.select_for_update()
+
+        return items.in_bulk()
+
+    def save(self, updated):
+        """ Write the changed fields for the adjusted items (grouped by the set of changed fields) """
+
+        groups = defaultdict(list)
+
+        for item, fields in updated.values():
+            groups[tuple(fields)].append(item)
+
+        for fields, items in groups.items():
+            StockItem.objects.bulk_update(items, list(fields) + ['updated'], batch_size=500)
+
+    @transaction.atomic
+    def run(self, adjustments):
+        """
+        Perform the provided adjustments.
+
+        Args:
+            adjustments: List of (stock_item, quantity) pairs
+
+        Returns:
+            StockAdjustmentResult object
+        """
+
+        result = StockAdjustmentResult()
+
+        quantities = []
+
+        for stock_item, quantity in adjustments:
+            quantities.append((getattr(stock_item, 'pk', stock_item), quantity))
+
+        items = self.lock_items([pk for pk, quantity in quantities])
+
+        self.load_related(items.values())
+
+        updated = {}
+        tracking = []
+        part_ids = set()
+
+        # Stock items which have already been adjusted (in this batch)
+        adjusted = set()
+
+        for pk, quantity in quantities:
+
+            item = items.get(pk, None)
+
+            if item is None:
+                result.errors[pk] = _('Stock item does not exist')
+                continue
+
+            if pk in adjusted:
+                result.errors[pk] = _('Stock item can only be adjusted once')
+                continue
+
+            if self.action == 'move' and 0 < quantity < item.quantity and self.is_in_stock(item):
+                # Moving part of the stock requires the item to be split (as per StockItem.move)
+                try:
+                    with transaction.atomic():
+                        new_item = item.splitStock(quantity, self.location, self.user)
+
+                        if self.owner is not None:
+                            new_item.owner = self.owner
+                            new_item.save()
+                except ValidationError as e:
+                    result.errors[pk] = '; '.join(e.messages)
+                    continue
+
+                adjusted.add(pk)
+                result.adjusted.append(item)
+                continue
+
+            try:
+                fields, title = self.adjust(item, quantity)
+            except ValueError as e:
+                result.errors[pk] = str(e)
+                continue
+
+            part_ids.add(item.part_id)
+            adjusted.add(pk)
+            result.adjusted.append(item)
+
+            if item.quantity == 0 and item.delete_on_deplete and item.can_delete():
+                # Depleted items are deleted individually (as per StockItem.updateQuantity)
+                item.delete()
+                continue
+
+            item.updated = self.today
+            updated[pk] = (item, fields)
+
+            tracking.append(self.track(item, title))
+
+        self.save(updated)
+
+        StockItemTracking.objects.bulk_create(tracking, batch_size=500)
+
+        # Bulk operations do not trigger the post_save signal, so update the stock summary (and location tree) here
+        PartStockSummary.update_parts(part_ids, create=False)
+
+        StockLocation.invalidate_tree()
+        transaction.on_commit(StockLocation.invalidate_tree)
+
+        logger.info(f"Stock adjustment '{self.action}': {result.count} items adjusted, {len(result.errors)} errors")
+
+        return result
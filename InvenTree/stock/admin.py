@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 
 from django.contrib import admin
+from django.db import transaction
 
 from import_export.admin import ImportExportModelAdmin
 from import_export.resources import ModelResource
@@ -17,6 +18,9 @@ from company.models import Company, SupplierPart
 from order.models import PurchaseOrder, SalesOrder
 from part.models import Part
 
+from InvenTree.exporter import ExportResourceMixin
+from InvenTree.helpers import str2bool
+
 
 class LocationResource(ModelResource):
     """ Class for managing StockLocation data import/export """
@@ -36,12 +40,15 @@ class LocationResource(ModelResource):
             'lft', 'rght', 'tree_id', 'level',
         ]
 
-    def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
-
-        super().after_import(dataset, result, using_transactions, dry_run, **kwargs)
+    def import_data(self, *args, **kwargs):
+        """
+        Delay updates to the StockLocation tree until the import is complete,
+        and then rebuild only the tree(s) which were affected
+        """
 
-        # Rebuild the StockLocation tree(s)
-        StockLocation.objects.rebuild()
+        with transaction.atomic():
+            with StockLocation.objects.delay_mptt_updates():
+                return super().import_data(*args, **kwargs)
 
 
 class LocationAdmin(ImportExportModelAdmin):
@@ -53,7 +60,7 @@ class LocationAdmin(ImportExportModelAdmin):
     search_fields = ('name', 'description')
 
 
-class StockItemResource(ModelResource):
+class StockItemResource(ExportResourceMixin, ModelResource):
     """ Class for managing StockItem data import/export """
 
     # Custom manaegrs for ForeignKey fields
@@ -90,12 +97,35 @@ class StockItemResource(ModelResource):
     
     stocktake_date = Field(attribute='stocktake_date', widget=widgets.DateWidget())
 
-    def after_import(self, dataset, result, using_transactions, dry_run, **kwargs):
+    def get_queryset(self):
+        """ Fetch related data for quicker access """
+
+        query = super().get_queryset()
+        query = query.select_related(
+            'part',
+            'supplier_part__supplier',
+            'customer',
+            'location',
+            'belongs_to',
+            'build',
+            'parent',
+            'sales_order',
+            'purchase_order',
+        )
+
+        return query
 
-        super().after_import(dataset, result, using_transactions, dry_run, **kwargs)
+    def import_data(self, *args, **kwargs):
+        """
+        Delay updates to the StockItem tree until the import is complete,
+        and then rebuild only the tree(s) which were affected.
 
-        # Rebuild the StockItem tree(s)
-        StockItem.objects.rebuild()
+        Note: For large datasets, use the 'import_stock' management command instead (see stock.importer)
+        """
+
+        with transaction.atomic():
+            with StockItem.objects.delay_mptt_updates():
+                return super().import_data(*args, **kwargs)
 
     class Meta:
         model = StockItem
@@ -109,6 +139,88 @@ class StockItemResource(ModelResource):
         ]
 
 
+def stock_export_queryset(params):
+    """
+    Return the StockItem queryset to be exported (via StockItemResource),
+    filtered by the provided parameters (e.g. the query parameters of a StockExport request)
+    """
+
+    # Check if a particular location was specified
+    loc_id = params.get('location', None)
+    location = None
+
+    if loc_id:
+        try:
+            location = StockLocation.objects.get(pk=loc_id)
+        except (ValueError, StockLocation.DoesNotExist):
+            pass
+
+    # Check if a particular supplier was specified
+    sup_id = params.get('supplier', None)
+    supplier = None
+
+    if sup_id:
+        try:
+            supplier = Company.objects.get(pk=sup_id)
+        except (ValueError, Company.DoesNotExist):
+            pass
+
+    # Check if a particular supplier_part was specified
+    sup_part_id = params.get('supplier_part', None)
+    supplier_part = None
+
+    if sup_part_id:
+        try:
+            supplier_part = SupplierPart.objects.get(pk=sup_part_id)
+        except (ValueError, SupplierPart.DoesNotExist):
+            pass
+
+    # Check if a particular part was specified
+    part_id = params.get('part', None)
+    part = None
+
+    if part_id:
+        try:
+            part = Part.objects.get(pk=part_id)
+        except (ValueError, Part.DoesNotExist):
+            pass
+
+    if location:
+        # CHeck if locations should be cascading
+        cascade = str2bool(params.get('cascade', True))
+        stock_items = location.get_stock_items(cascade)
+    else:
+        cascade = True
+        stock_items = StockItem.objects.all()
+
+    if part:
+        stock_items = stock_items.filter(part=part)
+
+    if supplier:
+        stock_items = stock_items.filter(supplier_part__supplier=supplier)
+
+    if supplier_part:
+        stock_items = stock_items.filter(supplier_part=supplier_part)
+
+    # Filter out stock items that are not 'in stock'
+    stock_items = stock_items.filter(StockItem.IN_STOCK_FILTER)
+
+    # Fetch related fields to reduce DB queries
+    stock_items = stock_items.select_related(
+        'part',
+        'supplier_part__supplier',
+        'customer',
+        'location',
+        'belongs_to',
+        'build',
+        'parent',
+        'sales_order',
+        'purchase_order',
+    )
+
+    return stock_items
+
+
 class StockItemAdmin(ImportExportModelAdmin):
 
     resource_class = StockItemResource
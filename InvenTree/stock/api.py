@@ -16,6 +16,8 @@ from .models import StockLocation, StockItem
 from .models import StockItemTracking
 from .models import StockItemAttachment
 from .models import StockItemTestResult
+from .adjustment import StockAdjustment
+from .results import installed_items, latest_results
 
 from part.models import Part, PartCategory
 from part.serializers import PartBriefSerializer
@@ -35,6 +37,7 @@ from .serializers import StockItemTestResultSerializer
 from InvenTree.views import TreeSerializer
 from InvenTree.helpers import str2bool, isNull
 from InvenTree.api import AttachmentMixin
+from InvenTree.serializers import get_requested_fields
 
 from decimal import Decimal, InvalidOperation
 
@@ -50,13 +53,12 @@ class StockCategoryTree(TreeSerializer):
     title = 'Stock'
     model = StockLocation
 
+    cache_timeout = 3600
+
     @property
     def root_url(self):
         return reverse('stock-index')
 
-    def get_items(self):
-        return StockLocation.objects.all().prefetch_related('stock_items', 'children')
-
     permission_classes = [
         permissions.IsAuthenticated,
     ]
@@ -122,14 +124,17 @@ class StockAdjust(APIView):
     - StockRemove: remove stock items
     - StockTransfer: transfer stock items
 
-    # TODO - This needs serious refactoring!!!
-
+    Adjustments are performed as a single batch (see stock.adjustment).
+    Any items which could not be adjusted are reported in the 'errors' field of the response.
     """
 
     queryset = StockItem.objects.none()
 
     allow_missing_quantity = False
 
+    # Adjustment action (see StockAdjustment.ACTIONS)
+    adjustment_action = None
+
     def get_items(self, request):
         """
         Return a list of items posted to the endpoint.
@@ -146,18 +151,29 @@ class StockAdjust(APIView):
         else:
             raise ValidationError({'items': 'Request must contain list of stock items'})
 
+        for entry in _items:
+            if not type(entry) == dict:
+                raise ValidationError({'error': 'Improperly formatted data'})
+
+        # Load all the referenced stock items at once
+        pks = set()
+
+        for entry in _items:
+            try:
+                pks.add(int(entry.get('pk', None)))
+            except (ValueError, TypeError):
+                pass
+
+        stock_items = StockItem.objects.in_bulk(pks)
+
         # List of validated items
         self.items = []
 
         for entry in _items:
 
-            if not type(entry) == dict:
-                raise ValidationError({'error': 'Improperly formatted data'})
-
             try:
-                pk = entry.get('pk', None)
-                item = StockItem.objects.get(pk=pk)
-            except (ValueError, StockItem.DoesNotExist):
+                item = stock_items[int(entry.get('pk', None))]
+            except (ValueError, TypeError, KeyError):
                 raise ValidationError({'pk': 'Each entry must contain a valid pk field'})
 
             if self.allow_missing_quantity and 'quantity' not in entry:
@@ -178,24 +194,41 @@ class StockAdjust(APIView):
 
         self.notes = str(request.data.get('notes', ''))
 
+    def adjust(self, request, location=None):
+        """
+        Perform the adjustment for all posted items.
+
+        Returns a StockAdjustmentResult object
+        """
+
+        adjustment = StockAdjustment(self.adjustment_action, request.user, notes=self.notes, location=location)
+
+        return adjustment.run([(item['item'], item['quantity']) for item in self.items])
+
+    def get_response(self, result, message):
+
+        data = {'success': message}
+
+        if result.has_errors():
+            data['errors'] = result.errors
+
+        return Response(data)
+
 
 class StockCount(StockAdjust):
     """
     Endpoint for counting stock (performing a stocktake).
     """
+
+    adjustment_action = 'count'
     
     def post(self, request, *args, **kwargs):
 
         self.get_items(request)
 
-        n = 0
-
-        for item in self.items:
-
-            if item['item'].stocktake(item['quantity'], request.user, notes=self.notes):
-                n += 1
+        result = self.adjust(request)
 
-        return Response({'success': 'Updated stock for {n} items'.format(n=n)})
+        return self.get_response(result, 'Updated stock for {n} items'.format(n=result.count))
 
 
 class StockAdd(StockAdjust):
@@ -203,17 +236,15 @@ class StockAdd(StockAdjust):
     Endpoint for adding a quantity of stock to an existing StockItem
     """
 
+    adjustment_action = 'add'
+
     def post(self, request, *args, **kwargs):
 
         self.get_items(request)
 
-        n = 0
-
-        for item in self.items:
-            if item['item'].add_stock(item['quantity'], request.user, notes=self.notes):
-                n += 1
+        result = self.adjust(request)
 
-        return Response({"success": "Added stock for {n} items".format(n=n)})
+        return self.get_response(result, "Added stock for {n} items".format(n=result.count))
 
 
 class StockRemove(StockAdjust):
@@ -221,18 +252,15 @@ class StockRemove(StockAdjust):
     Endpoint for removing a quantity of stock from an existing StockItem.
     """
 
+    adjustment_action = 'take'
+
     def post(self, request, *args, **kwargs):
 
         self.get_items(request)
-        
-        n = 0
-
-        for item in self.items:
 
-            if item['item'].take_stock(item['quantity'], request.user, notes=self.notes):
-                n += 1
+        result = self.adjust(request)
 
-        return Response({"success": "Removed stock for {n} items".format(n=n)})
+        return self.get_response(result, "Removed stock for {n} items".format(n=result.count))
 
 
 class StockTransfer(StockAdjust):
@@ -242,6 +270,8 @@ class StockTransfer(StockAdjust):
 
     allow_missing_quantity = True
 
+    adjustment_action = 'move'
+
     def post(self, request, *args, **kwargs):
 
         self.get_items(request)
@@ -253,21 +283,18 @@ class StockTransfer(StockAdjust):
         except (ValueError, StockLocation.DoesNotExist):
             raise ValidationError({'location': 'Valid location must be specified'})
 
-        n = 0
-
         for item in self.items:
 
             # If quantity is not specified, move the entire stock
             if item['quantity'] in [0, None]:
                 item['quantity'] = item['item'].quantity
 
-            if item['item'].move(location, self.notes, request.user, quantity=item['quantity']):
-                n += 1
+        result = self.adjust(request, location=location)
 
-        return Response({'success': 'Moved {n} parts to {loc}'.format(
-            n=n,
+        return self.get_response(result, 'Moved {n} parts to {loc}'.format(
+            n=result.count,
             loc=str(location),
-        )})
+        ))
 
 
 class StockLocationList(generics.ListCreateAPIView):
@@ -337,6 +364,16 @@ class StockList(generics.ListCreateAPIView):
     serializer_class = StockItemSerializer
     queryset = StockItem.objects.all()
 
+    def get_serializer(self, *args, **kwargs):
+
+        kwargs['context'] = self.get_serializer_context()
+
+        # Optionally restrict the serialized fields (e.g. ?fields=pk,part,quantity)
+        if self.request is not None and self.request.method == 'GET':
+            kwargs['fields'] = get_requested_fields(self.request)
+
+        return self.serializer_class(*args, **kwargs)
+
     def create(self, request, *args, **kwargs):
         """
         Create a new StockItem object via the API.
@@ -397,15 +434,15 @@ class StockList(generics.ListCreateAPIView):
 
         # Iterate through each StockItem and grab some data
         for item in data:
-            loc = item['location']
+            loc = item.get('location', None)
             if loc:
                 location_ids.add(loc)
 
-            part = item['part']
+            part = item.get('part', None)
             if part:
                 part_ids.add(part)
 
-            sp = item['supplier_part']
+            sp = item.get('supplier_part', None)
 
             if sp:
                 supplier_part_ids.add(sp)
@@ -425,7 +462,7 @@ class StockList(generics.ListCreateAPIView):
 
             # Now update each StockItem with the related Part data
             for stock_item in data:
-                part_id = stock_item['part']
+                part_id = stock_item.get('part', None)
                 stock_item['part_detail'] = part_map.get(part_id, None)
 
         # Do we wish to include SupplierPart detail?
@@ -439,7 +476,7 @@ class StockList(generics.ListCreateAPIView):
                 supplier_part_map[part.pk] = SupplierPartSerializer(part).data
 
             for stock_item in data:
-                part_id = stock_item['supplier_part']
+                part_id = stock_item.get('supplier_part', None)
                 stock_item['supplier_part_detail'] = supplier_part_map.get(part_id, None)
 
         # Do we wish to include StockLocation detail?
@@ -459,7 +496,7 @@ class StockList(generics.ListCreateAPIView):
 
             # Now update each StockItem with the related StockLocation data
             for stock_item in data:
-                loc_id = stock_item['location']
+                loc_id = stock_item.get('location', None)
                 stock_item['location_detail'] = location_map.get(loc_id, None)
 
         """
@@ -901,6 +938,39 @@ class StockItemTestResultList(generics.ListCreateAPIView):
     queryset = StockItemTestResult.objects.all()
     serializer_class = StockItemTestResultSerializer
 
+    def filter_queryset(self, queryset):
+        """
+        Custom filtering:
+
+        - stock_item: Filter by StockItem
+        - include_installed: Include results for stock items installed in the StockItem (and in those items)
+        - latest: Only return the latest result for each test (for each stock item)
+        """
+
+        queryset = super().filter_queryset(queryset)
+
+        params = self.request.query_params
+
+        stock_item = params.get('stock_item', None)
+
+        if stock_item is not None:
+            try:
+                item = StockItem.objects.get(pk=stock_item)
+
+                items = [item]
+
+                if str2bool(params.get('include_installed', False)):
+                    items += installed_items([item], cascade=True)[item.pk]
+
+                queryset = queryset.filter(stock_item__in=items)
+            except (ValueError, StockItem.DoesNotExist):
+                queryset = queryset.none()
+
+        if str2bool(params.get('latest', False)):
+            queryset = latest_results(queryset)
+
+        return queryset
+
     filter_backends = [
         DjangoFilterBackend,
         filters.SearchFilter,
@@ -908,7 +978,6 @@ class StockItemTestResultList(generics.ListCreateAPIView):
     ]
 
     filter_fields = [
-        'stock_item',
         'test',
         'user',
         'result',
@@ -0,0 +1,735 @@
+"""
+Bulk import engine for StockItem data.
+
+Importing stock through the StockItemResource (i.e. via the admin interface)
+saves each row individually, which is very slow for large datasets:
+
+- Each StockItem.save() performs separate validation queries (for the uid and serial number)
+- Each new StockItem creates its own StockItemTracking entry
+- Each new StockItem is inserted into the MPTT tree structure individually
+
+Instead, the StockImporter processes the rows in batches:
+
+- Related objects (part, location, supplier part, etc) are loaded once for each batch
+- Uniqueness of uid and serial number values is checked once for each batch
+- Items (and their tracking entries) are created with bulk_create
+- Each new item is the root of its own tree, so the tree fields are assigned directly
+  (rather than rebuilding the tree structure)
+
+Rows which specify a parent item are saved individually (as they must be inserted into an existing tree),
+with tree updates delayed until the end of the import - at which point only the affected trees are rebuilt.
+
+StockLocation data are imported in bulk by the LocationImporter (see below).
+"""
+
+import time
+import logging
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils.translation import gettext_lazy as _
+
+from InvenTree.helpers import lock_tree_ids, serial_to_int
+
+from part.models import PartStockSummary
+
+from .admin import LocationResource, StockItemResource
+from .models import StockItem, StockItemTracking, StockLocation
+
+
+logger = logging.getLogger(__name__)
+
+
+class StockImportResult:
+    """
+    Summary of a stock import.
+
+    Attributes:
+        total: Number of rows processed
+        created: Number of stock items created
+        errors: List of (row_number, error_dict) tuples (rows are numbered from 1)
+        duration: Time taken (seconds)
+        dry_run: True if the import was not committed to the database
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.created = 0
+        self.errors = []
+        self.duration = 0
+        self.dry_run = False
+
+    def has_errors(self):
+        return len(self.errors) > 0
+
+    @property
+    def rate(self):
+        """ Number of rows processed per second """
+
+        if self.duration > 0:
+            return self.total / self.duration
+        else:
+            return 0
+
+
+class StockImporter:
+    """
+    Import a dataset of StockItem rows.
+
+    Column names match those exported by the StockItemResource
+    (readonly columns such as 'part_name' or 'location_name' are ignored).
+    Related objects are specified by primary key.
+
+    All rows are imported within a single transaction.
+    If any row is invalid, the entire import is rolled back (unless skip_errors is set,
+    in which case the invalid rows are skipped and reported).
+    """
+
+    batch_size = 1000
+
+    # Related objects which are required to validate a StockItem
+    RELATED_FIELDS = {
+        'supplier_part': ['part'],
+        'build': ['part'],
+    }
+
+    def __init__(self, user=None, batch_size=None, skip_errors=False):
+
+        self.user = user
+        self.skip_errors = skip_errors
+
+        if batch_size is not None:
+            self.batch_size = batch_size
+
+        self.resource = StockItemResource()
+
+        # Foreign key fields (which are specified by primary key)
+        self.foreign_keys = {}
+
+        for field in StockItem._meta.concrete_fields:
+            if field.is_relation:
+                self.foreign_keys[field.name] = field
+
+        # Other (writable) fields, which are converted using the resource widgets
+        self.value_fields = {}
+
+        for name, field in self.resource.fields.items():
+            if name in ['id', 'parent'] or name in self.foreign_keys or field.readonly:
+                continue
+
+            try:
+                StockItem._meta.get_field(field.attribute)
+            except Exception:
+                # Not a model field
+                continue
+
+            self.value_fields[name] = field
+
+    def import_rows(self, rows, dry_run=False):
+        """
+        Import the provided rows (an iterable of dicts, e.g. tablib.Dataset.dict)
+
+        Returns a StockImportResult object
+        """
+
+        result = StockImportResult()
+        result.dry_run = dry_run
+
+        t_start = time.time()
+
+        # uid and serial number values which have already been used in this import
+        self.uids = set()
+        self.serials = set()
+
+        with transaction.atomic():
+            with StockItem.objects.delay_mptt_updates():
+
+                batch = []
+
+                for row in rows:
+                    result.total += 1
+                    batch.append((result.total, row))
+
+                    if len(batch) >= self.batch_size:
+                        self.import_batch(batch, result)
+                        batch = []
+
+                if len(batch) > 0:
+                    self.import_batch(batch, result)
+
+            if dry_run or (result.has_errors() and not self.skip_errors):
+                transaction.set_rollback(True)
+                result.created = 0
+            else:
+                StockLocation.invalidate_tree()
+                transaction.on_commit(StockLocation.invalidate_tree)
+
+        result.duration = time.time() - t_start
+
+        logger.info(f"Imported {result.created} stock items ({result.total} rows) in {result.duration:.1f}s")
+
+        return result
+
+    def load_related(self, batch):
+        """
+        Load the related objects referenced by a batch of rows.
+
+        Returns a dict of {field_name: {pk: object}}
+        """
+
+        ids = defaultdict(set)
+
+        for idx, row in batch:
+            for name in self.foreign_keys:
+                value = row.get(name, None)
+
+                if value not in [None, '']:
+                    try:
+                        ids[name].add(int(value))
+                    except (ValueError, TypeError):
+                        pass
+
+        related = {}
+
+        for name, pks in ids.items():
+            query = self.foreign_keys[name].related_model.objects.all()
+
+            if name in self.RELATED_FIELDS:
+                query = query.select_related(*self.RELATED_FIELDS[name])
+
+            related[name] = query.in_bulk(pks)
+
+        return related
+
+    def construct_item(self, row, related):
+        """
+        Construct (but do not save) a StockItem from a row of data.
+
+        Raises ValidationError if the row data are invalid.
+        """
+
+        item = StockItem()
+
+        errors = {}
+
+        for name, field in self.foreign_keys.items():
+            value = row.get(name, None)
+
+            if value in [None, '']:
+                continue
+
+            try:
+                obj = related[name][int(value)]
+            except (ValueError, TypeError, KeyError):
+                errors[name] = [_("Invalid value: '{v}'").format(v=value)]
+                continue
+
+            setattr(item, name, obj)
+
+        for name, field in self.value_fields.items():
+            value = row.get(name, None)
+
+            # Empty values are left at the default value for the field
+            if value in [None, '']:
+                continue
+
+            try:
+                setattr(item, field.attribute, field.clean(row))
+            except (ValueError, ValidationError, ArithmeticError) as e:
+                errors[name] = [str(e)]
+
+        if item.part_id is None and 'part' not in errors:
+            errors['part'] = [_('Part must be specified')]
+
+        if len(errors) > 0:
+            raise ValidationError(errors)
+
+        # Foreign key fields are not checked here (as they have already been loaded),
+        # and the tree fields are assigned when the item is created
+        item.clean_fields(exclude=list(self.foreign_keys.keys()) + ['lft', 'rght', 'tree_id', 'level'])
+        item.clean()
+
+        item.serial_int = serial_to_int(item.serial)
+
+        return item
+
+    def validate_unique(self, items):
+        """
+        Check uid and serial number values for a batch of items, against the database,
+        and against the other items in this import.
+
+        Returns a dict of {row_number: error_dict}
+        """
+
+        errors = {}
+
+        uids = [item.uid for idx, item in items if item.uid]
+
+        existing_uids = set(StockItem.objects.filter(uid__in=uids).values_list('uid', flat=True))
+
+        serials = [item.serial for idx, item in items if item.serial is not None]
+        trees = [item.part.tree_id for idx, item in items if item.serial is not None]
+
+        existing_serials = set(
+            StockItem.objects.filter(
+                part__tree_id__in=trees,
+                serial__in=serials
+            ).values_list('part__tree_id', 'serial')
+        )
+
+        for idx, item in items:
+
+            if item.uid:
+                if item.uid in existing_uids or item.uid in self.uids:
+                    errors[idx] = {'uid': [_("StockItem with this unique identifier already exists")]}
+                    continue
+
+                self.uids.add(item.uid)
+
+            if item.serial is not None:
+                key = (item.part.tree_id, item.serial)
+
+                if key in existing_serials or key in self.serials:
+                    errors[idx] = {'serial': [_("StockItem with this serial number already exists")]}
+                    continue
+
+                self.serials.add(key)
+
+        return errors
+
+    def import_batch(self, batch, result):
+        """
+        Validate and create the stock items for a single batch of rows
+        """
+
+        related = self.load_related(batch)
+
+        items = []
+
+        # Any rows which refer to an existing stock item are rejected
+        ids = set()
+
+        for idx, row in batch:
+            try:
+                ids.add(int(row.get('id', None)))
+            except (ValueError, TypeError):
+                pass
+
+        existing = set([str(pk) for pk in StockItem.objects.filter(pk__in=ids).values_list('pk', flat=True)])
+
+        for idx, row in batch:
+
+            if str(row.get('id', None)) in existing:
+                result.errors.append((idx, {'id': [_('Stock item already exists')]}))
+                continue
+
+            try:
+                item = self.construct_item(row, related)
+            except ValidationError as e:
+                result.errors.append((idx, e.message_dict))
+                continue
+
+            items.append((idx, item))
+
+        errors = self.validate_unique(items)
+
+        for idx, error in errors.items():
+            result.errors.append((idx, error))
+
+        items = [item for idx, item in items if idx not in errors]
+
+        # Stop creating items once an error has occurred, as the import will be rolled back
+        if result.has_errors() and not self.skip_errors:
+            return
+
+        roots = []
+
+        for item in items:
+            if item.parent_id is None:
+                roots.append(item)
+            else:
+                # Items within an existing tree are saved individually
+                item.save(user=self.user)
+                result.created += 1
+
+        self.create_items(roots)
+
+        result.created += len(roots)
+
+        # Bulk operations do not trigger the post_save signal, so update the stock summary here
+        PartStockSummary.update_parts(set([item.part_id for item in items]), create=False)
+
+    def create_items(self, items):
+        """
+        Create new (root) stock items, and their tracking entries
+        """
+
+        if len(items) == 0:
+            return
+
+        # Each item is the root of a new tree
+        StockItem.create_roots(items)
+
+        title = _('Created stock item')
+
+        tracking = []
+
+        for item in items:
+            tracking.append(StockItemTracking(
+                item=item,
+                title=title,
+                user=self.user,
+                quantity=item.quantity,
+                notes=f"{_('Created new stock item for')} {str(item.part)}",
+                system=True,
+            ))
+
+        StockItemTracking.objects.bulk_create(tracking, batch_size=500)
+
+
+class LocationImporter:
+    """
+    Import a dataset of StockLocation rows.
+
+    Column names match those exported by the LocationResource.
+    The parent of each location is specified by primary key, and refers either to an existing location,
+    or to the 'id' value of another row in the dataset (which allows an entire tree to be imported).
+
+    Importing locations through the LocationResource saves each row individually
+    (with separate validation queries for each row). Instead:
+
+    - Rows are validated together, with a single query for the existing locations they refer to
+    - Locations are created with one bulk insert for each level of the imported tree
+    - The tree structure of each affected tree is calculated in memory (in the order used by the tree manager)
+      and written using bulk_update, rather than inserting each location into the tree individually
+
+    As with the StockImporter, all rows are imported within a single transaction.
+    """
+
+    TREE_FIELDS = ['tree_id', 'lft', 'rght', 'level']
+
+    def __init__(self, skip_errors=False):
+
+        self.skip_errors = skip_errors
+
+        self.resource = LocationResource()
+
+        # Foreign key fields (other than the parent location), which are specified by primary key
+        self.foreign_keys = {}
+
+        for field in StockLocation._meta.concrete_fields:
+            if field.is_relation and field.name != 'parent':
+                self.foreign_keys[field.name] = field
+
+        # Other (writable) fields, which are converted using the resource widgets
+        self.value_fields = {}
+
+        for name, field in self.resource.fields.items():
+            if name in ['id', 'parent'] or name in self.foreign_keys or field.readonly:
+                continue
+
+            self.value_fields[name] = field
+
+    def import_rows(self, rows, dry_run=False):
+        """
+        Import the provided rows (an iterable of dicts, e.g. tablib.Dataset.dict)
+
+        Returns a StockImportResult object
+        """
+
+        result = StockImportResult()
+        result.dry_run = dry_run
+
+        t_start = time.time()
+
+        rows = list(rows)
+
+        result.total = len(rows)
+
+        with transaction.atomic():
+            entries = self.construct_locations(rows, result)
+
+            if not result.has_errors() or self.skip_errors:
+                self.create_locations(entries, result)
+
+            if dry_run or (result.has_errors() and not self.skip_errors):
+                transaction.set_rollback(True)
+                result.created = 0
+            else:
+                StockLocation.invalidate_tree()
+                transaction.on_commit(StockLocation.invalidate_tree)
+
+        result.duration = time.time() - t_start
+
+        logger.info(f"Imported {result.created} stock locations ({result.total} rows) in {result.duration:.1f}s")
+
+        return result
+
+    def construct_locations(self, rows, result):
+        """
+        Construct (but do not save) the locations for each row.
+
+        Returns a list of (row_number, key, parent_key, location) tuples,
+        where key is the 'id' value of the row, and parent_key is the 'id' value of the parent row (if any)
+        """
+
+        ids = set()
+        related_ids = {name: set() for name in self.foreign_keys}
+
+        for row in rows:
+            for value in [row.get('id', None), row.get('parent', None)]:
+                try:
+                    ids.add(int(value))
+                except (ValueError, TypeError):
+                    pass
+
+            for name in self.foreign_keys:
+                try:
+                    related_ids[name].add(int(row.get(name, None)))
+                except (ValueError, TypeError):
+                    pass
+
+        existing = StockLocation.objects.in_bulk(ids)
+
+        # The 'id' value of each new row (which may be referenced by the parent value of other rows)
+        keys = set()
+
+        for row in rows:
+            key = str(row.get('id', None) or '').strip()
+
+            if key and not (key.isdigit() and int(key) in existing):
+                keys.add(key)
+
+        related = {}
+
+        for name, pks in related_ids.items():
+            related[name] = self.foreign_keys[name].related_model.objects.in_bulk(pks)
+
+        # Names which are already used under each (existing) parent location
+        siblings = set(StockLocation.objects.filter(parent__in=list(existing.keys())).values_list('parent', 'name'))
+
+        entries = []
+
+        for idx, row in enumerate(rows, start=1):
+
+            key = str(row.get('id', None) or '').strip()
+            parent = str(row.get('parent', None) or '').strip()
+
+            if key and key.isdigit() and int(key) in existing:
+                result.errors.append((idx, {'id': [_('Stock location already exists')]}))
+                continue
+
+            try:
+                location = self.construct_location(row, related)
+            except ValidationError as e:
+                result.errors.append((idx, e.message_dict))
+                continue
+
+            parent_key = None
+
+            if parent in keys:
+                parent_key = parent
+            elif parent:
+                location.parent = existing.get(int(parent), None) if parent.isdigit() else None
+
+                if location.parent is None:
+                    result.errors.append((idx, {'parent': [_("Invalid value: '{v}'").format(v=parent)]}))
+                    continue
+
+            # Names must be unique under each parent location (top level names are not checked, as per validate_unique)
+            sibling = (parent_key or location.parent_id, location.name)
+
+            if sibling[0] is not None:
+                if sibling in siblings:
+                    result.errors.append((idx, {'name': [_('A location with this name already exists at this level')]}))
+                    continue
+
+                siblings.add(sibling)
+
+            entries.append((idx, key, parent_key, location))
+
+        return entries
+
+    def construct_location(self, row, related):
+        """
+        Construct (but do not save) a StockLocation from a row of data.
+
+        Raises ValidationError if the row data are invalid.
+        """
+
+        location = StockLocation()
+
+        errors = {}
+
+        for name in self.foreign_keys:
+            value = row.get(name, None)
+
+            if value in [None, '']:
+                continue
+
+            try:
+                obj = related[name][int(value)]
+            except (ValueError, TypeError, KeyError):
+                errors[name] = [_("Invalid value: '{v}'").format(v=value)]
+                continue
+
+            setattr(location, name, obj)
+
+        for name, field in self.value_fields.items():
+            value = row.get(name, None)
+
+            # Empty values are left at the default value for the field
+            if value in [None, '']:
+                continue
+
+            try:
+                setattr(location, field.attribute, field.clean(row))
+            except (ValueError, ValidationError) as e:
+                errors[name] = [str(e)]
+
+        if len(errors) > 0:
+            raise ValidationError(errors)
+
+        location.clean_fields(exclude=list(self.foreign_keys.keys()) + ['parent'] + self.TREE_FIELDS)
+
+        return location
+
+    def create_locations(self, entries, result):
+        """
+        Create the locations, with one bulk insert for each level of the imported tree,
+        and then write the tree structure of each affected tree.
+        """
+
+        created = {}
+        locations = []
+
+        pending = entries
+
+        # Lock the tree_id range, so that concurrent inserts cannot use the same tree_id values
+        tree_id = lock_tree_ids(StockLocation)
+
+        while len(pending) > 0:
+
+            level = [entry for entry in pending if entry[2] is None or entry[2] in created]
+
+            if len(level) == 0:
+                # The remaining rows refer (directly or indirectly) to a parent which cannot be created
+                for idx, key, parent_key, location in pending:
+                    result.errors.append((idx, {'parent': [_("Invalid value: '{v}'").format(v=parent_key)]}))
+
+                break
+
+            for idx, key, parent_key, location in level:
+                if parent_key is not None:
+                    location.parent = created[parent_key]
+
+                # Each location is temporarily placed in its own tree (the tree structure is written below)
+                tree_id += 1
+
+                location.tree_id = tree_id
+                location.lft = 1
+                location.rght = 2
+                location.level = 0
+
+            batch = [location for idx, key, parent_key, location in level]
+
+            StockLocation.objects.bulk_create(batch, batch_size=500)
+
+            if not connection.features.can_return_rows_from_bulk_insert:
+                # Primary key values are not returned - so look them up by the (unique) tree_id values
+                pks = dict(StockLocation.objects.filter(
+                    tree_id__in=[location.tree_id for location in batch]
+                ).values_list('tree_id', 'pk'))
+
+                for location in batch:
+                    location.pk = pks[location.tree_id]
+
+            for idx, key, parent_key, location in level:
+                if key:
+                    created[key] = location
+
+            locations += batch
+
+            # Rows in the next level may refer to any of the locations created so far
+            done = set([entry[0] for entry in level])
+
+            pending = [entry for entry in pending if entry[0] not in done]
+
+        result.created = len(locations)
+
+        self.build_trees(locations)
+
+    def build_trees(self, locations):
+        """
+        Calculate (and write) the tree structure for each tree which contains a new location.
+
+        New locations are placed in the tree of their top level location,
+        and the nested set values of each affected tree are calculated in a single pass
+        (with siblings ordered by name, as per the tree manager).
+        """
+
+        # Nodes in each affected tree, as {tree_id: [location]}
+        trees = defaultdict(list)
+
+        def root_tree(location):
+            while location.parent is not None and location.parent.pk in new_pks:
+                location = location.parent
+
+            if location.parent is None:
+                return location.tree_id
+
+            return location.parent.tree_id
+
+        new_pks = set([location.pk for location in locations])
+
+        for location in locations:
+            trees[root_tree(location)].append(location)
+
+        existing_trees = set([location.parent.tree_id for location in locations if location.parent is not None and location.parent.pk not in new_pks])
+
+        for pk, parent_id, name, tree_id in StockLocation.objects.filter(tree_id__in=existing_trees).exclude(pk__in=new_pks).values_list('pk', 'parent', 'name', 'tree_id'):
+            node = StockLocation(pk=pk, parent_id=parent_id, name=name)
+            trees[tree_id].append(node)
+
+        updated = []
+
+        for tree_id, nodes in trees.items():
+
+            pks = set([node.pk for node in nodes])
+
+            children = defaultdict(list)
+
+            for node in nodes:
+                children[node.parent_id if node.parent_id in pks else None].append(node)
+
+            for siblings in children.values():
+                siblings.sort(key=lambda node: (node.name, node.pk))
+
+            counter = 0
+
+            # Depth first traversal, with an explicit stack of (node, level, visited) entries
+            stack = [(node, 0, False) for node in reversed(children[None])]
+
+            while len(stack) > 0:
+                node, level, visited = stack.pop()
+
+                counter += 1
+
+                if visited:
+                    node.rght = counter
+                    continue
+
+                node.tree_id = tree_id
+                node.level = level
+                node.lft = counter
+
+                stack.append((node, level, True))
+
+                for child in reversed(children[node.pk]):
+                    stack.append((child, level + 1, False))
+
+            updated += nodes
+
+        StockLocation.objects.bulk_update(updated, self.TREE_FIELDS, batch_size=500)
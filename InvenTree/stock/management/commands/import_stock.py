@@ -0,0 +1,104 @@
+"""
+Custom management command to bulk import stock items (or stock locations) from a data file
+"""
+
+import os
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+import tablib
+
+from stock.importer import LocationImporter, StockImporter
+
+
+class Command(BaseCommand):
+    """
+    Import stock data from a file (e.g. a stocktake exported from another system).
+
+    The file columns match the columns exported by InvenTree.
+    """
+
+    help = 'Bulk import stock items (or stock locations) from a data file'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('filename', type=str, help='Data file (csv / tsv / xls / xlsx / json / yaml)')
+        parser.add_argument('--locations', action='store_true', help='Import stock locations (rather than stock items)')
+        parser.add_argument('--user', type=str, default=None, help='Username to associate with the stock tracking entries')
+        parser.add_argument('--batch-size', type=int, default=None, help='Number of rows to process in each batch')
+        parser.add_argument('--skip-errors', action='store_true', help='Skip invalid rows (rather than cancelling the import)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the data without importing it')
+
+    def load_dataset(self, filename):
+
+        if not os.path.exists(filename):
+            raise CommandError(f"File '{filename}' does not exist")
+
+        ext = os.path.splitext(filename)[1].lower().strip('.')
+
+        if ext in ['xls', 'xlsx']:
+            with open(filename, 'rb') as f:
+                return tablib.Dataset().load(f.read(), format=ext)
+        elif ext in ['csv', 'tsv', 'json', 'yaml']:
+            with open(filename, 'r', encoding='utf-8-sig') as f:
+                return tablib.Dataset().load(f.read(), format=ext)
+        else:
+            raise CommandError(f"Unsupported file format '{ext}'")
+
+    def import_locations(self, dataset, skip_errors, dry_run):
+
+        importer = LocationImporter(skip_errors=skip_errors)
+
+        result = importer.import_rows(dataset.dict, dry_run=dry_run)
+
+        for row, errors in result.errors:
+            for field, messages in errors.items():
+                for message in messages:
+                    self.stderr.write(f"Row {row}: {field}: {message}")
+
+        self.stdout.write(f"Created {result.created} stock locations")
+
+        return result.total, result.duration, result.has_errors() and not skip_errors
+
+    def import_stock(self, dataset, user, batch_size, skip_errors, dry_run):
+
+        importer = StockImporter(user=user, batch_size=batch_size, skip_errors=skip_errors)
+
+        result = importer.import_rows(dataset.dict, dry_run=dry_run)
+
+        for row, errors in result.errors:
+            for field, messages in errors.items():
+                for message in messages:
+                    self.stderr.write(f"Row {row}: {field}: {message}")
+
+        self.stdout.write(f"Created {result.created} stock items")
+
+        return result.total, result.duration, result.has_errors() and not skip_errors
+
+    def handle(self, *args, **kwargs):
+
+        dataset = self.load_dataset(kwargs['filename'])
+
+        dry_run = kwargs['dry_run']
+
+        user = None
+
+        if kwargs['user']:
+            try:
+                user = User.objects.get(username=kwargs['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{kwargs['user']}' does not exist")
+
+        if kwargs['locations']:
+            rows, duration, failed = self.import_locations(dataset, kwargs['skip_errors'], dry_run)
+        else:
+            rows, duration, failed = self.import_stock(dataset, user, kwargs['batch_size'], kwargs['skip_errors'], dry_run)
+
+        rate = rows / duration if duration > 0 else 0
+
+        self.stdout.write(f"Processed {rows} rows in {duration:.2f}s ({rate:.1f} rows/s)")
+
+        if failed:
+            raise CommandError("Import failed - no data were imported")
+        elif dry_run:
+            self.stdout.write("Dry run - no data were imported")
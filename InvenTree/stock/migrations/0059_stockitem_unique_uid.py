@@ -0,0 +1,61 @@
+# Generated by Django 3.0.7 on 2021-04-07 11:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def clear_duplicate_uids(apps, schema_editor):
+    """
+    Before the unique constraint can be added,
+    remove any duplicate uid values (the first StockItem keeps the uid).
+
+    The removed uid is recorded in the tracking history of each affected StockItem,
+    so that the barcode can be re-assigned manually.
+    """
+
+    StockItem = apps.get_model('stock', 'stockitem')
+    StockItemTracking = apps.get_model('stock', 'stockitemtracking')
+
+    duplicates = StockItem.objects.exclude(uid='').values('uid').annotate(n=Count('pk')).filter(n__gt=1)
+
+    for row in duplicates:
+        items = list(StockItem.objects.filter(uid=row['uid']).order_by('pk'))
+
+        first = items[0]
+
+        StockItemTracking.objects.bulk_create([
+            StockItemTracking(
+                item=item,
+                title='Removed duplicate barcode',
+                notes=f"Barcode hash '{row['uid']}' was also assigned to stock item {first.pk}",
+                quantity=item.quantity,
+                system=True,
+            ) for item in items[1:]
+        ])
+
+        StockItem.objects.filter(pk__in=[item.pk for item in items[1:]]).update(uid='')
+
+        logger.warning(
+            f"Removed duplicate barcode hash '{row['uid']}' from stock items {[item.pk for item in items[1:]]} "
+            f"(kept by stock item {first.pk})"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0058_stockitem_packaging'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_uids, reverse_code=migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockitem',
+            constraint=models.UniqueConstraint(condition=models.Q(_negated=True, uid=''), fields=('uid',), name='unique_stockitem_uid'),
+        ),
+    ]
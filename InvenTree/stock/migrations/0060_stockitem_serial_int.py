@@ -0,0 +1,50 @@
+# Generated by Django 3.0.7 on 2021-04-08 09:14
+
+from django.db import migrations, models
+
+
+def update_serial_int(apps, schema_editor):
+    """
+    Calculate the integer value of the serial number for each existing StockItem
+    """
+
+    StockItem = apps.get_model('stock', 'stockitem')
+
+    items = []
+
+    for item in StockItem.objects.exclude(serial=None).only('pk', 'serial').iterator():
+
+        serial = str(item.serial).strip()
+
+        if serial.isdigit() and int(serial) <= 2147483647:
+            item.serial_int = int(serial)
+            items.append(item)
+
+    StockItem.objects.bulk_update(items, ['serial_int'], batch_size=500)
+
+    if len(items) > 0:
+        print(f"Updated serial number values for {len(items)} stock items")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0059_stockitem_unique_uid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockitem',
+            name='serial_int',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='stockitem',
+            index=models.Index(fields=['part', 'serial'], name='stockitem_part_serial'),
+        ),
+        migrations.AddIndex(
+            model_name='stockitem',
+            index=models.Index(fields=['part', 'serial_int'], name='stockitem_part_serial_int'),
+        ),
+        migrations.RunPython(update_serial_int, reverse_code=migrations.RunPython.noop),
+    ]
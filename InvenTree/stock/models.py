@@ -9,15 +9,15 @@ from __future__ import unicode_literals
 import os
 
 from django.utils.translation import gettext_lazy as _
-from django.core.exceptions import ValidationError, FieldError
+from django.core.exceptions import ValidationError
 from django.urls import reverse
 
-from django.db import models, transaction
-from django.db.models import Sum, Q
+from django.db import connection, models, transaction
+from django.db.models import Sum, Q, F, Count, UniqueConstraint
 from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
 from django.dispatch import receiver
 
 from markdownx.models import MarkdownxField
@@ -42,6 +42,7 @@ from users.models import Owner
 
 from company import models as CompanyModels
 from part import models as PartModels
+from stock import results as StockResults
 
 
 class StockLocation(InvenTreeTree):
@@ -112,6 +113,14 @@ class StockLocation(InvenTreeTree):
         """
         return self.stock_item_count()
 
+    @classmethod
+    def get_item_counts(cls):
+        """ Return the number of stock items in each location (not including sublocations) """
+
+        query = StockItem.objects.filter(location__isnull=False).values('location').annotate(count=Count('pk')).order_by()
+
+        return {row['location']: row['count'] for row in query}
+
 
 @receiver(pre_delete, sender=StockLocation, dispatch_uid='stocklocation_delete_log')
 def before_delete_stock_location(sender, instance, using, **kwargs):
@@ -127,6 +136,20 @@ def before_delete_stock_location(sender, instance, using, **kwargs):
         child.save()
 
 
+@receiver(post_save, sender=StockLocation, dispatch_uid='stocklocation_save_tree')
+@receiver(post_delete, sender=StockLocation, dispatch_uid='stocklocation_delete_tree')
+@receiver(post_save, sender='stock.StockItem', dispatch_uid='stockitem_save_location_tree')
+@receiver(post_delete, sender='stock.StockItem', dispatch_uid='stockitem_delete_location_tree')
+def after_location_tree_change(sender, instance, **kwargs):
+    """ Invalidate the cached location tree when a location (or a stock item) is changed """
+
+    StockLocation.invalidate_tree()
+
+    # Invalidate again once the transaction is committed,
+    # in case the tree was cached from uncommitted data
+    transaction.on_commit(StockLocation.invalidate_tree)
+
+
 class StockItem(MPTTModel):
     """
     A StockItem object represents a quantity of physical instances of a part.
@@ -140,6 +163,7 @@ class StockItem(MPTTModel):
         quantity: Number of stocked units
         batch: Batch number for this StockItem
         serial: Unique serial number for this StockItem
+        serial_int: Integer value of the serial number (if the serial number is numeric)
         link: Optional URL to link to external resource
         updated: Date that this stock item was last updated (auto)
         expiry_date: Expiry date of the StockItem (optional)
@@ -171,6 +195,18 @@ class StockItem(MPTTModel):
     # A query filter which can be used to filter StockItem objects which have expired
     EXPIRED_FILTER = IN_STOCK_FILTER & ~Q(expiry_date=None) & Q(expiry_date__lt=datetime.now().date())
 
+    class Meta:
+        constraints = [
+            # A (non-empty) uid must be unique, as it is used to look up scanned barcodes
+            UniqueConstraint(fields=['uid'], condition=~Q(uid=''), name='unique_stockitem_uid'),
+        ]
+
+        indexes = [
+            # Serial number lookups (see stock.serials)
+            models.Index(fields=['part', 'serial'], name='stockitem_part_serial'),
+            models.Index(fields=['part', 'serial_int'], name='stockitem_part_serial_int'),
+        ]
+
     def save(self, *args, **kwargs):
         """
         Save this StockItem to the database. Performs a number of checks:
@@ -225,6 +261,16 @@ class StockItem(MPTTModel):
         """
 
         super(StockItem, self).validate_unique(exclude)
+
+        # If the uid (barcode hash) is set, make sure it is not a duplicate
+        if self.uid:
+            stock = StockItem.objects.filter(uid=self.uid)
+
+            if self.pk is not None:
+                stock = stock.exclude(pk=self.pk)
+
+            if stock.exists():
+                raise ValidationError({"uid": _("StockItem with this unique identifier already exists")})
         
         # If the serial number is set, make sure it is not a duplicate
         if self.serial is not None:
@@ -418,7 +464,10 @@ class StockItem(MPTTModel):
         max_length=100, blank=True, null=True,
         help_text=_('Serial number for this item')
     )
- 
+
+    # Integer value of the serial number (if it is numeric), used for ordering serial numbers
+    serial_int = models.IntegerField(blank=True, null=True, editable=False)
+
     link = InvenTreeURLField(
         verbose_name=_('External Link'),
         max_length=125, blank=True,
@@ -714,33 +763,10 @@ class StockItem(MPTTModel):
         Args:
             cascade - Include items which are installed in items which are installed in items
 
-        Note: This function is recursive, and may result in a number of database hits!
+        Note: Installed items are loaded with a single query for each level of nesting (see stock.results)
         """
 
-        installed = set()
-
-        items = StockItem.objects.filter(belongs_to=self)
-
-        for item in items:
-            
-            # Prevent duplication or recursion
-            if item == self or item in installed:
-                continue
-
-            installed.add(item)
-
-            if cascade:
-                sub_items = item.get_installed_items(cascade=True)
-
-                for sub_item in sub_items:
-
-                    # Prevent recursion
-                    if sub_item == self or sub_item in installed:
-                        continue
-
-                    installed.add(sub_item)
-
-        return installed
+        return set(StockResults.installed_items([self], cascade=cascade)[self.pk])
 
     def installedItemCount(self):
         """
@@ -925,7 +951,7 @@ class StockItem(MPTTModel):
 
         Args:
             quantity: Number of items to serialize (integer)
-            serials: List of serial numbers (list<int>)
+            serials: List of serial numbers (list<int>), or None to use the next available serial numbers
             user: User object associated with action
             notes: Optional notes for tracking
             location: If specified, serialized items will be placed in the given location
@@ -950,6 +976,9 @@ class StockItem(MPTTModel):
         if quantity > self.quantity:
             raise ValidationError({"quantity": _("Quantity must not exceed available stock quantity ({n})".format(n=self.quantity))})
 
+        if serials is None:
+            serials = self.part.allocate_serial_numbers(quantity)
+
         if not type(serials) in [list, tuple]:
             raise ValidationError({"serial_numbers": _("Serial numbers must be a list of integers")})
 
@@ -963,54 +992,215 @@ class StockItem(MPTTModel):
             exists = ','.join([str(x) for x in existing])
             raise ValidationError({"serial_numbers": _("Serial numbers already exist") + ': ' + exists})
 
-        # Create a new stock item for each unique serial number
+        # Serial numbers must also be unique within the provided list
+        if len(set([str(serial) for serial in serials])) < len(serials):
+            raise ValidationError({"serial_numbers": _("Duplicate serial numbers provided")})
+
+        # Create a copy of this StockItem, which is used as a template for each new item
+        template = StockItem.objects.get(pk=self.pk)
+        template.pk = None
+        template.quantity = 1
+        template.serial = serials[0]
+        template.uid = ''
+        template.parent = self
+
+        if location:
+            template.location = location
+
+        # The new items differ only by serial number, so are validated once
+        template.clean()
+
+        fields = [f.attname for f in StockItem._meta.concrete_fields if not f.primary_key]
+
+        new_items = []
+
         for serial in serials:
-            
-            # Create a copy of this StockItem
-            new_item = StockItem.objects.get(pk=self.pk)
-            new_item.quantity = 1
+            new_item = StockItem(**{name: getattr(template, name) for name in fields})
+
             new_item.serial = serial
-            new_item.pk = None
-            new_item.parent = self
+            new_item.serial_int = helpers.serial_to_int(serial)
 
-            if location:
-                new_item.location = location
+            new_items.append(new_item)
 
-            # The item already has a transaction history, don't create a new note
-            new_item.save(user=user, note=False)
+        self.insert_children(new_items)
 
-            # Copy entire transaction history
-            new_item.copyHistoryFrom(self)
+        # Copy entire transaction history
+        helpers.bulk_copy(self.tracking_info.all(), 'item', new_items)
 
-            # Copy test result history
-            new_item.copyTestResultsFrom(self)
+        # Copy test result history
+        helpers.bulk_copy(self.test_results.all(), 'stock_item', new_items)
 
-            # Create a new stock tracking item
-            new_item.addTransactionNote(_('Add serial number'), user, notes=notes)
+        # Create a new stock tracking item
+        StockItemTracking.objects.bulk_create([
+            StockItemTracking(
+                item=item,
+                title=_('Add serial number'),
+                user=user,
+                quantity=item.quantity,
+                notes=notes,
+                system=True,
+            ) for item in new_items
+        ], batch_size=500)
 
         # Remove the equivalent number of items
         self.take_stock(quantity, user, notes=_('Serialized {n} items'.format(n=quantity)))
 
+    @classmethod
+    @transaction.atomic
+    def create_roots(cls, items, batch_size=500):
+        """
+        Create new StockItem objects (each the root of a new tree), using bulk inserts.
+
+        The tree fields are assigned directly (rather than inserting each item into the tree individually).
+
+        Args:
+            items: List of (unsaved) StockItem objects
+
+        Note: As with any bulk_create operation, the save() method is not called and no signals are sent.
+        The items must be validated before they are created (e.g. as per serializeStock).
+        """
+
+        if len(items) == 0:
+            return items
+
+        # Lock the tree_id range, so that concurrent inserts cannot use the same tree_id values
+        tree_id = helpers.lock_tree_ids(StockItem)
+
+        for item in items:
+            tree_id += 1
+
+            item.parent = None
+            item.tree_id = tree_id
+            item.lft = 1
+            item.rght = 2
+            item.level = 0
+
+        StockItem.objects.bulk_create(items, batch_size=batch_size)
+
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Primary key values are not returned - so look them up by the (unique) tree_id values
+            pks = dict(StockItem.objects.filter(
+                tree_id__in=[item.tree_id for item in items]
+            ).values_list('tree_id', 'pk'))
+
+            for item in items:
+                item.pk = pks[item.tree_id]
+
+        return items
+
+    def insert_children(self, items, batch_size=500):
+        """
+        Insert new StockItem objects as the last children of this item, using bulk inserts.
+
+        The space for the new items is made in the tree with two queries (rather than a tree update for each item).
+
+        Args:
+            items: List of (unsaved) StockItem objects
+
+        Note: As with any bulk_create operation, the save() method is not called and no signals are sent.
+        """
+
+        if len(items) == 0:
+            return items
+
+        n = len(items)
+
+        # Read the current tree position of this item (the in-memory values may be out of date)
+        tree_id, level, left, right = StockItem.objects.filter(pk=self.pk).values_list('tree_id', 'level', 'lft', 'rght').get()
+
+        # Make space in the tree for the new items
+        StockItem.objects.filter(tree_id=tree_id, rght__gte=right).update(rght=F('rght') + 2 * n)
+        StockItem.objects.filter(tree_id=tree_id, lft__gt=right).update(lft=F('lft') + 2 * n)
+
+        self.tree_id = tree_id
+        self.lft = left
+        self.rght = right + 2 * n
+
+        for idx, item in enumerate(items):
+            item.parent_id = self.pk
+            item.tree_id = tree_id
+            item.level = level + 1
+            item.lft = right + 2 * idx
+            item.rght = right + 2 * idx + 1
+
+        StockItem.objects.bulk_create(items, batch_size=batch_size)
+
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Primary key values are not returned - look them up by position in the tree
+            pks = dict(StockItem.objects.filter(
+                tree_id=tree_id,
+                lft__in=[item.lft for item in items]
+            ).values_list('lft', 'pk'))
+
+            for item in items:
+                item.pk = pks[item.lft]
+
+        return items
+
+    def split_children(self, splits, track, prepare=None):
+        """
+        Split a number of quantities from this item into new (child) stock items, in bulk.
+
+        As per splitStock, each new item is a copy of this item (with its own transaction history and test results),
+        but the new items are created with a single bulk insert (see insert_children).
+
+        Args:
+            splits: List of (quantity, data) pairs, one for each new item
+            track: Callable track(item, title, notes) which records a tracking entry
+            prepare: Optional callable prepare(item, data) which sets any other fields of each new item before it is created
+
+        Returns:
+            List of the new StockItem objects
+
+        Note: The quantity of this item is reduced by the total split quantity, but this item is not saved.
+        """
+
+        if len(splits) == 0:
+            return []
+
+        fields = [f.attname for f in StockItem._meta.concrete_fields if not f.primary_key]
+
+        children = []
+
+        for quantity, data in splits:
+            child = StockItem(**{name: getattr(self, name) for name in fields})
+
+            child.uid = ''
+            child.quantity = quantity
+
+            if prepare is not None:
+                prepare(child, data)
+
+            children.append(child)
+
+        self.insert_children(children)
+
+        # Copy the transaction history and test results of this item to each new item
+        helpers.bulk_copy(self.tracking_info.all(), 'item', children)
+        helpers.bulk_copy(self.test_results.all(), 'stock_item', children)
+
+        for child in children:
+            track(child, _("Split from existing stock"), f"{_('Split')} {helpers.normalize(child.quantity)} {_('items')}")
+
+        split = sum([child.quantity for child in children])
+
+        self.quantity -= split
+
+        track(self, f"{_('Removed')} {helpers.normalize(split)} {_('items')}", f"{_('Split')} {split} {_('items into new stock item')}")
+
+        return children
+
     @transaction.atomic
     def copyHistoryFrom(self, other):
         """ Copy stock history from another StockItem """
 
-        for item in other.tracking_info.all():
-            
-            item.item = self
-            item.pk = None
-            item.save()
+        helpers.bulk_copy(other.tracking_info.all(), 'item', [self])
 
     @transaction.atomic
     def copyTestResultsFrom(self, other, filters={}):
         """ Copy all test results from another StockItem """
 
-        for result in other.test_results.all().filter(**filters):
-
-            # Create a copy of the test result by nulling-out the pk
-            result.pk = None
-            result.stock_item = self
-            result.save()
+        helpers.bulk_copy(other.test_results.all().filter(**filters), 'stock_item', [self])
 
     @transaction.atomic
     def splitStock(self, quantity, location, user):
@@ -1048,6 +1238,7 @@ class StockItem(MPTTModel):
         # Nullify the PK so a new record is created
         new_stock = StockItem.objects.get(pk=self.pk)
         new_stock.pk = None
+        new_stock.uid = ''
         new_stock.parent = self
         new_stock.quantity = quantity
 
@@ -1338,36 +1529,19 @@ class StockItem(MPTTModel):
 
         This map is useful for rendering to a template (e.g. a test report),
         as all named tests are accessible.
+
+        To calculate the test results for multiple stock items at once, use stock.results.TestResultMap
         """
 
         # Do we wish to include test results from installed items?
         include_installed = kwargs.pop('include_installed', False)
 
-        # Filter results by "date", so that newer results
-        # will override older ones.
-        results = self.getTestResults(**kwargs).order_by('date')
-
-        result_map = {}
-
-        for result in results:
-            key = helpers.generateTestKey(result.test)
-            result_map[key] = result
-
         # Do we wish to "cascade" and include test results from installed stock items?
-        cascade = kwargs.get('cascade', False)
-
-        if include_installed:
-            installed_items = self.get_installed_items(cascade=cascade)
+        cascade = kwargs.pop('cascade', False)
 
-            for item in installed_items:
-                item_results = item.testResultMap()
+        result_map = StockResults.TestResultMap([self], include_installed=include_installed, cascade=cascade, **kwargs)
 
-                for key in item_results.keys():
-                    # Results from sub items should not override master ones
-                    if key not in result_map.keys():
-                        result_map[key] = item_results[key]
-
-        return result_map
+        return result_map.get(self)
 
     def testResultList(self, **kwargs):
         """
@@ -1387,31 +1561,7 @@ class StockItem(MPTTModel):
             - failed: Number of tests that have failed
         """
 
-        # All the tests required by the part object
-        required = self.part.getRequiredTests()
-
-        results = self.testResultMap()
-
-        total = len(required)
-        passed = 0
-        failed = 0
-
-        for test in required:
-            key = helpers.generateTestKey(test.test_name)
-
-            if key in results:
-                result = results[key]
-
-                if result.result:
-                    passed += 1
-                else:
-                    failed += 1
-
-        return {
-            'total': total,
-            'passed': passed,
-            'failed': failed,
-        }
+        return StockResults.TestResultMap([self]).required_status(self)
 
     @property
     def required_test_count(self):
@@ -1440,21 +1590,9 @@ class StockItem(MPTTModel):
         Return a list of TestReport objects which match this StockItem.
         """
 
-        reports = []
-
-        item_query = StockItem.objects.filter(pk=self.pk)
-
-        for test_report in report.models.TestReport.objects.filter(enabled=True):
-
-            # Attempt to validate report filter (skip if invalid)
-            try:
-                filters = helpers.validateFilterString(test_report.filters)
-                if item_query.filter(**filters).exists():
-                    reports.append(test_report)
-            except (ValidationError, FieldError):
-                continue
+        reports = report.models.TestReport.objects.filter(enabled=True)
 
-        return reports
+        return helpers.filterTemplatesForItems(reports, StockItem, [self])
 
     @property
     def has_test_reports(self):
@@ -1469,21 +1607,9 @@ class StockItem(MPTTModel):
         Return a list of Label objects which match this StockItem
         """
 
-        labels = []
+        labels = label.models.StockItemLabel.objects.filter(enabled=True)
 
-        item_query = StockItem.objects.filter(pk=self.pk)
-
-        for lbl in label.models.StockItemLabel.objects.filter(enabled=True):
-
-            try:
-                filters = helpers.validateFilterString(lbl.filters)
-
-                if item_query.filter(**filters).exists():
-                    labels.append(lbl)
-            except (ValidationError, FieldError):
-                continue
-
-        return labels
+        return helpers.filterTemplatesForItems(labels, StockItem, [self])
 
     @property
     def has_labels(self):
@@ -1494,6 +1620,13 @@ class StockItem(MPTTModel):
         return len(self.available_labels()) > 0
 
 
+@receiver(pre_save, sender=StockItem, dispatch_uid='stock_item_pre_save_serial')
+def before_save_stock_item(sender, instance, **kwargs):
+    """ Update the integer value of the serial number (including for "raw" saves, e.g. loading fixtures) """
+
+    instance.serial_int = helpers.serial_to_int(instance.serial)
+
+
 @receiver(pre_delete, sender=StockItem, dispatch_uid='stock_item_pre_delete_log')
 def before_delete_stock_item(sender, instance, using, **kwargs):
     """ Receives pre_delete signal from StockItem object.
@@ -0,0 +1,257 @@
+"""
+Bulk test result maps for stock items.
+
+Building the test result map for a stock item (via StockItem.testResultMap) requires:
+
+- A query for the test results of the stock item
+- A query for the items installed in the stock item, repeated (recursively) for every installed item
+- A query for the test results of each installed item
+
+and calculating the required test status (via StockItem.requiredTestStatus) loads the required test
+templates for the part (and its ancestors) again for every stock item.
+Rendering a test report against a large batch of stock items repeats all of this for every item.
+
+Instead, the TestResultMap class calculates the test results for any number of stock items at once:
+
+- The installed items are loaded with a single query for each level of nesting (for all stock items at once)
+- Only the latest result for each test is loaded, with a single query
+- The required test templates for all parts are loaded with a single query
+
+Note: The latest result for each test is selected by excluding any results for which a newer result
+(for the same stock item and test) exists, as window expressions cannot be filtered in the Django ORM.
+"""
+
+import logging
+
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef, Q
+
+from InvenTree import helpers
+
+from part import models as PartModels
+from stock import models as StockModels
+
+
+logger = logging.getLogger(__name__)
+
+
+def latest_results(queryset, base=None):
+    """
+    Filter a StockItemTestResult queryset to the latest result for each test (for each stock item).
+
+    Where multiple results were recorded at the same time, the most recently created result is used.
+
+    Args:
+        queryset: StockItemTestResult queryset
+        base: Queryset of results which may supersede those in the queryset (default = queryset)
+    """
+
+    if base is None:
+        base = queryset
+
+    newer = base.filter(
+        stock_item=OuterRef('stock_item'),
+        test=OuterRef('test'),
+    ).filter(
+        Q(date__gt=OuterRef('date')) | Q(date=OuterRef('date'), pk__gt=OuterRef('pk'))
+    )
+
+    return queryset.annotate(superseded=Exists(newer)).filter(superseded=False)
+
+
+def installed_items(items, cascade=False):
+    """
+    Return the stock items installed in each of the provided stock items.
+
+    Args:
+        items: Iterable of StockItem objects
+        cascade: Include items which are installed in items which are installed in items
+
+    Returns:
+        A dict of {stock item pk: [installed StockItem objects]}.
+        With cascade, items are ordered by their level of nesting (directly installed items first).
+    """
+
+    installed = defaultdict(list)
+
+    # Stock items in the tree of each (top level) stock item, to prevent duplication or recursion
+    seen = {item.pk: set([item.pk]) for item in items}
+
+    # Pairs of (stock item pk, top level stock item pk) for the current level of nesting
+    level = [(pk, pk) for pk in seen.keys()]
+
+    while len(level) > 0:
+
+        children = defaultdict(list)
+
+        for child in StockModels.StockItem.objects.filter(belongs_to__in=set([pk for pk, root in level])).order_by('pk'):
+            children[child.belongs_to_id].append(child)
+
+        next_level = []
+
+        for pk, root in level:
+            for child in children[pk]:
+
+                if child.pk in seen[root]:
+                    continue
+
+                seen[root].add(child.pk)
+                installed[root].append(child)
+
+                next_level.append((child.pk, root))
+
+        if not cascade:
+            break
+
+        level = next_level
+
+    return installed
+
+
+class TestResultMap:
+    """
+    Test results for a number of stock items, calculated at once.
+
+    Attributes:
+        items: List of StockItem objects
+        results: The test result map for each stock item, as {stock item pk: {test key: StockItemTestResult}}
+    """
+
+    def __init__(self, items, include_installed=False, cascade=False, **filters):
+        """
+        Args:
+            items: Iterable of StockItem objects (e.g. a queryset)
+            include_installed: Include test results from installed stock items
+            cascade: Include test results from items installed in installed items
+            filters: Filters for the test results of the provided items (as per StockItem.getTestResults)
+        """
+
+        self.items = list(items)
+
+        self.installed = installed_items(self.items, cascade=cascade) if include_installed else {}
+
+        self.results = {}
+
+        # Own test results (without filters) for each item, as used by the required test status
+        self.own_results = None
+
+        self.required = None
+
+        self.load(filters)
+
+    def query(self, item_ids, **filters):
+        """ Return {stock item pk: {test key: result}} for the latest (filtered) test results of the provided items """
+
+        base = StockModels.StockItemTestResult.objects.all()
+
+        if filters.get('test', None):
+            base = base.filter(test=filters['test'])
+
+        if filters.get('result', None) is not None:
+            base = base.filter(result=filters['result'])
+
+        if filters.get('user', None):
+            base = base.filter(user=filters['user'])
+
+        queryset = latest_results(base.filter(stock_item__in=item_ids), base=base)
+
+        result_map = defaultdict(dict)
+
+        # Results are ordered by date, so that newer results will override older ones
+        for result in queryset.order_by('date', 'pk'):
+            result_map[result.stock_item_id][result.key] = result
+
+        return result_map
+
+    def load(self, filters):
+        """ Load the test results for all of the stock items (and any installed items) """
+
+        item_ids = [item.pk for item in self.items]
+        installed_ids = [child.pk for children in self.installed.values() for child in children]
+
+        filtered = len([value for value in filters.values() if value not in [None, '']]) > 0
+
+        if filtered:
+            own = self.query(item_ids, **filters)
+            installed = self.query(installed_ids)
+        else:
+            own = self.query(item_ids + installed_ids)
+            installed = own
+
+            self.own_results = own
+
+        for item in self.items:
+            result_map = dict(own.get(item.pk, {}))
+
+            for child in self.installed.get(item.pk, []):
+                for key, result in installed.get(child.pk, {}).items():
+                    # Results from sub items should not override master ones
+                    if key not in result_map:
+                        result_map[key] = result
+
+            self.results[item.pk] = result_map
+
+    def get(self, item):
+        """ Return the test result map for a stock item """
+
+        return self.results.get(item.pk, {})
+
+    def load_required(self):
+        """ Load the required test templates for the parts of all of the stock items """
+
+        if self.own_results is None:
+            self.own_results = self.query([item.pk for item in self.items])
+
+        part_ids = set([item.part_id for item in self.items])
+
+        parts = list(PartModels.Part.objects.filter(pk__in=part_ids).values_list('pk', 'tree_id', 'lft', 'rght'))
+
+        tree_ids = set([part[1] for part in parts])
+
+        templates = list(PartModels.PartTestTemplate.objects.filter(
+            required=True,
+            part__tree_id__in=tree_ids,
+        ).values_list('test_name', 'part__tree_id', 'part__lft', 'part__rght'))
+
+        # Required tests for each part are those defined against the part, or any of its ancestors
+        self.required = {}
+
+        for pk, tree_id, lft, rght in parts:
+            self.required[pk] = [
+                helpers.generateTestKey(name) for name, t_tree, t_lft, t_rght in templates
+                if t_tree == tree_id and t_lft <= lft and t_rght >= rght
+            ]
+
+    def required_status(self, item):
+        """
+        Return the status of the tests required for a stock item (as per StockItem.requiredTestStatus)
+
+        return:
+            A dict containing the following items:
+            - total: Number of required tests
+            - passed: Number of tests that have passed
+            - failed: Number of tests that have failed
+        """
+
+        if self.required is None:
+            self.load_required()
+
+        required = self.required.get(item.part_id, [])
+        results = self.own_results.get(item.pk, {})
+
+        passed = 0
+        failed = 0
+
+        for key in required:
+            if key in results:
+                if results[key].result:
+                    passed += 1
+                else:
+                    failed += 1
+
+        return {
+            'total': len(required),
+            'passed': passed,
+            'failed': failed,
+        }
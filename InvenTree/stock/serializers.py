@@ -9,15 +9,9 @@ from .models import StockItemTracking
 from .models import StockItemAttachment
 from .models import StockItemTestResult
 
-from django.db.models.functions import Coalesce
-
 from django.db.models import Case, When, Value
 from django.db.models import BooleanField
-from django.db.models import Q
-
-from sql_util.utils import SubquerySum, SubqueryCount
-
-from decimal import Decimal
+from django.db.models import Q, Sum, Count
 
 from datetime import datetime, timedelta
 
@@ -25,6 +19,7 @@ import common.models
 from company.serializers import SupplierPartSerializer
 from part.serializers import PartBriefSerializer
 from InvenTree.serializers import UserSerializerBrief, InvenTreeModelSerializer
+from InvenTree.serializers import InvenTreeAggregateListSerializer
 from InvenTree.serializers import InvenTreeAttachmentSerializerField
 
 
@@ -99,20 +94,6 @@ class StockItemSerializer(InvenTreeModelSerializer):
         performing database queries as efficiently as possible.
         """
 
-        # Annotate the queryset with the total allocated to sales orders
-        queryset = queryset.annotate(
-            allocated=Coalesce(
-                SubquerySum('sales_order_allocations__quantity'), Decimal(0)
-            ) + Coalesce(
-                SubquerySum('allocations__quantity'), Decimal(0)
-            )
-        )
-
-        # Annotate the queryset with the number of tracking items
-        queryset = queryset.annotate(
-            tracking_items=SubqueryCount('tracking_info')
-        )
-
         # Add flag to indicate if the StockItem has expired
         queryset = queryset.annotate(
             expired=Case(
@@ -139,6 +120,17 @@ class StockItemSerializer(InvenTreeModelSerializer):
 
         return queryset
 
+    # Allocation and tracking totals are calculated (with a single grouped query) for all serialized items at once
+    aggregates = {
+        'allocated': [
+            ('order.SalesOrderAllocation', 'item', Sum('quantity')),
+            ('build.BuildItem', 'stock_item', Sum('quantity')),
+        ],
+        'tracking_items': [
+            ('stock.StockItemTracking', 'item', Count('pk')),
+        ],
+    }
+
     status_text = serializers.CharField(source='get_status_display', read_only=True)
         
     supplier_part_detail = SupplierPartSerializer(source='supplier_part', many=False, read_only=True)
@@ -147,11 +139,11 @@ class StockItemSerializer(InvenTreeModelSerializer):
 
     location_detail = LocationBriefSerializer(source='location', many=False, read_only=True)
 
-    tracking_items = serializers.IntegerField(source='tracking_info_count', read_only=True, required=False)
+    tracking_items = serializers.IntegerField(read_only=True, required=False)
 
     quantity = serializers.FloatField()
     
-    allocated = serializers.FloatField(source='allocation_count', required=False)
+    allocated = serializers.FloatField(read_only=True, required=False)
 
     expired = serializers.BooleanField(required=False, read_only=True)
 
@@ -171,19 +163,20 @@ class StockItemSerializer(InvenTreeModelSerializer):
         super(StockItemSerializer, self).__init__(*args, **kwargs)
 
         if part_detail is not True:
-            self.fields.pop('part_detail')
+            self.fields.pop('part_detail', None)
 
         if location_detail is not True:
-            self.fields.pop('location_detail')
+            self.fields.pop('location_detail', None)
 
         if supplier_part_detail is not True:
-            self.fields.pop('supplier_part_detail')
+            self.fields.pop('supplier_part_detail', None)
 
         if test_detail is not True:
-            self.fields.pop('required_tests')
+            self.fields.pop('required_tests', None)
 
     class Meta:
         model = StockItem
+        list_serializer_class = InvenTreeAggregateListSerializer
         fields = [
             'allocated',
             'batch',
@@ -0,0 +1,132 @@
+"""
+Serial number lookup and allocation.
+
+Serial numbers must be unique across an entire Part "tree" (a template part and all of its variants).
+
+Each StockItem stores the integer value of its serial number (if it has one) in the serial_int field,
+which is indexed together with the part. This allows the "latest" serial number,
+and any gaps in the used serial numbers, to be found using the index,
+rather than loading (and sorting) every serialized StockItem in the tree.
+
+All functions here operate on a batch of serial numbers with a fixed number of queries.
+"""
+
+from django.db.models import Max
+
+from InvenTree.helpers import serial_to_int
+
+from stock import models as StockModels
+
+
+def get_tree_stock(tree_id):
+    """ Return all serialized stock items for the given Part tree """
+
+    return StockModels.StockItem.objects.filter(part__tree_id=tree_id).exclude(serial=None)
+
+
+def find_conflicting_serials(tree_id, serials, exclude=None):
+    """
+    Return the subset of the provided serial numbers which are already in use within the given Part tree.
+
+    Args:
+        tree_id: Part tree ID
+        serials: List of serial numbers to check
+        exclude: Optional list of StockItem pk values to ignore
+
+    Returns:
+        A list of the conflicting serial numbers (in the order provided)
+    """
+
+    if len(serials) == 0:
+        return []
+
+    stock = get_tree_stock(tree_id).filter(serial__in=set([str(serial) for serial in serials]))
+
+    if exclude:
+        stock = stock.exclude(pk__in=exclude)
+
+    existing = set(stock.values_list('serial', flat=True))
+
+    return [serial for serial in serials if str(serial) in existing]
+
+
+def get_latest_serial(tree_id):
+    """
+    Return the "latest" serial number for the given Part tree.
+
+    If *all* the serial numbers are integers, then this will return the highest one.
+    Otherwise, it will simply return the serial number most recently added.
+    """
+
+    stock = get_tree_stock(tree_id)
+
+    # One or more of the serial numbers is non-numeric
+    # In this case, the "best" we can do is return the most recent
+    if stock.filter(serial_int=None).exists():
+        return stock.order_by('pk').last().serial
+
+    latest = stock.order_by('-serial_int').first()
+
+    if latest is None:
+        return None
+
+    return latest.serial
+
+
+def allocate_serials(tree_id, quantity, start=None, exclude=None):
+    """
+    Return the next available (unused) serial numbers for the given Part tree.
+
+    Args:
+        tree_id: Part tree ID
+        quantity: Number of serial numbers required
+        start: The first serial number to consider.
+               If not provided, the numbers following the highest existing serial number are returned.
+        exclude: Optional list of serial numbers which are also unavailable (e.g. already requested)
+
+    Returns:
+        A list of (integer) serial numbers
+
+    Note: Serial numbers are not reserved, so must still be checked when the stock items are created
+    """
+
+    quantity = int(quantity)
+
+    excluded = set()
+
+    for serial in exclude or []:
+        value = serial_to_int(serial)
+
+        if value is not None:
+            excluded.add(value)
+
+    stock = get_tree_stock(tree_id)
+
+    if start is None:
+        latest = stock.aggregate(Max('serial_int'))['serial_int__max']
+
+        start = (latest or 0) + 1
+
+    start = max(int(start), 1)
+
+    # Iterate through the used serial numbers (in order), and fill any gaps
+    used = stock.filter(serial_int__gte=start).order_by('serial_int').values_list('serial_int', flat=True)
+    used = used.iterator()
+
+    serials = []
+
+    n = start
+    u = next(used, None)
+
+    while len(serials) < quantity:
+
+        # Skip past any used values which are lower than the current candidate
+        while u is not None and u < n:
+            u = next(used, None)
+
+        if n != u and n not in excluded:
+            serials.append(n)
+
+        n += 1
+
+    return serials
@@ -0,0 +1,32 @@
+"""
+Background tasks for the stock app
+"""
+
+import tempfile
+
+from common.tasks import register_task, save_task_output
+
+from InvenTree.exporter import WriteExport
+
+from stock.admin import StockItemResource, stock_export_queryset
+
+
+@register_task(max_attempts=1)
+def export_stock(params, export_format, filename):
+    """
+    Export stock items to a file (see stock.views.StockExport)
+
+    Returns the filename and URL of the generated file
+    """
+
+    with tempfile.TemporaryFile() as output:
+        WriteExport(StockItemResource(), stock_export_queryset(params), export_format, output)
+
+        output.seek(0)
+
+        url = save_task_output(filename, output)
+
+    return {
+        'filename': filename,
+        'url': url,
+    }
@@ -70,6 +70,45 @@ class StockLocationTest(StockAPITestCase):
         response = self.client.post(self.list_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_tree(self):
+        """
+        Test that the location tree matches the per-location item counts
+        """
+
+        url = reverse('api-stock-tree')
+
+        def check_nodes(nodes):
+            for node in nodes:
+                location = StockLocation.objects.get(pk=node['pk'])
+
+                self.assertEqual(node['text'], location.name)
+                self.assertEqual(node['tags'][0], location.item_count)
+
+                children = node.get('nodes', [])
+
+                self.assertEqual(len(children), location.get_children().count())
+                self.assertEqual([child['text'] for child in children], sorted([child['text'] for child in children]))
+
+                check_nodes(children)
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        tree = response.json()['tree'][0]
+
+        self.assertEqual(tree['tags'][0], StockItem.objects.filter(location__isnull=False).count())
+        check_nodes(tree['nodes'])
+
+        # Adding a stock item invalidates the cached tree
+        StockItem.objects.create(part_id=1, location_id=5, quantity=10)
+
+        response = self.client.get(url, format='json')
+
+        tree = response.json()['tree'][0]
+
+        self.assertEqual(tree['tags'][0], StockItem.objects.filter(location__isnull=False).count())
+        check_nodes(tree['nodes'])
+
 
 class StockItemListTest(StockAPITestCase):
     """
@@ -257,6 +296,34 @@ class StockItemListTest(StockAPITestCase):
 
             self.assertEqual(len(response['results']), n)
 
+    def test_cursor_paginate(self):
+        """
+        Test that we can page through all results using a cursor
+        """
+
+        response = self.get_stock(cursor='', limit=4)
+
+        self.assertNotIn('count', response)
+
+        pks = [item['pk'] for item in response['results']]
+
+        while response['next'] is not None:
+            response = self.client.get(response['next'], format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            response = response.data
+
+            self.assertLessEqual(len(response['results']), 4)
+
+            pks += [item['pk'] for item in response['results']]
+
+        # Every item is returned exactly once, in primary key order
+        self.assertEqual(pks, list(StockItem.objects.order_by('pk').values_list('pk', flat=True)))
+
+        # Invalid cursor
+        response = self.client.get(self.list_url, {'cursor': 'notacursor'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class StockItemTest(StockAPITestCase):
     """
@@ -541,6 +608,11 @@ class StockTestResultTest(StockAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreaterEqual(len(response.data), 4)
 
+        # Only the latest result for each test
+        response = self.client.get(url, data={'stock_item': 105, 'latest': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+
     def test_post_fail(self):
         # Attempt to post a new test result without specifying required data
 
@@ -1,4 +1,6 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.db.models import Sum
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
@@ -7,6 +9,9 @@ import datetime
 
 from .models import StockLocation, StockItem, StockItemTracking
 from .models import StockItemTestResult
+from .importer import LocationImporter, StockImporter
+from .adjustment import StockAdjustment
+from .results import TestResultMap
 
 from part.models import Part
 from build.models import Build
@@ -344,6 +349,46 @@ class StockTest(TestCase):
         with self.assertRaises(StockItem.DoesNotExist):
             w2 = StockItem.objects.get(pk=101)
 
+    def test_batch_adjustment(self):
+        """ Test that a batch of stock adjustments is performed (with per-item errors) """
+
+        n = StockItemTracking.objects.count()
+
+        q1 = StockItem.objects.get(pk=1).quantity
+        q2 = StockItem.objects.get(pk=2).quantity
+
+        adjustment = StockAdjustment('add', self.user, notes='Batch add')
+
+        result = adjustment.run([(1, 10), (2, 20), (2, 5), (9999, 1), (3, -1)])
+
+        self.assertEqual(result.count, 2)
+        self.assertEqual(set(result.errors.keys()), set([2, 9999, 3]))
+
+        self.assertEqual(StockItem.objects.get(pk=1).quantity, q1 + 10)
+        self.assertEqual(StockItem.objects.get(pk=2).quantity, q2 + 20)
+
+        # A tracking entry is created for each adjusted item
+        self.assertEqual(StockItemTracking.objects.count(), n + 2)
+
+        track = StockItemTracking.objects.filter(item=2).latest('id')
+        self.assertIn('Added', track.title)
+        self.assertEqual(track.notes, 'Batch add')
+
+        # Move a batch of items to the office
+        adjustment = StockAdjustment('move', self.user, location=self.office)
+
+        result = adjustment.run([(1, StockItem.objects.get(pk=1).quantity), (2, StockItem.objects.get(pk=2).quantity)])
+
+        self.assertFalse(result.has_errors())
+
+        for pk in [1, 2]:
+            item = StockItem.objects.get(pk=pk)
+            self.assertEqual(item.location, self.office)
+            self.assertIn('Moved to', item.tracking_info.latest('id').title)
+
+        with self.assertRaises(ValueError):
+            StockAdjustment('move', self.user)
+
     def test_serialize_stock_invalid(self):
         """
         Test manual serialization of parts.
@@ -410,6 +455,74 @@ class StockTest(TestCase):
         # Serialize the remainder of the stock
         item.serializeStock(2, [99, 100], self.user)
 
+    def test_serialize_stock_bulk(self):
+        """ Serialized items are created in bulk, with a valid tree structure """
+
+        item = StockItem.objects.get(pk=100)
+        item.addTransactionNote('A note', self.user)
+
+        # Each serialization adds a note to the parent item, so the history copied to each batch is counted separately
+        history = {}
+
+        def serialize(quantity, serials, **kwargs):
+            count = item.tracking_info.count()
+
+            item.serializeStock(quantity, serials, self.user, **kwargs)
+
+            # (a single query, which is the same for every batch)
+            for pk in item.get_children().values_list('pk', flat=True):
+                history.setdefault(pk, count)
+
+        # The first serialization populates any lazily loaded data (e.g. content types and cached lookups)
+        serialize(1, [1])
+
+        with CaptureQueriesContext(connection) as small:
+            serialize(2, [2, 3])
+
+        with CaptureQueriesContext(connection) as large:
+            serialize(5, [4, 5, 6, 7, 8], notes='Bulk')
+
+        # The number of queries does not depend on the number of items
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+        # The next available serial number is allocated automatically
+        serialize(1, None)
+
+        item.refresh_from_db()
+
+        self.assertEqual(item.quantity, 1)
+
+        children = item.get_children()
+
+        self.assertEqual(children.count(), 9)
+        self.assertTrue(children.filter(serial='1001').exists())
+
+        for child in children:
+            self.assertEqual(child.quantity, 1)
+            self.assertEqual(child.parent, item)
+            self.assertEqual(child.uid, '')
+            self.assertEqual(child.serial_int, int(child.serial))
+            self.assertFalse(child.delete_on_deplete)
+
+            # Entire history (at the time of serialization) copied, plus a new note
+            self.assertEqual(child.tracking_info.count(), history[child.pk] + 1)
+            self.assertEqual(child.tracking_info.last().title, 'Add serial number')
+
+        self.assertEqual(children.filter(tracking_info__notes='Bulk').count(), 5)
+
+        # The tree structure is the same as if it were rebuilt from scratch
+        fields = ['pk', 'lft', 'rght', 'level']
+
+        tree = list(StockItem.objects.filter(tree_id=item.tree_id).order_by('pk').values_list(*fields))
+
+        StockItem.objects.partial_rebuild(item.tree_id)
+
+        self.assertEqual(tree, list(StockItem.objects.filter(tree_id=item.tree_id).order_by('pk').values_list(*fields)))
+
+        # Duplicate serial numbers are rejected
+        with self.assertRaises(ValidationError):
+            item.serializeStock(2, [500, 500], self.user)
+
 
 class VariantTest(StockTest):
     """
@@ -493,6 +606,29 @@ class VariantTest(StockTest):
         item.serial += 1
         item.save()
 
+    def test_allocate_serial_numbers(self):
+        # Serial numbers in use for the chair tree: 1-5, 10-12, 20-22
+
+        chair = Part.objects.get(pk=10000)
+        variant = Part.objects.get(pk=10004)
+
+        self.assertEqual(chair.allocate_serial_numbers(3), [23, 24, 25])
+        self.assertEqual(variant.allocate_serial_numbers(3, start=1), [6, 7, 8])
+        self.assertEqual(chair.allocate_serial_numbers(4, start=9, exclude=['13']), [9, 14, 15, 16])
+
+        # Conflicts are checked across the entire tree, with a single query
+        with self.assertNumQueries(1):
+            conflicts = variant.find_conflicting_serial_numbers(list(range(1, 30)))
+
+        self.assertEqual(conflicts, [1, 2, 3, 4, 5, 10, 11, 12, 20, 21, 22])
+
+        # Non-numeric serial numbers are not considered when allocating
+        item = StockItem.objects.create(part=variant, quantity=1, serial='ABC')
+
+        self.assertIsNone(item.serial_int)
+        self.assertEqual(chair.getLatestSerialNumber(), 'ABC')
+        self.assertEqual(chair.allocate_serial_numbers(1), [23])
+
 
 class TestResultTest(StockTest):
     """
@@ -681,3 +817,190 @@ class TestResultTest(StockTest):
         tests = item.testResultMap(include_installed=False)
         self.assertEqual(len(tests), 3)
         self.assertNotIn('somenewtest', tests)
+
+    def test_bulk_result_map(self):
+        """
+        Test results for multiple stock items are calculated at once
+        """
+
+        item = StockItem.objects.get(pk=105)
+
+        sub_item = StockItem.objects.create(part=item.part, quantity=1, belongs_to=item, location=None)
+        StockItemTestResult.objects.create(stock_item=sub_item, test='some new test', result=True)
+
+        items = list(StockItem.objects.filter(pk__in=[105, 522]))
+
+        # Installed items, test results, parts, required test templates
+        with self.assertNumQueries(4):
+            result_map = TestResultMap(items, include_installed=True)
+
+            status = {item.pk: result_map.required_status(item) for item in items}
+
+        for item in items:
+            self.assertEqual(result_map.get(item), item.testResultMap(include_installed=True))
+            self.assertEqual(status[item.pk], item.requiredTestStatus())
+
+        self.assertIn('somenewtest', result_map.get(StockItem.objects.get(pk=105)))
+        self.assertEqual(status[522]['total'], 5)
+
+
+class StockImportTest(TestCase):
+    """
+    Tests for the bulk stock (and stock location) import engines
+    """
+
+    fixtures = [
+        'category',
+        'part',
+        'location',
+        'stock',
+    ]
+
+    def setUp(self):
+
+        self.office = StockLocation.objects.get(name='Office')
+        self.drawer1 = StockLocation.objects.get(name='Drawer_1')
+
+        self.user = get_user_model().objects.create_user('username', 'user@email.com', 'password')
+
+        StockItem.objects.rebuild()
+        StockLocation.objects.rebuild()
+
+    def test_import(self):
+
+        n = StockItem.objects.count()
+        n_tracking = StockItemTracking.objects.count()
+
+        rows = [
+            {'part': 1, 'location': self.office.pk, 'quantity': '100', 'batch': 'IMPORT-001'},
+            {'part': 3, 'location': self.drawer1.pk, 'quantity': '5.5', 'part_name': 'ignored'},
+            {'part': 10001, 'location': '', 'quantity': '1', 'serial': '9001'},
+            {'part': 10001, 'quantity': '1', 'serial': '9002', 'uid': 'xyz-123'},
+        ]
+
+        result = StockImporter(user=self.user, batch_size=3).import_rows(rows)
+
+        self.assertFalse(result.has_errors())
+        self.assertEqual(result.total, 4)
+        self.assertEqual(result.created, 4)
+
+        self.assertEqual(StockItem.objects.count(), n + 4)
+        self.assertEqual(StockItemTracking.objects.count(), n_tracking + 4)
+
+        item = StockItem.objects.get(batch='IMPORT-001')
+
+        self.assertEqual(item.quantity, 100)
+        self.assertEqual(item.location, self.office)
+        self.assertEqual(item.tracking_info.count(), 1)
+        self.assertEqual(item.tracking_info.first().user, self.user)
+
+        # Each new item is the root of its own (valid) tree
+        self.assertTrue(item.is_root_node())
+        self.assertEqual(item.get_descendant_count(), 0)
+
+        tree_ids = StockItem.objects.filter(serial__in=['9001', '9002']).values_list('tree_id', flat=True)
+        self.assertEqual(len(set(tree_ids)), 2)
+
+        # Importing duplicate serial numbers (or uid values) fails
+        result = StockImporter().import_rows([
+            {'part': 10001, 'quantity': '1', 'serial': '9001'},
+            {'part': 10001, 'quantity': '1', 'uid': 'xyz-123'},
+            {'part': 1, 'quantity': '10'},
+        ])
+
+        self.assertTrue(result.has_errors())
+        self.assertEqual(len(result.errors), 2)
+        self.assertIn('serial', result.errors[0][1])
+        self.assertIn('uid', result.errors[1][1])
+
+        # Nothing was imported
+        self.assertEqual(result.created, 0)
+        self.assertEqual(StockItem.objects.count(), n + 4)
+
+    def test_import_errors(self):
+
+        n = StockItem.objects.count()
+
+        rows = [
+            {'part': 1, 'quantity': '10'},
+            {'part': 99999, 'quantity': '10'},
+            {'quantity': '10'},
+            {'part': 1, 'quantity': 'abc'},
+            {'part': 10001, 'quantity': '2', 'serial': '1000'},
+        ]
+
+        result = StockImporter(skip_errors=True).import_rows(rows)
+
+        self.assertEqual([idx for idx, errors in result.errors], [2, 3, 4, 5])
+
+        self.assertIn('part', result.errors[0][1])
+        self.assertIn('part', result.errors[1][1])
+        self.assertIn('quantity', result.errors[2][1])
+        self.assertIn('quantity', result.errors[3][1])
+
+        # The valid row was imported
+        self.assertEqual(result.created, 1)
+        self.assertEqual(StockItem.objects.count(), n + 1)
+
+        # A dry run does not import anything
+        result = StockImporter().import_rows(rows[:1], dry_run=True)
+
+        self.assertFalse(result.has_errors())
+        self.assertEqual(StockItem.objects.count(), n + 1)
+
+    def test_import_locations(self):
+
+        n = StockLocation.objects.count()
+
+        rows = [
+            # A new tree (with rows in any order)
+            {'id': '501', 'name': 'Shelf', 'parent': '500'},
+            {'id': '500', 'name': 'Warehouse', 'description': 'Offsite storage'},
+            {'id': '502', 'name': 'Bin', 'parent': '501'},
+            # New locations within an existing tree
+            {'id': '503', 'name': 'Drawer_0', 'parent': str(self.office.pk)},
+            {'name': 'Tray', 'parent': '503'},
+        ]
+
+        result = LocationImporter().import_rows(rows)
+
+        self.assertFalse(result.has_errors())
+        self.assertEqual(result.created, 5)
+        self.assertEqual(StockLocation.objects.count(), n + 5)
+
+        warehouse = StockLocation.objects.get(name='Warehouse')
+
+        self.assertTrue(warehouse.is_root_node())
+        self.assertEqual(warehouse.description, 'Offsite storage')
+        self.assertEqual([loc.name for loc in warehouse.get_descendants()], ['Shelf', 'Bin'])
+
+        tray = StockLocation.objects.get(name='Tray')
+
+        self.assertEqual([loc.name for loc in tray.get_ancestors()], ['Office', 'Drawer_0'])
+
+        # The tree structure is the same as if it were rebuilt from scratch
+        fields = ['pk', 'tree_id', 'lft', 'rght', 'level']
+
+        tree = list(StockLocation.objects.order_by('pk').values_list(*fields))
+
+        for tree_id in [warehouse.tree_id, tray.tree_id]:
+            StockLocation.objects.partial_rebuild(tree_id)
+
+        self.assertEqual(tree, list(StockLocation.objects.order_by('pk').values_list(*fields)))
+
+        # Existing locations, duplicate names and invalid parents are rejected
+        result = LocationImporter().import_rows([
+            {'id': str(warehouse.pk), 'name': 'Warehouse'},
+            {'name': 'Shelf', 'parent': str(warehouse.pk)},
+            {'name': 'Nowhere', 'parent': '99999'},
+            {'name': 'Valid'},
+        ])
+
+        self.assertEqual([idx for idx, errors in result.errors], [1, 2, 3])
+        self.assertIn('id', result.errors[0][1])
+        self.assertIn('name', result.errors[1][1])
+        self.assertIn('parent', result.errors[2][1])
+
+        # Nothing was imported
+        self.assertEqual(result.created, 0)
+        self.assertEqual(StockLocation.objects.count(), n + 5)
@@ -11,6 +11,7 @@ from django.views.generic import DetailView, ListView, UpdateView
 from django.forms.models import model_to_dict
 from django.forms import HiddenInput
 from django.urls import reverse
+from django.http import JsonResponse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 
@@ -24,21 +25,24 @@ from InvenTree.views import QRCodeView
 from InvenTree.views import InvenTreeRoleMixin
 from InvenTree.forms import ConfirmForm
 
-from InvenTree.helpers import str2bool, DownloadFile, GetExportFormats
+from InvenTree.exporter import DownloadExport
+from InvenTree.helpers import str2bool, GetExportFormats
 from InvenTree.helpers import extract_serial_numbers
 
 from decimal import Decimal, InvalidOperation
 from datetime import datetime, timedelta
 
-from company.models import Company, SupplierPart
+from company.models import SupplierPart
 from part.models import Part
 from .models import StockItem, StockLocation, StockItemTracking, StockItemAttachment, StockItemTestResult
 
 import common.settings
 from common.models import InvenTreeSetting
+from common.tasks import offload_task, is_worker_running
 from users.models import Owner
 
-from .admin import StockItemResource
+from .admin import StockItemResource, stock_export_queryset
+from .adjustment import StockAdjustment
 
 from . import forms as StockForms
 
@@ -545,46 +549,6 @@ class StockExport(AjaxView):
     def get(self, request, *args, **kwargs):
 
         export_format = request.GET.get('format', 'csv').lower()
-        
-        # Check if a particular location was specified
-        loc_id = request.GET.get('location', None)
-        location = None
-        
-        if loc_id:
-            try:
-                location = StockLocation.objects.get(pk=loc_id)
-            except (ValueError, StockLocation.DoesNotExist):
-                pass
-
-        # Check if a particular supplier was specified
-        sup_id = request.GET.get('supplier', None)
-        supplier = None
-
-        if sup_id:
-            try:
-                supplier = Company.objects.get(pk=sup_id)
-            except (ValueError, Company.DoesNotExist):
-                pass
-
-        # Check if a particular supplier_part was specified
-        sup_part_id = request.GET.get('supplier_part', None)
-        supplier_part = None
-
-        if sup_part_id:
-            try:
-                supplier_part = SupplierPart.objects.get(pk=sup_part_id)
-            except (ValueError, SupplierPart.DoesNotExist):
-                pass
-
-        # Check if a particular part was specified
-        part_id = request.GET.get('part', None)
-        part = None
-
-        if part_id:
-            try:
-                part = Part.objects.get(pk=part_id)
-            except (ValueError, Part.DoesNotExist):
-                pass
 
         if export_format not in GetExportFormats():
             export_format = 'csv'
@@ -594,34 +558,20 @@ class StockExport(AjaxView):
             fmt=export_format
         )
 
-        if location:
-            # CHeck if locations should be cascading
-            cascade = str2bool(request.GET.get('cascade', True))
-            stock_items = location.get_stock_items(cascade)
-        else:
-            cascade = True
-            stock_items = StockItem.objects.all()
-
-        if part:
-            stock_items = stock_items.filter(part=part)
-
-        if supplier:
-            stock_items = stock_items.filter(supplier_part__supplier=supplier)
-
-        if supplier_part:
-            stock_items = stock_items.filter(supplier_part=supplier_part)
+        if str2bool(request.GET.get('background', False)) and is_worker_running():
+            # Generate the export file in the background
+            task = offload_task('stock.tasks.export_stock', request.GET.dict(), export_format, filename, user=request.user)
 
-        # Filter out stock items that are not 'in stock'
-        stock_items = stock_items.filter(StockItem.IN_STOCK_FILTER)
+            data = {
+                'task': task.pk,
+                'url': reverse('api-task-detail', kwargs={'pk': task.pk}),
+            }
 
-        # Pre-fetch related fields to reduce DB queries
-        stock_items = stock_items.prefetch_related('part', 'supplier_part__supplier', 'location', 'purchase_order', 'build')
+            return JsonResponse(data, status=202)
 
-        dataset = StockItemResource().export(queryset=stock_items)
+        stock_items = stock_export_queryset(request.GET)
 
-        filedata = dataset.export(export_format)
-
-        return DownloadFile(filedata, filename)
+        return DownloadExport(StockItemResource(), stock_items, export_format, filename)
 
 
 class StockItemQRCode(QRCodeView):
@@ -938,22 +888,33 @@ class StockAdjust(AjaxView, FormMixin):
     def get_POST_items(self):
         """ Return list of stock items sent back by client on a POST request """
 
-        items = []
+        quantities = {}
 
         for item in self.request.POST:
             if item.startswith('stock-id-'):
                 
                 pk = item.replace('stock-id-', '')
-                q = self.request.POST[item]
 
                 try:
-                    stock_item = StockItem.objects.get(pk=pk)
-                except StockItem.DoesNotExist:
+                    quantities[int(pk)] = self.request.POST[item]
+                except ValueError:
                     continue
 
-                stock_item.new_quantity = q
+        # Load all the stock items at once
+        stock_items = StockItem.objects.select_related('part', 'location').in_bulk(quantities.keys())
+
+        items = []
+
+        for pk, q in quantities.items():
+
+            stock_item = stock_items.get(pk, None)
+
+            if stock_item is None:
+                continue
 
-                items.append(stock_item)
+            stock_item.new_quantity = q
+
+            items.append(stock_item)
 
         return items
 
@@ -1105,85 +1066,76 @@ class StockAdjust(AjaxView, FormMixin):
         else:
             return _('No action performed')
 
-    def do_add(self):
-        
-        count = 0
-        note = self.request.POST['note']
+    def adjust(self, action, items, location=None):
+        """
+        Perform a batch adjustment of the provided items (see stock.adjustment)
 
-        for item in self.stock_items:
-            if item.new_quantity <= 0:
-                continue
+        Returns the number of items adjusted
+        """
 
-            item.add_stock(item.new_quantity, self.request.user, notes=note)
+        adjustment = StockAdjustment(action, self.request.user, notes=self.request.POST['note'], location=location)
 
-            count += 1
+        result = adjustment.run([(item, item.new_quantity) for item in items])
 
-        return f"{_('Added stock to ')} {count} {_('items')}"
+        # Update the quantity of the items in this view
+        adjusted = dict([(item.pk, item) for item in result.adjusted])
 
-    def do_take(self):
+        for item in items:
+            if item.pk in adjusted:
+                item.quantity = adjusted[item.pk].quantity
 
-        count = 0
-        note = self.request.POST['note']
+        return result.count
 
-        for item in self.stock_items:
-            if item.new_quantity <= 0:
-                continue
+    def do_add(self):
+        
+        items = [item for item in self.stock_items if item.new_quantity > 0]
 
-            item.take_stock(item.new_quantity, self.request.user, notes=note)
+        count = self.adjust('add', items)
 
-            count += 1
+        return f"{_('Added stock to ')} {count} {_('items')}"
+
+    def do_take(self):
+
+        items = [item for item in self.stock_items if item.new_quantity > 0]
+
+        count = self.adjust('take', items)
 
         return f"{_('Removed stock from ')} {count} {_('items')}"
 
     def do_count(self):
         
-        count = 0
-        note = self.request.POST['note']
-
-        for item in self.stock_items:
-            
-            item.stocktake(item.new_quantity, self.request.user, notes=note)
-
-            count += 1
+        count = self.adjust('count', self.stock_items)
 
         return _("Counted stock for {n} items".format(n=count))
 
     def do_move(self, destination, set_loc=None):
         """ Perform actual stock movement """
 
-        count = 0
+        if destination is None:
+            return _('No items were moved')
 
-        note = self.request.POST['note']
+        items = []
 
         for item in self.stock_items:
             # Avoid moving zero quantity
             if item.new_quantity <= 0:
                 continue
 
-            # If we wish to set the destination location to the default one
-            if set_loc:
-                item.part.default_location = destination
-                item.part.save()
-            
             # Do not move to the same location (unless the quantity is different)
             if destination == item.location and item.new_quantity == item.quantity:
                 continue
 
-            item.move(destination, note, self.request.user, quantity=item.new_quantity)
+            items.append(item)
 
-            count += 1
+        # If we wish to set the destination location to the default one
+        if set_loc:
+            parts = dict([(item.part.pk, item.part) for item in items])
 
-        # Is ownership control enabled?
-        stock_ownership_control = InvenTreeSetting.get_setting('STOCK_OWNERSHIP_CONTROL')
-
-        if stock_ownership_control:
-            # Fetch destination owner
-            destination_owner = destination.owner
+            for part in parts.values():
+                part.default_location = destination
+                part.save()
 
-            if destination_owner:
-                # Update owner
-                item.owner = destination_owner
-                item.save()
+        count = self.adjust('move', items, location=destination)
 
         if count == 0:
             return _('No items were moved')
@@ -1497,7 +1449,7 @@ class StockItemSerialize(AjaxUpdateView):
             destination = None
 
         try:
-            numbers = extract_serial_numbers(serials, quantity)
+            numbers = extract_serial_numbers(serials, quantity, allocator=item.part.allocate_serial_numbers)
         except ValidationError as e:
             form.add_error('serial_numbers', e.messages)
             valid = False
@@ -1772,7 +1724,7 @@ class StockItemCreate(AjaxCreateView):
 
             if len(sn) > 0:
                 try:
-                    serials = extract_serial_numbers(sn, quantity)
+                    serials = extract_serial_numbers(sn, quantity, allocator=part.allocate_serial_numbers)
                 except ValidationError as e:
                     serials = None
                     form.add_error('serial_numbers', e.messages)
@@ -1814,7 +1766,7 @@ class StockItemCreate(AjaxCreateView):
 
             # Create a single stock item for each provided serial number
             if len(sn) > 0:
-                serials = extract_serial_numbers(sn, quantity)
+                serials = extract_serial_numbers(sn, quantity, allocator=part.allocate_serial_numbers)
 
                 for serial in serials:
                     item = StockItem(
@@ -4,13 +4,16 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db.models import UniqueConstraint, Q
 from django.db.utils import IntegrityError
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from common.cache import get_stamp
 
 import logging
 
@@ -58,6 +61,8 @@ class RuleSet(models.Model):
             'auth_permission',
             'authtoken_token',
             'users_ruleset',
+            'common_backgroundtask',
+            'common_workerheartbeat',
         ],
         'part_category': [
             'part_partcategory',
@@ -73,6 +78,7 @@ class RuleSet(models.Model):
             'part_partparameter',
             'part_partrelated',
             'part_partstar',
+            'part_partstocksummary',
             'company_supplierpart',
         ],
         'stock_location': [
@@ -80,6 +86,7 @@ class RuleSet(models.Model):
             'label_stocklocationlabel',
         ],
         'stock': [
+            'barcodes_barcodehash',
             'stock_stockitem',
             'stock_stockitemattachment',
             'stock_stockitemtracking',
@@ -123,6 +130,7 @@ class RuleSet(models.Model):
         'sessions_session',
 
         # Models which currently do not require permissions
+        'common_cacheversion',
         'common_colortheme',
         'common_inventreesetting',
         'company_contact',
@@ -398,6 +406,117 @@ def create_missing_rule_sets(sender, instance, **kwargs):
     update_group_roles(instance)
 
 
+# Key for the roles version stamp (see common.cache.VersionStamp), which is shared between processes
+ROLES_VERSION_KEY = 'inventree-roles-version'
+
+# Time (seconds) for which a role map is kept in the shared cache
+ROLES_CACHE_TIMEOUT = 3600
+
+# Number of role changes seen by this process
+# (used to discard role maps calculated before a change, including uncommitted changes)
+roles_generation = 0
+
+
+def get_roles_version():
+    """
+    Return the current version stamp for user roles (or None if it is not available).
+
+    The stamp is changed whenever any role assignment changes.
+    Changes made by other processes are seen within VersionStamp.CHECK_INTERVAL seconds.
+    """
+
+    return get_stamp(ROLES_VERSION_KEY).get()
+
+
+def invalidate_user_roles():
+    """
+    Invalidate the cached role maps for all users
+    """
+
+    global roles_generation
+
+    roles_generation += 1
+
+    get_stamp(ROLES_VERSION_KEY).increment()
+
+
+def calculate_user_roles(user):
+    """
+    Calculate the role map for a user, from the RuleSet objects for each group the user is in.
+
+    Roles are additive across groups.
+
+    Returns:
+        Dict of {role: {permission: bool}} for every available role
+    """
+
+    roles = {}
+
+    for role in RuleSet.RULESET_NAMES:
+        roles[role] = {}
+
+        for permission in RuleSet.RULESET_PERMISSIONS:
+            roles[role][permission] = user.is_superuser
+
+    if user.is_superuser or user.pk is None:
+        return roles
+
+    # Load all rulesets for all groups in a single query
+    rulesets = RuleSet.objects.filter(group__user=user)
+
+    for rule in rulesets:
+
+        if rule.name not in roles:
+            continue
+
+        roles[rule.name]['view'] |= rule.can_view
+        roles[rule.name]['add'] |= rule.can_add
+        roles[rule.name]['change'] |= rule.can_change
+        roles[rule.name]['delete'] |= rule.can_delete
+
+    return roles
+
+
+def get_user_roles(user):
+    """
+    Return the (cached) role map for the provided user.
+
+    - The map is stored against the user object, so it is only calculated once per request
+    - The map is also stored in the shared cache (keyed by the roles version stamp), so it is re-used across requests
+    - Both copies are discarded when any role assignment changes
+
+    The shared cache is not used inside a transaction which has changed any role assignment
+    (as the roles version stamp is not available until the change is committed).
+
+    Returns:
+        Dict of {role: {permission: bool}} for every available role
+    """
+
+    version = get_roles_version()
+
+    key = (version, roles_generation, user.is_superuser)
+
+    cached = getattr(user, '_inventree_roles', None)
+
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    if version is not None and user.pk is not None:
+        cache_key = f"user-roles-{user.pk}-{int(user.is_superuser)}-{version}"
+
+        roles = cache.get(cache_key)
+
+        if roles is None:
+            roles = calculate_user_roles(user)
+            cache.set(cache_key, roles, ROLES_CACHE_TIMEOUT)
+    else:
+        roles = calculate_user_roles(user)
+
+    user._inventree_roles = (key, roles)
+
+    return roles
+
+
 def check_user_role(user, role, permission):
     """
     Check if a user has a particular role:permission combination.
@@ -408,26 +527,39 @@ def check_user_role(user, role, permission):
     if user.is_superuser:
         return True
 
-    for group in user.groups.all():
+    roles = get_user_roles(user)
 
-        for rule in group.rule_sets.all():
+    return roles.get(role, {}).get(permission, False)
 
-            if rule.name == role:
 
-                if permission == 'add' and rule.can_add:
-                    return True
+def after_roles_change(**kwargs):
+    """
+    Invalidate cached role maps when any role assignment changes.
 
-                if permission == 'change' and rule.can_change:
-                    return True
+    The cache is invalidated immediately, and again once the change is committed
+    """
 
-                if permission == 'view' and rule.can_view:
-                    return True
+    invalidate_user_roles()
 
-                if permission == 'delete' and rule.can_delete:
-                    return True
+    transaction.on_commit(invalidate_user_roles)
+
+
+@receiver(post_save, sender=RuleSet, dispatch_uid='ruleset_save_invalidate_roles')
+@receiver(post_delete, sender=RuleSet, dispatch_uid='ruleset_delete_invalidate_roles')
+@receiver(post_delete, sender=Group, dispatch_uid='group_delete_invalidate_roles')
+@receiver(post_delete, sender=get_user_model(), dispatch_uid='user_delete_invalidate_roles')
+def after_ruleset_change(sender, instance, **kwargs):
+    """ Called when a RuleSet (or Group / User) is saved or deleted """
+
+    after_roles_change()
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through, dispatch_uid='user_groups_invalidate_roles')
+def after_user_groups_change(sender, instance, action, **kwargs):
+    """ Called when the groups for a User are changed """
 
-    # No matching permissions found
-    return False
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        after_roles_change()
 
 
 class Owner(models.Model):
@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from django.test import TestCase
+import time
+
+from django.test import TestCase, TransactionTestCase
 from django.apps import apps
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models import F
+
+from common.cache import get_stamp
+from common.models import CacheVersion
 
-from users.models import RuleSet, Owner
+from users.models import RuleSet, Owner, check_user_role, get_user_roles, ROLES_VERSION_KEY
 
 
 class RuleSetModelTest(TestCase):
@@ -160,6 +167,138 @@ class RuleSetModelTest(TestCase):
         self.assertEqual(group.permissions.count(), 0)
 
 
+class UserRoleTest(TestCase):
+    """
+    Tests for the (cached) user role map
+    """
+
+    def setUp(self):
+
+        self.user = get_user_model().objects.create_user(
+            username='sam',
+            email='sam@email.com',
+            password='custom123',
+        )
+
+        self.group = Group.objects.create(name='role_group')
+
+    def test_roles(self):
+
+        # No groups, no roles
+        self.assertFalse(check_user_role(self.user, 'part', 'view'))
+
+        # Adding the user to a group updates the roles
+        self.user.groups.add(self.group)
+
+        self.assertTrue(check_user_role(self.user, 'part', 'view'))
+        self.assertFalse(check_user_role(self.user, 'part', 'add'))
+
+        # Changing a ruleset updates the roles
+        rule = self.group.rule_sets.get(name='part')
+        rule.can_add = True
+        rule.save()
+
+        self.assertTrue(check_user_role(self.user, 'part', 'add'))
+        self.assertFalse(check_user_role(self.user, 'stock', 'add'))
+
+        # Removing the user from the group updates the roles
+        self.user.groups.remove(self.group)
+
+        self.assertFalse(check_user_role(self.user, 'part', 'view'))
+
+        # Superuser can do anything
+        self.user.is_superuser = True
+        self.user.save()
+
+        roles = get_user_roles(self.user)
+
+        self.assertTrue(roles['stock']['delete'])
+
+    def test_cached(self):
+
+        self.user.groups.add(self.group)
+
+        get_user_roles(self.user)
+
+        # Role map is cached against the user object
+        with self.assertNumQueries(0):
+            for role in RuleSet.RULESET_NAMES:
+                for permission in RuleSet.RULESET_PERMISSIONS:
+                    check_user_role(self.user, role, permission)
+
+        # The role change is not committed, so the role map is not shared between user objects (i.e. between requests)
+        user = get_user_model().objects.get(pk=self.user.pk)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(check_user_role(user, 'part', 'view'))
+
+
+class UserRoleCacheTest(TransactionTestCase):
+    """
+    Tests for the shared user role cache (a TransactionTestCase is used, so that role changes are committed)
+    """
+
+    def setUp(self):
+
+        cache.clear()
+
+        self.user = get_user_model().objects.create_user(
+            username='sam',
+            email='sam@email.com',
+            password='custom123',
+        )
+
+        self.group = Group.objects.create(name='role_group')
+
+        self.user.groups.add(self.group)
+
+        self.stamp = get_stamp(ROLES_VERSION_KEY)
+
+    def get_user(self):
+        """ Load a new user object (as per a new request) """
+
+        user = get_user_model().objects.get(pk=self.user.pk)
+
+        # Prevent the version stamp from being re-read during the test
+        self.stamp.checked = time.monotonic()
+
+        return user
+
+    def test_shared(self):
+
+        self.assertTrue(check_user_role(self.get_user(), 'part', 'view'))
+
+        # The role map is shared between user objects (i.e. between requests)
+        user = self.get_user()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(check_user_role(user, 'part', 'view'))
+            self.assertFalse(check_user_role(user, 'part', 'add'))
+
+        # A committed role change invalidates the shared role map
+        rule = self.group.rule_sets.get(name='part')
+        rule.can_add = True
+        rule.save()
+
+        self.assertTrue(check_user_role(self.get_user(), 'part', 'add'))
+
+        # Changes made by another process are seen once the version stamp is re-read
+        # (the group membership is removed without sending a signal, as if by another process)
+        get_user_model().groups.through.objects.filter(user=self.user).delete()
+
+        user = self.get_user()
+
+        self.assertTrue(check_user_role(user, 'part', 'view'))
+
+        CacheVersion.objects.filter(key=ROLES_VERSION_KEY).update(version=F('version') + 1)
+
+        user = self.get_user()
+
+        self.stamp.checked = 0
+
+        self.assertFalse(check_user_role(user, 'part', 'view'))
+
+
 class OwnerModelTest(TestCase):
     """
     Some simplistic tests to ensure the Owner model is setup correctly.
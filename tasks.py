@@ -112,6 +112,15 @@ def shell(c):
     manage(c, 'shell', pty=True)
 
 
+@task
+def worker(c):
+    """
+    Run the background task worker processes.
+    """
+
+    manage(c, 'worker', pty=True)
+
+
 @task
 def superuser(c):
     """